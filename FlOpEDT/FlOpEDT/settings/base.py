@@ -126,6 +126,8 @@ CACHES = {
 }
 
 CACHE_COUNT_TIMEOUT = 24 * 3600
+# Lifetime of the cached lists of (un)scheduled courses (cf. api.fetch.views.CoursesCacheMixin)
+COURSES_CACHE_TIMEOUT = 3600
 CACHE_INVALIDATE_ON_CREATE = 'whole-model'
 CACHE_MACHINE_USE_REDIS = True
 REDIS_BACKEND = 'redis://127.0.0.1:6379/1'
@@ -312,6 +314,73 @@ except KeyError:
     print("WARNING - GUROBI License is not declared. GUROBI solver won't be available")
     pass
 
+# Define the backend used to build the ILP models: 'pulp' (default) or 'matrix'
+MODEL_BACKEND = 'pulp'
+try:
+    MODEL_BACKEND = flop_config['flopedt']['model_backend']
+except KeyError:
+    pass
+
+# Define the number of solve jobs that the solver workers may run concurrently
+SOLVE_WORKERS = 2
+try:
+    SOLVE_WORKERS = int(flop_config['flopedt']['solve_workers'])
+except KeyError:
+    pass
+
+# Define how many processes solve in parallel the weeks of a job whose weeks are not solved together,
+# and the number of threads shared by the solvers (None lets the solver decide)
+SOLVE_WEEKS_PROCESSES = 1
+try:
+    SOLVE_WEEKS_PROCESSES = int(flop_config['flopedt']['solve_weeks_processes'])
+except KeyError:
+    pass
+SOLVER_THREADS = None
+try:
+    SOLVER_THREADS = int(flop_config['flopedt']['solver_threads'])
+except KeyError:
+    pass
+
+# Define how many built models each solver worker keeps (0 disables the model sessions), and for how long
+# (in seconds): a job solving the same weeks with the same parameters as a kept model only updates the
+# constraints that have been toggled or modified, and starts from the previous solution
+SOLVE_MODEL_SESSIONS = 0
+try:
+    SOLVE_MODEL_SESSIONS = int(flop_config['flopedt']['solve_model_sessions'])
+except KeyError:
+    pass
+SOLVE_MODEL_SESSION_TTL = 600
+try:
+    SOLVE_MODEL_SESSION_TTL = int(flop_config['flopedt']['solve_model_session_ttl'])
+except KeyError:
+    pass
+
+# Define how many processes run the constraints pre-analyses of a department (cf. TTapp.GlobalPreAnalysis)
+PRE_ANALYSIS_PROCESSES = 4
+try:
+    PRE_ANALYSIS_PROCESSES = int(flop_config['flopedt']['pre_analysis_processes'])
+except KeyError:
+    pass
+
+# Define the weeks covered by the ics feeds, before and after the current one, and how long (in seconds) a
+# rendered feed is kept: a feed is rendered again as soon as a week of the timetable is modified, the timeout
+# only bounds the staleness after the changes that do not increase the timetable version
+ICS_WEEKS_BEFORE = 8
+try:
+    ICS_WEEKS_BEFORE = int(flop_config['flopedt']['ics_weeks_before'])
+except KeyError:
+    pass
+ICS_WEEKS_AFTER = 52
+try:
+    ICS_WEEKS_AFTER = int(flop_config['flopedt']['ics_weeks_after'])
+except KeyError:
+    pass
+ICS_CACHE_TIMEOUT = 3600
+try:
+    ICS_CACHE_TIMEOUT = int(flop_config['flopedt']['ics_cache_timeout'])
+except KeyError:
+    pass
+
 # Define subdirs and other dirs
 MEDIA_ROOT=TMP_DIRECTORY
 CONF_XLS_DIR=os.path.join(STORAGE_DIRECTORY,'configuration')
@@ -48,7 +48,8 @@ class MyTTModel(TTModel):
                  keep_many_solution_files=False,
                  min_visio=0.5,
                  pre_assign_rooms=False,
-                 post_assign_rooms=True):
+                 post_assign_rooms=True,
+                 model_backend=None):
         """
         If you shall change something in the database ahead of creating the
         problem, you must write it here, before calling TTModel's constructor.
@@ -70,7 +71,8 @@ class MyTTModel(TTModel):
                          keep_many_solution_files=keep_many_solution_files,
                          min_visio=min_visio,
                          pre_assign_rooms=pre_assign_rooms,
-                         post_assign_rooms=post_assign_rooms)
+                         post_assign_rooms=post_assign_rooms,
+                         model_backend=model_backend)
 
     def add_specific_constraints(self):
         """
@@ -82,7 +84,7 @@ class MyTTModel(TTModel):
 
     def solve(self, time_limit=None, target_work_copy=None,
               solver=GUROBI_NAME, threads=None, ignore_sigint=True, send_gurobi_logs_email_to=None,
-              with_numerotation=True):
+              with_numerotation=True, warm_start=False, mip_start_work_copy=None):
         """
         If you shall add pre (or post) processing apps, you may write them down
         here.
@@ -93,7 +95,9 @@ class MyTTModel(TTModel):
                                          solver=solver,
                                          threads=threads,
                                          ignore_sigint=ignore_sigint,
-                                         send_gurobi_logs_email_to=send_gurobi_logs_email_to)
+                                         send_gurobi_logs_email_to=send_gurobi_logs_email_to,
+                                         warm_start=warm_start,
+                                         mip_start_work_copy=mip_start_work_copy)
         if with_numerotation:
             number_courses(self.department, from_week=self.weeks[0], until_week=self.weeks[-1],
                            work_copy=result_work_copy)
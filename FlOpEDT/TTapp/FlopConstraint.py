@@ -29,6 +29,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
 from django.db import models
+from django.forms.models import model_to_dict
 
 max_weight = 8
 
@@ -38,6 +39,18 @@ def all_subclasses(cls):
         [s for c in cls.__subclasses__() for s in all_subclasses(c)])
 
 
+def flop_constraint_signature(flop_constraint):
+    """
+    Values of the fields of flop_constraint, the many-to-many ones as sets of ids: two different
+    signatures mean that the constraint has been modified
+    """
+    signature = model_to_dict(flop_constraint)
+    for field in flop_constraint._meta.many_to_many:
+        if field.name in signature:
+            signature[field.name] = frozenset(obj.pk for obj in signature[field.name])
+    return signature
+
+
 class FlopConstraint(models.Model):
     """
     Abstract parent class of specific constraints that users may define
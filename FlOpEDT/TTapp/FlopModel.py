@@ -24,6 +24,7 @@
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
 import os, fnmatch
+from contextlib import contextmanager
 
 from pulp import LpVariable, LpConstraint, LpBinary, LpConstraintEQ, \
     LpConstraintGE, LpConstraintLE, LpAffineExpression, LpProblem, LpStatus, \
@@ -36,6 +37,7 @@ from TTapp.ilp_constraints.constraintManager import ConstraintManager
 from TTapp.ilp_constraints.constraint import Constraint
 from TTapp.ilp_constraints.constraint_type import ConstraintType
 from base.models import Department, ScheduledCourse
+from base.room_closure import check_room_closure_version
 
 from core.decorators import timer
 from django.db import close_old_connections
@@ -45,6 +47,7 @@ from django.conf import settings
 from TTapp.TTConstraints.TTConstraint import TTConstraint
 from TTapp.RoomConstraints.RoomConstraint import RoomConstraint
 from TTapp.FlopConstraint import all_subclasses
+from TTapp.matrix_problem import MatrixProblem, MatrixExpr
 
 logger = logging.getLogger(__name__)
 pattern = r".+: (.|\s)+ (=|>=|<=) \d*"
@@ -53,13 +56,26 @@ GUROBI_NAME = 'GUROBI_CMD'
 solution_files_path = os.path.join(settings.TMP_DIRECTORY,"misc/logs/solutions")
 iis_files_path = os.path.join(settings.TMP_DIRECTORY,"misc/logs/iis")
 gurobi_log_files_path = os.path.join(settings.TMP_DIRECTORY,"misc/logs/gurobi")
+# number of rows sent by each INSERT/UPDATE query when a solution is stored
+bulk_batch_size = 1000
+PULP_BACKEND = 'pulp'
+MATRIX_BACKEND = 'matrix'
 
 
 class FlopVar:
-    def __init__(self, id, name):
-        self.name = name
+    def __init__(self, id, name, name_args=()):
+        self._name = name
+        self.name_args = name_args
         self.id = id
 
+    @property
+    def name(self):
+        # the name is formatted when it is first used (e.g. by the IIS translation)
+        if self.name_args:
+            self._name = self._name % self.name_args
+            self.name_args = ()
+        return self._name
+
     def __str__(self):
         return self.name
 
@@ -67,29 +83,50 @@ class FlopVar:
         return self.name
 
 
+def flop_constraint_key(flop_constraint):
+    return flop_constraint.__class__.__name__, flop_constraint.id
+
+
 class FlopModel(object):
-    def __init__(self, department_abbrev, weeks, keep_many_solution_files=False, use_flop_vars=False):
+    def __init__(self, department_abbrev, weeks, keep_many_solution_files=False, use_flop_vars=False,
+                 model_backend=None):
         self.use_flop_vars = use_flop_vars
+        # the room hierarchy is read once for the whole build
+        check_room_closure_version()
         self.department = Department.objects.get(abbrev=department_abbrev)
         self.weeks = weeks
-        self.model = LpProblem(self.solution_files_prefix(), LpMinimize)
+        # PULP_BACKEND builds PuLP objects, MATRIX_BACKEND stores the constraints as sparse triplets
+        if model_backend is None:
+            model_backend = getattr(settings, 'MODEL_BACKEND', PULP_BACKEND)
+        if model_backend not in (PULP_BACKEND, MATRIX_BACKEND):
+            raise Exception(f"model_backend must be either '{PULP_BACKEND}' or '{MATRIX_BACKEND}'")
+        self.model_backend = model_backend
+        if self.model_backend == MATRIX_BACKEND:
+            self.model = MatrixProblem(self.solution_files_prefix())
+        else:
+            self.model = LpProblem(self.solution_files_prefix(), LpMinimize)
         self.keep_many_solution_files = keep_many_solution_files
         self.var_nb = 0
         if self.use_flop_vars:
             self.vars = {}
         self.constraintManager = ConstraintManager()
+        # key of the FlopConstraint being added, cf. enriching
+        self.current_flop_constraint = None
         self.one_var = self.add_var()
         self.add_constraint(self.one_var, '==', 1, Constraint(constraint_type=ConstraintType.TECHNICAL))
         self.warnings = {}
         self.obj = self.lin_expr()
 
-    def add_var(self, name=""):
+    def add_var(self, name="", *name_args):
         """
-        Create a PuLP binary variable
+        Create a binary variable
+        name may be a %-format completed by name_args: it is formatted only if the name is needed
         """
         self.var_nb += 1
         if self.use_flop_vars:
-            self.vars[self.var_nb] = FlopVar(self.var_nb, name)
+            self.vars[self.var_nb] = FlopVar(self.var_nb, name, name_args)
+        if self.model_backend == MATRIX_BACKEND:
+            return self.model.add_var(str(self.var_nb))
         return LpVariable(str(self.var_nb), cat=LpBinary)
 
     def add_constraint(self, expr, relation, value, constraint=Constraint()):
@@ -99,7 +136,11 @@ class FlopModel(object):
         constraint_id = self.constraintManager.get_nb_constraints()
 
         # Add mathematic constraint
-        if relation == '==':
+        if self.model_backend == MATRIX_BACKEND:
+            if relation not in ('==', '<=', '>='):
+                raise Exception("relation must be either '==' or '>=' or '<='")
+            self.model.add_constraint(expr, relation, value, name=str(constraint_id))
+        elif relation == '==':
             pulp_relation = LpConstraintEQ
         elif relation == '<=':
             pulp_relation = LpConstraintLE
@@ -107,19 +148,53 @@ class FlopModel(object):
             pulp_relation = LpConstraintGE
         else:
             raise Exception("relation must be either '==' or '>=' or '<='")
-        self.model += LpConstraint(e=expr, sense=pulp_relation,
-                                   rhs=value, name=str(constraint_id))
+        if self.model_backend == PULP_BACKEND:
+            self.model += LpConstraint(e=expr, sense=pulp_relation,
+                                       rhs=value, name=str(constraint_id))
 
         # Add intelligible constraint
         constraint.id = constraint_id
-        self.constraintManager.add_constraint(constraint)
+        self.constraintManager.add_constraint(constraint, self.current_flop_constraint)
 
-    @staticmethod
-    def lin_expr(expr=None):
+    def add_cost(self, costs, key, cost):
+        """
+        Adds cost to costs[key]
+        """
+        costs[key] += cost
+        if self.current_flop_constraint is not None:
+            self.constraintManager.add_cost(self.current_flop_constraint, costs, key, cost)
+
+    @contextmanager
+    def enriching(self, flop_constraint):
+        """
+        Tags with flop_constraint the constraints and the costs added inside the with block,
+        so that remove_flop_constraint may remove them
+        """
+        self.current_flop_constraint = flop_constraint_key(flop_constraint)
+        try:
+            yield
+        finally:
+            self.current_flop_constraint = None
+
+    def remove_flop_constraint(self, key):
+        """
+        Removes from the model the constraints and the costs added by the FlopConstraint of key
+        (cf. flop_constraint_key). The variables it has created are kept, unconstrained.
+        """
+        constraints_ids, costs_terms = self.constraintManager.pop_flop_constraint(key)
+        for constraint_id in constraints_ids:
+            self.remove_constraint(str(constraint_id))
+        for costs, cost_key, cost in costs_terms:
+            costs[cost_key] -= cost
+
+    def lin_expr(self, expr=None):
+        if self.model_backend == MATRIX_BACKEND:
+            return MatrixExpr(expr)
         return LpAffineExpression(expr)
 
-    @staticmethod
-    def sum(*args):
+    def sum(self, *args):
+        if self.model_backend == MATRIX_BACKEND:
+            return MatrixExpr.sum(*args)
         return lpSum(list(*args))
 
     @staticmethod
@@ -143,16 +218,26 @@ class FlopModel(object):
         return l
 
     def set_objective(self, obj):
-        self.model.setObjective(obj)
+        if self.model_backend == MATRIX_BACKEND:
+            self.model.set_objective(obj)
+        else:
+            self.model.setObjective(obj)
 
     def get_constraint(self, name):
+        if self.model_backend == MATRIX_BACKEND:
+            return self.model.get_constraint(name)
         return self.model.constraints[name]
 
     def get_all_constraints(self):
+        if self.model_backend == MATRIX_BACKEND:
+            return self.model.get_all_constraints()
         return self.model.constraints
 
     def remove_constraint(self, constraint_name):
-        del self.model.constraints[constraint_name]
+        if self.model_backend == MATRIX_BACKEND:
+            self.model.remove_constraint(constraint_name)
+        else:
+            del self.model.constraints[constraint_name]
 
     def var_coeff(self, var, constraint):
         return constraint[var]
@@ -264,8 +349,7 @@ class FlopModel(object):
         iis_filename = self.iis_filename()
         if write_iis:
             from gurobipy import read, GurobiError
-            lp = f"{self.solution_files_prefix()}-pulp.lp"
-            m = read(lp)
+            m = read(self.model_filename())
             if presolve:
                 try:
                     mp = m.presolve()
@@ -282,14 +366,26 @@ class FlopModel(object):
                                                          iis_files_path,
                                                          self.iis_filename_suffixe())
             
+    def model_filename(self):
+        if self.model_backend == MATRIX_BACKEND:
+            return f"{self.solution_files_prefix()}-matrix.mps"
+        return f"{self.solution_files_prefix()}-pulp.lp"
+
+    def mip_start_filename(self, warm_start=True):
+        if not warm_start:
+            return None
+        return f"{self.solution_files_prefix()}-matrix.mst"
+
     def gurobi_log_file(self):
         return f"{gurobi_log_files_path}/{self.log_files_prefix()}_gurobi.log"
 
     @timer
-    def optimize(self, time_limit, solver, presolve=2, threads=None, ignore_sigint=True):
+    def optimize(self, time_limit, solver, presolve=2, threads=None, ignore_sigint=True, warm_start=False):
         # The solver value shall be one of the available
         # solver corresponding pulp command or contain
         # gurobi
+        # If warm_start, the current values of the variables (e.g. the previous solution) are given
+        # to the solver as a MIP start
         if 'gurobi' in solver.lower() and hasattr(pulp, GUROBI_NAME):
             self.delete_solution_files(all=True)
             if ignore_sigint:
@@ -307,11 +403,33 @@ class FlopModel(object):
             if self.keep_many_solution_files:
                 options.append(('SolFiles',
                                 f"{self.solution_files_prefix()}"))
-            result = self.model.solve(GUROBI_CMD(keepFiles=1,
-                                                 msg=True,
-                                                 options=options))
-            if result is None or result == 0:
-                self.write_infaisability()
+            if self.model_backend == MATRIX_BACKEND:
+                self.model.solve_with_gurobi(GUROBI_CMD().path, options,
+                                             self.model_filename(),
+                                             f"{self.solution_files_prefix()}-matrix.sol",
+                                             start_filename=self.mip_start_filename(warm_start))
+                # a stopped optimization (time limit...) keeps the solution it found
+                if not self.model.has_solution():
+                    self.write_infaisability()
+            else:
+                result = self.model.solve(GUROBI_CMD(keepFiles=1,
+                                                     msg=True,
+                                                     options=options,
+                                                     warmStart=warm_start))
+                if result is None or result == 0:
+                    self.write_infaisability()
+
+        elif self.model_backend == MATRIX_BACKEND:
+            if solver not in ('PULP_CBC_CMD', 'COIN_CMD'):
+                print(f'Solver {solver} is not available with the {MATRIX_BACKEND} model backend.')
+                return None
+            self.model.solve_with_cbc(getattr(pulp, solver)().path,
+                                      self.model_filename(),
+                                      f"{self.solution_files_prefix()}-matrix.sol",
+                                      time_limit=time_limit,
+                                      presolve=presolve,
+                                      threads=threads,
+                                      start_filename=self.mip_start_filename(warm_start))
 
         elif hasattr(pulp, solver):
             # raise an exception when the solver name is incorrect
@@ -319,14 +437,16 @@ class FlopModel(object):
             self.model.solve(command(keepFiles=1,
                                      msg=True,
                                      presolve=presolve,
-                                     timeLimit=time_limit))
+                                     timeLimit=time_limit,
+                                     warmStart=warm_start))
         else:
             print(f'Solver {solver} not found.')
             return None
 
         status = self.model.status
         print(LpStatus[status])
-        if status == LpStatusOptimal or (solver != GUROBI_NAME and status == LpStatusNotSolved):
+        if status == LpStatusOptimal or (status == LpStatusNotSolved and (
+                solver != GUROBI_NAME or self.model_backend == MATRIX_BACKEND and self.model.has_solution())):
             return self.get_obj_coeffs()
 
         else:
@@ -1,38 +1,79 @@
 # only to solve a bug, maybe to delete
-from TTapp.GlobalPreAnalysis.tools_centralized_preanalysis import getFlopConstraintsInDB
+from TTapp.GlobalPreAnalysis.tools_centralized_preanalysis import snapshots, pre_analysis_snapshot
 import django
 django.setup()
 # end
 
+from contextlib import ExitStack
+import multiprocessing
 
-def pre_analyse(department, week):
+from django.conf import settings
+from django.db import connection, connections
+
+
+def pre_analyse(department, week, processes=None):
     """
         A global pre_analyse function that launch all "pre_analyse" on the existing TTConstraints for the given department and week.
 
     :param department: The department we want to search the TTConstraints that are applied on.
     :param week: The week we want to search the TTConstraints that are applied on.
-    :return: A dictionary with an exit status with a message that contains the reason of why it will be impossible to
-    create a timetable with the given data if the status is KO. If this status is KO for one pre_analyse, the loop stops
-    and the resulting status is the KO status returned by the one pre_analyse that failed.
+    :param processes: The number of processes running the pre-analyses (settings.PRE_ANALYSIS_PROCESSES if None).
+    :return: The list of the KO statuses (a dictionary with a message that contains the reason of why it will be
+    impossible to create a timetable with the given data) returned by the pre_analyse of the constraints.
+
+    """
+    return pre_analyse_weeks(department, [week], processes)[week]
+
 
+def pre_analyse_weeks(department, weeks, processes=None):
     """
+        Launches the "pre_analyse" of the existing TTConstraints for each of the given weeks of the department, for
+    instance for all the weeks of a semester before launching a generation. The data of each week is loaded once in a
+    PreAnalysisSnapshot, and the pre-analyses of all the weeks are run by a pool of processes.
 
-    # Get all the active imperative constraints in database
-    all_constraints_list = getFlopConstraintsInDB(week, department)
+    :param department: The department we want to search the TTConstraints that are applied on.
+    :param weeks: The weeks we want to pre-analyse.
+    :param processes: The number of processes running the pre-analyses (settings.PRE_ANALYSIS_PROCESSES if None).
+    :return: A dictionary giving for each week the list of the KO statuses, as pre_analyse.
+
+    """
+    if processes is None:
+        processes = settings.PRE_ANALYSIS_PROCESSES
+    with ExitStack() as stack:
+        # Get all the active imperative constraints in database, and the data they share
+        tasks = []
+        for week in weeks:
+            snapshot = stack.enter_context(pre_analysis_snapshot(department, week))
+            tasks += [(department.id, week, i) for i in range(len(snapshot.constraints))]
 
-    # Search for each TTConstraint's subclass if we can find an instance of it for the given week and department
-    result=[]
+        processes = min(processes, len(tasks))
+        # the pool processes cannot see the data of an uncommitted transaction
+        if processes <= 1 or connection.in_atomic_block:
+            statuses = [constraint_pre_analyse(*task) for task in tasks]
+        else:
+            # the pool processes must not share the database connections of the current one
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                statuses = pool.starmap(constraint_pre_analyse, tasks)
 
-    for constraint in all_constraints_list:
-        try:
-            json_dict = constraint.pre_analyse(week)
-            if json_dict['status'] != 'OK':
-                # KO status found
-                result.append(json_dict)
-        except AttributeError:
-                pass
+    result = {week: [] for week in weeks}
+    for (_, week, _), json_dict in zip(tasks, statuses):
+        if json_dict is not None:
+            result[week].append(json_dict)
+    return result
 
-    # All status returned by all pre-analysis iterations are OK
-    json_dict = {"status": "OK", "messages": [], "period": {"week": week.nb, "year": week.year}}
 
-    return result
\ No newline at end of file
+def constraint_pre_analyse(department_id, week, constraint_index):
+    """
+    :return: The status returned by the pre_analyse of a constraint of the snapshot of the week if it is KO, None
+    otherwise.
+    """
+    constraint = snapshots[(department_id, week.id)].constraints[constraint_index]
+    try:
+        json_dict = constraint.pre_analyse(week)
+        if json_dict['status'] != 'OK':
+            # KO status found
+            return json_dict
+    except AttributeError:
+            pass
+    return None
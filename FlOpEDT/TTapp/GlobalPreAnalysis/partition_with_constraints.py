@@ -1,4 +1,4 @@
-from TTapp.GlobalPreAnalysis.tools_centralized_preanalysis import getFlopConstraintsInDB
+from TTapp.GlobalPreAnalysis.tools_centralized_preanalysis import getFlopConstraintsInDB, get_snapshot
 from base.partition import Partition
 from base.models import ModulePossibleTutors
 
@@ -137,6 +137,10 @@ def create_course_partition_from_constraints(course, week, department, available
 
     # Init
     week_partition = Partition.get_partition_of_week(week, department, True, available = available)
+    snapshot = get_snapshot(department, week)
+    if snapshot is not None:
+        # with its groups and supplementary tutors
+        course = snapshot.course(course)
     possible_tutors_1 = set()
     required_supp_1 = set()
 
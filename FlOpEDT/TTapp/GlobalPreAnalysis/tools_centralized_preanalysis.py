@@ -1,6 +1,13 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
 from TTapp.FlopConstraint import FlopConstraint
 from TTapp.FlopConstraint import all_subclasses
-from django.db.models import Q
+from base.models import UserPreference, Course, ScheduledCourse
+from django.db.models import Q, prefetch_related_objects
+
+# snapshots of the weeks being pre-analysed, by (department id, week id)
+snapshots = {}
 
 
 def getFlopConstraintsInDB(week, department):
@@ -12,6 +19,9 @@ def getFlopConstraintsInDB(week, department):
     :return: A list of TTConstraint's instances.
 
     """
+    snapshot = get_snapshot(department, week)
+    if snapshot is not None:
+        return list(snapshot.constraints)
 
     # Init
     constraints_list = []
@@ -29,3 +39,103 @@ def getFlopConstraintsInDB(week, department):
                     constraints_list.append(constraint)
 
     return constraints_list
+
+
+class PreAnalysisSnapshot(object):
+    """
+        Read-only data of a week of a department, loaded once and shared by all the pre-analyses of this week
+    (and by the processes running them): the active imperative constraints, the courses of the week with their
+    groups, the scheduled courses of the other departments and the tutors' preferences.
+    """
+    def __init__(self, department, week):
+        self.department = department
+        self.week = week
+        self.constraints = getFlopConstraintsInDB(week, department)
+        # the weeks, groups, tutors... of the constraints, read by their complete_*_partition methods
+        constraints_by_class = defaultdict(list)
+        for constraint in self.constraints:
+            constraints_by_class[type(constraint)].append(constraint)
+        for constraint_class, constraints in constraints_by_class.items():
+            prefetch_related_objects(constraints, *(f.name for f in constraint_class._meta.many_to_many))
+
+        # the courses of every department: the tutors and groups may have courses elsewhere
+        self.courses = {c.id: c for c in Course.objects.filter(week=week)
+                                                       .select_related('type__department', 'tutor', 'module')
+                                                       .prefetch_related('groups', 'supp_tutor')}
+        # the public copy of the other departments
+        self.other_departments_sched_courses = list(
+            ScheduledCourse.objects.filter(course__week=week, work_copy=0)
+                                   .exclude(course__type__department=department)
+                                   .select_related('course__type', 'tutor')
+                                   .prefetch_related('course__supp_tutor'))
+
+        week_preferences = defaultdict(list)
+        default_preferences = defaultdict(list)
+        # the preferences of the tutors of the department, and of the tutors of its courses of the week
+        department_tutors = Q(user__departments=department) \
+            | Q(user__in=Course.objects.filter(type__department=department, week=week).values('tutor'))
+        for up in UserPreference.objects.filter(Q(week=week) | Q(week=None)) \
+                .filter(department_tutors).distinct().select_related('user'):
+            if up.week_id is None:
+                default_preferences[up.user_id].append(up)
+            else:
+                week_preferences[up.user_id].append(up)
+        # the preferences of the week if any, the default ones otherwise
+        self.user_preferences = dict(default_preferences)
+        self.user_preferences.update(week_preferences)
+
+    def tutor_preferences(self, tutor):
+        return self.user_preferences.get(tutor.id, [])
+
+    def course(self, course):
+        """
+        :return: The course of the snapshot (with its groups and supplementary tutors), course if it is not of the week.
+        """
+        return self.courses.get(course.id, course)
+
+    def group_courses(self, groups):
+        """
+        :return: The list of the courses of the week of any of the groups.
+        """
+        group_ids = {g.id for g in groups}
+        return [c for c in self.courses.values() if any(g.id in group_ids for g in c.groups.all())]
+
+    def tutor_courses(self, tutor):
+        """
+        :return: The list of the courses of the week given by the tutor, possibly as a supplementary tutor.
+        """
+        return [c for c in self.courses.values()
+                if c.tutor_id == tutor.id or any(t.id == tutor.id for t in c.supp_tutor.all())]
+
+    def other_departments_scheduled_courses(self, tutor=None):
+        """
+        :return: The list of the scheduled courses of the public copy of the other departments, given by the tutor
+        (possibly as a supplementary tutor) if any.
+        """
+        if tutor is None:
+            return list(self.other_departments_sched_courses)
+        return [sc for sc in self.other_departments_sched_courses
+                if sc.tutor_id == tutor.id or any(t.id == tutor.id for t in sc.course.supp_tutor.all())]
+
+
+def get_snapshot(department, week):
+    """
+    :return: The PreAnalysisSnapshot of the week of the department if it is being pre-analysed, None otherwise.
+    """
+    if department is None or week is None:
+        return None
+    return snapshots.get((department.id, week.id))
+
+
+@contextmanager
+def pre_analysis_snapshot(department, week):
+    """
+        Loads the PreAnalysisSnapshot of the week of the department and makes it available to the pre-analyses
+    (cf. get_snapshot) within the block.
+    """
+    key = (department.id, week.id)
+    snapshots[key] = PreAnalysisSnapshot(department, week)
+    try:
+        yield snapshots[key]
+    finally:
+        del snapshots[key]
@@ -24,35 +24,38 @@
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
 
-from base.models import RoomPreference, ScheduledCourse, TimeGeneralSettings, RoomSort, Room, Course
+from base.models import ScheduledCourse, TimeGeneralSettings, RoomSort, Room, Course
 
 from base.timing import Day
 import base.queries as queries
+from base.model_data import invalidate_model_sessions
+from base.daily_volumes import rebuild_daily_volumes
+from base.courses_cache import invalidate_courses_cache
 
 from TTapp.slots import Slot
 
-from django.db.models import F, Q
+from django.db import transaction
+from django.db.models import Q
 
 from TTapp.ilp_constraints.constraint import Constraint
 from TTapp.ilp_constraints.constraint_type import ConstraintType
 
 from core.decorators import timer
 
-from TTapp.FlopModel import FlopModel, GUROBI_NAME, get_room_constraints, solution_files_path
+from TTapp.FlopModel import FlopModel, GUROBI_NAME, bulk_batch_size, get_room_constraints, solution_files_path
 from TTapp.RoomConstraints.RoomConstraint import LocateAllCourses, \
     LimitGroupMoves, LimitTutorMoves, ConsiderRoomSorts, LimitSimultaneousRoomCourses
 from TTapp.FlopConstraint import max_weight
 
-from base.timing import  flopday_to_date, floptime_to_time
-
-from roomreservation.models import RoomReservation
+from TTapp.helpers.room_availability import compute_room_availability
 
 
 class RoomModel(FlopModel):
     @timer
-    def __init__(self, department_abbrev, weeks, work_copy=0, keep_many_solution_files=False):
+    def __init__(self, department_abbrev, weeks, work_copy=0, keep_many_solution_files=False, model_backend=None):
         # beg_file = os.path.join('logs',"FlOpTT")
-        super(RoomModel, self).__init__(department_abbrev, weeks, keep_many_solution_files=keep_many_solution_files)
+        super(RoomModel, self).__init__(department_abbrev, weeks, keep_many_solution_files=keep_many_solution_files,
+                                        model_backend=model_backend)
 
         print("\nLet's start rooms affectation for weeks #%s" % self.weeks)
         self.work_copy = work_copy
@@ -232,30 +235,12 @@ class RoomModel(FlopModel):
         TTrooms = {}
         for course in self.courses:
             for room in self.course_room_compat[course]:
-                TTrooms[(course, room)] = self.add_var("TTroom(%s,%s)" % (course, room))
+                TTrooms[(course, room)] = self.add_var("TTroom(%s,%s)", course, room)
         return TTrooms
 
     @timer
     def compute_avail_room(self):
-        avail_room = {}
-        for room in self.basic_rooms:
-            avail_room[room] = {}
-            for sl in self.slots:
-                if RoomPreference.objects.filter(
-                        start_time__lt=sl.start_time + sl.duration,
-                        start_time__gt=sl.start_time - F('duration'),
-                        day=sl.day.day,
-                        week=sl.day.week,
-                        room=room, value=0).exists():
-                    avail_room[room][sl] = 0
-                elif RoomReservation.objects.filter(
-                        start_time__lt=floptime_to_time(sl.start_time + sl.duration),
-                        end_time__gt=floptime_to_time(sl.start_time),
-                        date=flopday_to_date(sl.day),
-                        room=room).exists():
-                    avail_room[room][sl] = 0
-                else:
-                    avail_room[room][sl] = 1
+        avail_room = compute_room_availability(self.basic_rooms, self.slots)
 
         for sl in self.slots:
             # constraint : other_departments_located_courses rooms are not available
@@ -286,16 +271,16 @@ class RoomModel(FlopModel):
         return cost_I, cost_G, cost_SL, generic_cost
 
     def add_to_slot_cost(self, slot, cost, week=None):
-        self.cost_SL[slot] += cost
+        self.add_cost(self.cost_SL, slot, cost)
 
     def add_to_inst_cost(self, instructor, cost, week=None):
-        self.cost_I[instructor][week] += cost
+        self.add_cost(self.cost_I[instructor], week, cost)
 
     def add_to_group_cost(self, group, cost, week=None):
-        self.cost_G[group][week] += cost
+        self.add_cost(self.cost_G[group], week, cost)
 
     def add_to_generic_cost(self, cost, week=None):
-        self.generic_cost[week] += cost
+        self.add_cost(self.generic_cost, week, cost)
 
     @timer
     def add_core_constraints(self):
@@ -329,7 +314,8 @@ class RoomModel(FlopModel):
                     week=week,
                     is_active=True):
                 print(constr.__class__.__name__, constr.id, end=' - ')
-                timer(constr.enrich_room_model)(self, week)
+                with self.enriching(constr):
+                    timer(constr.enrich_room_model)(self, week)
 
     def update_objective(self):
         self.obj = self.lin_expr()
@@ -371,6 +357,7 @@ class RoomModel(FlopModel):
             result_work_copy = self.add_rooms_in_db(create_new_work_copy)
             return result_work_copy
 
+    @timer
     def add_rooms_in_db(self, create_new_work_copy):
         if create_new_work_copy:
             target_work_copy = self.choose_free_work_copy()
@@ -381,11 +368,22 @@ class RoomModel(FlopModel):
             for room in self.course_room_compat[course]:
                 if self.get_var_value(self.TTrooms[(course, room)]) == 1:
                     course_location_list.append((course, room))
+        scheduled_courses = []
         for course, room in course_location_list:
             scheduled_course = self.corresponding_scheduled_course[course]
             if create_new_work_copy:
                 scheduled_course.pk = None
                 scheduled_course.work_copy = target_work_copy
             scheduled_course.room = room
-            scheduled_course.save()
+            scheduled_courses.append(scheduled_course)
+        with transaction.atomic():
+            if create_new_work_copy:
+                ScheduledCourse.objects.bulk_create(scheduled_courses, batch_size=bulk_batch_size)
+            else:
+                ScheduledCourse.objects.bulk_update(scheduled_courses, ['room'], batch_size=bulk_batch_size)
+            # bulk queries do not send the signals maintaining the daily volumes and the cached courses
+            invalidate_courses_cache(self.department.id, self.weeks)
+            if target_work_copy == 0:
+                rebuild_daily_volumes(self.department, self.weeks)
+                invalidate_model_sessions()
         return target_work_copy
\ No newline at end of file
@@ -45,6 +45,7 @@ from TTapp.TTConstraints.groups_constraints import considered_basic_groups, pre_
 from base.models import Course, UserPreference, Holiday
 from base.partition import Partition
 import TTapp.GlobalPreAnalysis.partition_with_constraints as partition_bis
+from TTapp.GlobalPreAnalysis.tools_centralized_preanalysis import get_snapshot
 from base.timing import Day, flopdate_to_datetime
 from people.models import Tutor
 from django.db.models import Q
@@ -77,6 +78,18 @@ class NoSimultaneousGroupCourses(TTConstraint):
 
         considered_basic_groups = pre_analysis_considered_basic_groups(self)
         no_user_pref = not ConsiderTutorsUnavailability.objects.filter(weeks=week).exists()
+        snapshot = get_snapshot(self.department, week)
+
+        def courses_of(groups):
+            if snapshot is not None:
+                return snapshot.group_courses(groups)
+            return Course.objects.filter(week=week, groups__in=groups)
+
+        def time_of_courses(group):
+            if snapshot is not None:
+                return sum(c.type.duration for c in snapshot.group_courses([group]))
+            return group.time_of_courses(week)
+
         for bg in considered_basic_groups:
 
             # Retrieving information about general time settings and creating the partition with information about other constraints
@@ -94,7 +107,7 @@ class NoSimultaneousGroupCourses(TTConstraint):
             if tuple_graph:
                 graph, color_max = tuple_graph
                 for transversal_group in graph:
-                    time_courses = transversal_group.time_of_courses(week)
+                    time_courses = time_of_courses(transversal_group)
                     if time_courses > max_courses_time_transversal:
                         max_courses_time_transversal = time_courses
 
@@ -108,15 +121,15 @@ class NoSimultaneousGroupCourses(TTConstraint):
                             groups.append(summit)
 
                     group_to_consider = groups[0]
-                    time_group_courses = groups[0].time_of_courses(week)
+                    time_group_courses = time_of_courses(groups[0])
                     for gp in groups:
-                        if gp.time_of_courses(week) > time_group_courses:
+                        if time_of_courses(gp) > time_group_courses:
                             group_to_consider = gp
-                            time_group_courses = gp.time_of_courses(week)
+                            time_group_courses = time_of_courses(gp)
                     transversal_conflict_groups.add(group_to_consider)
 
             # Set of courses for the group and all its structural ancestors
-            considered_courses = set(c for c in Course.objects.filter(week=week, groups__in=bg.and_ancestors()))
+            considered_courses = set(courses_of(bg.and_ancestors()))
 
             # Mimimum time needed in any cases
             min_course_time_needed = sum(c.type.duration for c in considered_courses) + max_courses_time_transversal
@@ -133,8 +146,7 @@ class NoSimultaneousGroupCourses(TTConstraint):
             else:
                 # If they exists we add the transversal courses to the considered_courses
                 if transversal_conflict_groups:
-                    considered_courses = considered_courses | set(
-                        c for c in Course.objects.filter(week=week, groups__in=transversal_conflict_groups))
+                    considered_courses = considered_courses | set(courses_of(transversal_conflict_groups))
 
                 # If we are below that amount of time we probably cannot do it.
                 course_time_needed = sum(c.type.duration for c in considered_courses)
@@ -439,10 +451,15 @@ class ConsiderTutorsUnavailability(TTConstraint):
 
         if not considered_tutors:
             considered_tutors = Tutor.objects.filter(departments=self.department)
+        snapshot = get_snapshot(self.department, week)
 
         for tutor in considered_tutors:
-            courses = Course.objects.filter(Q(tutor=tutor) | Q(supp_tutor=tutor), week=week)
-            if not courses.filter(type__department=self.department):
+            if snapshot is not None:
+                courses = snapshot.tutor_courses(tutor)
+            else:
+                courses = list(Course.objects.filter(Q(tutor=tutor) | Q(supp_tutor=tutor), week=week)
+                                             .select_related('type'))
+            if not any(c.type.department_id == self.department.id for c in courses):
                 continue
 
             tutor_partition = partition_bis.create_tutor_partition_from_constraints(week=week,
@@ -521,7 +538,7 @@ class ConsiderTutorsUnavailability(TTConstraint):
                         {"str": message, "tutor": tutor.id, "type": "ConsiderTutorsUnavailability"})
                     jsondict["status"] = _("KO")
 
-                elif courses.exists():
+                elif courses:
                     # We build a dictionary with the courses' type as keys and list of courses of those types as values
                     courses_type = dict()
                     for course in courses:
@@ -535,7 +552,11 @@ class ConsiderTutorsUnavailability(TTConstraint):
                     for course_type, course_list in courses_type.items():
                         start_times = CourseStartTimeConstraint.objects.get(course_type=course_type).allowed_start_times
                         course_partition = Partition.get_partition_of_week(week, course_type.department, True)
-                        course_partition.add_scheduled_courses_to_partition(week, course_type.department, tutor, True)
+                        other_departments_sched_courses = None
+                        if snapshot is not None and course_type.department_id == self.department.id:
+                            other_departments_sched_courses = snapshot.other_departments_scheduled_courses(tutor)
+                        course_partition.add_scheduled_courses_to_partition(week, course_type.department, tutor, True,
+                                                                            other_departments_sched_courses)
                         course_partition.add_partition_data_type(tutor_partition, "user_preference")
 
                         if course_partition.available_duration < len(
@@ -611,15 +632,22 @@ class ConsiderTutorsUnavailability(TTConstraint):
             :rtype: Partition
 
         """
-        if partition.tutor_supp:
-
+        snapshot = get_snapshot(self.department, week)
+        if snapshot is not None:
+            user_preferences = snapshot.tutor_preferences(tutor)
+        else:
             user_preferences = UserPreference.objects.filter(user=tutor, week=week)
 
             if not user_preferences.exists():
                 user_preferences = UserPreference.objects.filter(user=tutor, week=None)
 
-            user_preferences = user_preferences.filter(value=0)
+            user_preferences = user_preferences.select_related('user')
+
+        if partition.tutor_supp:
+
             for up in user_preferences:
+                if up.value != 0:
+                    continue
                 up_day = Day(up.day, week)
                 partition.add_slot(
                     TimeInterval(flopdate_to_datetime(up_day, up.start_time),
@@ -630,14 +658,9 @@ class ConsiderTutorsUnavailability(TTConstraint):
 
         else:
 
-            user_preferences = UserPreference.objects.filter(user=tutor, week=week)
-
-            if not user_preferences.exists():
-                user_preferences = UserPreference.objects.filter(user=tutor, week=None)
-
-            user_preferences = user_preferences.filter(value__gte=1)
-
             for up in user_preferences:
+                if up.value < 1:
+                    continue
                 up_day = Day(up.day, week)
                 partition.add_slot(
                     TimeInterval(flopdate_to_datetime(up_day, up.start_time),
@@ -64,8 +64,8 @@ class StabilizeTutorsCourses(TTConstraint):
 
     def enrich_ttmodel(self, ttmodel, week, ponderation=5):
         tutors_to_be_considered = considered_tutors(self, ttmodel)
-        ttmodel.wdb.sched_courses = ttmodel.wdb.sched_courses.filter(work_copy=self.work_copy)
-        sched_courses = ttmodel.wdb.sched_courses.filter(course__week=week)
+        # the model data is shared with the other constraints (and kept by the model sessions)
+        sched_courses = ttmodel.wdb.sched_courses.filter(work_copy=self.work_copy, course__week=week)
 
         for sl in slots_filter(ttmodel.wdb.courses_slots, week=week):
             for i in tutors_to_be_considered:
@@ -131,8 +131,8 @@ class StabilizeGroupsCourses(TTConstraint):
 
     def enrich_ttmodel(self, ttmodel, week, ponderation=5):
         basic_groups_to_be_considered = considered_basic_groups(self, ttmodel)
-        ttmodel.wdb.sched_courses = ttmodel.wdb.sched_courses.filter(work_copy=self.work_copy)
-        sched_courses = ttmodel.wdb.sched_courses.filter(course__week=week)
+        # the model data is shared with the other constraints (and kept by the model sessions)
+        sched_courses = ttmodel.wdb.sched_courses.filter(work_copy=self.work_copy, course__week=week)
 
         for bg in basic_groups_to_be_considered:
             for sl in slots_filter(ttmodel.wdb.courses_slots, week=week):
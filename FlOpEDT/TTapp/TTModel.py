@@ -26,10 +26,13 @@
 
 from django.core.mail import EmailMessage
 
-from base.models import RoomType, RoomPreference, ScheduledCourse, TrainingProgramme, \
+from base.models import Course, RoomType, ScheduledCourse, TrainingProgramme, \
     TutorCost, GroupFreeHalfDay, GroupCost, TimeGeneralSettings, ModuleTutorRepartition, ScheduledCourseAdditional
 
-from base.timing import Time, flopday_to_date, floptime_to_time
+from base.timing import Time
+from base.model_data import invalidate_model_sessions
+from base.daily_volumes import rebuild_daily_volumes, daily_volumes_suspended
+from base.courses_cache import invalidate_courses_cache, courses_cache_suspended
 
 from people.models import Tutor
 
@@ -38,20 +41,20 @@ from TTapp.models import MinNonPreferedTutorsSlot, StabilizeTutorsCourses, MinNo
     MinimizeBusyDays, MinGroupsHalfDays, RespectMaxHoursPerDay, ConsiderDependencies, ConsiderPivots, \
     StabilizeGroupsCourses, RespectTutorsMinHoursPerDay
 
-from roomreservation.models import RoomReservation
-
 from TTapp.RoomConstraints.RoomConstraint import LocateAllCourses, LimitSimultaneousRoomCourses
 
-from TTapp.FlopConstraint import max_weight
+from TTapp.FlopConstraint import max_weight, flop_constraint_signature
 
 from TTapp.slots import slots_filter, days_filter
 
+from TTapp.helpers.room_availability import compute_room_availability
+from TTapp.helpers.preferences_costs import compute_tutors_preferences_costs
+
 from TTapp.WeeksDatabase import WeeksDatabase
 
 from TTapp.TTUtils import print_differences
 
-from django.db import close_old_connections
-from django.db.models import F
+from django.db import close_old_connections, transaction
 
 from TTapp.ilp_constraints.constraint import Constraint
 from TTapp.ilp_constraints.constraint_type import ConstraintType
@@ -61,7 +64,7 @@ from TTapp.ilp_constraints.constraints.slotInstructorConstraint import SlotInstr
 
 from core.decorators import timer
 
-from TTapp.FlopModel import FlopModel, GUROBI_NAME, get_ttconstraints, get_room_constraints, solution_files_path, gurobi_log_files_path, iis_files_path
+from TTapp.FlopModel import FlopModel, GUROBI_NAME, bulk_batch_size, flop_constraint_key, get_ttconstraints, get_room_constraints, solution_files_path, gurobi_log_files_path, iis_files_path
 from TTapp.RoomModel import RoomModel
 
 from django.utils.translation import gettext_lazy as _
@@ -86,9 +89,11 @@ class TTModel(FlopModel):
                  keep_many_solution_files=False,
                  min_visio=0.5,
                  pre_assign_rooms=False,
-                 post_assign_rooms=True):
+                 post_assign_rooms=True,
+                 model_backend=None):
         # beg_file = os.path.join('logs',"FlOpTT")
-        super(TTModel, self).__init__(department_abbrev, weeks, keep_many_solution_files=keep_many_solution_files)
+        super(TTModel, self).__init__(department_abbrev, weeks, keep_many_solution_files=keep_many_solution_files,
+                                      model_backend=model_backend)
         # Create the PuLP model, giving the name of the lp file
         self.min_ups_i = min_nps_i
         self.min_bhd_g = min_bhd_g
@@ -201,10 +206,10 @@ class TTModel(FlopModel):
 
         for sl in self.wdb.courses_slots:
             for c in self.wdb.compatible_courses[sl]:
-                TT[(sl, c)] = self.add_var("TT(%s,%s)" % (sl, c))
+                TT[(sl, c)] = self.add_var("TT(%s,%s)", sl, c)
                 for i in self.wdb.possible_tutors[c]:
                     TTinstructors[(sl, c, i)] \
-                        = self.add_var("TTinstr(%s,%s,%s)" % (sl, c, i))
+                        = self.add_var("TTinstr(%s,%s,%s)", sl, c, i)
         return TT, TTinstructors
 
     @timer
@@ -214,7 +219,7 @@ class TTModel(FlopModel):
             for c in self.wdb.compatible_courses[sl]:
                 for rg in self.wdb.course_rg_compat[c]:
                     TTrooms[(sl, c, rg)] \
-                        = self.add_var("TTroom(%s,%s,%s)" % (sl, c, rg))
+                        = self.add_var("TTroom(%s,%s,%s)", sl, c, rg)
         return TTrooms
 
     @timer
@@ -231,7 +236,7 @@ class TTModel(FlopModel):
                 other_dep_nb = len(other_dep_sched_courses_for_sl)
                 fixed_courses_for_sl = fixed_courses & self.wdb.fixed_courses_for_avail_slot[sl]
                 fixed_courses_nb = len(fixed_courses_for_sl)
-                IBS[(i, sl)] = self.add_var("IBS(%s,%s)" % (i, sl))
+                IBS[(i, sl)] = self.add_var("IBS(%s,%s)", i, sl)
                 # Linking the variable to the TT
                 expr = self.lin_expr()
                 expr += limit * IBS[(i, sl)]
@@ -263,7 +268,7 @@ class TTModel(FlopModel):
                 self.add_constraint(card * IBD[i, d] - self.sum(IBS[i, sl] for sl in dayslots), '>=', 0,
                                     Constraint(constraint_type=ConstraintType.IBD_INF, instructors=i, days=d))
             for apm in self.wdb.possible_apms:
-                halfdayslots = slots_filter(dayslots, apm=apm)
+                halfdayslots = slots_filter(self.wdb.availability_slots, day=d, apm=apm)
                 for i in self.wdb.instructors:
                     IBHD[(i, d, apm)] = self.add_var()
                     # Linking the variable to the TT
@@ -321,8 +326,8 @@ class TTModel(FlopModel):
 
                 for apm in self.possible_apms:
                     GBHD[(bg, d, apm)] \
-                        = self.add_var("GBHD(%s,%s,%s)" % (bg, d, apm))
-                    halfdayslots = slots_filter(dayslots, apm=apm)
+                        = self.add_var("GBHD(%s,%s,%s)", bg, d, apm)
+                    halfdayslots = slots_filter(self.wdb.courses_slots, day=d, apm=apm)
                     card = 2 * len(halfdayslots)
                     expr = card * GBHD[(bg, d, apm)] - self.sum(self.TT[(sl, c)]
                                                                 for sl in halfdayslots
@@ -373,16 +378,16 @@ class TTModel(FlopModel):
         return physical_presence, has_visio
 
     def add_to_slot_cost(self, slot, cost, week=None):
-        self.cost_SL[slot] += cost
+        self.add_cost(self.cost_SL, slot, cost)
 
     def add_to_inst_cost(self, instructor, cost, week=None):
-        self.cost_I[instructor][week] += cost
+        self.add_cost(self.cost_I[instructor], week, cost)
 
     def add_to_group_cost(self, group, cost, week=None):
-        self.cost_G[group][week] += cost
+        self.add_cost(self.cost_G[group], week, cost)
 
     def add_to_generic_cost(self, cost, week=None):
-        self.generic_cost[week] += cost
+        self.add_cost(self.generic_cost, week, cost)
 
     @timer
     def add_stabilization_constraints(self):
@@ -631,19 +636,13 @@ class TTModel(FlopModel):
             - max(0., 2 - slot value / (average of slot values) )
         """
 
-        avail_instr = {}
-        avail_at_school_instr = {}
-        unp_slot_cost = {}
-
         if self.wdb.holidays:
             self.add_warning(None, "%s are holidays" % self.wdb.holidays)
 
+        slots_of_week = {week: slots_filter(self.wdb.availability_slots, week=week) for week in self.weeks}
+        preferences_of_tutor_week = {}
         for i in self.wdb.instructors:
-            avail_instr[i] = {}
-            avail_at_school_instr[i] = {}
-            unp_slot_cost[i] = {}
             for week in self.weeks:
-                week_availability_slots = slots_filter(self.wdb.availability_slots, week=week)
                 teaching_duration = sum(c.type.duration
                                         for c in self.wdb.courses_for_tutor[i] if c.week == week)
                 total_teaching_duration = teaching_duration + sum(c.type.duration
@@ -657,91 +656,39 @@ class TTModel(FlopModel):
                         if a.day not in week_holidays)
                 else:
                     week_tutor_availabilities = self.wdb.availabilities[i][week]
+                preferences_of_tutor_week[(i, week)] = week_tutor_availabilities
 
                 if not week_tutor_availabilities:
                     self.add_warning(i, "no availability information given week %s" % week)
-                    for availability_slot in week_availability_slots:
-                        unp_slot_cost[i][availability_slot] = 0
-                        avail_at_school_instr[i][availability_slot] = 1
-                        avail_instr[i][availability_slot] = 1
+                    continue
 
-                else:
-                    avail_time = sum(a.duration for a in week_tutor_availabilities if a.value >= 1)
-
-                    if avail_time < teaching_duration:
-                        self.add_warning(i, "%g available hours < %g courses hours week %s" %
-                                         (avail_time / 60, teaching_duration / 60, week))
-                        # We used to forget tutor availabilities in this case...
-                        # for availability_slot in week_availability_slots:
-                        #     unp_slot_cost[i][availability_slot] = 0
-                        #     avail_at_school_instr[i][availability_slot] = 1
-                        #     avail_instr[i][availability_slot] = 1
-
-                    elif avail_time < total_teaching_duration:
-                        self.add_warning(i, "%g available hours < %g courses hours including other deps week %s" % (
-                            avail_time / 60, total_teaching_duration / 60, week))
-                        # We used to forget tutor availabilities in this case...
-                        # for availability_slot in week_availability_slots:
-                        #     unp_slot_cost[i][availability_slot] = 0
-                        #     avail_at_school_instr[i][availability_slot] = 1
-                        #     avail_instr[i][availability_slot] = 1
-
-                    elif avail_time < 2 * teaching_duration \
-                            and i.status == Tutor.FULL_STAFF:
-                        self.add_warning(i, "only %g available hours for %g courses hours week %s" %
-                                         (avail_time / 60,
-                                          teaching_duration / 60,
-                                          week))
-                    maximum = max([a.value for a in week_tutor_availabilities])
-                    if maximum == 0:
-                        for availability_slot in week_availability_slots:
-                            unp_slot_cost[i][availability_slot] = 0
-                            avail_at_school_instr[i][availability_slot] = 0
-                            avail_instr[i][availability_slot] = 0
-                        continue
-
-                    non_prefered_duration = max(1, sum(a.duration
-                                                       for a in week_tutor_availabilities if
-                                                       1 <= a.value <= maximum - 1))
-                    average_value = sum(a.duration * a.value
-                                        for a in week_tutor_availabilities
-                                        if 1 <= a.value <= maximum - 1) / non_prefered_duration
-
-                    for availability_slot in week_availability_slots:
-                        avail = set(a for a in week_tutor_availabilities
-                                    if availability_slot.is_simultaneous_to(a))
-                        if not avail:
-                            print(f"availability pbm for {i} availability_slot {availability_slot}")
-                            unp_slot_cost[i][availability_slot] = 0
-                            avail_at_school_instr[i][availability_slot] = 1
-                            avail_instr[i][availability_slot] = 1
-                            continue
-                            
-                        minimum = min(a.value for a in avail)
-                        if minimum == 0:
-                            unp_slot_cost[i][availability_slot] = 0
-                            avail_at_school_instr[i][availability_slot] = 0
-                            avail_instr[i][availability_slot] = 0
-                        elif minimum == 1:
-                            unp_slot_cost[i][availability_slot] = 1
-                            avail_at_school_instr[i][availability_slot] = 0
-                            avail_instr[i][availability_slot] = 1
-                        else:
-                            avail_at_school_instr[i][availability_slot] = 1
-                            avail_instr[i][availability_slot] = 1
-                            value = minimum
-                            if value == maximum:
-                                unp_slot_cost[i][availability_slot] = 0
-                            else:
-                                unp_slot_cost[i][availability_slot] = (value - maximum) / (average_value - maximum)
+                avail_time = sum(a.duration for a in week_tutor_availabilities if a.value >= 1)
 
-            # Add fixed_courses constraint
-            for sl in self.wdb.availability_slots:
-                fixed_courses = self.wdb.fixed_courses_for_tutor[i] & self.wdb.fixed_courses_for_avail_slot[sl]
+                if avail_time < teaching_duration:
+                    self.add_warning(i, "%g available hours < %g courses hours week %s" %
+                                     (avail_time / 60, teaching_duration / 60, week))
+
+                elif avail_time < total_teaching_duration:
+                    self.add_warning(i, "%g available hours < %g courses hours including other deps week %s" % (
+                        avail_time / 60, total_teaching_duration / 60, week))
+
+                elif avail_time < 2 * teaching_duration \
+                        and i.status == Tutor.FULL_STAFF:
+                    self.add_warning(i, "only %g available hours for %g courses hours week %s" %
+                                     (avail_time / 60,
+                                      teaching_duration / 60,
+                                      week))
+
+        # kept as arrays on the model, the dictionaries are built from them
+        self.tutors_preferences_costs = compute_tutors_preferences_costs(self.wdb.instructors,
+                                                                         slots_of_week,
+                                                                         preferences_of_tutor_week)
 
-                if fixed_courses:
-                    avail_instr[i][sl] = 0
+        # Add fixed_courses constraint
+        self.tutors_preferences_costs.set_unavailable(self.wdb.fixed_courses_for_tutor,
+                                                      self.wdb.fixed_courses_for_avail_slot)
 
+        avail_instr, avail_at_school_instr, unp_slot_cost = self.tutors_preferences_costs.as_dicts()
         return avail_instr, avail_at_school_instr, unp_slot_cost
 
     def compute_non_preferred_slots_cost_course(self):
@@ -804,26 +751,7 @@ class TTModel(FlopModel):
         return non_preferred_cost_course, avail_course
 
     def compute_avail_room(self):
-        avail_room = {}
-        for room in self.wdb.basic_rooms:
-            avail_room[room] = {}
-            for sl in self.wdb.availability_slots:
-                if RoomPreference.objects.filter(
-                        start_time__lt=sl.start_time + sl.duration,
-                        start_time__gt=sl.start_time - F('duration'),
-                        day=sl.day.day,
-                        week=sl.day.week,
-                        room=room, value=0).exists():
-                    avail_room[room][sl] = 0
-                elif RoomReservation.objects.filter(
-                        start_time__lt=floptime_to_time(sl.start_time + sl.duration),
-                        end_time__gt=floptime_to_time(sl.start_time),
-                        date=flopday_to_date(sl.day),
-                        room=room).exists():
-                    avail_room[room][sl] = 0
-                else:
-                    avail_room[room][sl] = 1
-
+        avail_room = compute_room_availability(self.wdb.basic_rooms, self.wdb.availability_slots)
         return avail_room
 
     @timer
@@ -867,11 +795,10 @@ class TTModel(FlopModel):
                 if other_dep_sched_courses:
                     self.avail_instr[i][sl] = 0
 
-    def add_specific_constraints(self):
+    def active_specific_constraints(self):
         """
-        Add the active specific constraints stored in the database.
+        Yields (week, constraint) for the active specific constraints stored in the database.
         """
-
         for week in self.weeks:
             for constr in get_ttconstraints(
                     self.department,
@@ -880,8 +807,7 @@ class TTModel(FlopModel):
                     is_active=True):
                 if not self.core_only or constr.__class__ in [AssignAllCourses, ScheduleAllCourses,
                                                               NoSimultaneousGroupCourses]:
-                    print(constr.__class__.__name__, constr.id, end=' - ')
-                    timer(constr.enrich_ttmodel)(self, week)
+                    yield week, constr
 
         if self.pre_assign_rooms and not self.core_only:
             for week in self.weeks:
@@ -891,8 +817,48 @@ class TTModel(FlopModel):
                         week=week,
                         is_active=True):
                     if hasattr(constr, 'enrich_ttmodel'):
-                        print(constr.__class__.__name__, constr.id, end=' - ')
-                        timer(constr.enrich_ttmodel)(self, week)
+                        yield week, constr
+
+    def add_specific_constraint(self, constr, week):
+        print(constr.__class__.__name__, constr.id, end=' - ')
+        with self.enriching(constr):
+            timer(constr.enrich_ttmodel)(self, week)
+        self.specific_constraints_signatures[flop_constraint_key(constr)] = flop_constraint_signature(constr)
+
+    def add_specific_constraints(self):
+        """
+        Add the active specific constraints stored in the database.
+        """
+        self.specific_constraints_signatures = {}
+        for week, constr in self.active_specific_constraints():
+            self.add_specific_constraint(constr, week)
+
+    @timer
+    def update_specific_constraints(self):
+        """
+        Brings a built model up to date with the specific constraints stored in the database:
+        only the contribution of the constraints that have been de-activated, deleted or modified
+        is removed, and only the new (or modified) active constraints are added.
+        Returns the number of removed and of added constraints.
+        """
+        active_constraints = {}
+        for week, constr in self.active_specific_constraints():
+            active_constraints.setdefault(flop_constraint_key(constr), (constr, []))[1].append(week)
+
+        removed = [key for key, signature in self.specific_constraints_signatures.items()
+                   if key not in active_constraints
+                   or flop_constraint_signature(active_constraints[key][0]) != signature]
+        for key in removed:
+            self.remove_flop_constraint(key)
+            del self.specific_constraints_signatures[key]
+
+        added = [key for key in active_constraints if key not in self.specific_constraints_signatures]
+        for key in added:
+            constr, weeks = active_constraints[key]
+            for week in weeks:
+                self.add_specific_constraint(constr, week)
+        print(f"\n{len(removed)} specific constraints removed, {len(added)} added")
+        return len(removed), len(added)
 
     def update_objective(self):
         self.obj = self.lin_expr()
@@ -930,100 +896,126 @@ class TTModel(FlopModel):
 
         self.add_specific_constraints()
 
+    @timer
     def add_tt_to_db(self, target_work_copy):
-
+        """
+        Stores the solution under target_work_copy, in a single transaction and with bulk queries
+        """
         close_old_connections()
-        # remove target working copy
-        ScheduledCourse.objects \
-            .filter(course__module__train_prog__department=self.department,
-                    course__week__in=self.weeks,
-                    work_copy=target_work_copy) \
-            .delete()
-
-        if self.department.mode.cosmo == 2:
-            corresponding_group = {}
-            for i in self.wdb.instructors:
-                corresponding_group[i] = self.wdb.groups.get(name=i.username)
+        with transaction.atomic():
+            # remove target working copy (the daily volumes and the cached courses are updated below)
+            with daily_volumes_suspended(), courses_cache_suspended():
+                ScheduledCourse.objects \
+                    .filter(course__module__train_prog__department=self.department,
+                            course__week__in=self.weeks,
+                            work_copy=target_work_copy) \
+                    .delete()
+
+            if self.department.mode.cosmo == 2:
+                corresponding_group = {}
+                for g in self.wdb.groups.filter(name__in=[i.username for i in self.wdb.instructors]):
+                    corresponding_group[g.name] = g
+                courses_groups = Course.groups.through
+                courses_groups.objects.filter(course__in=self.wdb.courses).delete()
+                new_courses_groups = []
+
+            scheduled_courses = []
             for c in self.wdb.courses:
-                c.groups.clear()
-
-        for c in self.wdb.courses:
-            for sl in self.wdb.compatible_slots[c]:
-                if self.get_var_value(self.TT[(sl, c)]) == 1:
-                    cp = ScheduledCourse(course=c,
-                                         start_time=sl.start_time,
-                                         day=sl.day.day,
-                                         work_copy=target_work_copy)
-                    for i in self.wdb.possible_tutors[c]:
-                        if self.get_var_value(self.TTinstructors[(sl, c, i)]) == 1:
-                            cp.tutor = i
-                            if self.department.mode.cosmo == 2:
-                                c.groups.add(corresponding_group[i])
-                            break
-                    if not self.department.mode.cosmo:
-                        if self.pre_assign_rooms:
-                            for rg in self.wdb.course_rg_compat[c]:
-                                if self.get_var_value(self.TTrooms[(sl, c, rg)]) == 1:
-                                    cp.room = rg
-                                    break
-                    cp.save()
-
-        for fc in self.wdb.fixed_courses:
-            cp = ScheduledCourse(course=fc.course,
-                                 start_time=fc.start_time,
-                                 day=fc.day,
-                                 room=fc.room,
-                                 work_copy=target_work_copy,
-                                 tutor=fc.tutor)
-            if ScheduledCourseAdditional.objects.filter(scheduled_course__id=fc.id).exists():
-                sca = fc.additional
+                for sl in self.wdb.compatible_slots[c]:
+                    if self.get_var_value(self.TT[(sl, c)]) == 1:
+                        cp = ScheduledCourse(course=c,
+                                             start_time=sl.start_time,
+                                             day=sl.day.day,
+                                             work_copy=target_work_copy)
+                        for i in self.wdb.possible_tutors[c]:
+                            if self.get_var_value(self.TTinstructors[(sl, c, i)]) == 1:
+                                cp.tutor = i
+                                if self.department.mode.cosmo == 2:
+                                    new_courses_groups.append(
+                                        courses_groups(course_id=c.id,
+                                                       genericgroup_id=corresponding_group[i.username].id))
+                                break
+                        if not self.department.mode.cosmo:
+                            if self.pre_assign_rooms:
+                                for rg in self.wdb.course_rg_compat[c]:
+                                    if self.get_var_value(self.TTrooms[(sl, c, rg)]) == 1:
+                                        cp.room = rg
+                                        break
+                        scheduled_courses.append(cp)
+
+            if self.department.mode.cosmo == 2:
+                courses_groups.objects.bulk_create(new_courses_groups, batch_size=bulk_batch_size)
+
+            fixed_scheduled_courses = [ScheduledCourse(course=fc.course,
+                                                       start_time=fc.start_time,
+                                                       day=fc.day,
+                                                       room=fc.room,
+                                                       work_copy=target_work_copy,
+                                                       tutor=fc.tutor)
+                                       for fc in self.wdb.fixed_courses]
+            ScheduledCourse.objects.bulk_create(scheduled_courses + fixed_scheduled_courses,
+                                                batch_size=bulk_batch_size)
+
+            # copy the additional information of the fixed courses
+            new_scheduled_course = {fc.id: cp for fc, cp in zip(self.wdb.fixed_courses, fixed_scheduled_courses)}
+            additionals = []
+            for sca in ScheduledCourseAdditional.objects.filter(scheduled_course__in=self.wdb.fixed_courses):
                 sca.pk = None
-                sca.scheduled_course = cp
-                sca.save()
-            cp.save()
-            
-       # On imprime les différences si demandé
-        if self.stabilize_work_copy is not None:
-            print_differences(self.department, self.weeks,
-                              self.stabilize_work_copy, target_work_copy, self.wdb.instructors)
-
-        # # On enregistre les coûts dans la BDD
-        TutorCost.objects.filter(department=self.department,
-                                 week__in=self.wdb.weeks,
-                                 work_copy=target_work_copy).delete()
-        GroupFreeHalfDay.objects.filter(group__train_prog__department=self.department,
-                                        week__in=self.wdb.weeks,
-                                        work_copy=target_work_copy).delete()
-        GroupCost.objects.filter(group__train_prog__department=self.department,
-                                 week__in=self.wdb.weeks,
-                                 work_copy=target_work_copy).delete()
-
-        for week in self.weeks:
-            for i in self.wdb.instructors:
-                tc = TutorCost(department=self.department,
-                               tutor=i,
-                               week=week,
-                               value=self.get_expr_value(self.cost_I[i][week]),
-                               work_copy=target_work_copy)
-                tc.save()
-
-            for g in self.wdb.basic_groups:
-                DJL = 0
-                if Time.PM in self.possible_apms:
-                    DJL += self.get_expr_value(self.FHD_G[Time.PM][g][week])
-                if Time.AM in self.possible_apms:
-                    DJL += 0.01 * self.get_expr_value(self.FHD_G[Time.AM][g][week])
-
-                djlg = GroupFreeHalfDay(group=g,
-                                        week=week,
-                                        work_copy=target_work_copy,
-                                        DJL=DJL)
-                djlg.save()
-                cg = GroupCost(group=g,
-                               week=week,
-                               work_copy=target_work_copy,
-                               value=self.get_expr_value(self.cost_G[g][week]))
-                cg.save()
+                sca.scheduled_course = new_scheduled_course[sca.scheduled_course_id]
+                additionals.append(sca)
+            ScheduledCourseAdditional.objects.bulk_create(additionals, batch_size=bulk_batch_size)
+
+            # bulk_create does not send the signals maintaining the daily volumes and the cached courses
+            invalidate_courses_cache(self.department.id, self.weeks)
+            if target_work_copy == 0:
+                rebuild_daily_volumes(self.department, self.weeks)
+                invalidate_model_sessions()
+
+           # On imprime les différences si demandé
+            if self.stabilize_work_copy is not None:
+                print_differences(self.department, self.weeks,
+                                  self.stabilize_work_copy, target_work_copy, self.wdb.instructors)
+
+            # # On enregistre les coûts dans la BDD
+            TutorCost.objects.filter(department=self.department,
+                                     week__in=self.wdb.weeks,
+                                     work_copy=target_work_copy).delete()
+            GroupFreeHalfDay.objects.filter(group__train_prog__department=self.department,
+                                            week__in=self.wdb.weeks,
+                                            work_copy=target_work_copy).delete()
+            GroupCost.objects.filter(group__train_prog__department=self.department,
+                                     week__in=self.wdb.weeks,
+                                     work_copy=target_work_copy).delete()
+
+            tutor_costs = []
+            groups_free_half_days = []
+            group_costs = []
+            for week in self.weeks:
+                for i in self.wdb.instructors:
+                    tutor_costs.append(TutorCost(department=self.department,
+                                                 tutor=i,
+                                                 week=week,
+                                                 value=self.get_expr_value(self.cost_I[i][week]),
+                                                 work_copy=target_work_copy))
+
+                for g in self.wdb.basic_groups:
+                    DJL = 0
+                    if Time.PM in self.possible_apms:
+                        DJL += self.get_expr_value(self.FHD_G[Time.PM][g][week])
+                    if Time.AM in self.possible_apms:
+                        DJL += 0.01 * self.get_expr_value(self.FHD_G[Time.AM][g][week])
+
+                    groups_free_half_days.append(GroupFreeHalfDay(group=g,
+                                                                  week=week,
+                                                                  work_copy=target_work_copy,
+                                                                  DJL=DJL))
+                    group_costs.append(GroupCost(group=g,
+                                                 week=week,
+                                                 work_copy=target_work_copy,
+                                                 value=self.get_expr_value(self.cost_G[g][week])))
+            TutorCost.objects.bulk_create(tutor_costs, batch_size=bulk_batch_size)
+            GroupFreeHalfDay.objects.bulk_create(groups_free_half_days, batch_size=bulk_batch_size)
+            GroupCost.objects.bulk_create(group_costs, batch_size=bulk_batch_size)
 
     # Some extra Utils
     def log_files_prefix(self):
@@ -1070,8 +1062,39 @@ class TTModel(FlopModel):
                                  tutor=fc.tutor)
             cp.save()
 
-    def solve(self, time_limit=None, target_work_copy=None, solver=GUROBI_NAME, threads=None, 
-              ignore_sigint=True, send_gurobi_logs_email_to=None):
+    @timer
+    def set_mip_start_from_work_copy(self, work_copy):
+        """
+        Sets the initial values of the TT, TTinstructors (and TTrooms) variables from the scheduled
+        courses of work_copy, so that the solver starts from this schedule (cf. warm_start).
+        The courses that are not scheduled in work_copy, or not on one of their compatible slots,
+        are left to the solver.
+        Returns the number of courses of the MIP start.
+        """
+        close_old_connections()
+        nb_courses = 0
+        for sc in ScheduledCourse.objects.filter(course__in=self.wdb.courses, work_copy=work_copy) \
+                .select_related('course', 'tutor', 'room'):
+            c = sc.course
+            scheduled_slots = [sl for sl in self.wdb.compatible_slots[c]
+                               if sl.day.day == sc.day and sl.start_time == sc.start_time]
+            if not scheduled_slots:
+                continue
+            nb_courses += 1
+            for sl in self.wdb.compatible_slots[c]:
+                scheduled = sl in scheduled_slots
+                self.TT[(sl, c)].setInitialValue(int(scheduled))
+                for i in self.wdb.possible_tutors[c]:
+                    self.TTinstructors[(sl, c, i)].setInitialValue(int(scheduled and i == sc.tutor))
+                if self.pre_assign_rooms:
+                    for rg in self.wdb.course_rg_compat[c]:
+                        self.TTrooms[(sl, c, rg)].setInitialValue(int(scheduled and rg == sc.room))
+        print(f"MIP start from work copy #{work_copy}: {nb_courses} courses")
+        return nb_courses
+
+    def solve(self, time_limit=None, target_work_copy=None, solver=GUROBI_NAME, threads=None,
+              ignore_sigint=True, send_gurobi_logs_email_to=None, warm_start=False,
+              mip_start_work_copy=None):
         """
         Generates a schedule from the TTModel
         The solver stops either when the best schedule is obtained or timeLimit
@@ -1086,13 +1109,21 @@ class TTModel(FlopModel):
         If target_work_copy is not given, stores under the lowest working copy
         number that is greater than the maximum work copy numbers for the
         considered week.
+        If warm_start, the solver starts from the current values of the variables,
+        e.g. the solution of a previous solve of the same (updated) model.
+        If mip_start_work_copy is given, the solver starts from the schedule of this work copy.
         Returns the number of the work copy
         """
         print("\nLet's solve weeks #%s" % self.weeks)
 
+        if mip_start_work_copy is not None:
+            self.set_mip_start_from_work_copy(mip_start_work_copy)
+            warm_start = True
+
         self.update_objective()
 
-        result = self.optimize(time_limit, solver, threads=threads, ignore_sigint=ignore_sigint)
+        result = self.optimize(time_limit, solver, threads=threads, ignore_sigint=ignore_sigint,
+                               warm_start=warm_start)
 
         if result is not None:
 
@@ -1105,7 +1136,8 @@ class TTModel(FlopModel):
             self.add_tt_to_db(target_work_copy)
             print("Added work copy N°%g" % target_work_copy)
             if self.post_assign_rooms:
-                RoomModel(self.department.abbrev, self.weeks, target_work_copy).solve()
+                RoomModel(self.department.abbrev, self.weeks, target_work_copy,
+                          model_backend=self.model_backend).solve()
                 print("Rooms assigned")
         
         if send_gurobi_logs_email_to is not None:
@@ -27,16 +27,24 @@
 
 from base.models import ScheduledCourse, RoomPreference, EdtVersion, Department, CourseStartTimeConstraint,\
     TimeGeneralSettings, Room, CourseModification, UserPreference, Week, Course, Module, CourseType, TrainingProgramme,\
-    Period
+    Period, Dependency, Pivot, GenericGroup
 from base.timing import str_slot, days_index
-from django.db.models import Count, Max, Q, F
-from TTapp.models import MinNonPreferedTrainProgsSlot, MinNonPreferedTutorsSlot
+from base.model_data import invalidate_model_sessions
+from base.daily_volumes import rebuild_daily_volumes, daily_volumes_suspended
+from base.courses_cache import invalidate_courses_cache, courses_cache_suspended
+from django.db import transaction
+from django.db.models import Count, Max, Q, F, Case, When, Value, IntegerField, Window, OuterRef, Subquery
+from django.db.models.functions import RowNumber
+from TTapp.models import MinNonPreferedTrainProgsSlot, MinNonPreferedTutorsSlot, StabilizationThroughWeeks, \
+    LimitTutorTimePerWeeks
 from TTapp.FlopConstraint import max_weight
 from TTapp.slots import slot_pause
 from TTapp.RoomModel import RoomModel
+from TTapp.helpers.conflicts import week_conflicts
 import base.views as base_views
 from django.core.cache import cache
 from people.models import Tutor
+import itertools
 import json
 from django.utils.translation import gettext_lazy as _
 
@@ -87,94 +95,20 @@ def get_shared_rooms():
     return Room.objects.annotate(num_depts=Count('departments')).filter(num_depts__gt=1)
 
 
-def compute_conflicts_helper(dic):
-    '''
-    Computes overlapping slots
-    '''
-    conflicts = []
-    for k in dic:
-        dic[k].sort(key=lambda s: (s['day'], s['start_time']))
-    for t, sched_list in dic.items():
-        for i in range(len(sched_list)-1):
-            if sched_list[i]['day'] == sched_list[i+1]['day'] and\
-               sched_list[i]['start_time'] + sched_list[i]['duration'] > sched_list[i+1]['start_time']:
-                conflicts.append((sched_list[i],sched_list[i+1]))
-    return conflicts
-    
-
 def compute_conflicts(department, week, copy_a):
     '''
     Computes the conflicts (tutor giving several courses at the same time or
     room used in parallel) in week (year,nb) between the work copy copy_a
     of department department, and work copy 0 of the other departments.
     '''
-    conflicts = {}
-
-    # tutors with overlapping courses
-    dic_by_tutor = {}
-    tmp_conflicts = []
-    tutors_username_list = get_shared_tutors(department, week, copy_a)
-    courses_list = ScheduledCourse.objects.select_related('course__module__train_prog__department',
-                                                          'course__type__duration',
-                                                          'tutor')\
-                                          .filter(Q(work_copy=copy_a) & Q(course__module__train_prog__department__abbrev=department) \
-                                                  | Q(work_copy=0)&~Q(course__module__train_prog__department__abbrev=department),
-                                                  course__week=week,
-                                                  tutor__username__in=tutors_username_list,
-                                          )\
-                                          .annotate(duration=F('course__type__duration'),
-                                                    week=F('course__week'))\
-                                          .values('id',
-                                                  'week',
-                                                  'day','start_time','duration','tutor__username')
-    for t in tutors_username_list:
-        dic_by_tutor[t] = []
-    for sc in courses_list:
-        dic_by_tutor[sc['tutor__username']].append(sc)
-    conflicts['tutor'] = compute_conflicts_helper(dic_by_tutor)
-
-    # rooms that are used in parallel
-    tmp_conflicts = []
-    dic_by_room = {}
-    dic_subrooms = {}
-    conflict_room_list = get_shared_rooms()
-    
-    for room in conflict_room_list:
-        dic_subrooms[str(room.id)] = [r.name for r in room.related_rooms()]
-    print(dic_subrooms)
-    courses_list = ScheduledCourse.objects.select_related('course__type__duration')\
-                                          .filter(Q(work_copy=copy_a) & Q(course__module__train_prog__department__abbrev=department) \
-                                                  | Q(work_copy=0)&~Q(course__module__train_prog__department__abbrev=department),
-                                                  course__week=week,
-                                                  work_copy=copy_a,
-                                                  room__in=conflict_room_list)\
-                                          .annotate(duration=F('course__type__duration'),
-                                                    week=F('course__week'))\
-                                          .values('id',
-                                                  'week',
-                                                  'day','start_time','duration','room')
-    for room in get_shared_rooms():
-        dic_by_room[room.name] = []
-
-    # create busy slots for every room in the roomgroups
-    for sc in courses_list:
-        roomgroup = sc['room']
-        for subroom in dic_subrooms[str(roomgroup)]:
-            if subroom in dic_by_room:
-                new_sc = sc.copy()
-                new_sc['room'] = subroom
-                dic_by_room[new_sc['room']].append(new_sc)
-
-    conflicts['room'] = compute_conflicts_helper(dic_by_room)
-
-    return conflicts
+    return week_conflicts(department, week, copy_a)
 
 
 def get_conflicts(department, week, copy_a):
     '''
     Checks whether the work copy copy_a of department department is compatible
     with the work copies 0 of the other departments.
-    Returns a result {'status':'blabla', 'more':'explanation'}
+    Returns a result {'status':'blabla', 'more':'explanation', 'conflicts': {'tutor': [...], 'room': [...]}}
     '''
     result = {'status':'OK'}
     more = ''
@@ -187,31 +121,26 @@ def get_conflicts(department, week, copy_a):
     if len(conflicts['tutor']) > 0:
         more += 'Prof déjà occupé·e : '
         for conflict in conflicts['tutor']:
-            sched = []
-            for sc in conflict:
-                sched.append(ScheduledCourse.objects.get(id=sc['id']))
-            more += sc['tutor__username'] + ' : '
+            more += conflict['resource'] + ' : '
             str_sched = list(map(
-                lambda s: f'{str_slot(s.day,s.start_time,s.course.type.duration)} '\
-                + f'({s.course.module.abbrev}, {s.course.module.train_prog.department.abbrev})',
-                sched))
+                lambda s: f'{str_slot(s["day"], s["start_time"], s["duration"])} '\
+                + f'({s["module"]}, {s["department"]})',
+                conflict['courses']))
             more += ' VS '.join(str_sched) + ' ; '
 
     if len(conflicts['room']) > 0:
         more += 'Salle déjà prise : '
         for conflict in conflicts['room']:
-            sched = []
-            for sc in conflict:
-                sched.append(ScheduledCourse.objects.get(id=sc['id']))
             str_sched = list(map(
-                lambda s: f'{s.room} ({str_slot(s.day,s.start_time,s.course.type.duration)}, '\
-                + f'{s.tutor.username if s.tutor is not None else "No one"}, '
-                + f'{s.course.module.train_prog.department.abbrev})',
-                sched))
+                lambda s: f'{s["room_name"]} ({str_slot(s["day"], s["start_time"], s["duration"])}, '\
+                + f'{s["tutor_username"] if s["tutor_username"] is not None else "No one"}, '
+                + f'{s["department"]})',
+                conflict['courses']))
             more += ' VS '.join(str_sched) + ' ; '
 
     result['status'] = 'KO'
     result['more'] = more
+    result['conflicts'] = conflicts
 
     return result
 
@@ -223,34 +152,28 @@ def basic_swap_version(department, week, copy_a, copy_b=0):
         'course__week': week,
     }
 
-    try:
-        tmp_wc = ScheduledCourse \
-                     .objects \
-                     .filter(**scheduled_courses_params) \
-                     .aggregate(Max('work_copy'))['work_copy__max'] + 1
-    except KeyError:
-        print('No scheduled courses')
-        return
-
-    version_copy = EdtVersion.objects.get(department=department, week=week)
-
-    for cp in ScheduledCourse.objects.filter(work_copy=copy_a, **scheduled_courses_params):
-        cp.work_copy = tmp_wc
-        cp.save()
-
-    for cp in ScheduledCourse.objects.filter(work_copy=copy_b, **scheduled_courses_params):
-        cp.work_copy = copy_a
-        cp.save()
-
-    for cp in ScheduledCourse.objects.filter(work_copy=tmp_wc, **scheduled_courses_params):
-        cp.work_copy = copy_b
-        cp.save()
-
-    if copy_a == 0 or copy_b == 0:
-        CourseModification.objects.filter(course__week=week).delete()
-        number_courses(department)
-        version_copy.version += 1
-        version_copy.save()
+    with transaction.atomic():
+        if not ScheduledCourse.objects.filter(**scheduled_courses_params).exists():
+            print('No scheduled courses')
+            return
+
+        version_copy = EdtVersion.objects.get(department=department, week=week)
+
+        # a single UPDATE exchanges both copies
+        ScheduledCourse.objects \
+            .filter(work_copy__in=[copy_a, copy_b], **scheduled_courses_params) \
+            .update(work_copy=Case(When(work_copy=copy_a, then=Value(copy_b)),
+                                   default=Value(copy_a),
+                                   output_field=IntegerField()))
+        invalidate_courses_cache(department.id, [week])
+
+        if copy_a == 0 or copy_b == 0:
+            # the UPDATE does not send the signals maintaining the daily volumes
+            rebuild_daily_volumes(department, [week])
+            CourseModification.objects.filter(course__week=week).delete()
+            renumber_courses_series(Course.objects.filter(week=week, module__train_prog__department=department))
+            version_copy.version += 1
+            version_copy.save()
 
     cache.delete(base_views.get_key_course_pl(department.abbrev,
                                    week,
@@ -276,16 +199,12 @@ def basic_delete_work_copy(department, week, work_copy):
         'work_copy': work_copy
     }
 
-    try:
-        sc_to_delete = ScheduledCourse \
-                     .objects \
-                     .filter(**scheduled_courses_params)
-    except KeyError:
-        result['status'] = 'KO'
-        result['more'] = 'No scheduled courses in wc #%g' % work_copy
-        return result
-
-    sc_to_delete.delete()
+    with transaction.atomic(), daily_volumes_suspended(), courses_cache_suspended():
+        ScheduledCourse.objects.filter(**scheduled_courses_params).delete()
+        invalidate_courses_cache(department.id, [week])
+        if work_copy == 0:
+            rebuild_daily_volumes(department, [week])
+            invalidate_model_sessions()
 
     cache.delete(base_views.get_key_course_pl(department.abbrev,
                                    week,
@@ -299,18 +218,30 @@ def basic_delete_all_unused_work_copies(department, week):
         'course__module__train_prog__department': department,
         'course__week': week
     }
-    work_copies = set(sc.work_copy
-                      for sc in ScheduledCourse.objects.filter(**scheduled_courses_params)
-                      .exclude(work_copy=0)
-                      .distinct("work_copy"))
-    for wc in work_copies:
-        result = basic_delete_work_copy(department, week, wc)
-        if result["status"] == "KO":
-            return result
+    unused = ScheduledCourse.objects.filter(**scheduled_courses_params).exclude(work_copy=0)
+    # the public copy is kept, no daily volume to maintain
+    with transaction.atomic(), daily_volumes_suspended(), courses_cache_suspended():
+        work_copies = set(unused.values_list('work_copy', flat=True).distinct())
+        unused.delete()
+        invalidate_courses_cache(department.id, [week])
 
+    for wc in work_copies:
+        cache.delete(base_views.get_key_course_pl(department.abbrev,
+                                                  week,
+                                                  wc))
     return result
 
 
+def scheduled_course_copy(sc, **changes):
+    """
+    Unsaved copy of the scheduled course sc, with changed fields
+    """
+    fields = {'course_id': sc.course_id, 'day': sc.day, 'start_time': sc.start_time, 'room_id': sc.room_id,
+              'number': sc.number, 'noprec': sc.noprec, 'work_copy': sc.work_copy, 'tutor_id': sc.tutor_id}
+    fields.update(changes)
+    return ScheduledCourse(**fields)
+
+
 def basic_duplicate_work_copy(department, week, work_copy):
 
     result = {'status': 'OK', 'more': ''}
@@ -318,25 +249,23 @@ def basic_duplicate_work_copy(department, week, work_copy):
         'course__module__train_prog__department': department,
         'course__week': week
     }
-    local_max_wc = ScheduledCourse \
-        .objects \
-        .filter(**scheduled_courses_params) \
-        .aggregate(Max('work_copy'))['work_copy__max']
-    target_work_copy = local_max_wc + 1
-
-    try:
-        sc_to_duplicate = ScheduledCourse \
-                            .objects \
-                            .filter(**scheduled_courses_params, work_copy=work_copy)
-    except KeyError:
-        result['status'] = 'KO'
-        result['more'] = 'No scheduled courses'
-        return result
-
-    for sc in sc_to_duplicate:
-        sc.pk = None
-        sc.work_copy = target_work_copy
-        sc.save()
+    with transaction.atomic():
+        local_max_wc = ScheduledCourse \
+            .objects \
+            .filter(**scheduled_courses_params) \
+            .aggregate(Max('work_copy'))['work_copy__max']
+        if local_max_wc is None:
+            result['status'] = 'KO'
+            result['more'] = 'No scheduled courses'
+            return result
+        target_work_copy = local_max_wc + 1
+
+        # the target copy is new, no daily volume to maintain
+        ScheduledCourse.objects.bulk_create(
+            [scheduled_course_copy(sc, work_copy=target_work_copy)
+             for sc in ScheduledCourse.objects.filter(**scheduled_courses_params, work_copy=work_copy)],
+            batch_size=1000)
+        invalidate_courses_cache(department.id, [week])
     result['status'] = f'Duplicated to copy #{target_work_copy}'
 
     return result
@@ -387,32 +316,67 @@ def load_dispos(json_filename):
         print("The following tutor do not exist:", exceptions)
 
 
+def course_signature(course, groups_of):
+    """
+    Hashable version of Course.equals
+    """
+    return course.type_id, course.tutor_id, course.room_type_id, course.module_id, groups_of.get(course.id, ())
+
+
 def duplicate_what_can_be_in_other_weeks(department, week, work_copy=0):
     result = {'status': 'OK', 'more': ''}
     try:
-        sched_week = ScheduledCourse.objects.filter(course__type__department=department,
-                                                    course__week=week,
-                                                    work_copy=work_copy)
-        other_weeks_courses = Course.objects.filter(type__department=department).exclude(week=week)
-        other_weeks = set(c.week for c in other_weeks_courses.distinct('week'))
-        new_dico = {}
-        for ow in other_weeks:
-            done = False
-            target_work_copy = first_free_work_copy(department, ow)
-            courses_ow = set(other_weeks_courses.filter(week=ow))
-            new_dico[ow] = []
-            for sc in sched_week:
-                filtered_c_ow = [c for c in courses_ow if sc.course.equals(c)]
-                if filtered_c_ow:
-                    corresponding_course = filtered_c_ow[0]
-                    courses_ow.remove(corresponding_course)
-                    sc.pk=None
-                    sc.course=corresponding_course
-                    sc.work_copy=target_work_copy
-                    sc.save()
-                    done = True
-            if done:
-                result['more'] += _('%s, ') % ow
+        with transaction.atomic():
+            sched_week = list(ScheduledCourse.objects.filter(course__type__department=department,
+                                                             course__week=week,
+                                                             work_copy=work_copy)
+                              .select_related('course'))
+            other_weeks_courses = list(Course.objects.filter(type__department=department)
+                                       .exclude(week=week)
+                                       .select_related('week')
+                                       .order_by('id'))
+
+            groups_of = {}
+            for course_id, group_id in Course.groups.through.objects \
+                    .filter(course__type__department=department) \
+                    .order_by('course_id', 'genericgroup_id') \
+                    .values_list('course_id', 'genericgroup_id'):
+                groups_of.setdefault(course_id, []).append(group_id)
+            groups_of = {course_id: tuple(group_ids) for course_id, group_ids in groups_of.items()}
+
+            # courses of the other weeks, by week and by signature
+            courses_ow = {}
+            for c in other_weeks_courses:
+                courses_ow.setdefault(c.week, {}).setdefault(course_signature(c, groups_of), []).append(c)
+            max_work_copy = dict(ScheduledCourse.objects
+                                 .filter(course__type__department=department, course__week__in=list(courses_ow))
+                                 .values_list('course__week')
+                                 .annotate(Max('work_copy')))
+
+            new_scheduled_courses = []
+            new_weeks = []
+            new_public_weeks = []
+            for ow in sorted(courses_ow, key=lambda w: (w.year, w.nb)):
+                done = False
+                target_work_copy = max_work_copy[ow.id] + 1 if ow.id in max_work_copy else 0
+                for sc in sched_week:
+                    corresponding_courses = courses_ow[ow].get(course_signature(sc.course, groups_of))
+                    if corresponding_courses:
+                        new_scheduled_courses.append(scheduled_course_copy(sc,
+                                                                           course_id=corresponding_courses.pop(0).id,
+                                                                           work_copy=target_work_copy))
+                        done = True
+                if done:
+                    result['more'] += _('%s, ') % ow
+                    new_weeks.append(ow)
+                    if target_work_copy == 0:
+                        new_public_weeks.append(ow)
+            ScheduledCourse.objects.bulk_create(new_scheduled_courses, batch_size=1000)
+            # bulk_create does not send the signals maintaining the daily volumes and the cached courses
+            invalidate_courses_cache(department.id, new_weeks)
+            if new_public_weeks:
+                rebuild_daily_volumes(department, new_public_weeks)
+                invalidate_model_sessions()
         return result
     except:
         result['status'] = 'KO'
@@ -430,6 +394,75 @@ def first_free_work_copy(department, week):
         return 0
 
 
+def first_free_work_copy_of_weeks(department, weeks):
+    """
+    Lowest work copy that is free for all the weeks
+    """
+    local_max_wc = ScheduledCourse \
+        .objects \
+        .filter(course__module__train_prog__department=department,
+                course__week__in=weeks) \
+        .aggregate(Max('work_copy'))['work_copy__max']
+    if local_max_wc is not None:
+        return local_max_wc + 1
+    else:
+        return 0
+
+
+def dependent_weeks_groups(department, weeks, train_prog=None):
+    """
+    Splits weeks into groups of weeks linked by constraints crossing weeks: dependencies or pivots
+    between courses of different weeks, active StabilizationThroughWeeks and active LimitTutorTimePerWeeks
+    on several weeks.
+    Returns a list of lists of weeks, in the order of weeks.
+    """
+    weeks = list(weeks)
+    if train_prog is None:
+        train_progs = TrainingProgramme.objects.filter(department=department)
+    else:
+        train_progs = TrainingProgramme.objects.filter(id=train_prog.id)
+    group_of = {w.id: w.id for w in weeks}
+
+    def root(week_id):
+        while group_of[week_id] != week_id:
+            group_of[week_id] = group_of[group_of[week_id]]
+            week_id = group_of[week_id]
+        return week_id
+
+    def link(week_ids):
+        week_ids = [w for w in week_ids if w in group_of]
+        for week_id in week_ids[1:]:
+            group_of[root(week_id)] = root(week_ids[0])
+
+    for week1_id, week2_id in Dependency.objects \
+            .filter(course1__week__in=weeks, course2__week__in=weeks, course1__module__train_prog__in=train_progs) \
+            .exclude(course1__week=F('course2__week')) \
+            .values_list('course1__week_id', 'course2__week_id'):
+        link([week1_id, week2_id])
+
+    for week1_id, week2_id in Pivot.objects \
+            .filter(pivot_course__week__in=weeks, other_courses__week__in=weeks,
+                    pivot_course__module__train_prog__in=train_progs) \
+            .exclude(pivot_course__week=F('other_courses__week')) \
+            .values_list('pivot_course__week_id', 'other_courses__week_id'):
+        link([week1_id, week2_id])
+
+    active_constraints = Q(department=department, is_active=True) & (Q(weeks__in=weeks) | Q(weeks__isnull=True))
+    for constraint in StabilizationThroughWeeks.objects.filter(active_constraints).distinct():
+        link(list(constraint.courses.filter(week__in=weeks).values_list('week_id', flat=True).distinct()))
+
+    for number_of_weeks in LimitTutorTimePerWeeks.objects.filter(active_constraints, number_of_weeks__gt=1) \
+            .values_list('number_of_weeks', flat=True).distinct():
+        sorted_weeks = sorted(weeks, key=lambda w: (w.year, w.nb))
+        for i in range(len(sorted_weeks) - number_of_weeks + 1):
+            link([w.id for w in sorted_weeks[i:i + number_of_weeks]])
+
+    groups = {}
+    for w in weeks:
+        groups.setdefault(root(w.id), []).append(w)
+    return list(groups.values())
+
+
 def convert_into_set(declared_object_or_iterable):
     if hasattr(declared_object_or_iterable, '__iter__'):
         return set(declared_object_or_iterable)
@@ -449,8 +482,42 @@ def sorted_by_start_time(schedule_courses_iterable):
     return sorted(sc_list, key= lambda x: (x.course.week, days_index[x.day], x.start_time))
 
 
+def day_order():
+    """
+    Index of the day of a scheduled course, to order them in SQL
+    """
+    return Case(*[When(day=day, then=Value(index)) for day, index in days_index.items()],
+                output_field=IntegerField())
+
+
+def week_from_query(week, prefix='course__week'):
+    return Q(**{f'{prefix}__year__gt': week.year}) | Q(**{f'{prefix}__year': week.year, f'{prefix}__nb__gte': week.nb})
+
+
+def week_until_query(week, prefix='course__week'):
+    return Q(**{f'{prefix}__year__lt': week.year}) | Q(**{f'{prefix}__year': week.year, f'{prefix}__nb__lte': week.nb})
+
+
+def series_group(course_ref):
+    """
+    First group (of smallest id) of the course course_ref, the group of its numbering series
+    """
+    return Subquery(Course.groups.through.objects
+                    .filter(course=OuterRef(course_ref))
+                    .order_by('genericgroup')
+                    .values('genericgroup')[:1])
+
+
 def number_courses(department, modules=None, course_types=None, periods=None, train_progs=None,
-                   from_week=None, until_week=None, work_copy=0):
+                   from_week=None, until_week=None, work_copy=0, groups=None):
+    """
+    Numbers the scheduled courses of work_copy within every (module, course type, group) series,
+    in chronological order: the first course of the series is 1. A course with several groups
+    belongs to the series of its first group, cf. series_group, whether groups is given or not.
+    If from_week is given, only the courses from this week on are numbered, after the courses of the
+    series that precede it; if until_week is given, only the courses until this week are numbered.
+    The numbers are computed with a single window query, and only the changed ones are written.
+    """
     considered_train_progs = intersect_with_declared_objects(TrainingProgramme.objects.filter(department=department),
                                                              train_progs)
     considered_periods = intersect_with_declared_objects(Period.objects.filter(department=department),
@@ -460,25 +527,61 @@ def number_courses(department, modules=None, course_types=None, periods=None, tr
                                                          modules)
     considered_course_types = intersect_with_declared_objects(CourseType.objects.filter(department=department),
                                                               course_types)
-    for module in considered_modules:
-        for course_type in considered_course_types:
-            considered_courses = Course.objects.filter(module=module, type=course_type)
-            for c_group in considered_courses.distinct('groups'):
-                group = c_group.groups.first()
-                group_courses = considered_courses.filter(groups=group)
-                total_number = len(group_courses)
-                if from_week is not None:
-                    group_courses = group_courses.filter(week__gte=from_week)
-                    past_courses_number = len(group_courses.filter(week__lt=from_week))
-                else:
-                    past_courses_number = 0
-                if until_week is not None:
-                    group_courses = group_courses.filter(week__lte=until_week)
-                sorted_sched_courses = sorted_by_start_time(ScheduledCourse.objects.filter(course__in=group_courses,
-                                                                                           work_copy=work_copy))
-                for i, sc in enumerate(sorted_sched_courses):
-                    sc.number = past_courses_number + i + 1
-                    sc.save()
+
+    def series_filter(queryset, prefix, course_ref):
+        queryset = queryset.annotate(series_group=series_group(course_ref)) \
+            .filter(**{f'{prefix}module__in': considered_modules, f'{prefix}type__in': considered_course_types,
+                       'series_group__isnull': False})
+        if groups is not None:
+            queryset = queryset.filter(series_group__in=[g.id for g in convert_into_set(groups)])
+        return queryset
+
+    sched_courses = series_filter(ScheduledCourse.objects.filter(work_copy=work_copy), 'course__', 'course_id')
+    past_courses_number = {}
+    if from_week is not None:
+        sched_courses = sched_courses.filter(week_from_query(from_week))
+        for module_id, type_id, group_id, nb in series_filter(Course.objects.all(), '', 'id') \
+                .filter(~week_from_query(from_week, prefix='week')) \
+                .order_by() \
+                .values_list('module', 'type', 'series_group') \
+                .annotate(nb=Count('id')):
+            past_courses_number[module_id, type_id, group_id] = nb
+    if until_week is not None:
+        sched_courses = sched_courses.filter(week_until_query(until_week))
+
+    changed = []
+    changed_weeks = set()
+    for sc_id, week_id, module_id, type_id, group_id, rank, number in sched_courses \
+            .annotate(rank=Window(RowNumber(),
+                                  partition_by=[F('course__module'), F('course__type'), F('series_group')],
+                                  order_by=[F('course__week__year').asc(), F('course__week__nb').asc(),
+                                            day_order().asc(), F('start_time').asc(), F('id').asc()])) \
+            .values_list('id', 'course__week', 'course__module', 'course__type', 'series_group', 'rank', 'number'):
+        new_number = past_courses_number.get((module_id, type_id, group_id), 0) + rank
+        if new_number != number:
+            changed.append(ScheduledCourse(id=sc_id, number=new_number))
+            changed_weeks.add(week_id)
+    ScheduledCourse.objects.bulk_update(changed, ['number'], batch_size=1000)
+    invalidate_courses_cache(department.id, changed_weeks)
+
+
+def renumber_courses_series(courses, work_copy=0):
+    """
+    Incremental numbering: renumbers only the (module, course type, group) series of courses
+    """
+    for department, series in itertools.groupby(
+            sorted(Course.objects.filter(id__in=[c.id for c in courses])
+                   .annotate(series_group=series_group('id'))
+                   .filter(series_group__isnull=False)
+                   .values_list('module__train_prog__department', 'module', 'type', 'series_group')),
+            key=lambda s: s[0]):
+        series = list(series)
+        number_courses(Department.objects.get(id=department),
+                       modules=Module.objects.filter(id__in=set(s[1] for s in series)),
+                       course_types=CourseType.objects.filter(id__in=set(s[2] for s in series)),
+                       groups=GenericGroup.objects.filter(id__in=set(s[3] for s in series)),
+                       work_copy=work_copy)
+
 
 def print_differences(department, weeks, old_copy, new_copy, tutors=Tutor.objects.all()):
     for week in weeks:
@@ -23,6 +23,8 @@
 # a commercial license. Buying such a license is mandatory as soon as
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
+from copy import deepcopy
+
 from django.core.mail import EmailMessage
 from pulp import LpVariable, LpConstraint, LpBinary, LpConstraintEQ, \
     LpConstraintGE, LpConstraintLE, LpAffineExpression, LpProblem, LpStatus, \
@@ -49,7 +51,7 @@ from people.models import Tutor, PhysicalPresence
 
 from misc.manage_rooms_ponderations import register_ponderations_in_database
 
-from TTapp.slots import Slot, CourseSlot, slots_filter, days_filter
+from TTapp.slots import Slot, CourseSlot, SlotIndex, DayIndex, slots_filter, days_filter
 from TTapp.models import AssignAllCourses
 
 from django.db.models import Q, Max, F
@@ -92,6 +94,8 @@ class WeeksDatabase(object):
             self.basic_groups_of, self.conflicting_basic_groups, self.transversal_groups_of,\
             self.not_parallel_transversal_groups, \
             self.courses_for_group, self.courses_for_basic_group, self.all_courses_for_basic_group = self.groups_init()
+        self.module_possible_tutors, self.course_possible_tutors, self.tutors_repartition = \
+            self.possible_tutors_init()
         self.instructors, self.courses_for_tutor, self.courses_for_supp_tutor, self.availabilities, \
             self.fixed_courses_for_tutor, \
             self.other_departments_courses_for_tutor, self.other_departments_scheduled_courses_for_supp_tutor, \
@@ -109,8 +113,8 @@ class WeeksDatabase(object):
                 for week in self.weeks
                 for day in TimeGeneralSettings.objects.get(department=self.department).days]
 
-        database_holidays = Holiday.objects.filter(week__in=self.weeks)
-        holidays = set(d for d in days if database_holidays.filter(day=d.day, week=d.week).exists())
+        database_holidays = set(Holiday.objects.filter(week__in=self.weeks).values_list('week_id', 'day'))
+        holidays = set(d for d in days if (d.week.id, d.day) in database_holidays)
 
         if self.department.mode.cosmo != 1:
             for hd in holidays:
@@ -130,7 +134,7 @@ class WeeksDatabase(object):
             else:
                 day_before[day] = days[i-1]
 
-        days = set(days)
+        days = DayIndex(days)
 
         return days, day_after, holidays, training_half_days, day_before
 
@@ -145,16 +149,17 @@ class WeeksDatabase(object):
         for cc in filtered_cstc:
             start_times = cc.allowed_start_times
             if self.slots_step is None:
-                courses_slots |= set(CourseSlot(d, start_time, cc.course_type)
+                courses_slots |= set(CourseSlot(d, start_time, cc.course_type, tgs.lunch_break_finish_time)
                              for d in self.days
                              for start_time in start_times)
             else:
-                courses_slots |= set(CourseSlot(d, start_time, cc.course_type)
+                courses_slots |= set(CourseSlot(d, start_time, cc.course_type, tgs.lunch_break_finish_time)
                                      for d in self.days
                                      for start_time in cc.allowed_start_times if start_time % self.slots_step == 0)
 
-        for slot in courses_slots:
-            self.possible_apms.add(slot.apm)
+        # Indexed once, so that slots_filter does not scan every slot for each query
+        courses_slots = SlotIndex(courses_slots)
+        self.possible_apms |= set(courses_slots.by_apm)
 
         # We build availability slots considering the possible Intervals from a possible start time to another
         # and adding the possible end times. It is a partition, and we may use the Partition class to do it.
@@ -174,11 +179,11 @@ class WeeksDatabase(object):
             start_times.remove(tgs.lunch_break_start_time)
             end_times.remove(tgs.lunch_break_finish_time)
 
-        availability_slots = {Slot(day=day,
-                                   start_time=start_times[i],
-                                   end_time=end_times[i])
-                              for day in self.days
-                              for i in range(len(start_times))}
+        availability_slots = SlotIndex(Slot(day=day,
+                                            start_time=start_times[i],
+                                            end_time=end_times[i])
+                                       for day in self.days
+                                       for i in range(len(start_times)))
         print('Ok' + f' : {len(courses_slots)} courses_slots and {len(availability_slots)} availability_slots created!')
 
         first_hour_slots = {slot for slot in availability_slots if slot.start_time < start_times[0] + 60}
@@ -190,15 +195,16 @@ class WeeksDatabase(object):
     def courses_init(self):
         # COURSES
         courses = Course.objects.filter(week__in=self.weeks, module__train_prog__in=self.train_prog)\
-            .select_related('module', 'room_type')
+            .select_related('module', 'room_type', 'type', 'tutor', 'week')
 
         course_types = set(c.type for c in courses)
 
-        courses_by_week = {week: set(courses.filter(week=week)) for week in self.weeks}
+        courses_by_week = {week: set(c for c in courses if c.week_id == week.id) for week in self.weeks}
 
         sched_courses = ScheduledCourse \
             .objects \
-            .filter(course__in=courses)
+            .filter(course__in=courses) \
+            .select_related('course__type', 'course__week')
 
         if self.department.mode.cosmo:
             sched_courses = sched_courses.filter(work_copy=0)
@@ -207,7 +213,8 @@ class WeeksDatabase(object):
             .filter(course__module__train_prog__department=self.department,
                     course__week__in=self.weeks,
                     work_copy=0) \
-            .exclude(course__module__train_prog__in=self.train_prog)
+            .exclude(course__module__train_prog__in=self.train_prog) \
+            .select_related('course__type', 'course__week')
 
         other_departments_courses = Course.objects.filter(
             week__in=self.weeks) \
@@ -216,7 +223,8 @@ class WeeksDatabase(object):
         other_departments_sched_courses = ScheduledCourse \
             .objects \
             .filter(course__in=other_departments_courses,
-                    work_copy=0)
+                    work_copy=0) \
+            .select_related('course__type', 'course__week')
 
         courses_availabilities = CoursePreference.objects \
             .filter(Q(week__in=self.weeks) | Q(week=None),
@@ -256,56 +264,74 @@ class WeeksDatabase(object):
 
     def rooms_init(self):
         # ROOMS
-        room_types = RoomType.objects.filter(department=self.department)
-        used_room_types = set(c.room_type for c in self.courses.distinct('room_type'))
+        room_types = RoomType.objects.filter(department=self.department).prefetch_related('members')
+        used_room_types = set(c.room_type for c in self.courses)
         basic_rooms = queries.get_rooms(self.department.abbrev, basic=True).distinct()
         room_prefs = RoomSort.objects.filter(for_type__department=self.department)
         rooms_for_type = {t: t.members.all() for t in room_types}
 
+        # read from the cached room hierarchy, cf. base.room_closure
+        and_overrooms_of = {r: r.and_overrooms() for r in basic_rooms}
+
         rooms = set(Room.objects.filter(departments=self.department).distinct())
         for r in basic_rooms:
-            rooms |= r.and_overrooms()
+            rooms |= and_overrooms_of[r]
 
+        members_of_type = {rt: set(rt.members.all())
+                           for rt in RoomType.objects.filter(id__in=set(c.room_type_id for c in self.courses))
+                                                     .prefetch_related('members')}
         course_rg_compat = {}
+        courses_for_rg = {}
         for c in self.courses:
-            course_rg_compat[c] = set(c.room_type.members.all())
+            course_rg_compat[c] = set(members_of_type[c.room_type])
+            for rg in course_rg_compat[c]:
+                courses_for_rg.setdefault(rg, []).append(c)
 
         # for each Room, build the list of courses that may use it
         room_course_compat = {}
         for r in basic_rooms:
             # print "compat for ", r
             room_course_compat[r] = []
-            for rg in r.and_overrooms():
+            for rg in and_overrooms_of[r]:
                 room_course_compat[r].extend(
-                    [(c, rg) for c in self.courses if rg in course_rg_compat[c]])
-                     # self.courses.filter(room_type__in=rg.types.all())])
+                    [(c, rg) for c in courses_for_rg.get(rg, [])])
         if self.department.mode.visio:
             # All courses can have no room (except no-visio ones?)
             for c in set(self.courses):
                 # if c not in self.no_visio_courses:
                 course_rg_compat[c].add(None)
+
+        fixed_courses_in_room = {}
+        for fc in self.fixed_courses:
+            fixed_courses_in_room.setdefault(fc.room_id, set()).add(fc)
+        other_departments_sched_courses_in_room = {}
+        for sc in self.other_departments_sched_courses.filter(room__in=rooms):
+            other_departments_sched_courses_in_room.setdefault(sc.room_id, set()).add(sc)
+
         fixed_courses_for_room = {}
         for r in basic_rooms:
             fixed_courses_for_room[r] = set()
-            for rg in r.and_overrooms():
-                fixed_courses_for_room[r] |= set(self.fixed_courses.filter(room=rg))
+            for rg in and_overrooms_of[r]:
+                fixed_courses_for_room[r] |= fixed_courses_in_room.get(rg.id, set())
 
         other_departments_sched_courses_for_room = {}
         for r in basic_rooms:
             other_departments_sched_courses_for_room[r] = set()
-            for rg in r.and_overrooms():
-                other_departments_sched_courses_for_room[r] |= set(self.other_departments_sched_courses.filter(room=rg))
+            for rg in and_overrooms_of[r]:
+                other_departments_sched_courses_for_room[r] |= other_departments_sched_courses_in_room.get(rg.id,
+                                                                                                         set())
 
         department_rooms_ponderations = RoomPonderation.objects.filter(department=self.department)
         if not department_rooms_ponderations.exists():
             register_ponderations_in_database(self.department)
 
+        used_room_types_ids = set(rt.id for rt in used_room_types)
         rooms_ponderations = set(rp for rp in department_rooms_ponderations
-                                 if rp.get_room_types_set() & set(used_room_types))
+                                 if set(rp.room_types) & used_room_types_ids)
 
         courses_for_room_type = {}
         for rt in room_types:
-            courses_for_room_type[rt] = set(self.courses.filter(room_type=rt))
+            courses_for_room_type[rt] = set(c for c in self.courses if c.room_type_id == rt.id)
 
         return room_types, used_room_types, rooms, basic_rooms, room_prefs, rooms_for_type, room_course_compat, course_rg_compat, \
                fixed_courses_for_room, other_departments_sched_courses_for_room, rooms_ponderations, \
@@ -316,23 +342,17 @@ class WeeksDatabase(object):
         # Slots and courses are compatible if they have the same type
         # OR if slot type is None and they have the same duration
         if not self.department.mode.cosmo:
+            untyped_slots = self.courses_slots.by_course_type.get(None, set())
             compatible_slots = {}
             for c in self.courses:
-                compatible_slots[c] = set(slot for slot in self.courses_slots
-                                          if slot.day.week == c.week and
-                                          (slot.course_type == c.type
-                                           or (slot.course_type is None and c.type.duration == slot.duration)))
-
-            compatible_courses = {}
-            for sl in self.courses_slots:
-                if sl.course_type is None:
-                    compatible_courses[sl] = set(course for course in self.courses
-                                                 if course.type.duration == sl.duration
-                                                 and sl.day.week == course.week)
-                else:
-                    compatible_courses[sl] = set(course for course in self.courses
-                                                 if course.type == sl.course_type
-                                                 and sl.day.week == course.week)
+                compatible_slots[c] = slots_filter(self.courses_slots, week=c.week, course_type=c.type) \
+                                      | set(slot for slot in untyped_slots
+                                            if slot.day.week == c.week and c.type.duration == slot.duration)
+
+            compatible_courses = {sl: set() for sl in self.courses_slots}
+            for c, slots in compatible_slots.items():
+                for sl in slots:
+                    compatible_courses[sl].add(c)
         else:
             compatible_courses = {sl: set() for sl in self.courses_slots}
             compatible_slots = {c: set() for c in self.courses}
@@ -360,22 +380,35 @@ class WeeksDatabase(object):
     def groups_init(self):
         # GROUPS
         structural_groups = StructuralGroup.objects.filter(train_prog__in=self.train_prog)
-        transversal_groups = TransversalGroup.objects.filter(train_prog__in=self.train_prog)
+        transversal_groups = TransversalGroup.objects.filter(train_prog__in=self.train_prog)\
+            .prefetch_related('conflicting_groups', 'parallel_groups')
         all_groups = set(structural_groups) | set(transversal_groups)
 
         basic_groups = structural_groups.filter(basic=True)
-        #  ,
+        #  ,
         # id__in=self.courses.values_list('groupe_id').distinct())
 
+        # The whole group hierarchy of the department is loaded at once
+        parent_groups = {}
+        for link in StructuralGroup.parent_groups.through.objects \
+                .filter(from_structuralgroup__train_prog__department=self.department) \
+                .select_related('to_structuralgroup'):
+            parent_groups.setdefault(link.from_structuralgroup_id, set()).add(link.to_structuralgroup)
+
         all_groups_of = {}
         for g in basic_groups:
-            all_groups_of[g] = g.and_ancestors()
-
-        basic_groups_of = {}
-        for g in structural_groups:
-            basic_groups_of[g] = set()
-            for bg in basic_groups:
-                if g in all_groups_of[bg]:
+            all_groups_of[g] = {g}
+            to_visit = [g]
+            while to_visit:
+                for parent in parent_groups.get(to_visit.pop().id, ()):
+                    if parent not in all_groups_of[g]:
+                        all_groups_of[g].add(parent)
+                        to_visit.append(parent)
+
+        basic_groups_of = {g: set() for g in structural_groups}
+        for bg in basic_groups:
+            for g in all_groups_of[bg]:
+                if g in basic_groups_of:
                     basic_groups_of[g].add(bg)
 
         conflicting_basic_groups = {}
@@ -394,17 +427,28 @@ class WeeksDatabase(object):
         not_parallel_transversal_groups = {}
         for tg in transversal_groups:
             not_parallel_transversal_groups[tg] = set()
-            for tg2 in transversal_groups.filter(train_prog=tg.train_prog).exclude(id=tg.id):
-                if tg2 not in tg.parallel_groups.all() and conflicting_basic_groups[tg] & conflicting_basic_groups[tg2]:
+            parallel_groups = set(tg.parallel_groups.all())
+            for tg2 in transversal_groups:
+                if tg2.train_prog_id != tg.train_prog_id or tg2.id == tg.id:
+                    continue
+                if tg2 not in parallel_groups and conflicting_basic_groups[tg] & conflicting_basic_groups[tg2]:
                     not_parallel_transversal_groups[tg].add(tg2)
 
+        courses_by_id = {c.id: c for c in self.courses}
+        courses_for_group_id = {}
+        for course_id, group_id in Course.groups.through.objects.filter(course__in=self.courses)\
+                .values_list('course_id', 'genericgroup_id'):
+            courses_for_group_id.setdefault(group_id, set()).add(courses_by_id[course_id])
+
         courses_for_group = {}
         for g in all_groups:
-            courses_for_group[g] = set(self.courses.filter(groups=g))
+            courses_for_group[g] = set(courses_for_group_id.get(g.id, set()))
 
         courses_for_basic_group = {}
         for bg in basic_groups:
-            courses_for_basic_group[bg] = set(self.courses.filter(groups__in=all_groups_of[bg]))
+            courses_for_basic_group[bg] = set()
+            for g in all_groups_of[bg]:
+                courses_for_basic_group[bg] |= courses_for_group_id.get(g.id, set())
 
         #consider all courses, including transversal_groups ones
         all_courses_for_basic_group = {}
@@ -419,72 +463,99 @@ class WeeksDatabase(object):
             conflicting_basic_groups, transversal_groups_of, not_parallel_transversal_groups,\
             courses_for_group, courses_for_basic_group, all_courses_for_basic_group
 
+    def possible_tutors_init(self):
+        # Tutors that may be assigned to modules and courses, loaded at once
+        module_possible_tutors = {}
+        for mpt in ModulePossibleTutors.objects.filter(module__in=self.modules).prefetch_related('possible_tutors'):
+            module_possible_tutors[mpt.module_id] = set(mpt.possible_tutors.all())
+
+        course_possible_tutors = {}
+        for cpt in CoursePossibleTutors.objects.filter(course__in=self.courses).prefetch_related('possible_tutors'):
+            course_possible_tutors[cpt.course_id] = set(cpt.possible_tutors.all())
+
+        tutors_repartition = {}
+        for mtr in ModuleTutorRepartition.objects.filter(module__in=self.modules,
+                                                         week__in=self.weeks).select_related('tutor'):
+            tutors_repartition.setdefault((mtr.module_id, mtr.course_type_id, mtr.week_id), set()).add(mtr.tutor)
+
+        return module_possible_tutors, course_possible_tutors, tutors_repartition
+
     def users_init(self):
         # USERS
-        instructors = set()
-        for tutor in Tutor.objects.filter(id__in=self.courses.values_list('tutor_id')):
-            instructors.add(tutor)
-        for cst in self.courses.distinct("supp_tutor"):
-            for tutor in cst.supp_tutor.all():
-                instructors.add(tutor)
-        for mpt in ModulePossibleTutors.objects.filter(module__in=self.modules):
-            for tutor in mpt.possible_tutors.all():
-                instructors.add(tutor)
-        for cpt in CoursePossibleTutors.objects.filter(course__in=self.courses):
-            for tutor in cpt.possible_tutors.all():
-                instructors.add(tutor)
-        for mtr in ModuleTutorRepartition.objects.filter(module__in=self.modules,
-                                                         week__in=self.weeks):
-            instructors.add(mtr.tutor)
+        courses_by_id = {c.id: c for c in self.courses}
+        supp_tutor_links = Course.supp_tutor.through.objects.filter(course__in=self.courses).select_related('tutor')
+
+        instructors = set(c.tutor for c in self.courses if c.tutor is not None)
+        for link in supp_tutor_links:
+            instructors.add(link.tutor)
+        for possible_tutors in self.module_possible_tutors.values():
+            instructors |= possible_tutors
+        for possible_tutors in self.course_possible_tutors.values():
+            instructors |= possible_tutors
+        for tutors in self.tutors_repartition.values():
+            instructors |= tutors
         try:
             no_tut = Tutor.objects.get(username='---')
             instructors.add(no_tut)
         except:
             pass
-        courses_for_tutor = {}
-        for i in instructors:
-            courses_for_tutor[i] = set(self.courses.filter(tutor=i))
+        instructors_by_id = {i.id: i for i in instructors}
 
-        courses_for_supp_tutor = {}
-        for i in instructors:
-            courses_for_supp_tutor[i] = set(i.courses_as_supp.filter(id__in=self.courses))
+        courses_for_tutor = {i: set() for i in instructors}
+        for c in self.courses:
+            if c.tutor_id is not None:
+                courses_for_tutor[instructors_by_id[c.tutor_id]].add(c)
+
+        courses_for_supp_tutor = {i: set() for i in instructors}
+        for link in supp_tutor_links:
+            courses_for_supp_tutor[instructors_by_id[link.tutor_id]].add(courses_by_id[link.course_id])
+
+        week_preferences = {}
+        default_preferences = {}
+        for up in UserPreference.objects.filter(Q(week__in=self.weeks) | Q(week=None), user__in=instructors)\
+                .select_related('week'):
+            if up.week_id is None:
+                default_preferences.setdefault(up.user_id, []).append(up)
+            else:
+                week_preferences.setdefault((up.user_id, up.week_id), set()).add(up)
 
         availabilities = {}
         for i in instructors:
             availabilities[i] = {}
             for week in self.weeks:
-                availabilities[i][week] = set(UserPreference.objects.filter(week=week, user=i))
+                availabilities[i][week] = week_preferences.get((i.id, week.id), set())
                 if not availabilities[i][week]:
-                    availabilities[i][week] = set(UserPreference.objects.filter(week=None, user=i))
+                    # each week gets its own copy of the default preferences
+                    availabilities[i][week] = set(deepcopy(avail) for avail in default_preferences.get(i.id, []))
                     for avail in availabilities[i][week]:
                         avail.week=week
 
-        fixed_courses_for_tutor = {}
-        for i in instructors:
-            fixed_courses_for_tutor[i] = set(self.fixed_courses.filter(Q(tutor=i) | Q(course__supp_tutor=i)))
-
-        other_departments_courses_for_tutor = {}
-        for i in instructors:
-            other_departments_courses_for_tutor[i] = set(self.other_departments_courses.filter(tutor=i))
-
-        other_departments_scheduled_courses_for_supp_tutor = {}
-        for i in instructors:
-            other_departments_scheduled_courses_for_supp_tutor[i] = set(self.other_departments_sched_courses
-                                                              .filter(course__supp_tutor=i))
-
-        other_departments_scheduled_courses_for_tutor = {}
-        for i in instructors:
-            other_departments_scheduled_courses_for_tutor[i] = set(self.other_departments_sched_courses
-                                                                   .filter(course__tutor=i))
-
-        physical_presence_days_for_tutor = {}
-        for i in instructors:
-            physical_presence_days_for_tutor[i] = {}
-            for w in self.weeks:
-                physical_presence_days_for_tutor[i][w] = []
-                if PhysicalPresence.objects.filter(user=i, week=w).exists():
-                    for pp in i.physical_presences.filter(week=w):
-                        physical_presence_days_for_tutor[i][w].append(pp.day)
+        fixed_courses_for_tutor = {i: set() for i in instructors}
+        for fc in self.fixed_courses:
+            if fc.tutor_id in instructors_by_id:
+                fixed_courses_for_tutor[instructors_by_id[fc.tutor_id]].add(fc)
+        for fc in self.fixed_courses.filter(course__supp_tutor__in=instructors)\
+                .annotate(supp_tutor_id=F('course__supp_tutor')):
+            fixed_courses_for_tutor[instructors_by_id[fc.supp_tutor_id]].add(fc)
+
+        other_departments_courses_for_tutor = {i: set() for i in instructors}
+        for c in self.other_departments_courses.filter(tutor__in=instructors):
+            other_departments_courses_for_tutor[instructors_by_id[c.tutor_id]].add(c)
+
+        other_departments_scheduled_courses_for_supp_tutor = {i: set() for i in instructors}
+        for sc in self.other_departments_sched_courses.filter(course__supp_tutor__in=instructors)\
+                .annotate(supp_tutor_id=F('course__supp_tutor')):
+            other_departments_scheduled_courses_for_supp_tutor[instructors_by_id[sc.supp_tutor_id]].add(sc)
+
+        other_departments_scheduled_courses_for_tutor = {i: set() for i in instructors}
+        for sc in self.other_departments_sched_courses.filter(course__tutor__in=instructors):
+            other_departments_scheduled_courses_for_tutor[instructors_by_id[sc.course.tutor_id]].add(sc)
+
+        physical_presence_days_for_tutor = {i: {w: [] for w in self.weeks} for i in instructors}
+        weeks_by_id = {w.id: w for w in self.weeks}
+        for user_id, week_id, day in PhysicalPresence.objects.filter(user__in=instructors, week__in=self.weeks)\
+                .values_list('user_id', 'week_id', 'day'):
+            physical_presence_days_for_tutor[instructors_by_id[user_id]][weeks_by_id[week_id]].append(day)
 
         return instructors, courses_for_tutor, courses_for_supp_tutor, availabilities, \
             fixed_courses_for_tutor, other_departments_courses_for_tutor, \
@@ -495,8 +566,8 @@ class WeeksDatabase(object):
     def possible_courses_tutor_init(self):
         possible_tutors = {}
         for m in self.modules:
-            if ModulePossibleTutors.objects.filter(module=m).exists():
-                possible_tutors[m] = set(ModulePossibleTutors.objects.get(module=m).possible_tutors.all())
+            if m.id in self.module_possible_tutors:
+                possible_tutors[m] = set(self.module_possible_tutors[m.id])
             else:
                 possible_tutors[m] = self.instructors
 
@@ -514,24 +585,24 @@ class WeeksDatabase(object):
             if c.tutor is not None:
                 possible_tutors[c] = {c.tutor}
             else:
-                if CoursePossibleTutors.objects.filter(course=c).exists():
-                    possible_tutors[c] = set(CoursePossibleTutors.objects.get(course=c).possible_tutors.all())
-                elif ModuleTutorRepartition.objects.filter(course_type=c.type, module=c.module,
-                                                           week=c.week).exists():
-                    possible_tutors[c] = set(mtr.tutor for mtr in
-                                             ModuleTutorRepartition.objects.filter(course_type=c.type, module=c.module,
-                                                                                   week=c.week))
+                if c.id in self.course_possible_tutors:
+                    possible_tutors[c] = set(self.course_possible_tutors[c.id])
+                elif (c.module_id, c.type_id, c.week_id) in self.tutors_repartition:
+                    possible_tutors[c] = set(self.tutors_repartition[(c.module_id, c.type_id, c.week_id)])
                 else:
                     possible_tutors[c] = possible_tutors[c.module]
 
-        possible_modules = {}
-        for i in self.instructors:
-            possible_modules[i] = set(m for m in self.modules
-                                      if i in possible_tutors[m])
+        possible_modules = {i: set() for i in self.instructors}
+        for m in self.modules:
+            for i in possible_tutors[m]:
+                if i in possible_modules:
+                    possible_modules[i].add(m)
 
-        possible_courses = {}
-        for i in self.instructors:
-            possible_courses[i] = set(c for c in self.courses if i in possible_tutors[c])
+        possible_courses = {i: set() for i in self.instructors}
+        for c in self.courses:
+            for i in possible_tutors[c]:
+                if i in possible_courses:
+                    possible_courses[i].add(c)
 
         return possible_tutors, possible_modules, possible_courses
 
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+from django.db.models import F, Q
+
+from base.models import ScheduledCourse
+from base.room_closure import room_closure
+
+
+def week_scheduled_courses(department, week, work_copy):
+    """
+    Scheduled courses of work copy work_copy of department (abbrev), and of
+    work copy 0 of the other departments, during week, as dicts
+    """
+    department_filter = Q(course__module__train_prog__department__abbrev=department)
+    return list(ScheduledCourse.objects
+                .filter(Q(work_copy=work_copy) & department_filter | Q(work_copy=0) & ~department_filter,
+                        course__week=week)
+                .values('id', 'day', 'start_time', 'room_id')
+                .annotate(duration=F('course__type__duration'),
+                          tutor_username=F('tutor__username'),
+                          room_name=F('room__name'),
+                          module=F('course__module__abbrev'),
+                          department=F('course__module__train_prog__department__abbrev')))
+
+
+def overlapping_pairs(courses, in_department):
+    """
+    Sweep-line over courses of a single resource in a single day: yields the
+    overlapping pairs (course of the department, course of another one)
+    """
+    active = []
+    for course in sorted(courses, key=lambda c: c['start_time']):
+        active = [a for a in active if a['start_time'] + a['duration'] > course['start_time']]
+        for other in active:
+            if in_department(other) != in_department(course):
+                yield (other, course) if in_department(other) else (course, other)
+        active.append(course)
+
+
+def week_conflicts(department, week, work_copy):
+    """
+    Computes the conflicts (tutor giving several courses at the same time or
+    room used in parallel) in week between the work copy work_copy of
+    department (abbrev) and work copy 0 of the other departments.
+    Returns {'tutor': [conflict...], 'room': [conflict...]}, every conflict
+    being {'resource': tutor username or basic room name,
+           'courses': [course of department, course of another department]}
+    """
+    courses = week_scheduled_courses(department, week, work_copy)
+
+    def in_department(course):
+        return course['department'] == department
+
+    by_tutor = {}
+    by_room = {}
+    closure = room_closure()
+    for course in courses:
+        if course['tutor_username'] is not None:
+            by_tutor.setdefault((course['tutor_username'], course['day']), []).append(course)
+        if course['room_id'] is not None:
+            if course['room_id'] not in closure:
+                closure = room_closure(course['room_id'])
+            for room_id in closure.basic_room_ids[course['room_id']]:
+                by_room.setdefault((room_id, course['day']), []).append(course)
+
+    conflicts = {'tutor': [], 'room': []}
+    for (username, _), day_courses in by_tutor.items():
+        for pair in overlapping_pairs(day_courses, in_department):
+            conflicts['tutor'].append({'resource': username, 'courses': list(pair)})
+
+    # a pair of courses in room groups may conflict in several basic rooms
+    seen = set()
+    for (room_id, _), day_courses in by_room.items():
+        for pair in overlapping_pairs(day_courses, in_department):
+            key = (pair[0]['id'], pair[1]['id'])
+            if key not in seen:
+                seen.add(key)
+                conflicts['room'].append({'resource': closure.to_room(room_id).name, 'courses': list(pair)})
+    return conflicts
@@ -97,11 +97,9 @@ class MinHalfDaysHelperModule(MinHalfDaysHelperBase):
         mod_b_h_d = {}
         for d in days:
             mod_b_h_d[(self.module, d, Time.AM)] \
-                = self.ttmodel.add_var("ModBHD(%s,%s,%s)"
-                                    % (self.module, d, Time.AM))
+                = self.ttmodel.add_var("ModBHD(%s,%s,%s)", self.module, d, Time.AM)
             mod_b_h_d[(self.module, d, Time.PM)] \
-                = self.ttmodel.add_var("ModBHD(%s,%s,%s)"
-                                    % (self.module, d, Time.PM))
+                = self.ttmodel.add_var("ModBHD(%s,%s,%s)", self.module, d, Time.PM)
 
             # add constraint linking MBHD to TT
             for apm in [Time.AM, Time.PM]:
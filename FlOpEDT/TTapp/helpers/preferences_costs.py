@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+import numpy as np
+
+# Marks the minutes (and slots) that are not covered by any preference
+NO_PREFERENCE = 127
+
+
+class TutorsPreferencesCosts(object):
+    """
+    Availability and non-preferred slot costs of the tutors, as (tutors x availability slots) arrays:
+        - min_value : minimal value of the preferences simultaneous to the slot (NO_PREFERENCE if none)
+        - avail : 0/1, including availability to home-teaching
+        - avail_at_school : 0/1, excluding home-teaching
+        - cost : float in [0,1]
+    tutor_index and slot_index give the row and the column of a tutor and a slot.
+    """
+    def __init__(self, tutors, slots):
+        self.tutors = list(tutors)
+        self.slots = list(slots)
+        self.tutor_index = {tutor: i for i, tutor in enumerate(self.tutors)}
+        self.slot_index = {sl: j for j, sl in enumerate(self.slots)}
+        shape = (len(self.tutors), len(self.slots))
+        self.min_value = np.full(shape, NO_PREFERENCE, dtype=np.int8)
+        self.avail = np.ones(shape, dtype=np.int8)
+        self.avail_at_school = np.ones(shape, dtype=np.int8)
+        self.cost = np.zeros(shape)
+
+    def set_unavailable(self, items_of_tutor, items_of_slot):
+        """
+        Makes the tutors unavailable on the slots sharing some item (e.g. a fixed course) with them
+
+        :param items_of_tutor: { tutor => set of items }
+        :param items_of_slot: { slot => set of items }
+        """
+        rows, columns = {}, {}
+        for tutor, items in items_of_tutor.items():
+            if tutor in self.tutor_index:
+                for item in items:
+                    rows.setdefault(item, []).append(self.tutor_index[tutor])
+        for sl, items in items_of_slot.items():
+            if sl in self.slot_index:
+                for item in items:
+                    columns.setdefault(item, []).append(self.slot_index[sl])
+        for item, item_rows in rows.items():
+            if item in columns:
+                self.avail[np.ix_(item_rows, columns[item])] = 0
+
+    def as_dicts(self):
+        """
+        :return: avail, avail_at_school and cost as 2 level-dictionaries { tutor => slot => value }
+        """
+        def to_dict(array):
+            return {tutor: dict(zip(self.slots, row)) for tutor, row in zip(self.tutors, array.tolist())}
+        return to_dict(self.avail), to_dict(self.avail_at_school), to_dict(self.cost)
+
+
+def compute_tutors_preferences_costs(tutors, slots_of_week, preferences_of_tutor_week):
+    """
+    Computes, for all tutors at once, the availability and the cost of each availability slot.
+
+    The preferences of each tutor are laid out on a per day minute timeline, from which the minimal
+    value of the preferences simultaneous to each slot is read. The slot cost is then:
+        - 0 if it is a preferred slot
+        - (value - maximum) / (average of non-preferred values - maximum) otherwise
+
+    :param tutors: the considered tutors
+    :param slots_of_week: { week => availability slots of the week }
+    :param preferences_of_tutor_week: { (tutor, week) => preferences of the tutor for this week }
+    :return: a TutorsPreferencesCosts
+    """
+    result = TutorsPreferencesCosts(tutors, [sl for week_slots in slots_of_week.values() for sl in week_slots])
+    nb_tutors = len(result.tutors)
+    if not nb_tutors:
+        return result
+
+    for week, week_slots in slots_of_week.items():
+        if not week_slots:
+            continue
+        columns = np.array([result.slot_index[sl] for sl in week_slots])
+        week_days = sorted(set(sl.day.day for sl in week_slots))
+        day_index = {day: d for d, day in enumerate(week_days)}
+        first_minute = min(sl.start_time for sl in week_slots)
+        last_minute = max(sl.end_time for sl in week_slots)
+
+        # Preferences as arrays
+        tutors_rows, days, starts, ends, values = [], [], [], [], []
+        for tutor in result.tutors:
+            for preference in preferences_of_tutor_week.get((tutor, week), ()):
+                tutors_rows.append(result.tutor_index[tutor])
+                days.append(day_index.get(preference.day, -1))
+                starts.append(preference.start_time)
+                ends.append(preference.start_time + preference.duration)
+                values.append(preference.value)
+        tutors_rows, days, starts, ends, values = (np.array(a, dtype=int)
+                                                   for a in (tutors_rows, days, starts, ends, values))
+
+        # Maximum and average value of the non-preferred (neither unavailable nor maximum) preferences
+        has_preferences = np.bincount(tutors_rows, minlength=nb_tutors) > 0
+        maximum = np.full(nb_tutors, -1)
+        np.maximum.at(maximum, tutors_rows, values)
+        non_preferred = (values >= 1) & (values <= maximum[tutors_rows] - 1)
+        durations = ends - starts
+        non_preferred_duration = np.maximum(1, np.bincount(tutors_rows[non_preferred],
+                                                           weights=durations[non_preferred],
+                                                           minlength=nb_tutors))
+        average_value = np.bincount(tutors_rows[non_preferred],
+                                    weights=(durations * values)[non_preferred],
+                                    minlength=nb_tutors) / non_preferred_duration
+
+        # Minimal preference value on each minute of each day
+        timeline = np.full((nb_tutors, len(week_days), last_minute - first_minute), NO_PREFERENCE, dtype=np.int8)
+        for t, d, start, end, value in zip(tutors_rows, days, starts, ends, values):
+            if d < 0:
+                continue
+            start, end = max(start, first_minute) - first_minute, min(end, last_minute) - first_minute
+            if start < end:
+                np.minimum(timeline[t, d, start:end], value, out=timeline[t, d, start:end])
+
+        # Minimal preference value on each slot, for slots sharing the same times at once
+        slots_days = np.array([day_index[sl.day.day] for sl in week_slots])
+        slots_times = {}
+        for k, sl in enumerate(week_slots):
+            slots_times.setdefault((sl.start_time, sl.end_time), []).append(k)
+        week_min_value = np.empty((nb_tutors, len(week_slots)), dtype=np.int8)
+        for (start, end), ks in slots_times.items():
+            minimum_on_days = timeline[:, :, start - first_minute:end - first_minute].min(axis=2)
+            week_min_value[:, ks] = minimum_on_days[:, slots_days[ks]]
+        result.min_value[:, columns] = week_min_value
+
+        # Availabilities and costs
+        tutor_maximum = maximum[:, None]
+        tutor_average = average_value[:, None]
+        no_preference = week_min_value == NO_PREFERENCE
+        unavailable = week_min_value == 0
+        home_only = week_min_value == 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            graded_cost = np.where(week_min_value == tutor_maximum, 0.,
+                                   (week_min_value - tutor_maximum) / (tutor_average - tutor_maximum))
+        avail = np.where(unavailable, 0, 1)
+        avail_at_school = np.where(unavailable | home_only, 0, 1)
+        cost = np.where(no_preference | unavailable, 0., np.where(home_only, 1., graded_cost))
+
+        # Tutors without preference are available, tutors with a null maximum are not
+        no_information = ~has_preferences[:, None]
+        never_available = (has_preferences & (maximum == 0))[:, None]
+        avail = np.where(no_information, 1, np.where(never_available, 0, avail))
+        avail_at_school = np.where(no_information, 1, np.where(never_available, 0, avail_at_school))
+        cost = np.where(no_information | never_available, 0., cost)
+
+        for t, k in np.argwhere(no_preference & has_preferences[:, None] & (maximum > 0)[:, None]):
+            print(f"availability pbm for {result.tutors[t]} availability_slot {week_slots[k]}")
+
+        result.avail[:, columns] = avail
+        result.avail_at_school[:, columns] = avail_at_school
+        result.cost[:, columns] = cost
+
+    return result
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+import numpy as np
+
+from base.models import RoomPreference
+from base.timing import flopday_to_date, floptime_to_time
+from roomreservation.models import RoomReservation
+
+
+class RoomAvailability(object):
+    """
+    Dense room x slot availability matrix: 1 if the room is available during the slot, 0 otherwise.
+
+    room_availability[room][slot] reads or writes one cell, as the former dict of dicts did,
+    while matrix, room_index and slot_index give a direct access to the underlying array.
+    """
+    def __init__(self, rooms, slots):
+        self.rooms = list(rooms)
+        self.slots = list(slots)
+        self.room_index = {room: i for i, room in enumerate(self.rooms)}
+        self.slot_index = {sl: j for j, sl in enumerate(self.slots)}
+        self.matrix = np.ones((len(self.rooms), len(self.slots)), dtype=np.int8)
+
+    def __getitem__(self, room):
+        return RoomAvailabilityRow(self, self.room_index[room])
+
+    def __contains__(self, room):
+        return room in self.room_index
+
+    def __iter__(self):
+        return iter(self.rooms)
+
+    def __len__(self):
+        return len(self.rooms)
+
+
+class RoomAvailabilityRow(object):
+    __slots__ = ('availability', 'index')
+
+    def __init__(self, availability, index):
+        self.availability = availability
+        self.index = index
+
+    def __getitem__(self, slot):
+        return int(self.availability.matrix[self.index, self.availability.slot_index[slot]])
+
+    def __setitem__(self, slot, value):
+        self.availability.matrix[self.index, self.availability.slot_index[slot]] = value
+
+
+def minutes(time_of_day):
+    return time_of_day.hour * 60 + time_of_day.minute + time_of_day.second / 60
+
+
+def compute_room_availability(rooms, slots):
+    """
+    Computes the availability of the rooms during the slots from two queries:
+    a room is unavailable if it has a null RoomPreference or a RoomReservation overlapping the slot.
+    """
+    availability = RoomAvailability(rooms, slots)
+    if not availability.rooms or not availability.slots:
+        return availability
+    room_index_by_id = {room.id: i for i, room in enumerate(availability.rooms)}
+
+    # Slots indexes, start and end times grouped by day
+    slots_for_day = {}
+    for j, sl in enumerate(availability.slots):
+        slots_for_day.setdefault((sl.day.week, sl.day.day), []).append(j)
+    day_arrays = {}
+    for (week, day), indexes in slots_for_day.items():
+        day_slots = [availability.slots[j] for j in indexes]
+        day_arrays[(week.id, day)] = (np.array(indexes),
+                                      np.array([sl.start_time for sl in day_slots]),
+                                      np.array([sl.start_time + sl.duration for sl in day_slots]))
+
+    for room_id, week_id, day, start_time, duration in \
+            RoomPreference.objects.filter(room__in=availability.rooms,
+                                          week__in=set(week for week, _ in slots_for_day),
+                                          value=0) \
+            .values_list('room_id', 'week_id', 'day', 'start_time', 'duration'):
+        if (week_id, day) not in day_arrays:
+            continue
+        indexes, starts, ends = day_arrays[(week_id, day)]
+        overlapping = (start_time < ends) & (start_time > starts - duration)
+        availability.matrix[room_index_by_id[room_id], indexes[overlapping]] = 0
+
+    # Reservations are compared as times of the day, the same way flop times are converted into them
+    date_arrays = {}
+    for (week, day), indexes in slots_for_day.items():
+        _, starts, ends = day_arrays[(week.id, day)]
+        date_arrays[flopday_to_date(availability.slots[indexes[0]].day)] = \
+            (np.array(indexes),
+             np.array([minutes(floptime_to_time(int(t))) for t in starts]),
+             np.array([minutes(floptime_to_time(int(t))) for t in ends]))
+
+    for room_id, date, start_time, end_time in \
+            RoomReservation.objects.filter(room__in=availability.rooms, date__in=list(date_arrays)) \
+            .values_list('room_id', 'date', 'start_time', 'end_time'):
+        indexes, starts, ends = date_arrays[date]
+        overlapping = (minutes(start_time) < ends) & (minutes(end_time) > starts)
+        availability.matrix[room_index_by_id[room_id], indexes[overlapping]] = 0
+
+    return availability
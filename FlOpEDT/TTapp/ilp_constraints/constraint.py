@@ -53,59 +53,51 @@ def convert_to_list(dimension):
         return [dimension]
 
 
+# dimensions of the constraints, with their display name
+dimensions_display = {
+    "instructors": "professeur",
+    "slots": "slot",
+    "courses": "cours",
+    "weeks": "semaine",
+    "rooms": "salle",
+    "groups": "groupe",
+    "days": "jour",
+    "departments": "department",
+    "modules": "module",
+    "apm": "demi-journée",
+}
+
+
 class Constraint:
     def __init__(self, constraint_type=ConstraintType.UNDEFINED, instructors=[], slots=[], courses=[], weeks=[], rooms=[],
                  groups=[], days=[], departments=[], modules=[], apm=[], name=None):
-
-        instructors, slots, courses, weeks, rooms, groups, days, departments, modules, apm \
-            = self.handle_dimensions(instructors, slots, courses, weeks, rooms, groups, days,
-                                     departments, modules, apm)
         self.name = name
 
         # self.id added with add_constraint
         self.constraint_type = constraint_type
-        self.dimensions = {
-            "instructors": {
-                "display": "professeur",
-                "value": instructors
-            },
-            "slots": {
-                "display": "slot",
-                "value": slots
-            },
-            "courses": {
-                "display": "cours",
-                "value": courses
-            },
-            "weeks": {
-                "display": "semaine",
-                "value": weeks
-            },
-            "rooms": {
-                "display": "salle",
-                "value": rooms
-            },
-            "groups": {
-                "display": "groupe",
-                "value": groups,
-            },
-            "days": {
-                "display": "jour",
-                "value": days,
-            },
-            "departments": {
-                "display": "department",
-                "value": departments,
-            },
-            "modules": {
-                "display": "module",
-                "value": modules,
-            },
-            "apm": {
-                "display": "demi-journée",
-                "value": apm,
-            }
+        # the dimensions are made readable only when they are needed (cf. dimensions),
+        # e.g. for the analysis of an infeasible model
+        self.raw_dimensions = {
+            "instructors": instructors,
+            "slots": slots,
+            "courses": courses,
+            "weeks": weeks,
+            "rooms": rooms,
+            "groups": groups,
+            "days": days,
+            "departments": departments,
+            "modules": modules,
+            "apm": apm,
         }
+        self._dimensions = None
+
+    @property
+    def dimensions(self):
+        if self._dimensions is None:
+            values = self.handle_dimensions(**self.raw_dimensions)
+            self._dimensions = {dimension: {"display": display, "value": value}
+                                for (dimension, display), value in zip(dimensions_display.items(), values)}
+        return self._dimensions
 
     def handle_dimensions(self, instructors, slots, courses, weeks, rooms, groups, days, departments,
                           modules, apm):
@@ -23,6 +23,9 @@
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
 
+from array import array
+
+from TTapp.ilp_constraints.constraint import Constraint, convert_to_list, dimensions_display
 from TTapp.ilp_constraints.print_infaisibility import print_all
 
 def inc(occurs_types, constraint_type):
@@ -48,23 +51,87 @@ def inc_with_type(occurs_dimension, dimension, constraint_type):
 
 
 class ConstraintManager:
+    """
+    Keeps the description of the constraints of a model in compact columns: a code for the type
+    and the class of each constraint, and (dimension, object code) entries, the codes indexing
+    the objects list. Constraint objects are only rebuilt for the analysis of an infeasible model.
+    """
     def __init__(self, threshold_type=60, threshold_attr=80):
         self.threshold_type = threshold_type  # % des types sont pris en compte
         self.threshold_attr = threshold_attr  # % des attributs sont pris en compte
-        self.constraints = []
+        self.objects = []
+        self.object_codes = {}
+        self.types = array('l')
+        self.classes = array('l')
+        self.names = {}
+        # entries of the constraint i are in [dimensions_offsets[i], dimensions_offsets[i+1])
+        self.dimensions_offsets = array('l', [0])
+        self.dimensions_kinds = array('b')
+        self.dimensions_objects = array('l')
         self.infeasible_constraints = []
         self.occurs = None
         self.nb_constraints = 0
-
-    def add_constraint(self, constraint):
-        self.constraints.append(constraint)
+        # ids of the constraints and (costs, key, cost) terms added by each FlopConstraint,
+        # identified by its flop_constraint_key
+        self.constraints_of_flop_constraint = {}
+        self.costs_of_flop_constraint = {}
+
+    def code(self, obj):
+        try:
+            return self.object_codes[obj]
+        except KeyError:
+            self.object_codes[obj] = len(self.objects)
+        except TypeError:
+            # unhashable objects are not shared
+            pass
+        self.objects.append(obj)
+        return len(self.objects) - 1
+
+    def add_constraint(self, constraint, flop_constraint=None):
+        self.types.append(self.code(constraint.constraint_type))
+        self.classes.append(self.code(constraint.__class__))
+        if constraint.name is not None:
+            self.names[constraint.id] = constraint.name
+        for kind, dimension in enumerate(dimensions_display):
+            for obj in convert_to_list(constraint.raw_dimensions[dimension]):
+                self.dimensions_kinds.append(kind)
+                self.dimensions_objects.append(self.code(obj))
+        self.dimensions_offsets.append(len(self.dimensions_objects))
         self.nb_constraints += 1
+        if flop_constraint is not None:
+            self.constraints_of_flop_constraint.setdefault(flop_constraint, []).append(constraint.id)
+
+    def add_cost(self, flop_constraint, costs, key, cost):
+        self.costs_of_flop_constraint.setdefault(flop_constraint, []).append((costs, key, cost))
+
+    def pop_flop_constraint(self, flop_constraint):
+        """
+        Forgets the contribution of flop_constraint, and returns its constraints ids and cost terms
+        """
+        return self.constraints_of_flop_constraint.pop(flop_constraint, []), \
+            self.costs_of_flop_constraint.pop(flop_constraint, [])
 
     def get_nb_constraints(self):
         return self.nb_constraints
 
+    def get_constraint(self, id_constraint):
+        """
+        Rebuilds the Constraint of id id_constraint
+        """
+        raw_dimensions = {dimension: [] for dimension in dimensions_display}
+        dimensions = list(dimensions_display)
+        start, end = self.dimensions_offsets[id_constraint], self.dimensions_offsets[id_constraint + 1]
+        for kind, obj in zip(self.dimensions_kinds[start:end], self.dimensions_objects[start:end]):
+            raw_dimensions[dimensions[kind]].append(self.objects[obj])
+        constraint_class = self.objects[self.classes[id_constraint]]
+        constraint = constraint_class.__new__(constraint_class)
+        Constraint.__init__(constraint, constraint_type=self.objects[self.types[id_constraint]],
+                            name=self.names.get(id_constraint), **raw_dimensions)
+        constraint.id = id_constraint
+        return constraint
+
     def get_constraints(self, id_constraints):
-        return [self.constraints[id_constraint] for id_constraint in id_constraints]
+        return [self.get_constraint(id_constraint) for id_constraint in id_constraints]
 
     def parse_iis(self, iis_filename):
         f = open(iis_filename, "r")
@@ -0,0 +1,137 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from base.models import Department, Week, TimeGeneralSettings, UserPreference, ScheduledCourse
+from base.partition import Partition
+from base.timing import Day, TimeInterval, flopdate_to_datetime
+
+from people.models import Tutor
+
+from TTapp.FlopModel import FlopModel
+from TTapp.WeeksDatabase import WeeksDatabase
+
+
+class BenchmarkModel(FlopModel):
+    def log_files_prefix(self):
+        return f"Benchmark_{self.department.abbrev}"
+
+
+def add_tt_vars(model, wdb, lazy_names):
+    """
+    Creates the TT and TTinstructors variables as TTModel.TT_vars_init does
+    """
+    for sl in wdb.courses_slots:
+        for c in wdb.compatible_courses[sl]:
+            if lazy_names:
+                model.add_var("TT(%s,%s)", sl, c)
+            else:
+                model.add_var("TT(%s,%s)" % (sl, c))
+            for i in wdb.possible_tutors[c]:
+                if lazy_names:
+                    model.add_var("TTinstr(%s,%s,%s)", sl, c, i)
+                else:
+                    model.add_var("TTinstr(%s,%s,%s)" % (sl, c, i))
+
+
+def build_tutor_partitions(week, time_settings, preferences, scheduled_courses):
+    """
+    Builds the partition of each tutor as the pre-analysis does:
+    day time, lunch breaks, user preferences and courses of the other departments
+    """
+    start_week = flopdate_to_datetime(Day(time_settings.days[0], week), time_settings.day_start_time)
+    end_week = flopdate_to_datetime(Day(time_settings.days[-1], week), time_settings.day_finish_time)
+    partitions = {}
+    for tutor in preferences:
+        partition = Partition("None", start_week, end_week)
+        partition.add_lunch_break(time_settings.lunch_break_start_time, time_settings.lunch_break_finish_time)
+        partition.add_night_time(time_settings.day_start_time, time_settings.day_finish_time)
+        for up in preferences[tutor]:
+            up_day = Day(up.day, week)
+            partition.add_slot(TimeInterval(flopdate_to_datetime(up_day, up.start_time),
+                                            flopdate_to_datetime(up_day, up.end_time)),
+                               "user_preference",
+                               {"value": up.value, "available": True, "tutor": tutor})
+        for sc in scheduled_courses[tutor]:
+            sc_day = Day(sc.day, week)
+            partition.add_slot(TimeInterval(flopdate_to_datetime(sc_day, sc.start_time),
+                                            flopdate_to_datetime(sc_day, sc.end_time)),
+                               "scheduled_course",
+                               {"scheduled_course": sc, "forbidden": True})
+        partitions[tutor] = partition
+    return partitions
+
+
+class Command(BaseCommand):
+    help = 'Measure the time spent in some steps of the model building'
+
+    def add_arguments(self, parser):
+        parser.add_argument('case', choices=['variables', 'partition'])
+        parser.add_argument('--department', type=str, help='department abbreviation')
+        parser.add_argument('--weeks', type=str, nargs='+', default=[], help='weeks, as nb-year')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def best_time(self, repeat, function, *args):
+        best = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            function(*args)
+            total = time.perf_counter() - start_time
+            if best is None or total < best:
+                best = total
+        return best
+
+    def weeks(self, options):
+        weeks = []
+        for w in options['weeks']:
+            nb, year = w.split('-')
+            try:
+                weeks.append(Week.objects.get(nb=int(nb), year=int(year)))
+            except Week.DoesNotExist:
+                raise CommandError(f"Unknown week {w}")
+        return weeks
+
+    def benchmark_variables(self, options):
+        if options['department'] is None:
+            raise CommandError("The variables benchmark needs a department")
+        department = Department.objects.get(abbrev=options['department'])
+        wdb = WeeksDatabase(department, self.weeks(options), None)
+        for lazy_names in (False, True):
+            models = []
+
+            def build():
+                model = BenchmarkModel(department.abbrev, wdb.weeks)
+                add_tt_vars(model, wdb, lazy_names)
+                models.append(model)
+            total = self.best_time(options['repeat'], build)
+            self.stdout.write(f"{'lazy' if lazy_names else 'eager'} names: {models[-1].var_nb} variables "
+                              f"in {total:.5f}s")
+
+    def benchmark_partition(self, options):
+        if options['department'] is None or len(options['weeks']) != 1:
+            raise CommandError("The partition benchmark needs a department and a week")
+        department = Department.objects.get(abbrev=options['department'])
+        week = self.weeks(options)[0]
+        time_settings = TimeGeneralSettings.objects.get(department=department)
+        preferences = {}
+        scheduled_courses = {}
+        for tutor in Tutor.objects.filter(departments=department):
+            preferences[tutor] = list(UserPreference.objects.filter(user=tutor, week=week, value__gte=1))
+            if not preferences[tutor]:
+                preferences[tutor] = list(UserPreference.objects.filter(user=tutor, week=None, value__gte=1))
+            scheduled_courses[tutor] = list(ScheduledCourse.objects
+                                            .filter(Q(tutor=tutor) | Q(course__supp_tutor=tutor),
+                                                    course__week=week, work_copy=0)
+                                            .select_related('course__type'))
+        partitions = []
+
+        def build():
+            partitions.append(build_tutor_partitions(week, time_settings, preferences, scheduled_courses))
+        total = self.best_time(options['repeat'], build)
+        self.stdout.write(f"{len(preferences)} tutors "
+                          f"({sum(p.nb_intervals for p in partitions[-1].values())} intervals) "
+                          f"in {total:.5f}s")
+
+    def handle(self, *args, **options):
+        getattr(self, f"benchmark_{options['case']}")(options)
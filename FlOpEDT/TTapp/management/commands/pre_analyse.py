@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from base.models import Department, Week
+
+from TTapp.GlobalPreAnalysis.centralized_preanalysis import pre_analyse_weeks
+
+
+class Command(BaseCommand):
+    help = 'Run the pre-analysis of the constraints of a department for some weeks, and print the KO statuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('department', type=str, help='department abbreviation')
+        parser.add_argument('--weeks', type=str, nargs='+', required=True, help='weeks, as nb-year')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='number of processes running the pre-analyses')
+
+    def handle(self, *args, **options):
+        try:
+            department = Department.objects.get(abbrev=options['department'])
+        except Department.DoesNotExist:
+            raise CommandError(f"Unknown department {options['department']}")
+        weeks = []
+        for w in options['weeks']:
+            nb, year = w.split('-')
+            try:
+                weeks.append(Week.objects.get(nb=int(nb), year=int(year)))
+            except Week.DoesNotExist:
+                raise CommandError(f"Unknown week {w}")
+
+        result = pre_analyse_weeks(department, weeks, options['processes'])
+        for week in weeks:
+            if result[week]:
+                self.stdout.write(self.style.ERROR(f"Week {week}: KO"))
+                self.stdout.write(json.dumps(result[week], cls=DjangoJSONEncoder, indent=2))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Week {week}: OK"))
@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+"""
+Matrix backend of FlopModel.
+
+Constraints are stored as sparse COO triplets (row, variable index, coefficient) in numpy arrays,
+which are streamed to the solver as a MPS file, without building PuLP objects nor writing and
+parsing a LP file.
+"""
+
+import os
+import subprocess
+from numbers import Number
+
+import numpy as np
+from pulp import LpStatusOptimal, LpStatusNotSolved, LpStatusInfeasible, LpStatusUnbounded
+
+EQ, LE, GE = 0, 1, 2
+mps_senses = {EQ: 'E', LE: 'L', GE: 'G'}
+relations = {'==': EQ, '<=': LE, '>=': GE}
+
+# lines ending a gurobi optimization in its log; the solution of a stopped one is kept, as with cbc
+gurobi_log_statuses = (('Optimal solution found', LpStatusOptimal),
+                       # also "Model is infeasible or unbounded"
+                       ('Model is infeasible', LpStatusInfeasible),
+                       ('Model is unbounded', LpStatusUnbounded),
+                       ('Time limit reached', LpStatusNotSolved),
+                       ('Solution limit reached', LpStatusNotSolved),
+                       ('Solve interrupted', LpStatusNotSolved))
+
+
+class MatrixVar(object):
+    """
+    Binary variable of a MatrixProblem; arithmetic operations build MatrixExpr
+    """
+    __slots__ = ('problem', 'index', 'name')
+
+    def __init__(self, problem, index, name):
+        self.problem = problem
+        self.index = index
+        self.name = name
+
+    def getName(self):
+        return self.name
+
+    def value(self):
+        if self.index >= len(self.problem.values):
+            return None
+        value = self.problem.values[self.index]
+        if np.isnan(value):
+            return None
+        return float(value)
+
+    def setInitialValue(self, value):
+        self.problem.set_value(self.index, value)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return self.name
+
+    def __lt__(self, other):
+        return self.index < other.index
+
+    def __add__(self, other):
+        return MatrixExpr(self) + other
+
+    def __radd__(self, other):
+        return MatrixExpr(self) + other
+
+    def __sub__(self, other):
+        return MatrixExpr(self) - other
+
+    def __rsub__(self, other):
+        return other - MatrixExpr(self)
+
+    def __mul__(self, other):
+        return MatrixExpr({self: other})
+
+    def __rmul__(self, other):
+        return MatrixExpr({self: other})
+
+    def __truediv__(self, other):
+        return MatrixExpr({self: 1 / other})
+
+    def __neg__(self):
+        return MatrixExpr({self: -1})
+
+    def __pos__(self):
+        return MatrixExpr(self)
+
+
+class MatrixExpr(dict):
+    """
+    Linear expression { MatrixVar => coefficient } + constant
+    """
+    __slots__ = ('constant',)
+
+    def __init__(self, expr=None):
+        self.constant = 0
+        if expr is None:
+            super(MatrixExpr, self).__init__()
+        elif isinstance(expr, MatrixVar):
+            super(MatrixExpr, self).__init__({expr: 1})
+        elif isinstance(expr, MatrixExpr):
+            super(MatrixExpr, self).__init__(expr)
+            self.constant = expr.constant
+        elif isinstance(expr, Number):
+            super(MatrixExpr, self).__init__()
+            self.constant = expr
+        else:
+            super(MatrixExpr, self).__init__(expr)
+
+    def copy(self):
+        return MatrixExpr(self)
+
+    def add(self, other, sign=1):
+        if isinstance(other, MatrixVar):
+            self[other] = self.get(other, 0) + sign
+        elif isinstance(other, MatrixExpr):
+            for var, coeff in other.items():
+                self[var] = self.get(var, 0) + sign * coeff
+            self.constant += sign * other.constant
+        elif isinstance(other, Number):
+            self.constant += sign * other
+        else:
+            return NotImplemented
+        return self
+
+    def __iadd__(self, other):
+        return self.add(other)
+
+    def __isub__(self, other):
+        return self.add(other, -1)
+
+    def __add__(self, other):
+        return self.copy().add(other)
+
+    def __radd__(self, other):
+        return self.copy().add(other)
+
+    def __sub__(self, other):
+        return self.copy().add(other, -1)
+
+    def __rsub__(self, other):
+        return (-self).add(other)
+
+    def __mul__(self, other):
+        if not isinstance(other, Number):
+            return NotImplemented
+        result = MatrixExpr({var: other * coeff for var, coeff in self.items()})
+        result.constant = other * self.constant
+        return result
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self * (1 / other)
+
+    def __neg__(self):
+        return self * -1
+
+    def __pos__(self):
+        return self.copy()
+
+    def value(self):
+        result = self.constant
+        for var, coeff in self.items():
+            value = var.value()
+            if value is None:
+                return None
+            result += coeff * value
+        return result
+
+    @staticmethod
+    def sum(terms):
+        result = MatrixExpr()
+        for term in terms:
+            result.add(term)
+        return result
+
+
+class MatrixRow(object):
+    """
+    Coefficients of a constraint: row[var] reads or writes the coefficient of var
+    """
+    __slots__ = ('problem', 'row')
+
+    def __init__(self, problem, row):
+        self.problem = problem
+        self.row = row
+
+    def __getitem__(self, var):
+        entry = self.problem.row_index(self.row).get(var.index)
+        if entry is None:
+            return 0.
+        return float(self.problem.coeffs[entry])
+
+    def __setitem__(self, var, value):
+        index = self.problem.row_index(self.row)
+        entry = index.get(var.index)
+        if entry is None:
+            index[var.index] = self.problem.nb_entries
+            self.problem.append_entries(self.row, [var.index], [value])
+        else:
+            self.problem.coeffs[entry] = value
+
+
+class MatrixProblem(object):
+    """
+    Minimization problem over binary variables, with COO constraint matrix
+    """
+    def __init__(self, name, initial_capacity=1 << 16):
+        self.name = name
+        self.vars = []
+        self.values = np.full(0, np.nan)
+        # constraint matrix, as triplets
+        self.nb_entries = 0
+        self.rows = np.empty(initial_capacity, dtype=np.int32)
+        self.cols = np.empty(initial_capacity, dtype=np.int32)
+        self.coeffs = np.empty(initial_capacity)
+        # constraints
+        self.nb_rows = 0
+        self.senses = np.empty(initial_capacity // 8, dtype=np.int8)
+        self.rhs = np.empty(initial_capacity // 8)
+        self.active = np.empty(initial_capacity // 8, dtype=bool)
+        self.row_names = []
+        self.row_of_name = {}
+        # {row => {variable index => entry}} of the rows accessed through MatrixRow, cf. row_index
+        self.row_indexes = {}
+        self.sorted_entries = np.empty(0, dtype=np.int64)
+        self.sorted_rows = np.empty(0, dtype=np.int32)
+        self.objective = MatrixExpr()
+        self.status = LpStatusNotSolved
+
+    @staticmethod
+    def grown(array, needed):
+        if needed <= len(array):
+            return array
+        result = np.empty(max(needed, 2 * len(array)), dtype=array.dtype)
+        result[:len(array)] = array
+        return result
+
+    def add_var(self, name):
+        var = MatrixVar(self, len(self.vars), name)
+        self.vars.append(var)
+        return var
+
+    def append_entries(self, row, cols, coeffs):
+        n = len(cols)
+        end = self.nb_entries + n
+        self.rows = self.grown(self.rows, end)
+        self.cols = self.grown(self.cols, end)
+        self.coeffs = self.grown(self.coeffs, end)
+        self.rows[self.nb_entries:end] = row
+        self.cols[self.nb_entries:end] = cols
+        self.coeffs[self.nb_entries:end] = coeffs
+        self.nb_entries = end
+
+    def add_constraint(self, expr, relation, value, name):
+        if not isinstance(expr, MatrixExpr):
+            expr = MatrixExpr(expr)
+        row = self.nb_rows
+        self.nb_rows += 1
+        self.senses = self.grown(self.senses, self.nb_rows)
+        self.rhs = self.grown(self.rhs, self.nb_rows)
+        self.active = self.grown(self.active, self.nb_rows)
+        self.senses[row] = relations[relation]
+        self.rhs[row] = value - expr.constant
+        self.active[row] = True
+        self.row_names.append(name)
+        self.row_of_name[name] = row
+        n = len(expr)
+        if n:
+            self.append_entries(row,
+                                np.fromiter((var.index for var in expr.keys()), dtype=np.int32, count=n),
+                                np.fromiter(expr.values(), dtype=float, count=n))
+
+    def row_index(self, row):
+        """
+        {variable index => entry} of row, built on first access from the entries sorted by row
+        (sorted again once enough entries have been appended since the last sort)
+        """
+        index = self.row_indexes.get(row)
+        if index is None:
+            nb_sorted = len(self.sorted_entries)
+            if self.nb_entries - nb_sorted > nb_sorted // 8:
+                self.sorted_entries = np.argsort(self.rows[:self.nb_entries], kind='stable')
+                self.sorted_rows = self.rows[self.sorted_entries]
+                nb_sorted = self.nb_entries
+            start, end = np.searchsorted(self.sorted_rows, (row, row + 1))
+            entries = np.concatenate((self.sorted_entries[start:end],
+                                      nb_sorted + np.flatnonzero(self.rows[nb_sorted:self.nb_entries] == row)))
+            index = self.row_indexes[row] = dict(zip(self.cols[entries].tolist(), entries.tolist()))
+        return index
+
+    def get_constraint(self, name):
+        return MatrixRow(self, self.row_of_name[name])
+
+    def get_all_constraints(self):
+        return {name: MatrixRow(self, row) for row, name in enumerate(self.row_names) if self.active[row]}
+
+    def remove_constraint(self, name):
+        self.active[self.row_of_name.pop(name)] = False
+
+    def set_objective(self, expr):
+        self.objective = MatrixExpr(expr)
+
+    def write_mps(self, filename):
+        """
+        Writes the problem in (fixed) MPS format; rows and columns are named as PuLP does, so that
+        the IIS analysis of the ConstraintManager still applies
+        """
+        nb_vars = len(self.vars)
+        active_rows = np.flatnonzero(self.active[:self.nb_rows])
+        entries = np.flatnonzero(self.active[self.rows[:self.nb_entries]] & (self.coeffs[:self.nb_entries] != 0))
+        rows = self.rows[entries]
+        cols = self.cols[entries]
+        coeffs = self.coeffs[entries]
+
+        # objective as row -1, and a null objective coefficient for each variable, so that each one is declared
+        objective = np.zeros(nb_vars)
+        for var, coeff in self.objective.items():
+            objective[var.index] += coeff
+        rows = np.concatenate((rows, np.full(nb_vars, -1, dtype=np.int32)))
+        cols = np.concatenate((cols, np.arange(nb_vars, dtype=np.int32)))
+        coeffs = np.concatenate((coeffs, objective))
+        order = np.lexsort((rows, cols))
+
+        row_names = self.row_names + ['OBJ']
+        var_names = [var.name for var in self.vars]
+        with open(filename, 'w') as f:
+            f.write(f"*SENSE:Minimize\nNAME          {os.path.basename(self.name)}\nROWS\n N  OBJ\n")
+            f.writelines(f" {mps_senses[sense]}  {row_names[row]}\n"
+                         for row, sense in zip(active_rows.tolist(), self.senses[active_rows].tolist()))
+            f.write("COLUMNS\n    MARK      'MARKER'                 'INTORG'\n")
+            f.writelines(f"    {var_names[col]:<9} {row_names[row]:<9} {coeff:.12e}\n"
+                         for row, col, coeff in zip(rows[order].tolist(), cols[order].tolist(),
+                                                    coeffs[order].tolist()))
+            f.write("    MARK      'MARKER'                 'INTEND'\nRHS\n")
+            f.writelines(f"    RHS       {row_names[row]:<9} {rhs:.12e}\n"
+                         for row, rhs in zip(active_rows.tolist(), self.rhs[active_rows].tolist()))
+            f.write("BOUNDS\n")
+            f.writelines(f" BV BND       {name}\n" for name in var_names)
+            f.write("ENDATA\n")
+
+    def set_values(self, values_of_names):
+        self.values = np.full(len(self.vars), np.nan)
+        for name, value in values_of_names:
+            self.values[int(name) - 1] = value
+
+    def set_value(self, index, value):
+        if len(self.values) < len(self.vars):
+            values = np.full(len(self.vars), np.nan)
+            values[:len(self.values)] = self.values
+            self.values = values
+        self.values[index] = value
+
+    def known_values(self):
+        """
+        (name, value) of the variables having a value
+        """
+        return [(self.vars[index].name, value)
+                for index, value in zip(np.flatnonzero(~np.isnan(self.values)).tolist(),
+                                        self.values[~np.isnan(self.values)].tolist())]
+
+    def write_gurobi_start(self, filename):
+        with open(filename, 'w') as f:
+            f.writelines(f"{name} {value:g}\n" for name, value in self.known_values())
+
+    def write_cbc_start(self, filename):
+        # same format as a cbc solution file, as PuLP writes it
+        with open(filename, 'w') as f:
+            f.write("Stopped on time - objective value 0\n")
+            f.writelines(f"{i:>7} {name} {value:>15g} {0:>23}\n"
+                         for i, (name, value) in enumerate(self.known_values()))
+
+    def has_solution(self):
+        return bool(len(self.values)) and not np.isnan(self.values).all()
+
+    @staticmethod
+    def gurobi_status(log_filename, log_start, return_code):
+        """
+        Status of the optimization, from the lines written from log_start to the gurobi log
+        """
+        if return_code != 0 or not os.path.exists(log_filename):
+            return LpStatusNotSolved
+        with open(log_filename, 'rb') as f:
+            f.seek(log_start)
+            lines = f.read().decode(errors='replace').splitlines()
+        for line in reversed(lines):
+            for start, status in gurobi_log_statuses:
+                if line.startswith(start):
+                    return status
+        return LpStatusNotSolved
+
+    def solve_with_gurobi(self, path, options, mps_filename, solution_filename, start_filename=None):
+        """
+        Solves the problem with the gurobi_cl command, options being a list of (Parameter, value).
+        If start_filename is given, the known values of the variables are used as a MIP start.
+        The status is read from the gurobi log (LogFile option, next to the solution file if not given).
+        """
+        self.write_mps(mps_filename)
+        if os.path.exists(solution_filename):
+            os.remove(solution_filename)
+        options = list(options)
+        log_filename = dict(options).get('LogFile')
+        if log_filename is None:
+            log_filename = f"{solution_filename}.log"
+            options.append(('LogFile', log_filename))
+        # gurobi appends to its log
+        log_start = os.path.getsize(log_filename) if os.path.exists(log_filename) else 0
+        if start_filename is not None:
+            self.write_gurobi_start(start_filename)
+            options.append(("InputFile", start_filename))
+        return_code = subprocess.call([path, f"ResultFile={solution_filename}"]
+                                      + [f"{key}={value}" for key, value in options]
+                                      + [mps_filename])
+        self.status = self.gurobi_status(log_filename, log_start, return_code)
+        if not os.path.exists(solution_filename):
+            self.values = np.full(len(self.vars), np.nan)
+            if self.status == LpStatusOptimal:
+                self.status = LpStatusNotSolved
+            return self.status
+        with open(solution_filename) as f:
+            self.set_values((name, float(value)) for name, value in
+                            (line.split() for line in f if line.strip() and not line.startswith('#')))
+        return self.status
+
+    def solve_with_cbc(self, path, mps_filename, solution_filename, time_limit=None, presolve=None,
+                       threads=None, start_filename=None):
+        """
+        Solves the problem with the cbc command.
+        If start_filename is given, the known values of the variables are used as a MIP start.
+        """
+        self.write_mps(mps_filename)
+        if os.path.exists(solution_filename):
+            os.remove(solution_filename)
+        command = [path, mps_filename]
+        if start_filename is not None:
+            self.write_cbc_start(start_filename)
+            command += ["mips", start_filename]
+        if time_limit is not None:
+            command += ["sec", str(time_limit)]
+        if presolve is not None:
+            command += ["presolve", "on" if presolve else "off"]
+        if threads is not None:
+            command += ["threads", str(threads)]
+        command += ["branch", "printingOptions", "all", "solution", solution_filename]
+        subprocess.call(command)
+        if not os.path.exists(solution_filename):
+            self.values = np.full(len(self.vars), np.nan)
+            self.status = LpStatusNotSolved
+            return self.status
+        with open(solution_filename) as f:
+            status_line = f.readline()
+            # rows are printed before columns
+            for _ in range(int(self.active[:self.nb_rows].sum())):
+                f.readline()
+            values = []
+            for line in f:
+                tokens = line.split()
+                if tokens and tokens[0] == '**':
+                    tokens = tokens[1:]
+                if len(tokens) >= 3:
+                    values.append((tokens[1], float(tokens[2])))
+        # "Stopped on time", "Stopped on iterations"... keep the found solution, as PuLP does
+        if status_line.startswith('Optimal'):
+            self.status = LpStatusOptimal
+        elif status_line.startswith('Infeasible') or status_line.startswith('Integer infeasible'):
+            self.status = LpStatusInfeasible
+        elif status_line.startswith('Unbounded'):
+            self.status = LpStatusUnbounded
+        else:
+            self.status = LpStatusNotSolved
+        self.set_values(values)
+        return self.status
@@ -23,10 +23,13 @@
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
 
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
 from base.models import UserPreference, CoursePreference
 
 from base.models import TimeGeneralSettings
-from base.timing import Time, days_index, Day
+from base.timing import Time, days_index, days_list, Day
 from base.models import ScheduledCourse
 
 slot_pause = 30
@@ -37,22 +40,24 @@ basic_slot_duration = 90
 
 
 class Slot:
+    """
+    Slots are compact (no instance dict), with precomputed duration and apm. Their id is their
+    dense index in the SlotIndex they belong to (None until indexed).
+    Slots hash and compare by identity.
+    """
+    __slots__ = ('day', 'start_time', 'end_time', 'duration', '_apm', 'id')
+
     def __init__(self, day, start_time, end_time):
         self.day = day
         self.start_time = start_time
         self.end_time = end_time
-
-    @property
-    def duration(self):
-        return self.end_time - self.start_time
+        self.duration = end_time - start_time
+        self._apm = Time.PM if start_time >= midday else Time.AM
+        self.id = None
 
     @property
     def apm(self):
-        pm_start = midday
-        if self.start_time >= pm_start:
-            return Time.PM
-        else:
-            return Time.AM
+        return self._apm
 
     def __str__(self):
         return f"{self.day} de {self.start_time//60}h{self.start_time%60 if self.start_time%60!=0 else ''} " \
@@ -115,36 +120,31 @@ class Slot:
 
 
 class CourseSlot(Slot):
-    def __init__(self, day, start_time, course_type=None):
+    """
+    pm_start is the lunch break finish time of the department of course_type; if it is not
+    given, it is fetched on the first use of apm
+    """
+    __slots__ = ('course_type',)
+
+    def __init__(self, day, start_time, course_type=None, pm_start=None):
         if course_type is not None:
             duration = course_type.duration
         else:
             duration = basic_slot_duration
         Slot.__init__(self, day, start_time, start_time+duration)
         self.course_type = course_type
+        if course_type is not None:
+            self._apm = None if pm_start is None else (Time.PM if start_time >= pm_start else Time.AM)
 
     def same_through_weeks(self, other):
         return self.day.day == other.day.day and self.start_time == other.start_time and self.course_type == other.course_type
 
-
-    @property
-    def duration(self):
-        if self.course_type is not None:
-            return self.course_type.duration
-        else:
-            return basic_slot_duration
-
-
     @property
     def apm(self):
-        if self.course_type is not None:
+        if self._apm is None:
             pm_start = TimeGeneralSettings.objects.get(department=self.course_type.department).lunch_break_finish_time
-        else:
-            pm_start = midday
-        if self.start_time >= pm_start:
-            return Time.PM
-        else:
-            return Time.AM
+            self._apm = Time.PM if self.start_time >= pm_start else Time.AM
+        return self._apm
 
     def __str__(self):
         hours = self.start_time // 60
@@ -155,44 +155,247 @@ class CourseSlot(Slot):
 
 
 
-def slots_filter(slot_set, day=None, apm=None, course_type=None, start_time=None, week_day=None,
-                 simultaneous_to=None, week=None, is_after=None, starts_after=None, starts_before=None,
-                 ends_before=None, ends_after=None, day_in=None, same=None, week_in=None):
-    slots = slot_set
+class SlotIndex(frozenset):
+    """
+    Immutable set of slots with precomputed lookups.
+
+    It is built once (see WeeksDatabase.slots_init) and lets slots_filter answer
+    queries without scanning the whole slot set for each criterion:
+    - exact lookups by week, day, week day, course_type, apm and start_time;
+    - a per-day interval index (slots sorted by start_time) for simultaneous_to,
+      is_after and the starts_/ends_ range queries.
+    It also numbers its slots: sl.id is the index of sl in by_id, in chronological order.
+    """
+    keyed_criteria = ('week', 'week_in', 'day', 'day_in', 'week_day', 'course_type', 'apm', 'start_time')
+
+    def __init__(self, slots=()):
+        super().__init__()
+        by_week = defaultdict(set)
+        by_day = defaultdict(set)
+        by_day_object = defaultdict(set)
+        by_week_day = defaultdict(set)
+        by_course_type = defaultdict(set)
+        by_apm = defaultdict(set)
+        by_start_time = defaultdict(set)
+        for sl in self:
+            by_week[sl.day.week].add(sl)
+            by_day[(sl.day.week, sl.day.day)].add(sl)
+            by_day_object[sl.day].add(sl)
+            by_week_day[sl.day.day].add(sl)
+            if hasattr(sl, 'course_type'):
+                by_course_type[sl.course_type].add(sl)
+            by_apm[sl.apm].add(sl)
+            by_start_time[sl.start_time].add(sl)
+        self.by_week = dict(by_week)
+        self.by_day = dict(by_day)
+        self.by_day_object = dict(by_day_object)
+        self.by_week_day = dict(by_week_day)
+        self.by_course_type = dict(by_course_type)
+        self.by_apm = dict(by_apm)
+        self.by_start_time = dict(by_start_time)
+
+        # Interval index: for each day, the slots sorted by start time
+        self.day_intervals = {}
+        for day_key, day_slots in self.by_day.items():
+            ordered = sorted(day_slots, key=lambda sl: (sl.start_time, sl.end_time))
+            self.day_intervals[day_key] = ([sl.start_time for sl in ordered], ordered)
+        self.ordered = sorted(self, key=lambda sl: (sl.start_time, sl.end_time))
+        self.ordered_start_times = [sl.start_time for sl in self.ordered]
+
+        self.by_id = tuple(sorted(self, key=chronological_order))
+        for i, sl in enumerate(self.by_id):
+            sl.id = i
+
+    def keyed_slots(self, criterion, value):
+        if criterion == 'week':
+            return self.by_week.get(value, set())
+        if criterion == 'week_in':
+            return set().union(*(self.by_week.get(week, ()) for week in value))
+        if criterion == 'day':
+            return self.by_day.get((value.week, value.day), set())
+        if criterion == 'day_in':
+            return set().union(*(self.by_day_object.get(day, ()) for day in value))
+        if criterion == 'week_day':
+            return self.by_week_day.get(value, set())
+        if criterion == 'course_type':
+            return self.by_course_type.get(value, set())
+        if criterion == 'apm':
+            return self.by_apm.get(value, set())
+        if criterion == 'start_time':
+            return self.by_start_time.get(value, set())
+
+    def simultaneous_slots(self, other):
+        start_times, ordered = self.day_intervals.get(day_key(other), ((), ()))
+        # slots of the same day starting before other ends...
+        candidates = ordered[:bisect_left(start_times, other.end_time)]
+        # ...and ending after it starts
+        return set(sl for sl in candidates if sl.end_time > other.start_time)
+
+    def slots_after(self, other):
+        other_key = day_key(other)
+        other_order = day_order(other_key)
+        result = set()
+        for key, (start_times, ordered) in self.day_intervals.items():
+            if key == other_key:
+                result.update(ordered[bisect_left(start_times, other.end_time):])
+            elif day_order(key) > other_order:
+                result.update(ordered)
+        return result
+
+    def filter(self, **criteria):
+        criteria = {name: value for name, value in criteria.items() if value is not None}
+        if not criteria:
+            return self
+
+        buckets = [self.keyed_slots(name, criteria.pop(name))
+                   for name in self.keyed_criteria if name in criteria]
+        if buckets:
+            buckets.sort(key=len)
+            slots = set(buckets[0])
+            for bucket in buckets[1:]:
+                if not slots:
+                    break
+                slots &= bucket
+        elif 'simultaneous_to' in criteria:
+            slots = self.simultaneous_slots(criteria.pop('simultaneous_to'))
+        elif 'is_after' in criteria:
+            slots = self.slots_after(criteria.pop('is_after'))
+        elif 'starts_after' in criteria or 'starts_before' in criteria:
+            lower = criteria.pop('starts_after', None)
+            upper = criteria.pop('starts_before', None)
+            first = 0 if lower is None else bisect_left(self.ordered_start_times, lower)
+            last = len(self.ordered) if upper is None else bisect_right(self.ordered_start_times, upper)
+            slots = set(self.ordered[first:last])
+        elif 'same' in criteria:
+            slots = set(self.by_start_time.get(criteria['same'].start_time, ()))
+        else:
+            slots = set(self)
+
+        # Remaining criteria are checked on the (small) candidate set
+        checks = slot_checks(**criteria)
+        if checks and slots:
+            slots = set(sl for sl in slots if all(check(sl) for check in checks))
+        return slots
+
+
+class DayIndex(frozenset):
+    """
+    Immutable set of days with precomputed lookups used by days_filter.
+    """
+    def __init__(self, days=()):
+        super().__init__()
+        by_week = defaultdict(set)
+        by_day = defaultdict(set)
+        for d in self:
+            by_week[d.week].add(d)
+            by_day[d.day].add(d)
+        self.by_week = dict(by_week)
+        self.by_day = dict(by_day)
+
+    def filter(self, index=None, index_in=None, week=None, week_in=None, day=None, day_in=None):
+        buckets = []
+        if week is not None:
+            buckets.append(self.by_week.get(week, set()))
+        if week_in is not None:
+            buckets.append(set().union(*(self.by_week.get(w, ()) for w in week_in)))
+        if index is not None:
+            buckets.append(self.by_day.get(days_list[index], set()) if 0 <= index < len(days_list) else set())
+        if index_in is not None:
+            buckets.append(set().union(*(self.by_day.get(days_list[i], ()) for i in index_in
+                                         if 0 <= i < len(days_list))))
+        if day is not None:
+            buckets.append(self.by_day.get(day, set()))
+        if day_in is not None:
+            buckets.append(set().union(*(self.by_day.get(d, ()) for d in day_in)))
+        if not buckets:
+            return self
+        buckets.sort(key=len)
+        days = set(buckets[0])
+        for bucket in buckets[1:]:
+            days &= bucket
+        return days
+
+
+def day_key(other):
+    if isinstance(other, (Slot, CourseSlot)):
+        return other.day.week, other.day.day
+    elif isinstance(other, ScheduledCourse):
+        return other.course.week, other.day
+    elif isinstance(other, (UserPreference, CoursePreference)):
+        return other.week, other.day
+    else:
+        raise TypeError("A slot can only be compared with "
+                        "a ScheduledCourse, UserPreference, CoursePreference or another slot")
+
+
+def chronological_order(sl):
+    course_type = getattr(sl, 'course_type', None)
+    return day_order(day_key(sl)), sl.start_time, sl.end_time, course_type.id if course_type is not None else -1
+
+
+def day_order(key):
+    week, day = key
+    if week is None:
+        return -1, -1, days_index[day]
+    return week.year, week.nb, days_index[day]
+
+
+def slot_checks(day=None, apm=None, course_type=None, start_time=None, week_day=None,
+                simultaneous_to=None, week=None, is_after=None, starts_after=None, starts_before=None,
+                ends_before=None, ends_after=None, day_in=None, same=None, week_in=None):
+    checks = []
     if week is not None:
-        slots = set(sl for sl in slots if sl.day.week == week)
+        checks.append(lambda sl: sl.day.week == week)
     if week_in is not None:
-        slots = set(sl for sl in slots if sl.day.week in week_in)
+        checks.append(lambda sl: sl.day.week in week_in)
     if day is not None:
-        slots = set(sl for sl in slots if sl.day.equals(day))
+        checks.append(lambda sl: sl.day.equals(day))
     if day_in is not None:
-        slots = set(sl for sl in slots if sl.day in day_in)
+        checks.append(lambda sl: sl.day in day_in)
     if week_day is not None:
-        slots = set(sl for sl in slots if sl.day.day == week_day)
+        checks.append(lambda sl: sl.day.day == week_day)
     if course_type is not None:
-        slots = set(sl for sl in slots if sl.course_type == course_type)
+        checks.append(lambda sl: sl.course_type == course_type)
     if apm is not None:
-        slots = set(sl for sl in slots if sl.apm == apm)
+        checks.append(lambda sl: sl.apm == apm)
     if simultaneous_to is not None:
-        slots = set(sl for sl in slots if sl.is_simultaneous_to(simultaneous_to))
+        checks.append(lambda sl: sl.is_simultaneous_to(simultaneous_to))
     if is_after is not None:
-        slots = set(sl for sl in slots if sl.is_after(is_after))
+        checks.append(lambda sl: sl.is_after(is_after))
     if starts_after is not None:
-        slots = set(sl for sl in slots if sl.start_time >= starts_after)
+        checks.append(lambda sl: sl.start_time >= starts_after)
     if starts_before is not None:
-        slots = set(sl for sl in slots if sl.start_time <= starts_before)
+        checks.append(lambda sl: sl.start_time <= starts_before)
     if ends_before is not None:
-        slots = set(sl for sl in slots if sl.end_time <= ends_before)
+        checks.append(lambda sl: sl.end_time <= ends_before)
     if ends_after is not None:
-        slots = set(sl for sl in slots if sl.end_time >= ends_after)
+        checks.append(lambda sl: sl.end_time >= ends_after)
     if start_time is not None:
-        slots = set(sl for sl in slots if sl.start_time == start_time)
+        checks.append(lambda sl: sl.start_time == start_time)
     if same is not None:
-        slots = set(sl for sl in slots if sl.same_through_weeks(same))
-    return slots
+        checks.append(lambda sl: sl.same_through_weeks(same))
+    return checks
+
+
+def slots_filter(slot_set, day=None, apm=None, course_type=None, start_time=None, week_day=None,
+                 simultaneous_to=None, week=None, is_after=None, starts_after=None, starts_before=None,
+                 ends_before=None, ends_after=None, day_in=None, same=None, week_in=None):
+    criteria = dict(day=day, apm=apm, course_type=course_type, start_time=start_time, week_day=week_day,
+                    simultaneous_to=simultaneous_to, week=week, is_after=is_after, starts_after=starts_after,
+                    starts_before=starts_before, ends_before=ends_before, ends_after=ends_after,
+                    day_in=day_in, same=same, week_in=week_in)
+    if isinstance(slot_set, SlotIndex):
+        return slot_set.filter(**criteria)
+    checks = slot_checks(**criteria)
+    if not checks:
+        return slot_set
+    return set(sl for sl in slot_set if all(check(sl) for check in checks))
 
 
 def days_filter(days_set, index=None, index_in=None, week=None, week_in=None, day=None, day_in=None):
+    if isinstance(days_set, DayIndex):
+        return days_set.filter(index=index, index_in=index_in, week=week, week_in=week_in,
+                               day=day, day_in=day_in)
     days = days_set
     if week is not None:
         days = set(d for d in days if d.week == week)
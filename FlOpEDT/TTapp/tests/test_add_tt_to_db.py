@@ -0,0 +1,200 @@
+from types import SimpleNamespace
+
+from django.test import TransactionTestCase
+from pulp import LpVariable, LpAffineExpression
+
+import base.models as models
+from base.timing import Time
+from people.models import Tutor
+from TTapp.RoomModel import RoomModel
+from TTapp.TTModel import TTModel
+from TTapp.slots import CourseSlot
+
+
+def solved_var(name, value):
+    var = LpVariable(name, cat='Binary')
+    var.setInitialValue(value)
+    return var
+
+
+class AddTTToDBTestCase(TransactionTestCase):
+    """
+    Writes the solution of hand-made models, whose variables have fixed values, and sets
+    their MIP start (both close the old database connections, hence TransactionTestCase)
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        self.department = models.Department.objects.create(name="departement_db", abbrev="ddb")
+        tp = models.TrainingProgramme.objects.create(name="tp1", abbrev="tp1", department=self.department)
+        group_type = models.GroupType.objects.create(name="TD", department=self.department)
+        self.group = models.StructuralGroup.objects.create(name="g1", train_prog=tp, type=group_type, size=0)
+        period = models.Period.objects.create(name="S1", department=self.department, starting_week=1, ending_week=20)
+        module = models.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=tp, period=period)
+        self.course_type = models.CourseType.objects.create(name="TD", department=self.department)
+        self.week, _ = models.Week.objects.get_or_create(nb=10, year=2023)
+        self.tutors = [Tutor.objects.create(username=f"prof{i}") for i in range(2)]
+        self.rooms = [models.Room.objects.create(name=f"R{i}") for i in range(2)]
+        self.courses = []
+        for i in range(3):
+            course = models.Course.objects.create(type=self.course_type, module=module, week=self.week)
+            course.groups.add(self.group)
+            self.courses.append(course)
+        # the last course is fixed, in the public copy
+        self.fixed = models.ScheduledCourse.objects.create(course=self.courses[2], day='tu', start_time=480,
+                                                           tutor=self.tutors[1], room=self.rooms[1], work_copy=0)
+        models.ScheduledCourseAdditional.objects.create(scheduled_course=self.fixed, comment="fixed")
+
+    def solved_model(self, solution):
+        """
+        TTModel scheduling self.courses[:2] as given by solution {course: (start time, tutor, room)}
+        """
+        model = TTModel.__new__(TTModel)
+        model.department = models.Department.objects.get(id=self.department.id)
+        model.weeks = [self.week]
+        model.pre_assign_rooms = True
+        model.stabilize_work_copy = None
+        model.possible_apms = {Time.AM, Time.PM}
+        courses = self.courses[:2]
+        slots = [CourseSlot(models.Day('m', self.week), start_time, self.course_type) for start_time in (480, 600)]
+        model.wdb = SimpleNamespace(courses=courses,
+                                    compatible_slots={c: slots for c in courses},
+                                    possible_tutors={c: self.tutors for c in courses},
+                                    course_rg_compat={c: self.rooms for c in courses},
+                                    fixed_courses=[self.fixed],
+                                    groups=models.GenericGroup.objects.filter(train_prog__department=self.department),
+                                    instructors=self.tutors,
+                                    weeks=[self.week],
+                                    basic_groups=[self.group])
+        model.TT, model.TTinstructors, model.TTrooms = {}, {}, {}
+        for c in courses:
+            start_time, tutor, room = solution[c]
+            for sl in slots:
+                name = f"{c.id}_{sl.start_time}"
+                model.TT[(sl, c)] = solved_var(name, sl.start_time == start_time)
+                for i in self.tutors:
+                    model.TTinstructors[(sl, c, i)] = solved_var(f"{name}_{i.username}",
+                                                                 sl.start_time == start_time and i == tutor)
+                for r in self.rooms:
+                    model.TTrooms[(sl, c, r)] = solved_var(f"{name}_{r.name}",
+                                                           sl.start_time == start_time and r == room)
+        model.cost_I = {i: {self.week: LpAffineExpression(constant=2)} for i in self.tutors}
+        model.cost_G = {self.group: {self.week: LpAffineExpression(constant=3)}}
+        model.FHD_G = {apm: {self.group: {self.week: LpAffineExpression(constant=1)}} for apm in (Time.AM, Time.PM)}
+        return model
+
+    def scheduled(self, work_copy):
+        return sorted(models.ScheduledCourse.objects.filter(work_copy=work_copy)
+                      .values_list('course_id', 'day', 'start_time', 'tutor__username', 'room__name'))
+
+    def test_add_tt_to_db(self):
+        c0, c1, c2 = self.courses
+        model = self.solved_model({c0: (600, self.tutors[0], self.rooms[1]),
+                                   c1: (480, self.tutors[1], self.rooms[0])})
+        models.ScheduledCourse.objects.create(course=c0, day='f', start_time=480, work_copy=1)
+        model.add_tt_to_db(1)
+
+        # the previous content of the work copy is replaced, the fixed course is copied
+        self.assertEqual(self.scheduled(1), [(c0.id, 'm', 600, 'prof0', 'R1'),
+                                             (c1.id, 'm', 480, 'prof1', 'R0'),
+                                             (c2.id, 'tu', 480, 'prof1', 'R1')])
+        self.assertEqual(self.scheduled(0), [(c2.id, 'tu', 480, 'prof1', 'R1')])
+        self.assertEqual(models.ScheduledCourseAdditional.objects
+                         .filter(scheduled_course__work_copy=1).get().comment, "fixed")
+        self.assertEqual(models.TutorCost.objects.filter(work_copy=1).count(), 2)
+        self.assertEqual(models.GroupCost.objects.get(work_copy=1).value, 3)
+        self.assertEqual(models.DailyVolume.objects.filter(week=self.week).count(), 1)
+
+    def test_add_tt_to_db_public_copy(self):
+        c0, c1, c2 = self.courses
+        model = self.solved_model({c0: (480, self.tutors[0], self.rooms[0]),
+                                   c1: (600, self.tutors[0], self.rooms[0])})
+        self.fixed.delete()
+        model.wdb.fixed_courses = []
+        model.add_tt_to_db(0)
+        self.assertEqual(self.scheduled(0), [(c0.id, 'm', 480, 'prof0', 'R0'),
+                                             (c1.id, 'm', 600, 'prof0', 'R0')])
+        # bulk_create does not send signals, the volumes are rebuilt
+        self.assertEqual(list(models.DailyVolume.objects.values_list('day', 'tutor__username', 'nb_courses')),
+                         [('m', 'prof0', 2)])
+
+    def test_add_tt_to_db_cosmo(self):
+        c0, c1, c2 = self.courses
+        models.Mode.objects.filter(department=self.department).update(cosmo=models.Mode.COOPERATIVE_BY_WORKER)
+        worker_groups = {t: models.StructuralGroup.objects.create(name=t.username, train_prog=self.group.train_prog,
+                                                                  type=self.group.type, size=0)
+                         for t in self.tutors}
+        model = self.solved_model({c0: (480, self.tutors[1], self.rooms[0]),
+                                   c1: (600, self.tutors[0], self.rooms[1])})
+        model.add_tt_to_db(1)
+
+        # the courses are given to the group of their worker, and no room is assigned
+        self.assertEqual(self.scheduled(1), [(c0.id, 'm', 480, 'prof1', None),
+                                             (c1.id, 'm', 600, 'prof0', None),
+                                             (c2.id, 'tu', 480, 'prof1', 'R1')])
+        self.assertEqual([g.id for g in c0.groups.all()], [worker_groups[self.tutors[1]].id])
+        self.assertEqual([g.id for g in c1.groups.all()], [worker_groups[self.tutors[0]].id])
+        self.assertEqual([g.id for g in c2.groups.all()], [self.group.id])
+
+    def test_set_mip_start_from_work_copy(self):
+        c0, c1, c2 = self.courses
+        model = self.solved_model({c0: (480, self.tutors[0], self.rooms[0]),
+                                   c1: (480, self.tutors[0], self.rooms[0])})
+        models.ScheduledCourse.objects.create(course=c0, day='m', start_time=600, tutor=self.tutors[1],
+                                              room=self.rooms[1], work_copy=3)
+        # not on a compatible slot of c1
+        models.ScheduledCourse.objects.create(course=c1, day='f', start_time=480, tutor=self.tutors[1],
+                                              room=self.rooms[1], work_copy=3)
+        # not a course of the model
+        models.ScheduledCourse.objects.create(course=c2, day='m', start_time=600, tutor=self.tutors[1],
+                                              room=self.rooms[1], work_copy=3)
+        self.assertEqual(model.set_mip_start_from_work_copy(3), 1)
+
+        def start(course):
+            return (sorted((sl.start_time, var.varValue) for (sl, c), var in model.TT.items() if c == course),
+                    sorted((sl.start_time, i.username) for (sl, c, i), var in model.TTinstructors.items()
+                           if c == course and var.varValue),
+                    sorted((sl.start_time, r.name) for (sl, c, r), var in model.TTrooms.items()
+                           if c == course and var.varValue))
+        self.assertEqual(start(c0), ([(480, 0), (600, 1)], [(600, 'prof1')], [(600, 'R1')]))
+        # the values of c1 are left as they were
+        self.assertEqual(start(c1), ([(480, 1), (600, 0)], [(480, 'prof0')], [(480, 'R0')]))
+
+        # nothing from an empty work copy
+        self.assertEqual(model.set_mip_start_from_work_copy(4), 0)
+        self.assertEqual(start(c0), ([(480, 0), (600, 1)], [(600, 'prof1')], [(600, 'R1')]))
+
+    def room_model(self, rooms, work_copy):
+        model = RoomModel.__new__(RoomModel)
+        model.department = self.department
+        model.weeks = [self.week]
+        model.work_copy = work_copy
+        model.courses = list(rooms)
+        model.course_room_compat = {c: self.rooms for c in rooms}
+        model.corresponding_scheduled_course = {sc.course: sc for sc in models.ScheduledCourse.objects
+                                                .filter(work_copy=work_copy, course__in=rooms)}
+        model.TTrooms = {(c, r): solved_var(f"{c.id}_{r.name}", r == room)
+                         for c, room in rooms.items() for r in self.rooms}
+        return model
+
+    def test_add_rooms_in_db(self):
+        c0, c1, c2 = self.courses
+        for c in (c0, c1):
+            models.ScheduledCourse.objects.create(course=c, day='m', start_time=480, tutor=self.tutors[0],
+                                                  work_copy=0)
+
+        # new work copy
+        self.room_model({c0: self.rooms[0], c1: self.rooms[1]}, 0).add_rooms_in_db(create_new_work_copy=True)
+        self.assertEqual(self.scheduled(1), [(c0.id, 'm', 480, 'prof0', 'R0'),
+                                             (c1.id, 'm', 480, 'prof0', 'R1')])
+        self.assertEqual(self.scheduled(0), [(c0.id, 'm', 480, 'prof0', None),
+                                             (c1.id, 'm', 480, 'prof0', None),
+                                             (c2.id, 'tu', 480, 'prof1', 'R1')])
+
+        # in place, in the public copy
+        self.room_model({c0: self.rooms[1], c1: self.rooms[0]}, 0).add_rooms_in_db(create_new_work_copy=False)
+        self.assertEqual(self.scheduled(0), [(c0.id, 'm', 480, 'prof0', 'R1'),
+                                             (c1.id, 'm', 480, 'prof0', 'R0'),
+                                             (c2.id, 'tu', 480, 'prof1', 'R1')])
+        self.assertEqual(sorted(models.DailyVolume.objects.values_list('day', 'room__name', 'nb_courses')),
+                         [('m', 'R0', 1), ('m', 'R1', 1), ('tu', 'R1', 1)])
@@ -0,0 +1,100 @@
+from multiprocessing.pool import Pool
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+import base.models as models
+from people.models import Tutor
+from TTapp.models import ConsiderTutorsUnavailability
+from TTapp.GlobalPreAnalysis.centralized_preanalysis import pre_analyse, pre_analyse_weeks
+from TTapp.GlobalPreAnalysis.tools_centralized_preanalysis import snapshots, pre_analysis_snapshot
+
+
+class CentralizedPreAnalysisTestCase(TransactionTestCase):
+    """
+    Outside of a transaction, so that pre_analyse_weeks runs its pool of processes
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        self.department = models.Department.objects.create(name="Informatique", abbrev="INFO")
+        models.TimeGeneralSettings.objects.update_or_create(department=self.department,
+                                                            defaults={"day_start_time": 480,
+                                                                      "day_finish_time": 1140,
+                                                                      "lunch_break_start_time": 750,
+                                                                      "lunch_break_finish_time": 840,
+                                                                      "days": ["m", "tu", "w", "th", "f"]})
+        self.week, _ = models.Week.objects.get_or_create(nb=12, year=2023)
+        self.other_week, _ = models.Week.objects.get_or_create(nb=13, year=2023)
+        train_prog = models.TrainingProgramme.objects.create(name="Informatique 1er année", abbrev="INFO1",
+                                                             department=self.department)
+        period = models.Period.objects.create(name="S1", department=self.department, starting_week=1, ending_week=20)
+        module = models.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=train_prog, period=period)
+        course_type = models.CourseType.objects.create(name="CM", department=self.department, duration=90)
+        models.CourseStartTimeConstraint.objects.create(course_type=course_type, allowed_start_times=[480, 570, 840])
+        self.tutor = Tutor.objects.create(username="prof")
+        self.tutor.departments.add(self.department)
+        for week in (self.week, self.other_week):
+            for _ in range(2):
+                models.Course.objects.create(type=course_type, module=module, week=week, tutor=self.tutor)
+        # only one course fits in the preferences of the first week
+        models.UserPreference.objects.create(user=self.tutor, week=self.week, day="m", start_time=480,
+                                             duration=90, value=8)
+        models.UserPreference.objects.create(user=self.tutor, week=None, day="m", start_time=480,
+                                             duration=240, value=8)
+        ConsiderTutorsUnavailability.objects.create(department=self.department)
+
+    def test_pre_analyse(self):
+        result = pre_analyse(self.department, self.week)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["messages"][0]["type"], "ConsiderTutorsUnavailability")
+        self.assertEqual(result[0]["messages"][0]["tutor"], self.tutor.id)
+        self.assertEqual(snapshots, {})
+
+    def test_pre_analyse_weeks(self):
+        self.assertFalse(connection.in_atomic_block)
+        with mock.patch.object(Pool, 'starmap', autospec=True, side_effect=Pool.starmap) as starmap:
+            result = pre_analyse_weeks(self.department, [self.week, self.other_week], processes=2)
+        self.assertTrue(starmap.called)
+        self.assertEqual(len(result[self.week]), 1)
+        # the default preferences apply to the second week
+        self.assertEqual(result[self.other_week], [])
+
+    def test_snapshot_preferences(self):
+        other_department = models.Department.objects.create(name="Gestion", abbrev="GEST")
+        other_tutor = Tutor.objects.create(username="other_prof")
+        other_tutor.departments.add(other_department)
+        models.UserPreference.objects.create(user=other_tutor, week=None, day="m", start_time=480,
+                                             duration=240, value=8)
+        with pre_analysis_snapshot(self.department, self.week) as snapshot:
+            self.assertEqual(list(snapshot.user_preferences), [self.tutor.id])
+            self.assertEqual(len(snapshot.tutor_preferences(self.tutor)), 1)
+
+    def test_snapshot_courses(self):
+        other_department = models.Department.objects.create(name="Gestion", abbrev="GEST")
+        train_prog = models.TrainingProgramme.objects.create(name="Gestion 1ere annee", abbrev="GEST1",
+                                                             department=other_department)
+        period = models.Period.objects.create(name="S1", department=other_department, starting_week=1, ending_week=20)
+        module = models.Module.objects.create(name="Compta", abbrev="COMPTA", train_prog=train_prog, period=period)
+        course_type = models.CourseType.objects.create(name="TD", department=other_department, duration=90)
+        models.CourseStartTimeConstraint.objects.create(course_type=course_type, allowed_start_times=[480, 570])
+        group_type = models.GroupType.objects.create(name="TD", department=other_department)
+        group = models.StructuralGroup.objects.create(name="g1", train_prog=train_prog, type=group_type, size=0)
+        other_tutor = Tutor.objects.create(username="other_prof")
+        course = models.Course.objects.create(type=course_type, module=module, week=self.week, tutor=other_tutor)
+        course.groups.add(group)
+        course.supp_tutor.add(self.tutor)
+        models.ScheduledCourse.objects.create(course=course, day="m", start_time=570, tutor=other_tutor,
+                                              work_copy=0)
+        constraint = ConsiderTutorsUnavailability.objects.get(department=self.department)
+        expected = constraint.pre_analyse(self.week)
+
+        with pre_analysis_snapshot(self.department, self.week) as snapshot:
+            self.assertEqual(len(snapshot.courses), 3)
+            self.assertEqual(snapshot.group_courses([group]), [course])
+            self.assertEqual(len(snapshot.tutor_courses(self.tutor)), 3)
+            self.assertEqual([sc.course for sc in snapshot.other_departments_scheduled_courses(self.tutor)],
+                             [course])
+            self.assertEqual(snapshot.other_departments_scheduled_courses(Tutor.objects.create(username="p")), [])
+            self.assertEqual(constraint.pre_analyse(self.week), expected)
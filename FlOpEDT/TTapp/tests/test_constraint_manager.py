@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+
+from base.timing import Day
+from TTapp.slots import Slot
+from TTapp.ilp_constraints.constraint import Constraint
+from TTapp.ilp_constraints.constraint_type import ConstraintType
+from TTapp.ilp_constraints.constraintManager import ConstraintManager
+from TTapp.ilp_constraints.constraints.simulSlotGroupConstraint import SimulSlotGroupConstraint
+
+
+class ConstraintManagerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.slot = Slot(Day(Day.TUESDAY, None), 8 * 60, 9 * 60 + 30)
+        self.constraints = [Constraint(constraint_type=ConstraintType.TECHNICAL),
+                            SimulSlotGroupConstraint(self.slot, "TD1"),
+                            Constraint(constraint_type=ConstraintType.HAS_VISIO, groups=["TD1", "TD2"],
+                                       days=[Day.MONDAY], apm="AM", name="visio")]
+        self.manager = ConstraintManager()
+        for i, constraint in enumerate(self.constraints):
+            constraint.id = i
+            self.manager.add_constraint(constraint)
+
+    def test_rebuilt_constraints(self):
+        self.assertEqual(self.manager.get_nb_constraints(), len(self.constraints))
+        for constraint, rebuilt in zip(self.constraints, self.manager.get_constraints(range(3))):
+            self.assertIs(rebuilt.__class__, constraint.__class__)
+            self.assertEqual(rebuilt.id, constraint.id)
+            self.assertEqual(rebuilt.name, constraint.name)
+            self.assertEqual(rebuilt.constraint_type, constraint.constraint_type)
+            self.assertEqual(rebuilt.dimensions, constraint.dimensions)
+            self.assertEqual(str(rebuilt), str(constraint))
+
+    def test_shared_objects(self):
+        self.assertEqual(self.manager.objects.count("TD1"), 1)
+        self.assertEqual(self.manager.get_constraint(1).dimensions["days"]["value"], ["Mardi"])
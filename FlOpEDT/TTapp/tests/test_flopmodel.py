@@ -0,0 +1,150 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+from pulp import LpStatusOptimal, LpStatusNotSolved, LpStatusInfeasible
+
+import base.models as models
+from TTapp.FlopModel import FlopModel, PULP_BACKEND, MATRIX_BACKEND, solution_files_path, flop_constraint_key
+from TTapp.matrix_problem import MatrixProblem
+
+
+class SmallModel(FlopModel):
+
+    def __init__(self, department_abbrev, model_backend):
+        super(SmallModel, self).__init__(department_abbrev, [], model_backend=model_backend)
+        self.x = [self.add_var() for _ in range(8)]
+        self.add_constraint(self.sum(self.x[:4]), '<=', 2)
+        self.add_constraint(self.sum(2 * v for v in self.x[4:]) - self.x[0], '>=', 3)
+        self.both = self.add_conjunct(self.x[1], self.x[5])
+        self.floor = self.add_floor(self.sum(self.x[2:6]), 2, 4)
+        self.obj = self.lin_expr()
+        for k, v in enumerate(self.x):
+            self.obj += (k % 3 - 1) * v
+        self.obj -= 2 * self.both
+        self.obj += 1.5 * self.floor
+        self.set_objective(self.obj)
+
+    def log_files_prefix(self):
+        return f"SmallModel_{self.model_backend}"
+
+
+class ForbidVar(object):
+    """
+    Stands for a FlopConstraint forbidding a variable and rewarding another one
+    """
+    def __init__(self, id, forbidden, rewarded):
+        self.id = id
+        self.forbidden = forbidden
+        self.rewarded = rewarded
+
+    def enrich_model(self, model, costs):
+        model.add_constraint(model.sum([self.forbidden]), '==', 0)
+        model.add_cost(costs, 0, -3 * self.rewarded)
+
+
+class MatrixBackendTestCase(TestCase):
+
+    def setUp(self):
+        os.makedirs(solution_files_path, exist_ok=True)
+        self.department = models.Department.objects.create(name="Informatique", abbrev="INFO")
+
+    def test_same_solution_as_pulp(self):
+        solutions = {}
+        for backend in (PULP_BACKEND, MATRIX_BACKEND):
+            model = SmallModel(self.department.abbrev, backend)
+            self.assertIsNotNone(model.optimize(None, 'PULP_CBC_CMD'))
+            solutions[backend] = (model.get_expr_value(model.obj),
+                                  [model.get_var_value(v) for v in model.x + [model.both, model.floor]])
+        self.assertEqual(solutions[PULP_BACKEND], solutions[MATRIX_BACKEND])
+
+    def test_remove_flop_constraint(self):
+        for backend in (PULP_BACKEND, MATRIX_BACKEND):
+            reference = SmallModel(self.department.abbrev, backend)
+            reference.optimize(None, 'PULP_CBC_CMD')
+
+            model = SmallModel(self.department.abbrev, backend)
+            costs = {0: model.lin_expr()}
+            forbid = ForbidVar(1, model.x[4], model.x[6])
+            with model.enriching(forbid):
+                forbid.enrich_model(model, costs)
+            model.set_objective(model.obj + costs[0])
+            model.optimize(None, 'PULP_CBC_CMD')
+            self.assertEqual(model.get_var_value(model.x[4]), 0)
+
+            model.remove_flop_constraint(flop_constraint_key(forbid))
+            self.assertEqual(model.get_expr_value(costs[0]), 0)
+            model.set_objective(model.obj + costs[0])
+            self.assertIsNotNone(model.optimize(None, 'PULP_CBC_CMD', warm_start=True))
+            self.assertEqual(model.get_expr_value(model.obj), reference.get_expr_value(reference.obj))
+
+    def test_lazy_var_names(self):
+        model = SmallModel(self.department.abbrev, PULP_BACKEND)
+        model.use_flop_vars = True
+        model.vars = {}
+        model.add_var("TT(%s,%s)", self.department, 3)
+        model.add_var("check_var")
+        self.assertEqual([v.name for v in model.vars.values()], ["TT(INFO,3)", "check_var"])
+
+
+# stands for gurobi_cl: appends the lines of argv[1] to the log and writes a solution if argv[2] is given
+fake_gurobi_cl = """#!{python}
+import sys
+options = dict(arg.split('=', 1) for arg in sys.argv[1:-1])
+with open(options['LogFile'], 'a') as log:
+    log.write({log_lines!r})
+if {solution!r}:
+    with open(options['ResultFile'], 'w') as sol:
+        sol.write({solution!r})
+"""
+
+
+class MatrixProblemTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.problem = MatrixProblem("test")
+        self.x = [self.problem.add_var(str(i + 1)) for i in range(4)]
+        self.problem.add_constraint(self.x[0] + 2 * self.x[1], '<=', 2, "c0")
+        self.problem.add_constraint(self.x[1] + self.x[2] + self.x[3], '>=', 1, "c1")
+
+    def test_row_coefficients(self):
+        c0 = self.problem.get_constraint("c0")
+        self.assertEqual([c0[v] for v in self.x], [1, 2, 0, 0])
+        c0[self.x[1]] = 5
+        c0[self.x[3]] = -1
+        # rows added after the first access
+        self.problem.add_constraint(self.x[3] - self.x[0], '==', 0, "c2")
+        c1, c2 = self.problem.get_constraint("c1"), self.problem.get_constraint("c2")
+        c2[self.x[2]] = 4
+        self.assertEqual([self.problem.get_constraint("c0")[v] for v in self.x], [1, 5, 0, -1])
+        self.assertEqual([c1[v] for v in self.x], [0, 1, 1, 1])
+        self.assertEqual([c2[v] for v in self.x], [-1, 0, 4, 1])
+
+    def solve_with_fake_gurobi(self, log_lines, solution):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "gurobi_cl")
+        with open(path, 'w') as f:
+            f.write(fake_gurobi_cl.format(python=sys.executable, log_lines=log_lines, solution=solution))
+        os.chmod(path, stat.S_IRWXU)
+        log_filename = os.path.join(directory, "gurobi.log")
+        # log of a previous run
+        with open(log_filename, 'w') as log:
+            log.write("Optimal solution found (tolerance 1.00e-04)\n")
+        return self.problem.solve_with_gurobi(path, [('LogFile', log_filename)], os.path.join(directory, "model.mps"),
+                                              os.path.join(directory, "model.sol"))
+
+    def test_gurobi_status(self):
+        solution = "# Objective value = 0\n1 0\n2 1\n3 0\n4 0\n"
+        self.assertEqual(self.solve_with_fake_gurobi("Optimal solution found (tolerance 1.00e-04)\n", solution),
+                         LpStatusOptimal)
+        self.assertEqual(self.x[1].value(), 1)
+        # stopped on time: the solution found is kept
+        self.assertEqual(self.solve_with_fake_gurobi("Time limit reached\nBest objective 0\n", solution),
+                         LpStatusNotSolved)
+        self.assertTrue(self.problem.has_solution())
+        self.assertEqual(self.solve_with_fake_gurobi("Model is infeasible\n", ""), LpStatusInfeasible)
+        self.assertFalse(self.problem.has_solution())
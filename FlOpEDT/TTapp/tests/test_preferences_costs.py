@@ -0,0 +1,84 @@
+import random
+
+from django.test import SimpleTestCase
+
+import base.models as models
+from base.timing import Day
+from TTapp.slots import Slot
+from TTapp.helpers.preferences_costs import compute_tutors_preferences_costs
+
+
+def reference_costs(preferences, slots):
+    """Per slot computation, as done before the vectorization"""
+    maximum = max(a.value for a in preferences)
+    if maximum == 0:
+        return {sl: (0, 0, 0) for sl in slots}
+    non_prefered = [a for a in preferences if 1 <= a.value <= maximum - 1]
+    average_value = sum(a.duration * a.value for a in non_prefered) / max(1, sum(a.duration for a in non_prefered))
+    result = {}
+    for sl in slots:
+        avail = [a for a in preferences if sl.is_simultaneous_to(a)]
+        if not avail:
+            result[sl] = (1, 1, 0)
+            continue
+        minimum = min(a.value for a in avail)
+        if minimum == 0:
+            result[sl] = (0, 0, 0)
+        elif minimum == 1:
+            result[sl] = (1, 0, 1)
+        else:
+            result[sl] = (1, 1, 0 if minimum == maximum else (minimum - maximum) / (average_value - maximum))
+    return result
+
+
+class TutorsPreferencesCostsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.week = models.Week(id=1, nb=10, year=2022)
+        self.days = [Day(day=d, week=self.week) for d in (Day.MONDAY, Day.TUESDAY, Day.WEDNESDAY)]
+        self.slots = [Slot(day=d, start_time=st, end_time=st + 90)
+                      for d in self.days for st in (8 * 60, 9 * 60 + 30, 13 * 60, 15 * 60 + 15)]
+        self.tutors = ['t%d' % i for i in range(6)]
+
+    def random_preferences(self, maximum):
+        preferences = []
+        for d in self.days:
+            start_time = 8 * 60
+            while start_time < 18 * 60:
+                duration = random.choice((30, 60, 120))
+                # leave some holes
+                if random.random() > 0.1:
+                    preferences.append(models.UserPreference(week=self.week, day=d.day, start_time=start_time,
+                                                          duration=duration, value=random.randint(0, maximum)))
+                start_time += duration
+        return preferences
+
+    def test_same_as_per_slot_computation(self):
+        preferences = {(t, self.week): self.random_preferences(maximum) for t, maximum in
+                       zip(self.tutors, (8, 8, 4, 1, 0))}
+        costs = compute_tutors_preferences_costs(self.tutors, {self.week: self.slots}, preferences)
+        avail, avail_at_school, cost = costs.as_dicts()
+        for t in self.tutors:
+            if (t, self.week) in preferences:
+                expected = reference_costs(preferences[(t, self.week)], self.slots)
+            else:
+                expected = {sl: (1, 1, 0) for sl in self.slots}
+            for sl in self.slots:
+                self.assertEqual((avail[t][sl], avail_at_school[t][sl]), expected[sl][:2])
+                self.assertAlmostEqual(cost[t][sl], expected[sl][2])
+
+    def test_set_unavailable(self):
+        costs = compute_tutors_preferences_costs(self.tutors, {self.week: self.slots}, {})
+        # fixed courses: 'a' given by t0 and t1 on the 2 first slots, 'b' by t2 on the last one
+        items_of_tutor = {'t0': {'a'}, 't1': {'a'}, 't2': {'b'}, 'unknown': {'a'}}
+        items_of_slot = {sl: set() for sl in self.slots}
+        items_of_slot[self.slots[0]].add('a')
+        items_of_slot[self.slots[1]].add('a')
+        items_of_slot[self.slots[-1]].add('b')
+        costs.set_unavailable(items_of_tutor, items_of_slot)
+        avail, _, _ = costs.as_dicts()
+        for t in self.tutors:
+            for sl in self.slots:
+                expected = not (items_of_tutor.get(t, set()) & items_of_slot[sl])
+                self.assertEqual(avail[t][sl], int(expected))
@@ -0,0 +1,55 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+import base.models as models
+from base.timing import Day
+from people.models import User
+from roomreservation.models import RoomReservation
+from TTapp.slots import Slot
+from TTapp.helpers.room_availability import compute_room_availability
+
+
+class RoomAvailabilityTestCase(TestCase):
+
+    def setUp(self):
+        self.week = models.Week.objects.create(nb=10, year=2022)
+        self.monday = Day(day=Day.MONDAY, week=self.week)
+        self.tuesday = Day(day=Day.TUESDAY, week=self.week)
+        self.slots = [Slot(day=d, start_time=st, end_time=st + 120)
+                      for d in (self.monday, self.tuesday) for st in (8 * 60, 10 * 60, 14 * 60)]
+        self.rooms = [models.Room.objects.create(name=f"R{i}") for i in range(3)]
+        self.user = User.objects.create(username="resp")
+
+    def slot(self, day, start_time):
+        return next(sl for sl in self.slots if sl.day is day and sl.start_time == start_time)
+
+    def test_preferences_and_reservations(self):
+        models.RoomPreference.objects.create(room=self.rooms[0], week=self.week, day=Day.MONDAY,
+                                             start_time=9 * 60, duration=60, value=0)
+        # not unavailable, or in another week
+        models.RoomPreference.objects.create(room=self.rooms[0], week=self.week, day=Day.TUESDAY,
+                                             start_time=8 * 60, duration=60, value=4)
+        models.RoomPreference.objects.create(room=self.rooms[1], week=None, day=Day.MONDAY,
+                                             start_time=8 * 60, duration=600, value=0)
+        RoomReservation.objects.create(responsible=self.user, room=self.rooms[2], title="r",
+                                       date=datetime.date(2022, 3, 8),
+                                       start_time=datetime.time(11, 30), end_time=datetime.time(14, 30))
+
+        with CaptureQueriesContext(connection) as context:
+            avail_room = compute_room_availability(self.rooms, self.slots)
+        self.assertEqual(len(context.captured_queries), 2)
+
+        self.assertEqual(avail_room[self.rooms[0]][self.slot(self.monday, 8 * 60)], 0)
+        self.assertEqual(avail_room[self.rooms[0]][self.slot(self.monday, 10 * 60)], 1)
+        self.assertEqual(avail_room[self.rooms[0]][self.slot(self.tuesday, 8 * 60)], 1)
+        self.assertEqual(avail_room[self.rooms[1]][self.slot(self.monday, 8 * 60)], 1)
+        self.assertEqual(avail_room[self.rooms[2]][self.slot(self.tuesday, 10 * 60)], 0)
+        self.assertEqual(avail_room[self.rooms[2]][self.slot(self.tuesday, 14 * 60)], 0)
+        self.assertEqual(avail_room[self.rooms[2]][self.slot(self.monday, 14 * 60)], 1)
+        self.assertEqual(int(avail_room.matrix.sum()), len(self.rooms) * len(self.slots) - 3)
+
+        avail_room[self.rooms[1]][self.slot(self.monday, 8 * 60)] = 0
+        self.assertEqual(avail_room[self.rooms[1]][self.slot(self.monday, 8 * 60)], 0)
@@ -0,0 +1,54 @@
+from django.test import TestCase
+
+import base.models as models
+from base.timing import Day, Time
+from TTapp.slots import Slot, SlotIndex, DayIndex, slots_filter, days_filter
+
+
+class SlotIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.weeks = [models.Week.objects.create(nb=nb, year=2022) for nb in (10, 11)]
+        self.days = [Day(day=d, week=w) for w in self.weeks for d in (Day.MONDAY, Day.TUESDAY, Day.FRIDAY)]
+        self.slots = set(Slot(day=d, start_time=st, end_time=st + duration)
+                         for d in self.days
+                         for st in range(8 * 60, 18 * 60, 45)
+                         for duration in (60, 90))
+        self.index = SlotIndex(self.slots)
+
+    def assertSameFilter(self, **criteria):
+        self.assertEqual(slots_filter(self.index, **criteria), slots_filter(set(self.slots), **criteria))
+
+    def test_keyed_filters(self):
+        self.assertSameFilter(week=self.weeks[0])
+        self.assertSameFilter(week_in=self.weeks)
+        self.assertSameFilter(day=self.days[2], apm=Time.PM)
+        self.assertSameFilter(day_in=set(self.days[:2]), start_time=10 * 60 + 15)
+        self.assertSameFilter(week_day=Day.TUESDAY, week=self.weeks[1])
+
+    def test_interval_filters(self):
+        some_slot = next(iter(self.slots))
+        self.assertSameFilter(simultaneous_to=some_slot)
+        self.assertSameFilter(is_after=some_slot)
+        self.assertSameFilter(same=some_slot)
+        self.assertSameFilter(starts_after=9 * 60, starts_before=14 * 60)
+        self.assertSameFilter(day=self.days[0], ends_before=12 * 60, ends_after=10 * 60)
+
+    def test_days_filter(self):
+        days_index = DayIndex(self.days)
+        for criteria in (dict(week=self.weeks[0]), dict(index=4), dict(index_in=[0, 1], week_in=self.weeks[1:]),
+                         dict(day=Day.MONDAY), dict(day_in=[Day.TUESDAY, Day.FRIDAY])):
+            self.assertEqual(days_filter(days_index, **criteria), days_filter(set(self.days), **criteria))
+
+    def test_interned_days(self):
+        week = models.Week.objects.get(id=self.weeks[0].id)
+        self.assertIs(Day(Day.MONDAY, week), self.days[0])
+        self.assertIsNot(Day(Day.MONDAY, self.weeks[1]), self.days[0])
+
+    def test_slots_ids(self):
+        self.assertEqual(sorted(sl.id for sl in self.slots), list(range(len(self.slots))))
+        for sl in self.slots:
+            self.assertIs(self.index.by_id[sl.id], sl)
+        first, second = self.index.by_id[:2]
+        self.assertTrue(first.day.equals(self.days[0]))
+        self.assertLessEqual((first.start_time, first.end_time), (second.start_time, second.end_time))
@@ -0,0 +1,83 @@
+from django.test import TransactionTestCase
+
+import base.models as models
+from people.models import Tutor, TutorPreference
+from TTapp.TTModel import TTModel
+from TTapp.TTConstraints.stabilization_constraints import StabilizeTutorsCourses, StabilizeGroupsCourses
+
+
+class SpecificConstraintsUpdateTestCase(TransactionTestCase):
+    """
+    A model brought up to date by update_specific_constraints (as in the solver model sessions)
+    is the model built from scratch (building closes the old database connections, hence
+    TransactionTestCase)
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        self.department = models.Department.objects.create(name="departement_update", abbrev="dupd")
+        models.TimeGeneralSettings.objects.update_or_create(department=self.department,
+                                                            defaults={"day_start_time": 480,
+                                                                      "day_finish_time": 1080,
+                                                                      "lunch_break_start_time": 720,
+                                                                      "lunch_break_finish_time": 780,
+                                                                      "days": ["m", "tu"]})
+        self.week, _ = models.Week.objects.get_or_create(nb=10, year=2023)
+        tp = models.TrainingProgramme.objects.create(name="tp1", abbrev="tp1", department=self.department)
+        group_type = models.GroupType.objects.create(name="TD", department=self.department)
+        self.group = models.StructuralGroup.objects.create(name="g1", train_prog=tp, type=group_type, size=0,
+                                                           basic=True)
+        period = models.Period.objects.create(name="S1", department=self.department, starting_week=1,
+                                              ending_week=20)
+        module = models.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=tp, period=period)
+        course_type = models.CourseType.objects.create(name="TD", department=self.department, duration=120)
+        models.CourseStartTimeConstraint.objects.create(course_type=course_type,
+                                                        allowed_start_times=[480, 600, 840, 960])
+        room_type = models.RoomType.objects.create(name="TD", department=self.department)
+        room = models.Room.objects.create(name="R_upd")
+        room.types.add(room_type)
+        room.departments.add(self.department)
+        self.tutor = Tutor.objects.create(username="prof_upd")
+        self.tutor.departments.add(self.department)
+        TutorPreference.objects.create(tutor=self.tutor)
+        models.UserPreference.objects.create(user=self.tutor, week=None, day="m", start_time=480,
+                                             duration=600, value=8)
+        models.UserPreference.objects.create(user=self.tutor, week=None, day="tu", start_time=480,
+                                             duration=600, value=8)
+        for work_copy, day, start_time in ((1, 'm', 480), (2, 'tu', 840)):
+            course = models.Course.objects.create(type=course_type, module=module, week=self.week,
+                                                  tutor=self.tutor, room_type=room_type)
+            course.groups.add(self.group)
+            models.ScheduledCourse.objects.create(course=course, day=day, start_time=start_time,
+                                                  tutor=self.tutor, work_copy=1)
+            models.ScheduledCourse.objects.create(course=course, day='tu', start_time=start_time,
+                                                  tutor=self.tutor, work_copy=2)
+
+    def model(self):
+        return TTModel(self.department.abbrev, [self.week])
+
+    def objective(self, model):
+        """
+        Coefficients of the TT and TTinstructors variables in the objective (the numbers of the
+        variables depend on the build)
+        """
+        model.update_objective()
+        keys = {var.name: (sl.day.day, sl.start_time, c.id) for (sl, c), var in model.TT.items()}
+        keys.update({var.name: (sl.day.day, sl.start_time, c.id, i.username)
+                     for (sl, c, i), var in model.TTinstructors.items()})
+        return sorted((keys[var.name], coeff) for var, coeff in model.obj.items() if coeff and var.name in keys)
+
+    def assertUpdatedLikeFresh(self, constraint):
+        model = self.model()
+        constraint.work_copy = 2
+        constraint.save()
+        self.assertEqual(model.update_specific_constraints(), (1, 1))
+        self.assertEqual(self.objective(model), self.objective(self.model()))
+
+    def test_stabilize_tutors_courses(self):
+        constraint = StabilizeTutorsCourses.objects.create(department=self.department, weight=5, work_copy=1)
+        self.assertUpdatedLikeFresh(constraint)
+
+    def test_stabilize_groups_courses(self):
+        constraint = StabilizeGroupsCourses.objects.create(department=self.department, weight=5, work_copy=1)
+        self.assertUpdatedLikeFresh(constraint)
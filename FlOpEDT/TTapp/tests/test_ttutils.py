@@ -1,6 +1,12 @@
+from django.db import connection
 from django.test import TestCase
-from TTapp.TTUtils import basic_swap_version, basic_reassign_rooms
+from django.test.utils import CaptureQueriesContext
+from TTapp.TTUtils import basic_swap_version, basic_reassign_rooms, dependent_weeks_groups, get_conflicts, \
+    basic_duplicate_work_copy, basic_delete_all_unused_work_copies, duplicate_what_can_be_in_other_weeks, \
+    number_courses, renumber_courses_series
+from TTapp.models import StabilizationThroughWeeks, LimitTutorTimePerWeeks
 import base.models as models
+from people.models import Tutor
 
 class TTutilsTestCase(TestCase):
     @classmethod
@@ -39,4 +45,191 @@ class TTutilsTestCase(TestCase):
 
     def test_basic_reassign_rooms(self):
         basic_reassign_rooms(self.department1, self.w1, 0)
-        self.assertTrue(True)
\ No newline at end of file
+        self.assertTrue(True)
+
+
+
+class WorkCopiesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = models.Department.objects.create(name="departement1", abbrev="dept1")
+        cls.tp = models.TrainingProgramme.objects.create(name="TrainingProgramme1", abbrev="tp1",
+                                                         department=cls.department)
+        cls.gt = models.GroupType.objects.create(name="group_type_1", department=cls.department)
+        cls.groups = [models.StructuralGroup.objects.create(name=f"gp{i}", train_prog=cls.tp, type=cls.gt, size=0)
+                      for i in range(2)]
+        cls.ct = models.CourseType.objects.create(name="TD", department=cls.department)
+        cls.p = models.Period.objects.create(name="annee_complete", department=cls.department,
+                                             starting_week=0, ending_week=53)
+        cls.m = models.Module.objects.create(name="module1", abbrev="m1", train_prog=cls.tp, period=cls.p)
+        cls.weeks = [models.Week.objects.get_or_create(nb=nb, year=2019)[0] for nb in (47, 48, 49)]
+        cls.courses = {}
+        for w in cls.weeks:
+            for g in cls.groups:
+                course = models.Course.objects.create(week=w, type=cls.ct, module=cls.m)
+                course.groups.add(g)
+                cls.courses[w, g] = course
+        models.EdtVersion.objects.create(department=cls.department, week=cls.weeks[0], version=0)
+        week = cls.weeks[0]
+        for work_copy, start_time in ((0, 480), (1, 600)):
+            for g in cls.groups:
+                models.ScheduledCourse.objects.create(course=cls.courses[week, g], day=models.Day.MONDAY,
+                                                      start_time=start_time, work_copy=work_copy)
+        # week 48 already has a copy 0
+        models.ScheduledCourse.objects.create(course=cls.courses[cls.weeks[1], cls.groups[0]],
+                                              day=models.Day.FRIDAY, start_time=480, work_copy=0)
+
+    def copies(self, week):
+        return sorted(models.ScheduledCourse.objects.filter(course__week=week)
+                      .values_list('work_copy', 'course__groups__name', 'start_time'))
+
+    def test_swap_with_copy_0(self):
+        basic_swap_version(self.department, self.weeks[0], 1)
+        self.assertEqual(self.copies(self.weeks[0]), [(0, 'gp0', 600), (0, 'gp1', 600),
+                                                      (1, 'gp0', 480), (1, 'gp1', 480)])
+        self.assertEqual(models.EdtVersion.objects.get(department=self.department, week=self.weeks[0]).version, 1)
+        self.assertEqual(sorted(models.DailyVolume.objects.filter(week=self.weeks[0])
+                                .values_list('day', 'nb_courses')), [(models.Day.MONDAY, 2)])
+
+    def test_duplicate_and_delete(self):
+        result = basic_duplicate_work_copy(self.department, self.weeks[0], 1)
+        self.assertEqual(result['status'], 'Duplicated to copy #2')
+        self.assertEqual([c for c in self.copies(self.weeks[0]) if c[0] == 2], [(2, 'gp0', 600), (2, 'gp1', 600)])
+        self.assertEqual(basic_delete_all_unused_work_copies(self.department, self.weeks[0]),
+                         {'status': 'OK', 'more': ''})
+        self.assertEqual(self.copies(self.weeks[0]), [(0, 'gp0', 480), (0, 'gp1', 480)])
+
+    def test_duplicate_in_other_weeks(self):
+        result = duplicate_what_can_be_in_other_weeks(self.department, self.weeks[0], 1)
+        self.assertEqual(result['status'], 'OK')
+        self.assertEqual(result['more'], f'{self.weeks[1]}, {self.weeks[2]}, ')
+        self.assertEqual(self.copies(self.weeks[1]), [(0, 'gp0', 480), (1, 'gp0', 600), (1, 'gp1', 600)])
+        self.assertEqual(self.copies(self.weeks[2]), [(0, 'gp0', 600), (0, 'gp1', 600)])
+        self.assertEqual(sorted(models.DailyVolume.objects.filter(week=self.weeks[2])
+                                .values_list('day', 'nb_courses')), [(models.Day.MONDAY, 2)])
+
+    def test_number_courses(self):
+        # second course of gp0 in week 47, before the existing ones
+        course = models.Course.objects.create(week=self.weeks[0], type=self.ct, module=self.m)
+        course.groups.add(self.groups[0])
+        models.ScheduledCourse.objects.create(course=course, day=models.Day.MONDAY, start_time=300, work_copy=0)
+        with CaptureQueriesContext(connection) as context:
+            number_courses(self.department)
+        self.assertLessEqual(len(context.captured_queries), 8)
+
+        def numbers():
+            return sorted(models.ScheduledCourse.objects.filter(work_copy=0)
+                          .values_list('course__week__nb', 'course__groups__name', 'start_time', 'number'))
+        self.assertEqual(numbers(), [(47, 'gp0', 300, 1), (47, 'gp0', 480, 2), (47, 'gp1', 480, 1),
+                                     (48, 'gp0', 480, 3)])
+
+        # from week 48, the 2 courses of gp0 in week 47 are counted first
+        models.ScheduledCourse.objects.update(number=None)
+        number_courses(self.department, from_week=self.weeks[1])
+        self.assertEqual(numbers(), [(47, 'gp0', 300, None), (47, 'gp0', 480, None), (47, 'gp1', 480, None),
+                                     (48, 'gp0', 480, 3)])
+
+        number_courses(self.department)
+        models.ScheduledCourse.objects.filter(course=course).update(day=models.Day.TUESDAY)
+        renumber_courses_series([course])
+        self.assertEqual(numbers(), [(47, 'gp0', 300, 2), (47, 'gp0', 480, 1), (47, 'gp1', 480, 1),
+                                     (48, 'gp0', 480, 3)])
+
+    def test_number_courses_several_groups(self):
+        # a course of gp0 and gp1 is in the series of gp0, in full and group-filtered runs
+        course = models.Course.objects.create(week=self.weeks[1], type=self.ct, module=self.m)
+        course.groups.add(*self.groups)
+        sched_course = models.ScheduledCourse.objects.create(course=course, day=models.Day.MONDAY,
+                                                             start_time=600, work_copy=0)
+        gp1_sched_course = models.ScheduledCourse.objects.get(course=self.courses[self.weeks[0], self.groups[1]],
+                                                              work_copy=0)
+        number_courses(self.department)
+        sched_course.refresh_from_db()
+        gp1_sched_course.refresh_from_db()
+        self.assertEqual((sched_course.number, gp1_sched_course.number), (2, 1))
+
+        models.ScheduledCourse.objects.update(number=None)
+        number_courses(self.department, groups=[self.groups[1]])
+        sched_course.refresh_from_db()
+        gp1_sched_course.refresh_from_db()
+        self.assertEqual((sched_course.number, gp1_sched_course.number), (None, 1))
+
+        number_courses(self.department, groups=[self.groups[0]])
+        renumber_courses_series([course])
+        sched_course.refresh_from_db()
+        self.assertEqual(sched_course.number, 2)
+
+class DependentWeeksGroupsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = models.Department.objects.create(name="departement1", abbrev="dept1")
+        cls.tp = models.TrainingProgramme.objects.create(name="TrainingProgramme1", abbrev="tp1",
+                                                         department=cls.department)
+        cls.ct = models.CourseType.objects.create(name="CourseType1", department=cls.department)
+        cls.p = models.Period.objects.create(name="annee_complete", starting_week=0, ending_week=53)
+        cls.m = models.Module.objects.create(name="module1", abbrev="m1", train_prog=cls.tp, period=cls.p)
+        cls.weeks = [models.Week.objects.create(nb=nb, year=2019) for nb in range(40, 46)]
+        cls.courses = [models.Course.objects.create(week=w, type=cls.ct, module=cls.m) for w in cls.weeks]
+
+    def groups_nbs(self):
+        return [[w.nb for w in group] for group in dependent_weeks_groups(self.department, self.weeks)]
+
+    def test_independent_weeks(self):
+        self.assertEqual(self.groups_nbs(), [[nb] for nb in range(40, 46)])
+
+    def test_cross_week_constraints(self):
+        models.Dependency.objects.create(course1=self.courses[0], course2=self.courses[1])
+        stabilization = StabilizationThroughWeeks.objects.create(department=self.department)
+        stabilization.courses.set([self.courses[3], self.courses[4]])
+        self.assertEqual(self.groups_nbs(), [[40, 41], [42], [43, 44], [45]])
+        LimitTutorTimePerWeeks.objects.create(department=self.department, number_of_weeks=2)
+        self.assertEqual(self.groups_nbs(), [list(range(40, 46))])
+
+
+class ConflictsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.week, _ = models.Week.objects.get_or_create(nb=41, year=2019)
+        cls.tutor = Tutor.objects.create(username="shared")
+        cls.room_group = models.Room.objects.create(name="AB")
+        cls.rooms = [models.Room.objects.create(name=name) for name in "ABC"]
+        cls.rooms[0].subroom_of.add(cls.room_group)
+        cls.rooms[1].subroom_of.add(cls.room_group)
+        cls.modules = {}
+        for abbrev in ("dept1", "dept2"):
+            department = models.Department.objects.create(name=abbrev, abbrev=abbrev)
+            tp = models.TrainingProgramme.objects.create(name=abbrev, abbrev=abbrev, department=department)
+            period = models.Period.objects.create(name="annee", department=department,
+                                                  starting_week=0, ending_week=53)
+            cls.modules[abbrev] = models.Module.objects.create(name=abbrev, abbrev=abbrev, train_prog=tp,
+                                                               period=period)
+        cls.course_type = models.CourseType.objects.create(name="TD", duration=90)
+
+    def schedule(self, abbrev, work_copy, start_time, tutor=None, room=None, day=models.Day.MONDAY):
+        course = models.Course.objects.create(week=self.week, type=self.course_type, module=self.modules[abbrev])
+        return models.ScheduledCourse.objects.create(course=course, day=day, start_time=start_time,
+                                                     work_copy=work_copy, tutor=tutor, room=room)
+
+    def test_no_conflict(self):
+        self.schedule("dept1", 1, 480, tutor=self.tutor, room=self.rooms[0])
+        self.schedule("dept2", 0, 570, tutor=self.tutor, room=self.rooms[0])
+        self.schedule("dept2", 0, 480, tutor=self.tutor, room=self.rooms[0], day=models.Day.TUESDAY)
+        # conflicts inside a department, or with other copies, are not reported
+        self.schedule("dept1", 1, 480, tutor=self.tutor, room=self.rooms[0])
+        self.schedule("dept2", 1, 480, tutor=self.tutor, room=self.rooms[0])
+        self.assertEqual(get_conflicts("dept1", self.week, 1), {'status': 'OK'})
+
+    def test_conflicts(self):
+        mine = self.schedule("dept1", 1, 480, tutor=self.tutor, room=self.room_group)
+        tutor_conflict = self.schedule("dept2", 0, 540, tutor=self.tutor, room=self.rooms[2])
+        room_conflict = self.schedule("dept2", 0, 500, room=self.rooms[1])
+        with CaptureQueriesContext(connection) as context:
+            result = get_conflicts("dept1", self.week, 1)
+        self.assertLessEqual(len(context.captured_queries), 3)
+        self.assertEqual(result['status'], 'KO')
+        conflicts = result['conflicts']
+        self.assertEqual([(c['resource'], [sc['id'] for sc in c['courses']]) for c in conflicts['tutor']],
+                         [("shared", [mine.id, tutor_conflict.id])])
+        self.assertEqual([(c['resource'], [sc['id'] for sc in c['courses']]) for c in conflicts['room']],
+                         [("B", [mine.id, room_conflict.id])])
+        self.assertIn("shared : m. 08:00-09:30 (dept1, dept1) VS m. 09:00-10:30 (dept2, dept2)", result['more'])
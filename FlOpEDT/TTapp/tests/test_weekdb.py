@@ -1,7 +1,11 @@
 
 import base.models as models
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from base.timing import Day
+from people.models import Tutor
 from TTapp.TTModel import WeeksDatabase
 
 class WeekDBTestCase(TestCase):
@@ -13,4 +17,55 @@ class WeekDBTestCase(TestCase):
         department1 = tp1.department
         wdb = WeeksDatabase(department1, 39, 2018, [tp1])
         self.assertEqual(wdb.train_prog, [tp1])
-        # self.assertEqual(list(wdb.room_groups_for_type[self.rt1]), [self.rg1])        
\ No newline at end of file
+        # self.assertEqual(list(wdb.room_groups_for_type[self.rt1]), [self.rg1])        
+
+class WeeksDatabaseQueriesTestCase(TestCase):
+
+    def setUp(self):
+        self.department = models.Department.objects.create(name="Queries", abbrev="QRY")
+        self.train_prog = models.TrainingProgramme.objects.create(name="Queries programme", abbrev="QRY1",
+                                                                  department=self.department)
+        self.period = models.Period.objects.create(name="S1", department=self.department,
+                                                   starting_week=1, ending_week=52)
+        self.week = models.Week.objects.create(nb=12, year=2022)
+        self.course_type = models.CourseType.objects.create(name="TD", department=self.department)
+        models.CourseStartTimeConstraint.objects.create(course_type=self.course_type,
+                                                        allowed_start_times=[8 * 60, 10 * 60, 14 * 60])
+        self.room_type = models.RoomType.objects.create(name="TD room", department=self.department)
+        room = models.Room.objects.create(name="Room")
+        room.departments.add(self.department)
+        room.types.add(self.room_type)
+        self.root_group = models.StructuralGroup.objects.create(name="P", train_prog=self.train_prog, size=0)
+        self.nb = 0
+
+    def add_data(self, nb):
+        # nb more tutors, each one with a basic group, a module and some courses
+        for _ in range(nb):
+            self.nb += 1
+            tutor = Tutor.objects.create(username=f"tutor{self.nb}")
+            group = models.StructuralGroup.objects.create(name=f"G{self.nb}", train_prog=self.train_prog,
+                                                          size=0, basic=True)
+            group.parent_groups.add(self.root_group)
+            module = models.Module.objects.create(abbrev=f"M{self.nb}", train_prog=self.train_prog,
+                                                  period=self.period)
+            models.UserPreference.objects.create(user=tutor, week=None, day=Day.MONDAY,
+                                                 start_time=8 * 60, duration=4 * 60, value=8)
+            for _ in range(2):
+                course = models.Course.objects.create(type=self.course_type, room_type=self.room_type,
+                                                      tutor=tutor, module=module, week=self.week)
+                course.groups.add(group)
+                course.supp_tutor.add(tutor)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            WeeksDatabase(self.department, [self.week], [self.train_prog])
+        return len(context.captured_queries)
+
+    def test_queries_do_not_grow_with_data(self):
+        self.add_data(1)
+        # first build may register room ponderations
+        self.count_queries()
+        few = self.count_queries()
+        self.add_data(5)
+        many = self.count_queries()
+        self.assertEqual(few, many)
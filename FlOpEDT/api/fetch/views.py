@@ -28,10 +28,17 @@ from rest_framework import viewsets
 from rest_framework import exceptions
 from rest_framework.response import Response
 
+import hashlib
+
 from django.http import HttpResponse, JsonResponse
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
+from django.utils.cache import patch_cache_control
+from django.core.cache import cache
 from django.core.exceptions import MultipleObjectsReturned
 from django.db.models import Q
+from django.conf import settings
+from rest_framework import status
 
 from django.apps import apps
 
@@ -46,6 +53,60 @@ from api.shared.params import dept_param, week_param, year_param, user_param, \
     work_copy_param, group_param, train_prog_param, lineage_param, tutor_param
 from api.permissions import IsTutorOrReadOnly, IsAdminOrReadOnly
 from base.timing import flopday_to_date, Day, days_list, time_to_floptime
+from base.views import get_key_course_pl, get_key_course_pp
+from base.courses_cache import courses_version
+
+
+class CoursesCacheMixin(object):
+    """
+    Read-through cache of the list of (un)scheduled courses of a department, week and work copy.
+
+    The responses are stored under the course cache key of the view (get_key_course_pl or
+    get_key_course_pp, which are deleted on each edition), one per set of query parameters.
+    They are versioned by the version of the department and week of base.courses_cache, which the
+    signals change on every modification of the courses, so that changes made by other processes
+    (e.g. the solver) are seen. The version is also the ETag of the response, for If-None-Match requests.
+    """
+    course_cache_key = None
+
+    def courses_cache_params(self):
+        """
+        :return: department, week and work copy of the request, or None if it cannot be cached
+        """
+        params = self.request.query_params
+        try:
+            department = bm.Department.objects.get(abbrev=params['dept'])
+            week = bm.Week.objects.get(nb=params['week'], year=params['year'])
+            work_copy = int(params.get('work_copy', 0))
+        except (KeyError, ValueError, MultipleObjectsReturned, bm.Department.DoesNotExist, bm.Week.DoesNotExist):
+            return None
+        return department, week, work_copy
+
+    def list(self, request, *args, **kwargs):
+        cache_params = self.courses_cache_params()
+        if cache_params is None:
+            return super().list(request, *args, **kwargs)
+        key = self.course_cache_key(cache_params[0].abbrev, cache_params[1], cache_params[2])
+        variant = '&'.join(f'{name}={value}' for name, value in sorted(request.query_params.items()))
+        version = courses_version(cache_params[0].id, cache_params[1].id)
+        etag = '"%s"' % hashlib.sha1(f'{key}|{variant}|{version}'.encode()).hexdigest()
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            entry = cache.get(key)
+            if entry is None or entry['version'] != version:
+                entry = {'version': version, 'responses': {}}
+            if variant in entry['responses']:
+                response = Response(entry['responses'][variant])
+            else:
+                response = super().list(request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    entry['responses'][variant] = response.data
+                    cache.set(key, entry, settings.COURSES_CACHE_TIMEOUT)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
 
 class ScheduledCourseFilterSet(filters.FilterSet):
     # makes the fields required
@@ -72,16 +133,18 @@ class ScheduledCourseFilterSet(filters.FilterSet):
                           tutor_param()
                       ])
                   )
-class ScheduledCoursesViewSet(viewsets.ReadOnlyModelViewSet):
+class ScheduledCoursesViewSet(CoursesCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet to see all the scheduled courses
 
     Result can be filtered by function ScheduledCourseFilterSet
     as wanted with week, year and work_copy (0 by default).
     Request needs a department filter.
+    Responses are cached (cf. CoursesCacheMixin).
     """
     permission_classes = [IsAdminOrReadOnly]
     filter_class = ScheduledCourseFilterSet
+    course_cache_key = staticmethod(get_key_course_pl)
 
     def get_queryset(self):
         lineage = self.request.query_params.get('lineage', 'false')
@@ -195,14 +258,16 @@ class ScheduledCoursesViewSet(viewsets.ReadOnlyModelViewSet):
                           work_copy_param()
                       ])
                   )
-class UnscheduledCoursesViewSet(viewsets.ReadOnlyModelViewSet):
+class UnscheduledCoursesViewSet(CoursesCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet to see all the unscheduled courses
 
     Result can be filtered as wanted with week, year, work_copy and department fields.
+    Responses are cached (cf. CoursesCacheMixin).
     """
     permission_classes = [IsAdminOrReadOnly]
     serializer_class = serializers.UnscheduledCoursesSerializer
+    course_cache_key = staticmethod(get_key_course_pp)
 
     def get_queryset(self):
         # Creating querysets of all courses and all scheduled courses
@@ -29,10 +29,11 @@ from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
 from django.utils.decorators import method_decorator
-from django.db.models import Count, F, Sum, Q, Case, When
+from django.db.models import Count, F, Sum, Q, Case, When, Min, Value, IntegerField
+from django.db.models.functions import Coalesce
 
 from people.models import Tutor
-from base.models import ScheduledCourse, Department, TrainingProgramme, Week, Room
+from base.models import ScheduledCourse, Department, TrainingProgramme, Week, Room, DailyVolume
 
 from api.permissions import IsTutorOrReadOnly
 from api.shared.params import dept_param
@@ -296,32 +297,21 @@ class MonthlyVolumeByDayViewSet(viewsets.ViewSet):
 
         day_volumes_list = []
 
-        sched_courses = scheduled_courses_of_the_month(year=year, from_month=from_month, to_month=to_month,
-                                                       department=dept, tutor=tutor)
-        for dayschedcourse in sched_courses.distinct("course__week", "day"):
-            week = dayschedcourse.course.week
-            week_day = dayschedcourse.day
-            day_scheduled_courses = sched_courses.filter(course__week=week, day=week_day)
-            tds = day_scheduled_courses.filter(course__type__name='TD')
-            tps = day_scheduled_courses.filter(course__type__name='TP')
-            other = day_scheduled_courses.exclude(course__type__name__in=['TD', "TP"])
-
-            other = sum(sc.pay_duration for sc in other)/60
-            td = sum(sc.pay_duration for sc in tds)/60
-            tp = sum(sc.pay_duration for sc in tps)/60
-
-            date = flopday_to_date(Day(week=week, day=week_day))
-
-            day_volume = {
+        volumes = daily_volumes_of_the_month(year=year, from_month=from_month, to_month=to_month,
+                                             department=dept, tutor=tutor)
+        for day_volume in volumes_by_day(volumes).annotate(
+                td=pay_duration_sum(Q(course_type__name='TD')),
+                tp=pay_duration_sum(Q(course_type__name='TP')),
+                other=pay_duration_sum(~Q(course_type__name__in=['TD', 'TP']))):
+            date = day_date(day_volume)
+            day_volumes_list.append({
                 "month": date.month,
                 "date": date.isoformat(),
-                "other": other,
-                "td": td,
-                "tp": tp
-            }
-
-            day_volumes_list.append(day_volume)
-            day_volumes_list.sort(key=lambda x: x["date"])
+                "other": day_volume['other']/60,
+                "td": day_volume['td']/60,
+                "tp": day_volume['tp']/60
+            })
+        day_volumes_list.sort(key=lambda x: x["date"])
         serializer = DailyVolumeSerializer(day_volumes_list, many=True)
         return Response(serializer.data)
 
@@ -393,7 +383,7 @@ class MonthlyByDayDuplicatesViewSet(viewsets.ViewSet):
             }
 
             duplicates_list.append(day_duplicates)
-            duplicates_list.sort(key=lambda x: (x['tutor'], x["date"], x['time']))
+        duplicates_list.sort(key=lambda x: (x['tutor'], x["date"], x['time']))
         serializer = DuplicateSerializer(duplicates_list, many=True)
         return Response(serializer.data)
 
@@ -462,50 +452,80 @@ class RoomMonthlyVolumeByDayViewSet(viewsets.ViewSet):
 
         day_volumes_list = []
 
-        sched_courses = scheduled_courses_of_the_month(year=year, from_month=from_month, to_month=to_month,
-                                                       department=dept, room=room)
-        for dayschedcourse in sched_courses.distinct("course__week", "day"):
-            week = dayschedcourse.course.week
-            week_day = dayschedcourse.day
-            day_scheduled_courses = sched_courses.filter(course__week=week, day=week_day)
-            volume = sum(sc.pay_duration for sc in day_scheduled_courses)/60
+        volumes = daily_volumes_of_the_month(year=year, from_month=from_month, to_month=to_month,
+                                             department=dept, room=room)
+        for day_volume in volumes_by_day(volumes).annotate(volume=pay_duration_sum()):
+            day_volumes_list.append({
+                "date": day_date(day_volume).isoformat(),
+                "volume": day_volume['volume']/60,
+            })
+        day_volumes_list.sort(key=lambda x: x["date"])
+        serializer = RoomDailyVolumeSerializer(day_volumes_list, many=True)
+        return Response(serializer.data)
 
-            date = flopday_to_date(Day(week=week, day=week_day))
 
-            day_volume = {
-                "date": date.isoformat(),
-                "volume": volume,
-            }
 
-            day_volumes_list.append(day_volume)
-            day_volumes_list.sort(key=lambda x: x["date"])
-        serializer = RoomDailyVolumeSerializer(day_volumes_list, many=True)
-        return Response(serializer.data)
+def pay_duration_sum(condition=None):
+    """
+    Sum of the pay durations of the daily volumes satisfying condition (all of them if None)
+    """
+    if condition is None:
+        return Coalesce(Sum('pay_duration'), Value(0))
+    return Sum(Case(When(condition, then=F('pay_duration')), default=Value(0), output_field=IntegerField()))
+
+
+def volumes_by_day(volumes):
+    """
+    Groups the daily volumes by day, to be annotated with aggregates
+    """
+    return volumes.order_by().values('week__nb', 'week__year', 'day')
 
 
+def day_date(day_values, prefix='week'):
+    """
+    Date of a day given by the values of volumes_by_day (or of a scheduled
+    course query, with prefix='course__week')
+    """
+    return flopday_to_date(Day(week=Week(nb=day_values[f'{prefix}__nb'], year=day_values[f'{prefix}__year']),
+                               day=day_values['day']))
 
-def scheduled_courses_of_the_month(year, from_month=None, to_month=None, department=None, tutor=None, room=None):
+
+def months_bounds(year, from_month=None, to_month=None):
+    """
+    Returns the (year, week number, weekday) iso calendar of the first and of the last day of the months
+    from_month to to_month of year
+    """
     if from_month is None:
         start_month = datetime.datetime(year, 1, 1)
     else:
         start_month = datetime.datetime(year, from_month, 1)
-    start_year, start_week_nb, start_day = start_month.isocalendar()
 
-    if to_month is None:
-        end_month = datetime.datetime(year + 1, 1, 1) - datetime.timedelta(1)
-    elif to_month == 12:
+    if to_month is None or to_month == 12:
         end_month = datetime.datetime(year + 1, 1, 1) - datetime.timedelta(1)
     else:
         end_month = datetime.datetime(year, to_month+1, 1) - datetime.timedelta(1)
-    end_year, end_week_nb, end_day = end_month.isocalendar()
+    return start_month.isocalendar(), end_month.isocalendar()
+
 
-    start_week = Week.objects.get(nb=start_week_nb, year=start_year)
-    end_week = Week.objects.get(nb=end_week_nb, year=end_year)
+def weeks_between_query(start_year, start_week_nb, end_year, end_week_nb, prefix='course__week'):
+    """
+    Filter on the weeks strictly between two weeks, without fetching them
+    """
     if start_year == end_year:
-        intermediate_weeks = Week.objects.filter(year=start_year, nb__gt=start_week_nb, nb__lt=end_week_nb)
-    else:
-        intermediate_weeks = Week.objects.filter(Q(year=start_year, nb__gt=start_week_nb)
-                                                 | Q(year=end_year, nb__lt=end_week_nb))
+        return Q(**{f'{prefix}__year': start_year,
+                    f'{prefix}__nb__gt': start_week_nb,
+                    f'{prefix}__nb__lt': end_week_nb})
+    return Q(**{f'{prefix}__year': start_year, f'{prefix}__nb__gt': start_week_nb}) \
+        | Q(**{f'{prefix}__year__gt': start_year, f'{prefix}__year__lt': end_year}) \
+        | Q(**{f'{prefix}__year': end_year, f'{prefix}__nb__lt': end_week_nb})
+
+
+def scheduled_courses_of_the_month(year, from_month=None, to_month=None, department=None, tutor=None, room=None):
+    (start_year, start_week_nb, start_day), (end_year, end_week_nb, end_day) = \
+        months_bounds(year, from_month, to_month)
+    start_week = Q(course__week__nb=start_week_nb, course__week__year=start_year)
+    end_week = Q(course__week__nb=end_week_nb, course__week__year=end_year)
+
     relevant_scheduled_courses = ScheduledCourse.objects.filter(work_copy=0)
     if department is not None:
         relevant_scheduled_courses = relevant_scheduled_courses.filter(course__type__department=department)
@@ -513,25 +533,46 @@ def scheduled_courses_of_the_month(year, from_month=None, to_month=None, departm
         relevant_scheduled_courses = relevant_scheduled_courses.filter(tutor=tutor)
     if room is not None:
         relevant_scheduled_courses = relevant_scheduled_courses.filter(room__in=room.and_overrooms())
-    query = Q(course__week__in=intermediate_weeks) | \
-            Q(course__week=start_week, day__in=days_list[start_day-1:]) | \
-            Q(course__week=end_week, day__in=days_list[:end_day])
+    query = weeks_between_query(start_year, start_week_nb, end_year, end_week_nb) | \
+            start_week & Q(day__in=days_list[start_day-1:]) | \
+            end_week & Q(day__in=days_list[:end_day])
 
     relevant_scheduled_courses = \
-        relevant_scheduled_courses.filter(query).exclude(course__week=start_week, day=days_list[start_day-1],
-                                                         start_time=0)
+        relevant_scheduled_courses.filter(query).exclude(start_week, day=days_list[start_day-1], start_time=0)
     return relevant_scheduled_courses
 
 
+def daily_volumes_of_the_month(year, from_month=None, to_month=None, department=None, tutor=None, room=None):
+    """
+    Daily volumes of the public copy during the months from_month to to_month of year
+    """
+    (start_year, start_week_nb, start_day), (end_year, end_week_nb, end_day) = \
+        months_bounds(year, from_month, to_month)
+
+    relevant_volumes = DailyVolume.objects.all()
+    if department is not None:
+        relevant_volumes = relevant_volumes.filter(department=department)
+    if tutor is not None:
+        relevant_volumes = relevant_volumes.filter(tutor=tutor)
+    if room is not None:
+        relevant_volumes = relevant_volumes.filter(room__in=room.and_overrooms())
+    query = weeks_between_query(start_year, start_week_nb, end_year, end_week_nb, prefix='week') | \
+            Q(week__nb=start_week_nb, week__year=start_year, day__in=days_list[start_day-1:]) | \
+            Q(week__nb=end_week_nb, week__year=end_year, day__in=days_list[:end_day])
+    return relevant_volumes.filter(query)
+
+
 def duplicates_scheduled_courses_of_the_month(year, from_month=None, to_month=None, department=None, tutor=None):
     result_dict = {}
     sorted_scheduled_courses = scheduled_courses_of_the_month(year, from_month, to_month, department, tutor)
-    for specimen in sorted_scheduled_courses.distinct("course__week", "day", "start_time", "tutor"):
-        if specimen.tutor is not None:
-            count = sorted_scheduled_courses.filter(course__week=specimen.course.week,
-                                                    day=specimen.day,
-                                                    start_time=specimen.start_time,
-                                                    tutor=specimen.tutor).count() 
-            if count > 1:
-                result_dict[specimen.tutor, flopday_to_date(Day(week=specimen.course.week, day=specimen.day)), specimen.course.type.name, specimen.start_time] = count
-    return result_dict
\ No newline at end of file
+    duplicates = sorted_scheduled_courses.filter(tutor__isnull=False) \
+        .order_by() \
+        .values('course__week__nb', 'course__week__year', 'day', 'start_time', 'tutor') \
+        .annotate(count=Count('id'), course_type=Min('course__type__name')) \
+        .filter(count__gt=1)
+    duplicates = list(duplicates)
+    tutors = Tutor.objects.in_bulk(set(d['tutor'] for d in duplicates))
+    for d in duplicates:
+        result_dict[tutors[d['tutor']], day_date(d, prefix='course__week'), d['course_type'], d['start_time']] \
+            = d['count']
+    return result_dict
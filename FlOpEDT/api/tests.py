@@ -1,7 +1,15 @@
+import datetime
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase, APIRequestFactory
-from base.models import Department, TrainingProgramme
+from base.models import Department, TrainingProgramme, Week, Period, Module, CourseType, Course, ScheduledCourse, \
+    DailyVolume
+from base.daily_volumes import rebuild_daily_volumes, daily_volumes_suspended
+from people.models import Tutor
+from api.myflop.views import duplicates_scheduled_courses_of_the_month
 from django.utils.http import urlencode
+from django.utils import translation
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from TTapp.TTConstraints import tutors_constraints, visio_constraints
 
 
@@ -57,3 +65,164 @@ class ConstraintTest(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(len(response.json()), 3)
+
+
+class UnscheduledCoursesCacheTest(APITestCase):
+    def setUp(self):
+        self.dept = Department.objects.create(name="Informatique", abbrev="INFO")
+        self.week, _ = Week.objects.get_or_create(nb=12, year=2023)
+        train_prog = TrainingProgramme.objects.create(name="Informatique 1er année", abbrev="INFO1",
+                                                      department=self.dept)
+        period = Period.objects.create(name="S1", department=self.dept, starting_week=1, ending_week=20)
+        self.module = Module.objects.create(name="Algo", abbrev="ALGO", train_prog=train_prog, period=period)
+        self.course_type = CourseType.objects.create(name="CM", department=self.dept)
+        with translation.override('en'):
+            self.url = urlreverse('api:fetch:unscheduledcourses-list',
+                                  query_kwargs={'dept': 'INFO', 'week': 12, 'year': 2023})
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 0)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Course.objects.create(type=self.course_type, module=self.module, week=self.week)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_of_in_place_updates(self):
+        course = Course.objects.create(type=self.course_type, module=self.module, week=self.week)
+        etag = self.client.get(self.url)['ETag']
+        # the version is read from the cache, the courses are not counted
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 2)
+
+        course.tutor = Tutor.objects.create(username="prof_cache")
+        course.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['tutor'], "prof_cache")
+        etag = response['ETag']
+
+        scheduled_course = ScheduledCourse.objects.create(course=course, day='m', start_time=480, work_copy=0)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()), 0)
+        etag = response['ETag']
+
+        scheduled_course.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()), 1)
+        etag = response['ETag']
+
+        # whether the daily volumes are maintained or not
+        with daily_volumes_suspended():
+            ScheduledCourse.objects.create(course=course, day='m', start_time=480, work_copy=0)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()), 0)
+
+
+class MonthlyVolumeTest(APITestCase):
+    def setUp(self):
+        dept = Department.objects.create(name="Informatique", abbrev="INFO")
+        week, _ = Week.objects.get_or_create(nb=10, year=2023)
+        train_prog = TrainingProgramme.objects.create(name="Informatique 1er année", abbrev="INFO1",
+                                                      department=dept)
+        period = Period.objects.create(name="S2", department=dept, starting_week=1, ending_week=20)
+        module = Module.objects.create(name="Algo", abbrev="ALGO", train_prog=train_prog, period=period)
+        self.tutor = Tutor.objects.create(username="prof")
+        for type_name, pay_duration, day, start_time in [("TD", None, "m", 480), ("TP", 120, "m", 600),
+                                                          ("CM", None, "m", 840), ("CM", None, "tu", 480),
+                                                          ("CM", None, "tu", 480)]:
+            course_type, _ = CourseType.objects.get_or_create(name=type_name, department=dept,
+                                                              pay_duration=pay_duration)
+            course = Course.objects.create(type=course_type, module=module, week=week, tutor=self.tutor)
+            ScheduledCourse.objects.create(course=course, day=day, start_time=start_time, tutor=self.tutor,
+                                           work_copy=0)
+
+    def test_monthly_volume(self):
+        with translation.override('en'):
+            url = urlreverse('api:myflop:monthly_volume-list',
+                             query_kwargs={'year': 2023, 'tutor': 'prof', 'from_month': 3, 'to_month': 3})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'month': '3', 'date': '2023-03-06', 'other': 1.5, 'td': 1.5, 'tp': 2.0},
+            {'month': '3', 'date': '2023-03-07', 'other': 3.0, 'td': 0.0, 'tp': 0.0}])
+
+    def test_duplicates(self):
+        duplicates = duplicates_scheduled_courses_of_the_month(2023, 3, 3, tutor=self.tutor)
+        self.assertEqual(list(duplicates.items()), [((self.tutor, datetime.date(2023, 3, 7), "CM", 480), 2)])
+
+    def test_daily_volumes(self):
+        def volumes():
+            return sorted(DailyVolume.objects.values_list('day', 'course_type__name', 'nb_courses', 'pay_duration'))
+
+        # maintained by the signals
+        self.assertEqual(volumes(), [('m', 'CM', 1, 90), ('m', 'TD', 1, 90), ('m', 'TP', 1, 120),
+                                     ('tu', 'CM', 2, 180)])
+        sched_course = ScheduledCourse.objects.get(day='m', course__type__name='TP')
+        sched_course.day = 'tu'
+        sched_course.save()
+        ScheduledCourse.objects.filter(day='tu', course__type__name='CM').first().delete()
+        ScheduledCourse.objects.create(course=sched_course.course, day='m', start_time=480, work_copy=1)
+        expected = [('m', 'CM', 1, 90), ('m', 'TD', 1, 90), ('tu', 'CM', 1, 90), ('tu', 'TP', 1, 120)]
+        self.assertEqual(volumes(), expected)
+
+        DailyVolume.objects.all().delete()
+        rebuild_daily_volumes()
+        self.assertEqual(volumes(), expected)
+
+    def test_daily_volumes_of_course_changes(self):
+        def volumes():
+            return sorted(DailyVolume.objects.values_list('week__nb', 'day', 'course_type__name', 'pay_duration'))
+
+        td = CourseType.objects.get(name="TD")
+        td.pay_duration = 60
+        td.save()
+        self.assertIn((10, 'm', 'TD', 60), volumes())
+
+        # the volumes of the other departments are not rebuilt (and are left out of date here)
+        other_dept = Department.objects.create(name="Mesures Physiques", abbrev="MP")
+        other_type = CourseType.objects.create(name="TP MP", department=other_dept)
+        other_module = Module.objects.create(name="Optique", abbrev="OPT", period=Period.objects.first(),
+                                             train_prog=TrainingProgramme.objects.create(name="MP1", abbrev="MP1",
+                                                                                         department=other_dept))
+        ScheduledCourse.objects.create(course=Course.objects.create(type=other_type, module=other_module,
+                                                                    week=td.course_set.first().week),
+                                       day='m', start_time=480, work_copy=0)
+        DailyVolume.objects.filter(department=other_dept).delete()
+
+        course = Course.objects.get(type__name="TP")
+        course.week, _ = Week.objects.get_or_create(nb=11, year=2023)
+        course.save()
+        self.assertEqual(volumes(), [(10, 'm', 'CM', 90), (10, 'm', 'TD', 60), (10, 'tu', 'CM', 180),
+                                     (11, 'm', 'TP', 120)])
+
+        # nor are the volumes when the fields they depend on do not change
+        with CaptureQueriesContext(connection) as context:
+            course.module = other_module
+            course.save()
+        self.assertFalse(any('base_dailyvolume' in q['sql'] for q in context.captured_queries))
+
+        # a course moving to another department changes the volumes of both
+        course.week = td.course_set.first().week
+        course.type = other_type
+        course.save()
+        self.assertEqual(volumes(), [(10, 'm', 'CM', 90), (10, 'm', 'TD', 60), (10, 'm', 'TP MP', 90),
+                                     (10, 'm', 'TP MP', 90), (10, 'tu', 'CM', 180)])
+
+    def test_daily_volumes_suspended(self):
+        with CaptureQueriesContext(connection) as context:
+            with daily_volumes_suspended():
+                ScheduledCourse.objects.filter(work_copy=0).delete()
+        self.assertLess(len(context.captured_queries), 10)
+        self.assertEqual(DailyVolume.objects.count(), 4)
+        rebuild_daily_volumes()
+        self.assertEqual(DailyVolume.objects.count(), 0)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+"""
+Versions of the cached lists of (un)scheduled courses (cf. api.fetch.views.CoursesCacheMixin),
+one per department and week.
+
+The versions are stored in the django cache, so that the changes made by other processes (e.g. the
+solver) are seen, and are invalidated by the signals of base.signals on every change of a Course or
+of a ScheduledCourse. Bulk operations, that do not send the signals (or run within
+courses_cache_suspended), shall call invalidate_courses_cache on the weeks they modified.
+"""
+
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from base.models import Course
+
+
+_state = threading.local()
+
+
+@contextmanager
+def courses_cache_suspended():
+    """
+    Stops the invalidation by the ScheduledCourse signals, for bulk operations
+    followed by an invalidate_courses_cache
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def courses_cache_maintained():
+    return not getattr(_state, 'suspended', False)
+
+
+def courses_version_key(department_id, week_id):
+    return f'CV-D{department_id}-W{week_id}'
+
+
+def courses_version(department_id, week_id):
+    key = courses_version_key(department_id, week_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_courses_cache(department_id, weeks):
+    """
+    weeks being Week instances or ids
+    """
+    cache.delete_many([courses_version_key(department_id, getattr(week, 'id', week)) for week in weeks])
+
+
+def invalidate_courses_cache_of(course_ids):
+    for department_id, week_id in Course.objects.filter(id__in=course_ids) \
+            .order_by().values_list('module__train_prog__department', 'week').distinct():
+        if week_id is not None:
+            invalidate_courses_cache(department_id, [week_id])
+
+
+def courses_versions(department_ids, week_ids):
+    """
+    {(department id, week id): version}, read at once
+    """
+    keys = {courses_version_key(department_id, week_id): (department_id, week_id)
+            for department_id in department_ids for week_id in week_ids}
+    versions = cache.get_many(list(keys))
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+"""
+Maintenance of the DailyVolume table, the per-day teaching volumes of the
+public copy (work_copy 0) used by the payroll views.
+
+Single ScheduledCourse saves and deletions update it through signals
+(cf. base.signals), and so do the Course and CourseType modifications
+changing the volumes; bulk operations (solver, queryset updates) shall call
+rebuild_daily_volumes on the weeks they modified, and run their deletions
+within daily_volumes_suspended, so that the signals do not query row by row.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+
+from base.models import DailyVolume, ScheduledCourse
+
+# the DailyVolume key of a scheduled course
+key_fields = {
+    'department': F('course__type__department'),
+    'week': F('course__week'),
+    'course_type': F('course__type'),
+}
+key_names = ('day', 'department', 'week', 'tutor', 'room', 'course_type')
+
+# pay duration of a scheduled course, cf. ScheduledCourse.pay_duration
+pay_duration = Coalesce(F('course__type__pay_duration'), F('course__type__duration'))
+
+
+_state = threading.local()
+
+
+@contextmanager
+def daily_volumes_suspended():
+    """
+    Stops the maintenance of the daily volumes by the signals, for bulk
+    operations followed by a rebuild_daily_volumes
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def daily_volumes_maintained():
+    return not getattr(_state, 'suspended', False)
+
+
+def rebuild_daily_volumes(department=None, weeks=None):
+    """
+    Recomputes the daily volumes of department (all if None) during weeks
+    (all if None) from the public copy
+    """
+    volumes = DailyVolume.objects.all()
+    sched_courses = ScheduledCourse.objects.filter(work_copy=0)
+    if department is not None:
+        volumes = volumes.filter(department=department)
+        sched_courses = sched_courses.filter(course__type__department=department)
+    if weeks is not None:
+        volumes = volumes.filter(week__in=weeks)
+        sched_courses = sched_courses.filter(course__week__in=weeks)
+
+    aggregates = sched_courses.order_by().values('day', 'tutor', 'room', **key_fields) \
+        .annotate(nb_courses=Count('id'),
+                  duration=Sum('course__type__duration'),
+                  pay_duration=Sum(pay_duration))
+    with transaction.atomic():
+        volumes.delete()
+        DailyVolume.objects.bulk_create([DailyVolume(nb_courses=a['nb_courses'],
+                                                     duration=a['duration'],
+                                                     pay_duration=a['pay_duration'],
+                                                     **volume_key(a))
+                                         for a in aggregates],
+                                        batch_size=1000)
+
+
+def volume_key(values):
+    """
+    DailyVolume fields of the key given by values
+    """
+    return {('day' if k == 'day' else f'{k}_id'): values[k] for k in key_names}
+
+
+def scheduled_course_volume(sched_course_id):
+    """
+    Key and volume of a scheduled course, read from the database; None if it
+    does not exist or is not in the public copy
+    """
+    return ScheduledCourse.objects.filter(id=sched_course_id, work_copy=0) \
+        .values('day', 'tutor', 'room', **key_fields) \
+        .annotate(duration=F('course__type__duration'), pay_duration=pay_duration) \
+        .first()
+
+
+def add_volume(volume, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) the volume of a scheduled course, as
+    returned by scheduled_course_volume
+    """
+    if volume is None:
+        return
+    key = volume_key(volume)
+    row_id = DailyVolume.objects.filter(**key).values_list('id', flat=True).first()
+    if row_id is None:
+        # nothing to remove if the table was out of date
+        if sign > 0:
+            DailyVolume.objects.create(nb_courses=1,
+                                       duration=volume['duration'],
+                                       pay_duration=volume['pay_duration'],
+                                       **key)
+        return
+    row = DailyVolume.objects.filter(id=row_id)
+    row.update(nb_courses=F('nb_courses') + sign,
+               duration=F('duration') + sign * volume['duration'],
+               pay_duration=F('pay_duration') + sign * volume['pay_duration'])
+    if sign < 0:
+        row.filter(nb_courses__lte=0).delete()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.models import Department, Week
+from base.daily_volumes import rebuild_daily_volumes
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily volumes of the public copy, used by the payroll views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--department', type=str, default=None,
+                            help='department abbreviation (all departments if not given)')
+        parser.add_argument('--weeks', type=str, nargs='+', default=None,
+                            help='weeks, as nb-year (all weeks if not given)')
+
+    def handle(self, *args, **options):
+        department = None
+        if options['department'] is not None:
+            try:
+                department = Department.objects.get(abbrev=options['department'])
+            except Department.DoesNotExist:
+                raise CommandError(f"Unknown department {options['department']}")
+        weeks = None
+        if options['weeks'] is not None:
+            weeks = []
+            for w in options['weeks']:
+                nb, year = w.split('-')
+                try:
+                    weeks.append(Week.objects.get(nb=int(nb), year=int(year)))
+                except Week.DoesNotExist:
+                    raise CommandError(f"Unknown week {w}")
+
+        rebuild_daily_volumes(department, weeks)
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt the daily volumes'))
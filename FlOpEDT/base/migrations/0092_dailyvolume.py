@@ -0,0 +1,34 @@
+# Generated by Django 3.0.14 on 2026-10-18 17:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0036_notificationspreferences_notify_other_user_modifications'),
+        ('base', '0091_auto_20221124_2149'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVolume',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.CharField(choices=[('m', 'monday'), ('tu', 'tuesday'), ('w', 'wednesday'), ('th', 'thursday'), ('f', 'friday'), ('sa', 'saturday'), ('su', 'sunday')], default='m', max_length=2)),
+                ('nb_courses', models.IntegerField(default=0)),
+                ('duration', models.IntegerField(default=0)),
+                ('pay_duration', models.IntegerField(default=0)),
+                ('course_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='base.CourseType')),
+                ('department', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='base.Department')),
+                ('room', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_volumes', to='base.Room')),
+                ('tutor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_volumes', to='people.Tutor')),
+                ('week', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='base.Week')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailyvolume',
+            index=models.Index(fields=['week', 'day'], name='base_dailyv_week_id_97a656_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+"""
+Version of the data the solver models are built from, stored in the django cache.
+
+The solver model sessions (cf. solve_board.solve_queue) keep a built model until the data it
+was built from may have changed: invalidate_model_sessions is called by the signals of
+base.signals on the changes of the public copy and of the courses, and by the bulk
+operations writing the public copy.
+"""
+
+import time
+
+from django.core.cache import cache
+
+model_data_version_cache_key = 'solve_model_data_version'
+
+
+def invalidate_model_sessions():
+    """
+    Drops the model sessions of all the workers
+    """
+    cache.set(model_data_version_cache_key, time.time(), None)
+
+
+def model_data_version():
+    return cache.get(model_data_version_cache_key)
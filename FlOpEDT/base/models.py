@@ -35,6 +35,7 @@ from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 import base.weeks
+from base.room_closure import room_closure
 from base.timing import hhmm, str_slot, Day, Time, days_list, days_index
 
 slot_pause = 30
@@ -419,31 +420,37 @@ class Room(models.Model):
                                         related_name="subrooms")
     departments = models.ManyToManyField(Department)
 
+    # The closure methods read the cached room hierarchy, cf. base.room_closure
+
     @property
     def is_basic(self):
-        return self.subrooms.count() == 0
+        if self.pk is None:
+            return True
+        return not room_closure(self.pk).subrooms[self.pk]
 
     def and_subrooms(self):
-        ret = {self}
-        for sub in self.subrooms.all():
-            ret |= sub.and_subrooms()
-        return ret
+        if self.pk is None:
+            return {self}
+        closure = room_closure(self.pk)
+        return closure.to_rooms(closure.and_subroom_ids[self.pk])
 
     def basic_rooms(self):
-        s = set(r for r in self.and_subrooms() if r.is_basic)
-        return s
+        if self.pk is None:
+            return {self}
+        closure = room_closure(self.pk)
+        return closure.to_rooms(closure.basic_room_ids[self.pk])
 
     def and_overrooms(self):
-        ret = {self}
-        for over in self.subroom_of.all():
-            ret |= over.and_overrooms()
-        return ret
+        if self.pk is None:
+            return {self}
+        closure = room_closure(self.pk)
+        return closure.to_rooms(closure.and_overroom_ids[self.pk])
 
     def related_rooms(self):
-        result = set()
-        for r in self.basic_rooms():
-            result |= r.and_overrooms()
-        return result
+        if self.pk is None:
+            return {self}
+        closure = room_closure(self.pk)
+        return closure.to_rooms(closure.related_room_ids[self.pk])
 
     def __str__(self):
         return self.name
@@ -691,6 +698,34 @@ class ScheduledCourseAdditional(models.Model):
         return resp
 
 
+class DailyVolume(models.Model):
+    """
+    Teaching volume of the public copy (work_copy 0), aggregated per
+    department, day, tutor, room and course type.
+    Maintained by base.daily_volumes; several rows may share the same key,
+    readers shall sum them.
+    """
+    department = models.ForeignKey(
+        'Department', null=True, on_delete=models.CASCADE)
+    week = models.ForeignKey('Week', null=True, on_delete=models.CASCADE)
+    day = models.CharField(max_length=2, choices=Day.CHOICES, default=Day.MONDAY)
+    tutor = models.ForeignKey('people.Tutor', null=True, on_delete=models.CASCADE,
+                              related_name='daily_volumes')
+    room = models.ForeignKey('Room', null=True, on_delete=models.CASCADE,
+                             related_name='daily_volumes')
+    course_type = models.ForeignKey('CourseType', on_delete=models.CASCADE)
+    nb_courses = models.IntegerField(default=0)
+    # in minutes
+    duration = models.IntegerField(default=0)
+    pay_duration = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['week', 'day'])]
+
+    def __str__(self):
+        return f"{self.week}-{self.day}-{self.tutor_id}-{self.room_id}-{self.course_type_id}: {self.pay_duration}"
+
+
 class EnrichedLink(models.Model):
     url = models.URLField()
     description = models.CharField(max_length=100,
@@ -28,7 +28,17 @@ from base.timing import TimeInterval, Day, days_index, flopdate_to_datetime, tim
 from datetime import datetime, timedelta
 from django.db.models import Q
 from TTapp.TTConstraints.no_course_constraints import NoTutorCourseOnDay
-import copy
+from bisect import bisect_right
+
+
+def copy_data(data):
+    '''Copies the data of an interval: the containers are copied, not the objects they hold (tutors, courses...)'''
+    if isinstance(data, dict):
+        return {key: copy_data(value) for key, value in data.items()}
+    if isinstance(data, (list, set)):
+        return type(data)(copy_data(value) for value in data)
+    return data
+
 
 class Partition(object):
     '''Partition class to analyse data related by time'''
@@ -42,34 +52,84 @@ class Partition(object):
             day_start_time (int) [Optionnal]: the starting time in minutes of the schedule time each day
             day_end_time (int) [Optionnal]: the ending time in minutes of the schedule time each day
             
-        If one of the optionnal parameters is missing no day time will be set.'''
-        self.intervals = []
+        If one of the optionnal parameters is missing no day time will be set.
+
+        The intervals are kept sorted, with the list of their starts to find them by bisection. When an interval
+        is split, both parts share its data until one of them is modified (copy on write).'''
+        self._intervals = []
+        self._starts = []
+        # ids of the data dicts that may be held by several intervals
+        self._shared = set()
         self.type = type
         self.weekend =[]
         self.tutor_supp = False # TODO : explain
         self.day_start_time = day_start_time
         self.day_end_time = day_end_time
-        self.intervals.append(
+        self._intervals.append(
             (TimeInterval(date_start, date_end),
                 {"available" : available, "forbidden" : False}))
+        self._starts.append(self._intervals[0][0].start)
         if day_start_time and day_end_time:
             self.add_night_time(day_start_time, day_end_time)
 
+    @property
+    def intervals(self):
+        '''The list of (TimeInterval, data) tuples of the partition, sorted in chronological order.
+        Their TimeInterval and data may be modified by the caller.'''
+        self._unshare()
+        # the starts of the intervals may be modified by the caller
+        self._starts = None
+        return self._intervals
+
+    def _unshare(self):
+        '''Gives its own data to each interval'''
+        if self._shared:
+            for i, (interval, data) in enumerate(self._intervals):
+                if id(data) in self._shared:
+                    self._intervals[i] = (interval, copy_data(data))
+            self._shared.clear()
+
+    def _own_data(self, interval_index):
+        '''Returns the data of an interval, copied first if it is shared with another interval'''
+        interval, data = self._intervals[interval_index]
+        if id(data) in self._shared:
+            data = copy_data(data)
+            self._intervals[interval_index] = (interval, data)
+        return data
+
+    def _index_at(self, date):
+        '''Returns the index of the interval containing date'''
+        if self._starts is None:
+            self._starts = [interval.start for interval, _ in self._intervals]
+        return max(bisect_right(self._starts, date) - 1, 0)
+
+    def _split(self, interval_index, date):
+        '''Splits an interval at date, both parts sharing the same data
+
+        Returns:
+            (int): the index of the part beginning at date'''
+        interval, data = self._intervals[interval_index]
+        self._shared.add(id(data))
+        self._intervals.insert(interval_index + 1, (TimeInterval(date, interval.end), data))
+        self._starts.insert(interval_index + 1, date)
+        interval.end = date
+        return interval_index + 1
+
     @property
     def nb_intervals(self):
         '''The number of intervals of time the partition contains'''
-        return len(self.intervals)
+        return len(self._intervals)
 
     @property
     def duration(self):
         '''The amount of minutes between the begining of the partition and the end'''
-        return abs(self.intervals[len(self.intervals)-1][0].end - self.intervals[0][0].start).total_seconds()//60
+        return abs(self._intervals[-1][0].end - self._intervals[0][0].start).total_seconds()//60
 
     @property
     def available_duration(self):
         '''The number of minutes available (and not forbidden) in the partition'''
         avail_duration = 0
-        for interval in self.intervals:
+        for interval in self._intervals:
             if interval[1]["available"] and not interval[1]["forbidden"]:
                 avail_duration += interval[0].duration
         return avail_duration
@@ -78,7 +138,7 @@ class Partition(object):
     def not_forbidden_duration(self):
         '''The number of minutes not forbidden (available or not) in the partition'''
         not_forbid = 0
-        for interval in self.intervals:
+        for interval in self._intervals:
             if not interval[1]["forbidden"]:
                 not_forbid += interval[0].duration
         return not_forbid
@@ -96,10 +156,10 @@ class Partition(object):
         return self.weekend
 
     def __str__(self):
-        return_string = f"Partition starts at {self.intervals[0][0].start} and ends at {self.intervals[self.nb_intervals-1][0].end}\n"
+        return_string = f"Partition starts at {self._intervals[0][0].start} and ends at {self._intervals[self.nb_intervals-1][0].end}\n"
         return_string += f"It contains {self.available_duration} available minutes.\n"
         return_string += f"The intervals are :\n"
-        for interval in self.intervals:
+        for interval in self._intervals:
             return_string += f"{interval[0]}, {interval[1]}\n"
         return_string += "end."
         return return_string
@@ -111,13 +171,13 @@ class Partition(object):
         Parameters:
             start_time (int): the starting time in minutes from midnight of the lunch_break
             end_time (int): the ending time in minutes from midnight of the lunch_break'''
-        day = self.intervals[0][0].start
+        day = self._intervals[0][0].start
         end_hours = end_time//60
         end_minutes = end_time%60
         start_hours = start_time//60
         start_minutes = start_time%60
 
-        while day < self.intervals[len(self.intervals)-1][0].end:
+        while day < self._intervals[len(self._intervals)-1][0].end:
             self.add_slot(
                 TimeInterval(
                     datetime(day.year, day.month, day.day, start_hours, start_minutes, 0),
@@ -125,7 +185,7 @@ class Partition(object):
                 ), "lunch_break",
                 {"forbidden" : True, "lunch_break": True})
             day = day + timedelta(days = 1)
-        if self.intervals[0][0].start > self.intervals[len(self.intervals)-1][0].end:
+        if self._intervals[0][0].start > self._intervals[len(self._intervals)-1][0].end:
             self.add_slot(
                 TimeInterval(
                     datetime(day.year, day.month, day.day, start_hours, start_minutes, 0),
@@ -153,10 +213,10 @@ class Partition(object):
         if weekend_indexes[len(weekend_indexes)-1] - weekend_indexes[0] >= len(weekend_indexes):
             return False
         
-        day = self.intervals[0][0].start
+        day = self._intervals[0][0].start
         number_of_day_week_end = weekend_indexes[len(weekend_indexes)-1]-weekend_indexes[0]
-        #Manque le dernier jour si self.intervals[0][0].start > self.intervals[len(self.intervals)-1][0].end
-        while day < self.intervals[len(self.intervals)-1][0].end:
+        #Manque le dernier jour si self._intervals[0][0].start > self._intervals[len(self._intervals)-1][0].end
+        while day < self._intervals[len(self._intervals)-1][0].end:
             if day.weekday() == weekend_indexes[0]:
                 self.add_slot(
                     TimeInterval(
@@ -189,18 +249,18 @@ class Partition(object):
         else:
             day_end_time = self.day_end_time
 
-        day = self.intervals[0][0].start
+        day = self._intervals[0][0].start
         end_hours = day_end_time//60
         end_minutes = day_end_time%60
         start_hours = day_start_time//60
         start_minutes = day_start_time%60
-        if self.intervals[0][0].start.hour < start_hours or (self.intervals[0][0].start.hour == start_hours
-                                                            and self.intervals[0][0].start.minute < start_minutes):
+        if self._intervals[0][0].start.hour < start_hours or (self._intervals[0][0].start.hour == start_hours
+                                                            and self._intervals[0][0].start.minute < start_minutes):
             self.add_slot(TimeInterval(
                 datetime(day.year, day.month, day.day, 0, 0, 0),
                 datetime(day.year, day.month, day.day, start_hours, start_minutes)
                 ), "night_time", {"forbidden" : True, "night_time" : True})
-        while day < self.intervals[len(self.intervals)-1][0].end:
+        while day < self._intervals[len(self._intervals)-1][0].end:
             self.add_slot(
                 TimeInterval(
                     datetime(day.year, day.month, day.day, end_hours, end_minutes, 0),
@@ -222,7 +282,7 @@ class Partition(object):
 
         current_duration = 0
         nb_slots = 0
-        for interval in self.intervals:
+        for interval in self._intervals:
             if interval[1]["available"] and not interval[1]["forbidden"]:
                 current_duration += interval[0].duration
             else:
@@ -248,7 +308,7 @@ class Partition(object):
         slot_duration = 0
         nb_slots = 0
             
-        for interval in self.intervals:
+        for interval in self._intervals:
             
             # For each start time we look for a slot
                 
@@ -310,7 +370,7 @@ class Partition(object):
             (int): the number of times it founds a non forbidden slot time of minimum duration"""
         current_duration = 0
         nb_slots = 0
-        for interval in self.intervals:
+        for interval in self._intervals:
             if not interval[1]["forbidden"]:
                 current_duration += interval[0].duration
             else:
@@ -336,7 +396,7 @@ class Partition(object):
         slot_duration = 0
         nb_slots = 0
             
-        for interval in self.intervals:
+        for interval in self._intervals:
             
             # For each start time we look for a slot
                 
@@ -388,15 +448,14 @@ class Partition(object):
     
     def clear_merge(self):
         '''Checks if several consecutive interval have the same data and if so merge them'''
-        length = len(self.intervals)-1
-        i = 0
-        while i < length:
-            if self.intervals[i][1] == self.intervals[i+1][1]:
-                self.intervals[i][0].end = self.intervals[i+1][0].end
-                self.intervals.remove(self.intervals[i+1])
-                length-=1
+        merged = self._intervals[:1]
+        for interval in self._intervals[1:]:
+            if interval[1] == merged[-1][1]:
+                merged[-1][0].end = interval[0].end
             else:
-                i+=1
+                merged.append(interval)
+        self._intervals = merged
+        self._starts = None
 
     def add_partition(self, other):
         """Add all intervals from the other partition to the self one"""
@@ -423,13 +482,13 @@ class Partition(object):
         start = None
         i = 0
         intervalle = None
-        while i < len(self.intervals) and intervalle == None:
-            if key in self.intervals[i][1]:
-                start = self.intervals[i][0].start
-                while i < len(self.intervals) and key in self.intervals[i][1]:
+        while i < len(self._intervals) and intervalle == None:
+            if key in self._intervals[i][1]:
+                start = self._intervals[i][0].start
+                while i < len(self._intervals) and key in self._intervals[i][1]:
                     i+=1
-                if start + timedelta(hours = duration//60, minutes=duration%60) <= self.intervals[i][0].start: 
-                    intervalle = TimeInterval(start, self.intervals[i][0].start)
+                if start + timedelta(hours = duration//60, minutes=duration%60) <= self._intervals[i][0].start: 
+                    intervalle = TimeInterval(start, self._intervals[i][0].start)
             i+=1
         return intervalle
 
@@ -445,15 +504,15 @@ class Partition(object):
         start = None
         i = 0
         result = []
-        while i < len(self.intervals):
-            if key in self.intervals[i][1] and self.intervals[i][1]["available"] and not self.intervals[i][1]["forbidden"]:
+        while i < len(self._intervals):
+            if key in self._intervals[i][1] and self._intervals[i][1]["available"] and not self._intervals[i][1]["forbidden"]:
                 current_duration = 0
-                start = self.intervals[i][0].start
-                while i < len(self.intervals) and key in self.intervals[i][1] and self.intervals[i][1]["available"] and not self.intervals[i][1]["forbidden"]:
-                    current_duration+=self.intervals[i][0].duration
+                start = self._intervals[i][0].start
+                while i < len(self._intervals) and key in self._intervals[i][1] and self._intervals[i][1]["available"] and not self._intervals[i][1]["forbidden"]:
+                    current_duration+=self._intervals[i][0].duration
                     i+=1
                 if (duration == None or current_duration > duration):
-                    result.append(TimeInterval(start, self.intervals[i-1][0].end))
+                    result.append(TimeInterval(start, self._intervals[i-1][0].end))
             i+=1
         return result
 
@@ -470,24 +529,24 @@ class Partition(object):
         start = None
         i = 0
         result = []
-        while i < len(self.intervals):
-            if key in self.intervals[i][1] and self.intervals[i][1]["available"] and not self.intervals[i][1]["forbidden"]:
+        while i < len(self._intervals):
+            if key in self._intervals[i][1] and self._intervals[i][1]["available"] and not self._intervals[i][1]["forbidden"]:
                 for st in start_times:
-                    if time_to_floptime(self.intervals[i][0].start.time()) <= st and time_to_floptime(self.intervals[i][0].end.time()) > st:
-                        dif = st - time_to_floptime(self.intervals[i][0].start.time())
-                        datetime_start = self.intervals[i][0].start + timedelta(hours = dif/60)
+                    if time_to_floptime(self._intervals[i][0].start.time()) <= st and time_to_floptime(self._intervals[i][0].end.time()) > st:
+                        dif = st - time_to_floptime(self._intervals[i][0].start.time())
+                        datetime_start = self._intervals[i][0].start + timedelta(hours = dif/60)
                         start = st
                         break
                 else:
                     i+=1
                     continue
-                current_duration = self.intervals[i][0].duration - (start - time_to_floptime(self.intervals[i][0].start.time()))
+                current_duration = self._intervals[i][0].duration - (start - time_to_floptime(self._intervals[i][0].start.time()))
                 i+=1
-                while i < len(self.intervals) and key in self.intervals[i][1] and self.intervals[i][1]["available"] and not self.intervals[i][1]["forbidden"]:
-                    current_duration+=self.intervals[i][0].duration
+                while i < len(self._intervals) and key in self._intervals[i][1] and self._intervals[i][1]["available"] and not self._intervals[i][1]["forbidden"]:
+                    current_duration+=self._intervals[i][0].duration
                     i+=1
                 if (duration == None or current_duration >= duration):
-                    result.append(TimeInterval(datetime_start, self.intervals[i-1][0].end))
+                    result.append(TimeInterval(datetime_start, self._intervals[i-1][0].end))
                 start = None
             i+=1
         return result
@@ -505,28 +564,28 @@ class Partition(object):
         start = None
         i = 0
         result = []
-        while i < len(self.intervals):
-            if self.intervals[i][1]["available"] and not self.intervals[i][1][
+        while i < len(self._intervals):
+            if self._intervals[i][1]["available"] and not self._intervals[i][1][
                 "forbidden"]:
                 for st in start_times:
-                    if time_to_floptime(self.intervals[i][0].start.time()) <= st and time_to_floptime(
-                            self.intervals[i][0].end.time()) > st:
-                        dif = st - time_to_floptime(self.intervals[i][0].start.time())
-                        datetime_start = self.intervals[i][0].start + timedelta(hours=dif / 60)
+                    if time_to_floptime(self._intervals[i][0].start.time()) <= st and time_to_floptime(
+                            self._intervals[i][0].end.time()) > st:
+                        dif = st - time_to_floptime(self._intervals[i][0].start.time())
+                        datetime_start = self._intervals[i][0].start + timedelta(hours=dif / 60)
                         start = st
                         break
                 else:
                     i += 1
                     continue
-                current_duration = self.intervals[i][0].duration - (
-                            start - time_to_floptime(self.intervals[i][0].start.time()))
+                current_duration = self._intervals[i][0].duration - (
+                            start - time_to_floptime(self._intervals[i][0].start.time()))
                 i += 1
-                while i < len(self.intervals) and self.intervals[i][1][
-                    "available"] and not self.intervals[i][1]["forbidden"]:
-                    current_duration += self.intervals[i][0].duration
+                while i < len(self._intervals) and self._intervals[i][1][
+                    "available"] and not self._intervals[i][1]["forbidden"]:
+                    current_duration += self._intervals[i][0].duration
                     i += 1
                 if (duration == None or current_duration >= duration):
-                    result.append(TimeInterval(datetime_start, self.intervals[i - 1][0].end))
+                    result.append(TimeInterval(datetime_start, self._intervals[i - 1][0].end))
                 start = None
             i += 1
         return result
@@ -534,7 +593,7 @@ class Partition(object):
 
     def add_slot(self, interval, data_type, data):
         """Add an interval of time with data related to it to the Partition.
-        Linear complexity on the size of self.
+        Logarithmic complexity on the size of self to find the interval, plus the intervals it covers.
         
         Parameters:
             interval (TimeInterval) : The interval of time we are going to add
@@ -554,53 +613,23 @@ class Partition(object):
             - "scheduled_course" : with key "forbidden"
             - "holiday" : with key "forbidden"
             - "all" : with any key in it """
-        i = 0
         #Check if we are in the interval range
-        if (interval.start >= self.intervals[len(self.intervals)-1][0].end
-                or interval.end <= self.intervals[0][0].start):
+        if (interval.start >= self._intervals[-1][0].end
+                or interval.end <= self._intervals[0][0].start):
             return False
-
-        while self.intervals[i][0].end <= interval.start:
+        start = max(interval.start, self._intervals[0][0].start)
+        end = min(interval.end, self._intervals[-1][0].end)
+        if start == end:
+            return True
+
+        i = self._index_at(start)
+        if self._intervals[i][0].start < start:
+            i = self._split(i, start)
+        while i < len(self._intervals) and self._intervals[i][0].start < end:
+            if self._intervals[i][0].end > end:
+                self._split(i, end)
+            self.add_data(data_type, copy_data(data), i)
             i += 1
-        while i < len(self.intervals) and interval.end > self.intervals[i][0].start:
-            if(interval.start == self.intervals[i][0].end):
-                i+=1
-            if i == 0 and self.intervals[i][0].start > interval.start:
-                interval.start = self.intervals[i][0].start
-            if i == len(self.intervals)-1 and self.intervals[i][0].end < interval.end:
-                interval.end = self.intervals[i][0].end
-            #IF WE ALREADY HAVE THE SAME INTERVAL WE APPEND THE DATA
-            if self.intervals[i][0] == interval:
-                self.add_data(data_type, copy.deepcopy(data), i)
-                i += 1
-            #IF WE ARE INSIDE AN EXISTING INTERVAL
-            elif self.intervals[i][0].start <= interval.start and self.intervals[i][0].end >= interval.end:
-                new_part = 1
-                if self.intervals[i][0].end != interval.end:
-                    self.intervals.insert(i+1, (TimeInterval(interval.end, self.intervals[i][0].end),
-                                                            copy.deepcopy(self.intervals[i][1])))
-                    self.intervals[i][0].end = interval.end
-                if self.intervals[i][0].start != interval.start:
-                    self.intervals[i][0].end = interval.start
-                    self.intervals.insert(i+1, (TimeInterval(interval.start, interval.end), copy.deepcopy(self.intervals[i][1])))
-                    self.add_data(data_type, copy.deepcopy(data), i+1)
-                    new_part += 1
-                else:
-                    self.add_data(data_type, copy.deepcopy(data), i)
-                i += new_part
-            #ELSE WE ARE IN BETWEEN TWO OR MORE INTERVALS
-            else:
-                #The TimeInterval at the index i is inside our new TimeInterval
-                if self.intervals[i][0].start == interval.start:
-                    self.add_data(data_type, copy.deepcopy(data), i)
-                    interval.start = self.intervals[i+1][0].start
-                #Our new TimeInterval is cut by the ones at the index i and i+1
-                elif self.intervals[i][0].end > interval.start:
-                    self.intervals[i][0].end = interval.start
-                    self.intervals.insert(i+1, (TimeInterval(interval.start, self.intervals[i+1][0].start), copy.deepcopy(self.intervals[i][1])))
-                    self.add_data(data_type, copy.deepcopy(data), i+1)
-                    i += 2
-                    interval.start = self.intervals[i][0].start
         return True
 
     def add_data(self, data_type, data, interval_index):
@@ -615,41 +644,42 @@ class Partition(object):
         Returns:
             (None)
         Internal method not to be called by user'''
+        interval_data = self._own_data(interval_index)
         if "available" in data:
-            self.intervals[interval_index][1]["available"] = self.intervals[interval_index][1]["available"] or data["available"]
+            interval_data["available"] = interval_data["available"] or data["available"]
         if "forbidden" in data:
-            self.intervals[interval_index][1]["forbidden"] = self.intervals[interval_index][1]["forbidden"] or data["forbidden"]
-        if not data_type in self.intervals[interval_index][1] and data_type != "all" and data_type != 'scheduled_course':
-            self.intervals[interval_index][1][data_type] = dict()
+            interval_data["forbidden"] = interval_data["forbidden"] or data["forbidden"]
+        if not data_type in interval_data and data_type != "all" and data_type != 'scheduled_course':
+            interval_data[data_type] = dict()
         if data_type == "user_preference":
-            self.intervals[interval_index][1][data_type][data["tutor"]] = data["value"]
+            interval_data[data_type][data["tutor"]] = data["value"]
         elif data_type == "night_time" or data_type == "lunch_break" or data_type == "week_end":
-            self.intervals[interval_index][1][data_type] = data[data_type]
+            interval_data[data_type] = data[data_type]
         elif data_type == "no_course_tutor":
-            if "period" in self.intervals[interval_index][1][data_type]:
+            if "period" in interval_data[data_type]:
                 for p in data[data_type]["period"]:
-                    self.intervals[interval_index][1][data_type]["period"].add(p)
+                    interval_data[data_type]["period"].add(p)
             else:
-                self.intervals[interval_index][1][data_type]["period"] = data[data_type]["period"]
-            if "tutors" in self.intervals[interval_index][1][data_type]:
+                interval_data[data_type]["period"] = data[data_type]["period"]
+            if "tutors" in interval_data[data_type]:
                 for t in data[data_type]["tutors"]:
-                    self.intervals[interval_index][1][data_type]["tutors"].add(t)
+                    interval_data[data_type]["tutors"].add(t)
             else:
-                self.intervals[interval_index][1][data_type]["tutors"] = data[data_type]["tutors"]
+                interval_data[data_type]["tutors"] = data[data_type]["tutors"]
 
-            if "tutor_status" in self.intervals[interval_index][1][data_type]:
+            if "tutor_status" in interval_data[data_type]:
                 for ts in data[data_type]["tutor_status"]:
-                    self.intervals[interval_index][1][data_type]["tutor_status"].add(ts)
+                    interval_data[data_type]["tutor_status"].add(ts)
             else:
-                self.intervals[interval_index][1][data_type]["tutor_status"] = data[data_type]["tutor_status"]
+                interval_data[data_type]["tutor_status"] = data[data_type]["tutor_status"]
         elif data_type == 'scheduled_course':
-            if not data_type in self.intervals[interval_index][1]:
-                self.intervals[interval_index][1][data_type] = [data[data_type]]
-            self.intervals[interval_index][1][data_type].append(data[data_type])
+            if not data_type in interval_data:
+                interval_data[data_type] = [data[data_type]]
+            interval_data[data_type].append(data[data_type])
         elif data_type == "all":
             for key, value in data.items():
                 if key != "available" and key != "forbidden":
-                    self.intervals[interval_index][1][key] = value
+                    interval_data[key] = value
 
     @staticmethod
     def get_partition_of_week(week, department, with_day_time = False, available = False):
@@ -674,7 +704,8 @@ class Partition(object):
             considered_week_partition.add_night_time(time_settings.day_start_time, time_settings.day_finish_time)
         return considered_week_partition
 
-    def add_scheduled_courses_to_partition(self, week, department, tutor = None, forbidden = False):
+    def add_scheduled_courses_to_partition(self, week, department, tutor = None, forbidden = False,
+                                           other_departments_sched_courses = None):
         """Add all scheduled courses of other department to the partition.
         Complexity on O(s*i) s being the number of scheduled courses and i being the number of interval inside the partition.
         
@@ -683,10 +714,13 @@ class Partition(object):
             department (Department): the department from which we don't want any courses
             tutor (Tutor) [Optionnal]: the tutor teaching the scheduled courses, if None takes all scheduled courses
             forbidden (boolean) [Optionnal]: whether we want to consider all intervals as being forbidden or not
+            other_departments_sched_courses (list(ScheduledCourse)) [Optionnal]: these scheduled courses, if already
+                loaded (e.g. by a pre-analysis snapshot)
             
         Returns:
             (None)"""
-        other_departments_sched_courses = self.get_other_department_scheduled_courses(week, department, tutor)
+        if other_departments_sched_courses is None:
+            other_departments_sched_courses = self.get_other_department_scheduled_courses(week, department, tutor)
         for sc_course in other_departments_sched_courses:
             data = {"scheduled_course" : sc_course}
             if forbidden:
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+"""
+In-process index of the room hierarchy (subroom_of), answering the Room
+closure methods without queries.
+
+The index is built with two queries on first use, and dropped by
+invalidate_room_closure, that the signals of base.signals call on every
+change of a Room or of the subroom_of relation. Other processes notice the
+change through a version number stored in the django cache, which room_closure
+reads at most once per check_interval seconds (and not on every call, which
+happen in the solver loops), and check_room_closure_version once per model
+build.
+"""
+
+import time
+import uuid
+
+from django.apps import apps
+from django.core.cache import cache
+
+version_cache_key = 'room_closure_version'
+
+# seconds during which the version read from the cache is trusted
+check_interval = 5
+
+
+class RoomClosure(object):
+    """
+    Closures of the subroom_of relation, as sets of room ids
+    """
+    def __init__(self):
+        Room = apps.get_model('base', 'Room')
+        self.model = Room
+        self.db = Room.objects.db
+        self.field_names = [f.attname for f in Room._meta.concrete_fields]
+        # the field values only: every caller gets its own instances
+        self.rooms = {values[0]: values[1:] for values in Room.objects.values_list('pk', *self.field_names)}
+        self.subrooms = {room_id: set() for room_id in self.rooms}
+        self.overrooms = {room_id: set() for room_id in self.rooms}
+        for subroom_id, room_id in Room.subroom_of.through.objects.values_list('from_room_id', 'to_room_id'):
+            self.subrooms[room_id].add(subroom_id)
+            self.overrooms[subroom_id].add(room_id)
+        self.and_subroom_ids = {}
+        self.and_overroom_ids = {}
+        for room_id in self.rooms:
+            self.closure(room_id, self.subrooms, self.and_subroom_ids)
+            self.closure(room_id, self.overrooms, self.and_overroom_ids)
+        self.basic_room_ids = {room_id: frozenset(r for r in self.and_subroom_ids[room_id] if not self.subrooms[r])
+                               for room_id in self.rooms}
+        self.related_room_ids = {room_id: frozenset().union(*(self.and_overroom_ids[r]
+                                                             for r in self.basic_room_ids[room_id]))
+                                 for room_id in self.rooms}
+
+    @staticmethod
+    def closure(room_id, successors, result):
+        """
+        Reflexive transitive closure of successors from room_id, memoized in result
+        """
+        if room_id not in result:
+            ids = {room_id}
+            to_visit = [room_id]
+            while to_visit:
+                for successor in successors[to_visit.pop()]:
+                    if successor in result:
+                        ids |= result[successor]
+                    elif successor not in ids:
+                        ids.add(successor)
+                        to_visit.append(successor)
+            result[room_id] = frozenset(ids)
+        return result[room_id]
+
+    def __contains__(self, room_id):
+        return room_id in self.rooms
+
+    def to_room(self, room_id):
+        """
+        New Room instance of room_id
+        """
+        return self.model.from_db(self.db, self.field_names, self.rooms[room_id])
+
+    def to_rooms(self, room_ids):
+        return {self.to_room(room_id) for room_id in room_ids}
+
+
+_closure = None
+_closure_version = None
+_checked_at = None
+
+
+def room_closure(room_id=None):
+    """
+    Returns the up-to-date RoomClosure, rebuilt if it does not know room_id
+    """
+    global _closure, _closure_version
+    if _checked_at is None or time.monotonic() - _checked_at > check_interval:
+        check_room_closure_version()
+    if _closure is None or (room_id is not None and room_id not in _closure):
+        version = cache.get(version_cache_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.set(version_cache_key, version, None)
+        _closure = RoomClosure()
+        _closure_version = version
+    return _closure
+
+
+def check_room_closure_version():
+    """
+    Drops the RoomClosure if another process changed the room hierarchy
+    """
+    global _closure, _checked_at
+    if _closure is not None and cache.get(version_cache_key) != _closure_version:
+        _closure = None
+    _checked_at = time.monotonic()
+
+
+def invalidate_room_closure():
+    global _closure
+    _closure = None
+    cache.set(version_cache_key, uuid.uuid4().hex, None)
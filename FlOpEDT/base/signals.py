@@ -23,13 +23,157 @@
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
 
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
 from people.models import User
+from base.models import ScheduledCourse, Room, Course, CourseType, Module
 from base.preferences import split_preferences
+from base.daily_volumes import scheduled_course_volume, add_volume, daily_volumes_maintained, \
+    rebuild_daily_volumes
+from base.room_closure import invalidate_room_closure
+from base.courses_cache import invalidate_courses_cache, invalidate_courses_cache_of, courses_cache_maintained
+from base.model_data import invalidate_model_sessions
 
 @receiver(m2m_changed, sender=User.departments.through)
 def user_department_changed(sender, **kwargs):
     if kwargs['action'] == 'post_add':
         split_preferences(kwargs['instance'])
+
+
+# DailyVolume maintenance, cf. base.daily_volumes, and invalidation of the solver model sessions
+# when the public copy changes, cf. solve_board.solve_queue
+# (the work copies are exchanged by basic_swap_version, that rebuilds the volumes)
+
+@receiver(pre_save, sender=ScheduledCourse)
+def scheduled_course_pre_save(sender, instance, **kwargs):
+    # volume counted before the modification, if any
+    instance._previous_volume = None
+    if instance.pk is not None and instance.work_copy == 0 and daily_volumes_maintained():
+        instance._previous_volume = scheduled_course_volume(instance.pk)
+
+
+@receiver(post_save, sender=ScheduledCourse)
+def scheduled_course_saved(sender, instance, **kwargs):
+    if instance.work_copy != 0 or not daily_volumes_maintained():
+        return
+    add_volume(getattr(instance, '_previous_volume', None), -1)
+    add_volume(scheduled_course_volume(instance.pk))
+    instance._previous_volume = None
+    invalidate_model_sessions()
+
+
+@receiver(pre_delete, sender=ScheduledCourse)
+def scheduled_course_pre_delete(sender, instance, **kwargs):
+    # deleted instances come from the database, no need to query other copies
+    instance._previous_volume = None
+    if instance.work_copy == 0 and daily_volumes_maintained():
+        instance._previous_volume = scheduled_course_volume(instance.pk)
+
+
+@receiver(post_delete, sender=ScheduledCourse)
+def scheduled_course_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_previous_volume', None) is not None:
+        add_volume(instance._previous_volume, -1)
+        invalidate_model_sessions()
+
+
+# fields of Course and CourseType the solver models depend on, and among them the ones the volumes depend on
+course_model_fields = ('week_id', 'type_id', 'module_id', 'tutor_id')
+course_volume_fields = ('week_id', 'type_id')
+course_type_volume_fields = ('department_id', 'duration', 'pay_duration')
+
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=CourseType)
+def course_or_type_pre_save(sender, instance, **kwargs):
+    # previous values of the fields, followed by the previous department
+    instance._previous_volume_fields = None
+    if instance.pk is not None and daily_volumes_maintained():
+        if sender is Course:
+            fields = course_model_fields + ('type__department',)
+        else:
+            fields = course_type_volume_fields + ('department',)
+        instance._previous_volume_fields = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+def changed_fields(instance, previous, fields):
+    return {f for f, value in zip(fields, previous) if getattr(instance, f) != value}
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_volume_fields', None)
+    instance._previous_volume_fields = None
+    if previous is None:
+        return
+    changed = changed_fields(instance, previous, course_model_fields)
+    if not changed:
+        return
+    invalidate_model_sessions()
+    if changed.isdisjoint(course_volume_fields) \
+            or not ScheduledCourse.objects.filter(course=instance, work_copy=0).exists():
+        return
+    weeks = {previous[0], instance.week_id} - {None}
+    for department in {previous[-1], instance.type.department_id}:
+        rebuild_daily_volumes(department=department, weeks=weeks)
+
+
+@receiver(post_save, sender=CourseType)
+def course_type_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_volume_fields', None)
+    instance._previous_volume_fields = None
+    if previous is None or not changed_fields(instance, previous, course_type_volume_fields):
+        return
+    invalidate_model_sessions()
+    weeks = set(ScheduledCourse.objects.filter(course__type=instance, work_copy=0)
+                .values_list('course__week', flat=True).distinct())
+    if weeks:
+        for department in {previous[-1], instance.department_id}:
+            rebuild_daily_volumes(department=department, weeks=weeks - {None})
+
+
+# versions of the cached lists of courses, cf. base.courses_cache
+
+@receiver(post_save, sender=ScheduledCourse)
+@receiver(post_delete, sender=ScheduledCourse)
+def scheduled_course_changed(sender, instance, **kwargs):
+    if courses_cache_maintained():
+        invalidate_courses_cache_of([instance.course_id])
+
+
+@receiver(post_save, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_courses_cache_of([instance.id])
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    if instance.week_id is not None:
+        for department_id in Module.objects.filter(id=instance.module_id) \
+                .values_list('train_prog__department', flat=True):
+            invalidate_courses_cache(department_id, [instance.week_id])
+
+
+@receiver(m2m_changed, sender=Course.groups.through)
+@receiver(m2m_changed, sender=Course.supp_tutor.through)
+def course_relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_courses_cache_of([instance.id])
+    elif action == 'pre_clear':
+        # the courses of a group (or supplementary tutor) are unknown once cleared
+        courses = instance.courses if sender is Course.groups.through else instance.courses_as_supp
+        instance._cleared_course_ids = list(courses.values_list('id', flat=True))
+    elif action == 'post_clear':
+        invalidate_courses_cache_of(getattr(instance, '_cleared_course_ids', []))
+        instance._cleared_course_ids = None
+    elif action.startswith('post_'):
+        invalidate_courses_cache_of(pk_set)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(m2m_changed, sender=Room.subroom_of.through)
+def room_hierarchy_changed(sender, **kwargs):
+    invalidate_room_closure()
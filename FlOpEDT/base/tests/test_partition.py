@@ -0,0 +1,117 @@
+import copy
+import random
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from base.partition import Partition
+from base.timing import TimeInterval
+
+
+class LinearPartition(Partition):
+    """
+    Reference implementation: the previous add_slot, which walks the intervals linearly and deep copies the data
+    """
+    def add_slot(self, interval, data_type, data):
+        i = 0
+        if (interval.start >= self._intervals[len(self._intervals)-1][0].end
+                or interval.end <= self._intervals[0][0].start):
+            return False
+
+        while self._intervals[i][0].end <= interval.start:
+            i += 1
+        while i < len(self._intervals) and interval.end > self._intervals[i][0].start:
+            if(interval.start == self._intervals[i][0].end):
+                i+=1
+            if i == 0 and self._intervals[i][0].start > interval.start:
+                interval.start = self._intervals[i][0].start
+            if i == len(self._intervals)-1 and self._intervals[i][0].end < interval.end:
+                interval.end = self._intervals[i][0].end
+            if self._intervals[i][0] == interval:
+                self.add_data(data_type, copy.deepcopy(data), i)
+                i += 1
+            elif self._intervals[i][0].start <= interval.start and self._intervals[i][0].end >= interval.end:
+                new_part = 1
+                if self._intervals[i][0].end != interval.end:
+                    self._intervals.insert(i+1, (TimeInterval(interval.end, self._intervals[i][0].end),
+                                                 copy.deepcopy(self._intervals[i][1])))
+                    self._intervals[i][0].end = interval.end
+                if self._intervals[i][0].start != interval.start:
+                    self._intervals[i][0].end = interval.start
+                    self._intervals.insert(i+1, (TimeInterval(interval.start, interval.end),
+                                                 copy.deepcopy(self._intervals[i][1])))
+                    self.add_data(data_type, copy.deepcopy(data), i+1)
+                    new_part += 1
+                else:
+                    self.add_data(data_type, copy.deepcopy(data), i)
+                i += new_part
+            else:
+                if self._intervals[i][0].start == interval.start:
+                    self.add_data(data_type, copy.deepcopy(data), i)
+                    interval.start = self._intervals[i+1][0].start
+                elif self._intervals[i][0].end > interval.start:
+                    self._intervals[i][0].end = interval.start
+                    self._intervals.insert(i+1, (TimeInterval(interval.start, self._intervals[i+1][0].start),
+                                                 copy.deepcopy(self._intervals[i][1])))
+                    self.add_data(data_type, copy.deepcopy(data), i+1)
+                    i += 2
+                    interval.start = self._intervals[i][0].start
+        self._starts = None
+        return True
+
+
+class PartitionTestCase(TestCase):
+
+    def setUp(self):
+        # monday 8h - friday 19h, lunch break 12h30 - 14h
+        self.partition = Partition("tutor", datetime(2022, 3, 7), datetime(2022, 3, 12), 480, 1140)
+        self.partition.add_lunch_break(750, 840)
+
+    def test_add_slot(self):
+        nb_intervals = self.partition.nb_intervals
+        self.assertTrue(self.partition.add_slot(TimeInterval(datetime(2022, 3, 7, 8), datetime(2022, 3, 7, 14)),
+                                                "user_preference", {"value": 8, "available": True, "tutor": "a"}))
+        self.assertTrue(self.partition.add_slot(TimeInterval(datetime(2022, 3, 7, 9), datetime(2022, 3, 7, 10)),
+                                                "user_preference", {"value": 2, "available": True, "tutor": "b"}))
+        self.assertFalse(self.partition.add_slot(TimeInterval(datetime(2022, 3, 14, 8), datetime(2022, 3, 14, 9)),
+                                                 "user_preference", {"value": 8, "available": True, "tutor": "a"}))
+        # 8h-9h, 9h-10h and 10h-12h30 are cut from the morning
+        self.assertEqual(self.partition.nb_intervals, nb_intervals + 2)
+        self.assertEqual(self.partition.available_duration, 270)
+        self.assertEqual([interval[1]["user_preference"] for interval in self.partition.intervals[1:4]],
+                         [{"a": 8}, {"a": 8, "b": 2}, {"a": 8}])
+
+    def test_split_intervals_do_not_share_data(self):
+        self.partition.add_slot(TimeInterval(datetime(2022, 3, 8, 8), datetime(2022, 3, 8, 10)),
+                                "user_preference", {"value": 8, "available": True, "tutor": "a"})
+        self.partition.add_slot(TimeInterval(datetime(2022, 3, 8, 9), datetime(2022, 3, 8, 10)),
+                                "no_course_tutor", {"no_course_tutor": {"period": {"AM"}, "tutors": {"a"},
+                                                                        "tutor_status": set()}})
+        intervals = [interval for interval in self.partition.intervals if "user_preference" in interval[1]]
+        self.assertEqual(len(intervals), 2)
+        self.assertNotIn("no_course_tutor", intervals[0][1])
+        intervals[0][1]["available"] = False
+        self.assertTrue(intervals[1][1]["available"])
+        self.assertEqual(self.partition.available_duration, 60)
+
+    def test_same_as_linear_add_slot(self):
+        random.seed(0)
+        monday = datetime(2022, 3, 7)
+        for _ in range(20):
+            partitions = []
+            for partition_class in (LinearPartition, Partition):
+                partition = partition_class("tutor", monday, monday + timedelta(days=5), 480, 1140)
+                partition.add_lunch_break(750, 840)
+                partitions.append(partition)
+            for k in range(30):
+                start = monday + timedelta(days=random.randrange(6), minutes=random.randrange(0, 1440, 15))
+                end = start + timedelta(minutes=random.choice((30, 60, 90, 120, 240)))
+                if random.random() < 0.7:
+                    data_type, data = "user_preference", {"value": random.randint(1, 8), "available": True,
+                                                          "tutor": f"t{k % 3}"}
+                else:
+                    data_type, data = "scheduled_course", {"scheduled_course": k, "forbidden": True}
+                results = [partition.add_slot(TimeInterval(start, end), data_type, data)
+                           for partition in partitions]
+                self.assertEqual(results[0], results[1])
+            self.assertEqual(str(partitions[0]), str(partitions[1]))
@@ -0,0 +1,75 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+import base.models as models
+from base.room_closure import check_interval, version_cache_key
+
+
+class RoomClosureTestCase(TestCase):
+
+    def setUp(self):
+        # amphi = A + B, A = A1 + A2
+        self.rooms = {name: models.Room.objects.create(name=name) for name in ("amphi", "A", "B", "A1", "A2", "C")}
+        self.rooms["A"].subroom_of.add(self.rooms["amphi"])
+        self.rooms["B"].subroom_of.add(self.rooms["amphi"])
+        self.rooms["A1"].subroom_of.add(self.rooms["A"])
+        self.rooms["A2"].subroom_of.add(self.rooms["A"])
+
+    def names(self, rooms):
+        return sorted(r.name for r in rooms)
+
+    def test_closures(self):
+        amphi, a, a1, c = self.rooms["amphi"], self.rooms["A"], self.rooms["A1"], self.rooms["C"]
+        self.assertEqual(self.names(amphi.and_subrooms()), ["A", "A1", "A2", "B", "amphi"])
+        self.assertEqual(self.names(amphi.basic_rooms()), ["A1", "A2", "B"])
+        self.assertEqual(self.names(a1.and_overrooms()), ["A", "A1", "amphi"])
+        self.assertEqual(self.names(a.related_rooms()), ["A", "A1", "A2", "amphi"])
+        self.assertEqual(self.names(c.and_overrooms()), ["C"])
+        self.assertFalse(a.is_basic)
+        self.assertTrue(a1.is_basic)
+
+        with CaptureQueriesContext(connection) as context:
+            for room in self.rooms.values():
+                room.and_overrooms()
+                room.basic_rooms()
+        self.assertEqual(len(context.captured_queries), 0)
+
+        # every call returns its own instances
+        subroom = next(r for r in amphi.and_subrooms() if r.name == "A1")
+        subroom.name = "A1 renamed"
+        self.assertEqual(self.names(amphi.and_subrooms()), ["A", "A1", "A2", "B", "amphi"])
+        self.assertEqual(subroom, a1)
+
+    def test_invalidation(self):
+        self.assertEqual(self.names(self.rooms["C"].and_overrooms()), ["C"])
+        self.rooms["C"].subroom_of.add(self.rooms["A"])
+        self.assertEqual(self.names(self.rooms["C"].and_overrooms()), ["A", "C", "amphi"])
+        self.assertEqual(self.names(self.rooms["amphi"].basic_rooms()), ["A1", "A2", "B", "C"])
+        self.rooms["A"].subroom_of.clear()
+        self.assertEqual(self.names(self.rooms["amphi"].basic_rooms()), ["B"])
+        d = models.Room.objects.create(name="D")
+        self.assertTrue(d.is_basic)
+
+    def test_other_process_change(self):
+        a, c = self.rooms["A"], self.rooms["C"]
+        self.assertEqual(self.names(c.and_overrooms()), ["C"])
+        # change made by another process: no signal here, only a new cache version
+        models.Room.subroom_of.through.objects.create(from_room=c, to_room=a)
+        cache.set(version_cache_key, "other process", None)
+
+        # the version is not read by every call of the closure methods
+        with mock.patch('base.room_closure.cache.get') as cache_get:
+            for room in self.rooms.values():
+                room.and_overrooms()
+            self.assertFalse(cache_get.called)
+        self.assertEqual(self.names(c.and_overrooms()), ["C"])
+
+        # but once check_interval is over
+        monotonic = time.monotonic() + check_interval + 1
+        with mock.patch('base.room_closure.time.monotonic', return_value=monotonic):
+            self.assertEqual(self.names(c.and_overrooms()), ["A", "C", "amphi"])
@@ -1,9 +1,14 @@
 import unittest
 import base.models as models
 
-from django.test import Client, SimpleTestCase
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from base.views import clean_changes
+from people.models import Tutor
+
 
 class IndexViewTest(unittest.TestCase):
     
@@ -33,4 +38,59 @@ class IndexViewTest(unittest.TestCase):
         self.d1 = models.Department.objects.create(name="departement1", abbrev="d1")
         self.d2 = models.Department.objects.create(name="departement2", abbrev="d2")
         response = self.client.get('/')
-        self.assertEqual(response.content.decode(), "NOT IMPLEMENTED YET")
\ No newline at end of file
+        self.assertEqual(response.content.decode(), "NOT IMPLEMENTED YET")
+
+
+class CleanChangesTest(TestCase):
+
+    def setUp(self):
+        self.department = models.Department.objects.create(name="departement1", abbrev="d1")
+        tp = models.TrainingProgramme.objects.create(name="tp1", abbrev="tp1", department=self.department)
+        group_type = models.GroupType.objects.create(name="TD", department=self.department)
+        group = models.StructuralGroup.objects.create(name="g1", train_prog=tp, type=group_type, size=0)
+        period = models.Period.objects.create(name="S1", department=self.department, starting_week=1, ending_week=20)
+        module = models.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=tp, period=period)
+        course_type = models.CourseType.objects.create(name="TD", department=self.department)
+        self.week, _ = models.Week.objects.get_or_create(nb=10, year=2023)
+        self.tutors = [Tutor.objects.create(username=f"prof{i}") for i in range(2)]
+        self.room = models.Room.objects.create(name="R1")
+        self.initiator = self.tutors[0]
+        self.courses = []
+        for i in range(4):
+            course = models.Course.objects.create(type=course_type, module=module, week=self.week,
+                                                  tutor=self.tutors[0])
+            course.groups.add(group)
+            self.courses.append(course)
+        for i, course in enumerate(self.courses[:3]):
+            models.ScheduledCourse.objects.create(course=course, day="m", start_time=480 + 120 * i,
+                                                  tutor=self.tutors[0], work_copy=0)
+
+    def change(self, course, day, start, tutor="prof0", room=None, graded=False):
+        return {'id': course.id, 'day': day, 'start': start, 'tutor': tutor, 'room': room, 'graded': graded,
+                'id_visio': -1}
+
+    def test_apply(self):
+        changes = [self.change(self.courses[0], "tu", 480, room="R1", graded=True),
+                   self.change(self.courses[1], "m", 840, tutor="prof1"),
+                   self.change(self.courses[3], "m", 480)]
+        with CaptureQueriesContext(connection) as context:
+            result = clean_changes(self.week, 0, changes, initiator=self.initiator, apply=True,
+                                   department=self.department)
+        self.assertLess(len(context.captured_queries), 40)
+        self.assertEqual(len(result), 3)
+
+        scheduled = {sc.course_id: sc for sc in models.ScheduledCourse.objects.filter(work_copy=0)}
+        self.assertEqual((scheduled[self.courses[0].id].day, scheduled[self.courses[0].id].room), ("tu", self.room))
+        self.assertEqual(scheduled[self.courses[1].id].tutor, self.tutors[1])
+        self.assertEqual(scheduled[self.courses[3].id].start_time, 480)
+        self.assertEqual([scheduled[c.id].number for c in self.courses], [4, 3, 2, 1])
+        self.assertTrue(models.CourseAdditional.objects.get(course=self.courses[0]).graded)
+        self.assertEqual(models.CourseModification.objects.count(), 3)
+        self.assertEqual(sorted(models.DailyVolume.objects.values_list('day', 'tutor__username', 'nb_courses')),
+                         [("m", "prof0", 2), ("m", "prof1", 1), ("tu", "prof0", 1)])
+
+    def test_unknown_room(self):
+        with self.assertRaisesMessage(Exception, "salle R2 inconnue"):
+            clean_changes(self.week, 0, [self.change(self.courses[0], "tu", 480, room="R2")],
+                          initiator=self.initiator, apply=True, department=self.department)
+        self.assertFalse(models.ScheduledCourse.objects.filter(day="tu").exists())
@@ -27,6 +27,7 @@
 """
 from datetime import date, time, datetime
 from enum import Enum
+from weakref import WeakValueDictionary
 from django.utils.translation import gettext_lazy as _
 
 def hr_min(t):
@@ -223,10 +224,32 @@ class Day(object):
               (FRIDAY, _("friday")), (SATURDAY, _("saturday")),
               (SUNDAY, _("sunday")))
 
+  __slots__ = ('day', 'week', '__weakref__')
+
+  # Days are interned: Day(day, week) is the same object as long as it is alive,
+  # so that days hash and compare by identity, cheaply
+  interned = WeakValueDictionary()
+
+  def __new__(cls, day, week):
+      try:
+          existing = cls.interned.get((day, week))
+      except TypeError:
+          # unsaved week: cannot be interned
+          return super().__new__(cls)
+      if existing is None:
+          existing = super().__new__(cls)
+          existing.day = day
+          existing.week = week
+          cls.interned[(day, week)] = existing
+      return existing
+
   def __init__(self, day, week):
       self.day = day
       self.week = week
 
+  def __getnewargs__(self):
+      return self.day, self.week
+
   def __str__(self):
       # return self.nom[:3]
       return self.day + '_s' + str(self.week)
@@ -881,103 +881,139 @@ def fetch_all_modules_with_desc(req, **kwargs):
 
 def clean_change(week, old_version, change, work_copy=0,
                  initiator=None, apply=False, department=None):
-    from TTapp.TTUtils import number_courses
+    return clean_changes(week, old_version, [change], work_copy=work_copy,
+                         initiator=initiator, apply=apply, department=department)[0]
 
-    scheduled_before = True
-    renumber = False
-    course = Course.objects.get(id=change['id'])
-    try:
-        sched_course = ScheduledCourse.objects.get(course=course,
-                                                   work_copy=work_copy)
-    except ObjectDoesNotExist:
-        scheduled_before = False
-        sched_course = ScheduledCourse(course=course,
-                                       work_copy=work_copy)
-
-    tutor_old = sched_course.tutor
-    if tutor_old is None:
-        tutor_old = sched_course.course.tutor
-        sched_course.tutor = tutor_old
-
-    course_log = CourseModification(course=course,
-                                    old_week=week,
-                                    room_old=sched_course.room if scheduled_before else None,
-                                    day_old=sched_course.day if scheduled_before else None,
-                                    start_time_old=sched_course.start_time if scheduled_before else None,
-                                    tutor_old=tutor_old,
-                                    version_old=old_version,
-                                    initiator=initiator)
-
-    ret = {'course': course,
-           'sched': sched_course,
-           'log': course_log}
-
-    # Rooms
-    try:
-        new_room = Room.objects.get(name=change['room']) \
-            if change['room'] is not None else None
-        ret['sched'].room = new_room
-    except Room.DoesNotExist:
-        raise Exception(f"Problème : salle {change['room']} inconnue")
-
-    # Timing
-    if (not scheduled_before
-        or not (change['start'] == sched_course.start_time
-                and change['day'] == sched_course.day)):
-        renumber = True
-    ret['sched'].start_time = change['start']
-    ret['sched'].day = change['day']
-
-    # Tutor
-    try:
+
+def clean_changes(week, old_version, changes, work_copy=0,
+                  initiator=None, apply=False, department=None):
+    """
+    Checks the changes, and applies them if apply.
+    The referenced objects are fetched with one query per model, and the
+    changes are written with bulk queries; the changed series of courses
+    are renumbered once at the end.
+    Returns, for every change, {'course': course, 'sched': scheduled course, 'log': CourseModification}
+    """
+    from TTapp.TTUtils import renumber_courses_series
+    from base.daily_volumes import rebuild_daily_volumes
+    from base.courses_cache import invalidate_courses_cache_of
+
+    courses = Course.objects.select_related('type', 'module', 'week', 'tutor') \
+        .in_bulk([change['id'] for change in changes])
+    sched_courses = {sc.course_id: sc
+                     for sc in ScheduledCourse.objects.filter(course__in=list(courses), work_copy=work_copy)
+                     .select_related('room', 'tutor')}
+    rooms = {r.name: r for r in Room.objects.filter(name__in=set(change['room'] for change in changes
+                                                                  if change['room'] is not None))}
+    tutors = {t.username: t for t in Tutor.objects.filter(username__in=set(change['tutor'] for change in changes
+                                                                          if change['tutor'] is not None))}
+    additionals = {a.course_id: a for a in CourseAdditional.objects.filter(course__in=list(courses))}
+    visios = EnrichedLink.objects.in_bulk(set(change['id_visio'] for change in changes
+                                              if change['id_visio'] > -1))
+
+    result = []
+    renumbered_courses = []
+    for change in changes:
+        if change['id'] not in courses:
+            raise Course.DoesNotExist(f"Problème : cours {change['id']} inconnu")
+        course = courses[change['id']]
+        scheduled_before = course.id in sched_courses
+        if scheduled_before:
+            sched_course = sched_courses[course.id]
+        else:
+            sched_course = ScheduledCourse(course=course,
+                                           work_copy=work_copy)
+            # a course may be changed several times
+            sched_courses[course.id] = sched_course
+
+        tutor_old = sched_course.tutor
+        if tutor_old is None:
+            tutor_old = sched_course.course.tutor
+            sched_course.tutor = tutor_old
+
+        course_log = CourseModification(course=course,
+                                        old_week=week,
+                                        room_old=sched_course.room if scheduled_before else None,
+                                        day_old=sched_course.day if scheduled_before else None,
+                                        start_time_old=sched_course.start_time if scheduled_before else None,
+                                        tutor_old=tutor_old,
+                                        version_old=old_version,
+                                        initiator=initiator)
+
+        # Rooms
+        if change['room'] is not None and change['room'] not in rooms:
+            raise Exception(f"Problème : salle {change['room']} inconnue")
+        sched_course.room = rooms[change['room']] if change['room'] is not None else None
+
+        # Timing
+        if (not scheduled_before
+                or not (change['start'] == sched_course.start_time
+                        and change['day'] == sched_course.day)):
+            renumbered_courses.append(course)
+        sched_course.start_time = change['start']
+        sched_course.day = change['day']
+
+        # Tutor
         tutor = change['tutor']
         if tutor is not None:
-            tutor = Tutor.objects.get(username=tutor)
-        ret['sched'].tutor = tutor
-        if ret['course'].tutor is not None:
-            ret['course'].tutor = tutor
-    except ObjectDoesNotExist:
-        raise Exception(f"Problème : prof {change['tutor']} inconnu")
+            if tutor not in tutors:
+                raise Exception(f"Problème : prof {change['tutor']} inconnu")
+            tutor = tutors[tutor]
+        sched_course.tutor = tutor
+        if course.tutor is not None:
+            course.tutor = tutor
+
+        # Grade
+        if course.id not in additionals and change['graded']:
+            additionals[course.id] = CourseAdditional(course=course)
+        if course.id in additionals:
+            additionals[course.id].graded = change['graded']
+
+        # outside the log for now
+        if change['id_visio'] > -1 and change['id_visio'] not in visios:
+            raise Exception(
+                f"Problème : visio avec if {change['id_visio']} inconnue"
+            )
 
-    # Grade
-    try:
-        additional = CourseAdditional.objects.get(course=course)
-    except CourseAdditional.DoesNotExist:
-        additional = None
-        if change['graded']:
-            additional = CourseAdditional(course=course)
-    if additional is not None:
-        additional.graded = change['graded']
-        additional.save()
+        result.append({'course': course,
+                       'sched': sched_course,
+                       'log': course_log})
 
     if apply:
-        ret['course'].save()
-        ret['sched'].save()
+        changed_courses = list(courses.values())
+        changed_sched_courses = list({id(r['sched']): r['sched'] for r in result}.values())
+        Course.objects.bulk_update(changed_courses, ['tutor'], batch_size=1000)
+        ScheduledCourse.objects.bulk_update([sc for sc in changed_sched_courses if sc.pk is not None],
+                                            ['room', 'start_time', 'day', 'tutor'], batch_size=1000)
+        ScheduledCourse.objects.bulk_create([sc for sc in changed_sched_courses if sc.pk is None],
+                                            batch_size=1000)
+        CourseAdditional.objects.bulk_update([a for a in additionals.values() if a.pk is not None], ['graded'],
+                                             batch_size=1000)
+        CourseAdditional.objects.bulk_create([a for a in additionals.values() if a.pk is None], batch_size=1000)
+
+        visio_changes = {r['sched'].id: visios[change['id_visio']]
+                         for r, change in zip(result, changes) if change['id_visio'] > -1}
+        sched_additionals = {a.scheduled_course_id: a for a in ScheduledCourseAdditional.objects
+                             .filter(scheduled_course__in=list(visio_changes))}
+        for sched_course_id, visio in visio_changes.items():
+            if sched_course_id not in sched_additionals:
+                sched_additionals[sched_course_id] = ScheduledCourseAdditional(scheduled_course_id=sched_course_id)
+            sched_additionals[sched_course_id].link = visio
+        ScheduledCourseAdditional.objects.bulk_update([a for a in sched_additionals.values() if a.pk is not None],
+                                                      ['link'], batch_size=1000)
+        ScheduledCourseAdditional.objects.bulk_create([a for a in sched_additionals.values() if a.pk is None],
+                                                      batch_size=1000)
+        # bulk queries do not send the signals invalidating the cached courses
+        invalidate_courses_cache_of([course.id for course in changed_courses])
+
         if work_copy == 0:
-            ret['log'].save()
-            if renumber:
-                # (using from_week makes it starts from 1)
-                number_courses(department,
-                               modules=sched_course.course.module,
-                               course_types=sched_course.course.type)
-
-    # outside the log for now
-    if change['id_visio'] > -1:
-        try:
-            new_visio = EnrichedLink.objects.get(id=change['id_visio'])
-            if apply:
-                additional, created = \
-                    ScheduledCourseAdditional.objects.get_or_create(
-                        scheduled_course=sched_course
-                    )
-                additional.link = new_visio
-                additional.save()
-        except EnrichedLink.DoesNotExist:
-            raise Exception(
-                f"Problème : visio avec if {change['id_visio']} inconnue"
-            )
+            CourseModification.objects.bulk_create([r['log'] for r in result], batch_size=1000)
+            # bulk queries do not send the signals maintaining the daily volumes
+            rebuild_daily_volumes(department, set(course.week for course in changed_courses))
+            if renumbered_courses:
+                renumber_courses_series(renumbered_courses)
 
-    return ret
+    return result
 
 
 def edt_changes(req, **kwargs):
@@ -1039,20 +1075,10 @@ def edt_changes(req, **kwargs):
 
         with transaction.atomic():
             try:
-                for change in recv_changes:
-                    new_courses = clean_change(week, old_version, change,
-                                               work_copy=work_copy,
-                                               initiator=initiator, apply=True,
-                                               department=department)
-                    if work_copy == 0:
-                        same, changed = new_courses['log'].strs_course_changes(
-                        )
-                        impacted_tutor = new_courses['sched'].tutor
-                        msg[impacted_tutor] = str(new_courses['log'])
-                        impacted_inst.add(new_courses['course'].tutor)
-                        impacted_inst.add(new_courses['sched'].tutor)
-                        if None in impacted_inst:
-                            impacted_inst.remove(None)
+                all_new_courses = clean_changes(week, old_version, recv_changes,
+                                                work_copy=work_copy,
+                                                initiator=initiator, apply=True,
+                                                department=department)
             except Exception as e:
                 bad_response['more'] = str(e)
                 return JsonResponse(bad_response)
@@ -1067,6 +1093,15 @@ def edt_changes(req, **kwargs):
             cache.delete(get_key_course_pp(department.abbrev, week, work_copy))
 
         if work_copy == 0:
+            # the messages are built once the changes are committed
+            for new_courses in all_new_courses:
+                impacted_tutor = new_courses['sched'].tutor
+                msg[impacted_tutor] = str(new_courses['log'])
+                impacted_inst.add(new_courses['course'].tutor)
+                impacted_inst.add(new_courses['sched'].tutor)
+            if None in impacted_inst:
+                impacted_inst.remove(None)
+
             subject = '[flop!EDT] ' + initiator.username + ' a changé votre EDT'
 
             if initiator in impacted_inst:
@@ -1356,7 +1391,7 @@ def course_preferences_changes(req, year, week, train_prog, course_type, **kwarg
 
 @tutor_required
 def decale_changes(req, **kwargs):
-    from TTapp.TTUtils import number_courses
+    from TTapp.TTUtils import renumber_courses_series
     bad_response = HttpResponse("KO")
     good_response = HttpResponse("OK")
     print(req)
@@ -1398,9 +1433,7 @@ def decale_changes(req, **kwargs):
                     week=old_week, department=req.department)
                 ev.version += 1
                 ev.save()
-                number_courses(req.department,
-                               modules=scheduled_course.course.module,
-                               course_types=scheduled_course.course.type)
+                renumber_courses_series([scheduled_course.course])
             else:
                 cache.delete(get_key_course_pp(req.department.abbrev,
                                                old_week,
@@ -1524,9 +1557,8 @@ def send_email_proposal(req, **kwargs):
     msg += ' : \n\n'
 
     try:
-        for change in recv_changes:
-            new_courses = clean_change(week, 0, change, work_copy=work_copy,
-                                       initiator=initiator, apply=False)
+        for new_courses in clean_changes(week, 0, recv_changes, work_copy=work_copy,
+                                         initiator=initiator, apply=False):
             same, changed = new_courses['log'].strs_course_changes(course=new_courses['course'],
                                                                    sched_course=new_courses['sched'])
             msg += same + changed + '\n'
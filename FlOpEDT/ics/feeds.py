@@ -1,19 +1,26 @@
-from datetime import datetime
+from datetime import date, datetime
 from datetime import timedelta
+import hashlib
 from isoweek import Week
 
 from django_ical.views import ICalFeed
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 
-from base.models import ScheduledCourse, Room, StructuralGroup, TransversalGroup, Day, Department, Regen
+from base.models import ScheduledCourse, Room, StructuralGroup, TransversalGroup, Day, Department, Regen, \
+    GenericGroup, Week as BaseWeek
+from base.courses_cache import courses_versions
 from people.models import Tutor
-from django.db.models import Q
+from django.db.models import Q, Count, Max, Prefetch
 from roomreservation.models import RoomReservation
 
 from django.http import HttpResponse, Http404
-from django.utils.http import http_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from calendar import timegm
+import time
 
 def str_groups(c):
     groups = c.groups.all()
@@ -23,14 +30,95 @@ def str_groups(c):
     return gp_str, plural
 
 
+def feed_weeks():
+    """
+    First and last weeks covered by the feeds (cf. ICS_WEEKS_BEFORE and ICS_WEEKS_AFTER)
+    """
+    current_week = Week.withdate(date.today())
+    return current_week - settings.ICS_WEEKS_BEFORE, current_week + settings.ICS_WEEKS_AFTER
+
+
+def weeks_query(first_week, last_week, prefix='course__week'):
+    """
+    Filter on the weeks from first_week to last_week; prefix leads to the Week
+    (None when filtering the Week model itself)
+    """
+    def field(name):
+        return f'{prefix}__{name}' if prefix else name
+    return (Q(**{field('year__gt'): first_week.year})
+            | Q(**{field('year'): first_week.year, field('nb__gte'): first_week.week})) \
+        & (Q(**{field('year__lt'): last_week.year})
+           | Q(**{field('year'): last_week.year, field('nb__lte'): last_week.week}))
+
+
 class EventFeed(ICalFeed):
     """
-    A simple event calender
+    A simple event calender, covering the weeks given by feed_weeks.
+    The rendered calendars are cached as long as the versions of the course
+    lists of these weeks (cf. base.courses_cache) do not change, and served
+    with an ETag and a Last-Modified date, so that the calendar clients
+    polling an unchanged calendar get a 304 response.
     """
     product_id = 'flop'
     timezone = 'Europe/Paris'
     days = [abbrev for abbrev,_ in Day.CHOICES]
 
+    def __call__(self, request, *args, **kwargs):
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise Http404('Feed object does not exist.')
+        first_week, last_week = feed_weeks()
+        # one version per department and week: hashed to keep the key short
+        stamp = hashlib.md5('-'.join(str(value) for value in self.versions_stamp(obj)).encode()).hexdigest()
+        target = '-'.join(str(kwargs[k]) for k in sorted(kwargs))
+        key = f'ics-{self.__class__.__name__}-{target}-{first_week}-{last_week}-{stamp}'
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+        rendered = cache.get(key)
+        if rendered is None:
+            feedgen = self.get_feed(obj, request)
+            response = HttpResponse(content_type=feedgen.mime_type)
+            feedgen.write(response, 'utf-8')
+            rendered = (response.content, response['Content-Type'], int(time.time()))
+            cache.set(key, rendered, settings.ICS_CACHE_TIMEOUT)
+        content, content_type, last_modified = rendered
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def feed_departments(self, obj):
+        """
+        Ids of the departments whose timetables make the feed of obj
+        """
+        raise NotImplementedError
+
+    def versions_stamp(self, obj):
+        """
+        Values changing whenever the scheduled courses of the covered weeks may
+        have changed: the versions of the course lists of these weeks in the
+        departments of the feed
+        """
+        week_ids = BaseWeek.objects.filter(weeks_query(*feed_weeks(), prefix=None)).values_list('id', flat=True)
+        versions = courses_versions(self.feed_departments(obj), week_ids)
+        return tuple(versions[pair] for pair in sorted(versions))
+
+    def scheduled_courses(self):
+        """
+        Scheduled courses of the public copy during the covered weeks, with
+        all the objects the items are made of
+        """
+        return ScheduledCourse.objects\
+            .filter(weeks_query(*feed_weeks()), work_copy=0)\
+            .select_related('course__module', 'course__type', 'course__week', 'tutor', 'room')\
+            .prefetch_related(Prefetch('course__groups',
+                                       queryset=GenericGroup.objects.select_related('train_prog')
+                                                                    .order_by('train_prog__abbrev', 'name')))
+
     def item_title(self, scourse):
         course = scourse.course
         gp_str, plural = str_groups(course)
@@ -78,9 +166,20 @@ class TutorEventFeed(EventFeed):
     def get_object(self, request, department, tutor_id):
         return Tutor.objects.get(id=tutor_id)
 
+    def tutor_query(self, tutor):
+        return Q(tutor=tutor) | Q(course__supp_tutor=tutor)
+
+    def feed_departments(self, tutor):
+        # the departments where the tutor gives courses, possibly as a
+        # supplementary tutor, whatever their own departments are
+        return ScheduledCourse.objects.filter(self.tutor_query(tutor), weeks_query(*feed_weeks()), work_copy=0)\
+                                      .order_by()\
+                                      .values_list('course__module__train_prog__department', flat=True)\
+                                      .distinct()
+
     def items(self, tutor):
-        return ScheduledCourse.objects.filter(Q(tutor=tutor) | Q(course__supp_tutor=tutor), work_copy=0)\
-                                      .order_by('-course__week__year','-course__week__nb')
+        return self.scheduled_courses().filter(self.tutor_query(tutor))\
+                                       .order_by('-course__week__year','-course__week__nb')
 
     def item_title(self, scourse):
         course = scourse.course
@@ -94,14 +193,28 @@ class RoomEventFeed(EventFeed):
     def get_object(self, request, department, room_id):
         return Room.objects.get(id=room_id).and_overrooms()
 
+    def feed_departments(self, room_groups):
+        return Department.objects.filter(room__in=room_groups).distinct().values_list('id', flat=True)
+
     def items(self, room_groups):
         room_scheduled_courses = \
-            ScheduledCourse.objects\
-            .filter(room__in=room_groups, work_copy=0) \
+            self.scheduled_courses()\
+            .filter(room__in=room_groups) \
             .order_by('-course__week__year', '-course__week__nb')
-        room_reservations = RoomReservation.objects.filter(room__in=room_groups).order_by('-date', '-start_time')
+        room_reservations = self.room_reservations(room_groups)\
+            .select_related('reservation_type', 'responsible')\
+            .order_by('-date', '-start_time')
         return list(room_scheduled_courses) + list(room_reservations)
 
+    def room_reservations(self, room_groups):
+        first_week, last_week = feed_weeks()
+        return RoomReservation.objects.filter(room__in=room_groups,
+                                              date__gte=first_week.monday(), date__lte=last_week.sunday())
+
+    def versions_stamp(self, room_groups):
+        reservations = self.room_reservations(room_groups).aggregate(nb=Count('id'), last=Max('id'))
+        return super(RoomEventFeed, self).versions_stamp(room_groups) + (reservations['nb'], reservations['last'])
+
     def item_title(self, sched_course_or_reservation):
         if type(sched_course_or_reservation) is ScheduledCourse:
             scourse = sched_course_or_reservation
@@ -151,9 +264,12 @@ class GroupEventFeed(EventFeed):
     def get_object(self, request, department, group_id):
         raise NotImplementedError
 
+    def feed_departments(self, groups):
+        return {group.train_prog.department_id for group in groups}
+
     def items(self, groups):
-        return ScheduledCourse.objects\
-                              .filter(course__groups__in=groups, work_copy=0) \
+        return self.scheduled_courses()\
+                   .filter(course__groups__in=groups) \
             .order_by('-course__week__year', '-course__week__nb')
 
     def item_title(self, scourse):
@@ -1,3 +1,86 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import override
+
+import base.models as models
+from people.models import Tutor
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   ICS_WEEKS_BEFORE=2, ICS_WEEKS_AFTER=10)
+class TutorFeedTestCase(TestCase):
+
+    def setUp(self):
+        self.department = models.Department.objects.create(name="departement_ics", abbrev="dics")
+        tp = models.TrainingProgramme.objects.create(name="tp1", abbrev="tp1", department=self.department)
+        group_type = models.GroupType.objects.create(name="TD", department=self.department)
+        groups = [models.StructuralGroup.objects.create(name=f"g{i}", train_prog=tp, type=group_type, size=0)
+                  for i in (1, 0)]
+        period = models.Period.objects.create(name="S1", department=self.department, starting_week=1, ending_week=20)
+        module = models.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=tp, period=period)
+        course_type = models.CourseType.objects.create(name="TD", department=self.department)
+        self.tutor = Tutor.objects.create(username="prof0")
+        self.tutor.departments.add(self.department)
+        room = models.Room.objects.create(name="R1")
+        self.weeks = []
+        for days in (-7 * 20, 0, 7, 14):
+            year, nb, _ = (date.today() + timedelta(days=days)).isocalendar()
+            week, _ = models.Week.objects.get_or_create(nb=nb, year=year)
+            self.weeks.append(week)
+            course = models.Course.objects.create(type=course_type, module=module, week=week, tutor=self.tutor)
+            course.groups.add(*groups)
+            models.ScheduledCourse.objects.create(course=course, day="tu", start_time=480, tutor=self.tutor,
+                                                  room=room, work_copy=0)
+        with override('fr'):
+            self.url = reverse('ics:tutor', kwargs={'department': 'dics', 'tutor_id': self.tutor.id})
+
+    def test_feed(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        # the course of 20 weeks ago is out of the feed
+        self.assertEqual(content.count('BEGIN:VEVENT'), 3)
+        self.assertIn('SUMMARY:ALGO TD  - tp1 g0\\, tp1 g1', content)
+        self.assertLess(len(context.captured_queries), 11)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # the courses of the other tutors in the other departments do not matter
+        other_department = models.Department.objects.create(name="departement_ics2", abbrev="dics2")
+        other_tp = models.TrainingProgramme.objects.create(name="tp2", abbrev="tp2", department=other_department)
+        other_period = models.Period.objects.create(name="S1", department=other_department,
+                                                    starting_week=1, ending_week=20)
+        other_module = models.Module.objects.create(name="Prog", abbrev="PROG", train_prog=other_tp,
+                                                    period=other_period)
+        other_type = models.CourseType.objects.create(name="TP", department=other_department)
+        other_tutor = Tutor.objects.create(username="prof1")
+        other_course = models.Course.objects.create(type=other_type, module=other_module, week=self.weeks[1],
+                                                    tutor=other_tutor)
+        other_scourse = models.ScheduledCourse.objects.create(course=other_course, day="m", start_time=480,
+                                                              tutor=other_tutor, work_copy=0)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # but the courses the tutor gives there, even as a supplementary tutor, do
+        other_course.supp_tutor.add(self.tutor)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:PROG TP', response.content.decode())
+        etag = response['ETag']
+
+        # as well as the changes of their courses in the department
+        scourse = models.ScheduledCourse.objects.filter(course__week=self.weeks[2]).get()
+        scourse.start_time = 600
+        scourse.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -26,156 +26,161 @@
 from core.decorators import timer
 from base.models import Course, ScheduledCourse, Week, GenericGroup
 from notifications.models import BackUpModif
-from base.timing import flopdate_to_datetime, Day, french_format
-from people.models import Tutor, NotificationsPreferences
+from base.timing import flopday_to_date, Day, french_format
+from people.models import Tutor, Student, NotificationsPreferences
 import django
 import os
 import json
 from datetime import date, datetime
+from django.db import transaction
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext
 
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.utils.html import strip_tags
 
+# Number of emails handed at once to the (single) mail connection
+mail_batch_size = 100
+
+# Columns of BackUpModif identifying a line; the room is left aside, so that
+# a room change alone is not notified
+change_key_fields = ('week', 'year', 'day', 'module_abbrev', 'tutor_username', 'supp_tutor_usernames',
+                     'start_time', 'group_name', 'course_type_name', 'department_abbrev', 'train_prog_name')
+
+
 def backup():
-    print("Deleting old backup")
-    BackUpModif.objects.filter(new=False).delete()
-    print("Old backup deleted")
-    print("Converting recent backup in old one")
-    old_backup = BackUpModif.objects.filter(new=True)
-    for b in old_backup:
-        b.new = False
-        b.save()
-    print("Old backup conversion done")
-    print("New backup started")
-    #Get week number by using isocalendar
-    today = date.today()
-    week_number = date(today.year, today.month, today.day).isocalendar()[1]
-    week = Week.objects.get(nb=week_number, year=today.year)
-
-    courses = Course.objects.filter(week__gte=week)
-    scheduled_courses = ScheduledCourse.objects.filter(work_copy=0,
-                                                       course__in=courses)
-
-    for course in courses:
-        #Get all fields necessary for modification check
-        #A course can not be in ScheduledCourse
-        scheduled_course=scheduled_courses.filter(course=course)
-        if scheduled_course.exists():
-            scheduled_course = scheduled_course[0]
-            week = course.week.nb
-            year = course.week.year
-            day = scheduled_course.day
-            module = course.module.abbrev
-            course_type = course.type
-            #Can have no tutor
-            tutor = scheduled_course.tutor.username if scheduled_course.tutor != None else None
-            #Can have no supp_tutors
-            supp_tutors = list(course.supp_tutor.all()) if course.supp_tutor != None else None
-            start_time = scheduled_course.start_time
-            #Can have no room
-            room = scheduled_course.room.name if scheduled_course.room != None else None
-            #Multiple groups are possible for a single course
-            groups = list(course.groups.all())
-            for group in groups:
-                train_prog = group.train_prog.abbrev
-                department = group.train_prog.department.abbrev
-                #Create a new BackUpModif object which represent the table used for backup, fill it and then save it
-                line = BackUpModif()
-                line.new = True
-                line.week = week
-                line.year = year
-                line.day = day
-                line.module_abbrev = module
-                line.tutor_username = tutor
-                line.supp_tutor_usernames = supp_tutors
-                line.start_time = start_time
-                line.room_name = room
-                line.group_name = group.name
-                line.department_abbrev = department
-                line.train_prog_name = train_prog
-                line.course_type_name = course_type
-                line.save()
+    """
+    Turns the new backup into the old one, and saves the scheduled courses of
+    the public copy, from the current week on, as the new backup (one line per
+    course and group)
+    """
+    year, week_number, _weekday = date.today().isocalendar()
+    week_query = Q(week__year__gt=year) | Q(week__year=year, week__nb__gte=week_number)
+
+    supp_tutors = {}
+    for course_id, username in Course.supp_tutor.through.objects \
+            .filter(course__in=Course.objects.filter(week_query)) \
+            .order_by('course_id', 'tutor__username') \
+            .values_list('course_id', 'tutor__username'):
+        supp_tutors.setdefault(course_id, []).append(username)
+
+    lines = []
+    saved = set()
+    for sched_course in ScheduledCourse.objects \
+            .filter(course__in=Course.objects.filter(week_query), work_copy=0, course__groups__isnull=False) \
+            .order_by('id') \
+            .values('course_id', 'day', 'start_time', 'tutor__username', 'room__name',
+                    'course__week__nb', 'course__week__year', 'course__module__abbrev', 'course__type__name',
+                    'course__groups__name', 'course__groups__train_prog__abbrev',
+                    'course__groups__train_prog__department__abbrev'):
+        # a course is backed up with its first scheduled course only
+        key = (sched_course['course_id'], sched_course['course__groups__name'],
+               sched_course['course__groups__train_prog__abbrev'])
+        if key in saved:
+            continue
+        saved.add(key)
+        lines.append(BackUpModif(new=True,
+                                 week=sched_course['course__week__nb'],
+                                 year=sched_course['course__week__year'],
+                                 day=sched_course['day'],
+                                 module_abbrev=sched_course['course__module__abbrev'],
+                                 tutor_username=sched_course['tutor__username'],
+                                 supp_tutor_usernames=supp_tutors.get(sched_course['course_id'], []),
+                                 start_time=sched_course['start_time'],
+                                 room_name=sched_course['room__name'],
+                                 group_name=sched_course['course__groups__name'],
+                                 department_abbrev=sched_course['course__groups__train_prog__department__abbrev'],
+                                 train_prog_name=sched_course['course__groups__train_prog__abbrev'],
+                                 course_type_name=sched_course['course__type__name']))
+
+    with transaction.atomic():
+        BackUpModif.objects.filter(new=False).delete()
+        BackUpModif.objects.filter(new=True).update(new=False)
+        BackUpModif.objects.bulk_create(lines, batch_size=1000)
     print("Backup done")
-    print("Number of courses saved : " + str(BackUpModif.objects.filter(new=True).count()))
+    print("Number of courses saved : " + str(len(lines)))
+
+
+def backup_lines(new):
+    """
+    Lines of the new (or old) backup, as {change key: room name}
+    """
+    supp_tutors_index = change_key_fields.index('supp_tutor_usernames')
+    lines = {}
+    for line in BackUpModif.objects.filter(new=new).order_by('id').values_list(*change_key_fields, 'room_name'):
+        key = line[:-1]
+        if key[supp_tutors_index] is not None:
+            key = key[:supp_tutors_index] + (tuple(key[supp_tutors_index]),) + key[supp_tutors_index + 1:]
+        lines.setdefault(key, line[-1])
+    return lines
 
 
 def check_changes(save_json_files=False):
-    new_backup = set(BackUpModif.objects.filter(new=True))
-    old_backup = set(BackUpModif.objects.filter(new=False))
-    news = new_backup - old_backup
-    olds = old_backup - new_backup
-    changes = olds | news
+    new_backup = backup_lines(new=True)
+    old_backup = backup_lines(new=False)
+    news = new_backup.keys() - old_backup.keys()
+    olds = old_backup.keys() - new_backup.keys()
 
     # Create two dict that will be save as JSON at the end
     student_changes_dict = {}
     tutor_changes_dict = {}
 
-    departments = {change.department_abbrev for change in changes}
-
     # Initialise user dict with all departments
-    for department in departments:
-        student_changes_dict[department] = {}
-
-    for change in changes:
-        if change in olds:
-            mode = "Deleted"
-            #Useful for translation
-            gettext("Deleted")
-        else:
-            mode = "Created"
-            #Useful for translation
-            gettext("Created")
-        group = change.group_name
-        department = change.department_abbrev
-        train_prog = change.train_prog_name
-        tutor_username = change.tutor_username
-        module = change.module_abbrev
-        course_type = change.course_type_name
-        room = change.room_name
-        start_time = change.start_time
-        week = Week.objects.get(year=change.year, nb=change.week)
-        day = Day(week=week, day=change.day)
-        change_datetime = flopdate_to_datetime(day, change.start_time)
-
-        # Store all changes for users
-        if train_prog not in student_changes_dict[department]:
-            student_changes_dict[department][train_prog] = {}
-        if group not in student_changes_dict[department][train_prog]:
-            student_changes_dict[department][train_prog][group] = []
-        student_object = {gettext('Mode'): mode,
-                          gettext('Date'): change_datetime.date().strftime('%d/%m/%Y'),
-                          gettext('Start time'): french_format(start_time),
-                          gettext('Course Type'): course_type,
-                          gettext('Module'): module,
-                          gettext('Tutor'): tutor_username,
-                          gettext('Room'): room}
-        student_changes_dict[department][train_prog][group].append(student_object)
-
-        # Store all changes for tutors
-        if tutor_username not in tutor_changes_dict:
-            tutor_changes_dict[tutor_username] = {}
-        if department not in tutor_changes_dict[tutor_username]:
-            tutor_changes_dict[tutor_username][department] = []
-        tutor_object = {gettext('Mode'): mode,
-                        gettext('Date'): change_datetime.date().strftime('%d/%m/%Y'),
-                        gettext('Start time'): french_format(start_time),
-                        gettext('Course Type'): course_type,
-                        gettext('Module'): module,
-                        gettext('Train_prog'): train_prog,
-                        gettext('Group'): group,
-                        gettext('Room'): room}
-        tutor_changes_dict[tutor_username][department].append(tutor_object)
-
-        if save_json_files:
-            # Save users changes as JSON
-            with open("notifications/modifs_student.json", "w") as outfile:
-                json.dump(student_changes_dict, outfile)
-
-            # Save tutors changes as JSON
-            with open("notifications/modifs_tutor.json", "w") as outfile:
-                json.dump(tutor_changes_dict, outfile)
+    for change in news | olds:
+        student_changes_dict.setdefault(dict(zip(change_key_fields, change))['department_abbrev'], {})
+
+    #Useful for translation
+    gettext("Deleted")
+    gettext("Created")
+
+    dates = {}
+    for changes, mode, backup_rooms in ((olds, "Deleted", old_backup), (news, "Created", new_backup)):
+        for key in changes:
+            change = dict(zip(change_key_fields, key))
+            group = change['group_name']
+            department = change['department_abbrev']
+            train_prog = change['train_prog_name']
+            tutor_username = change['tutor_username']
+            module = change['module_abbrev']
+            course_type = change['course_type_name']
+            room = backup_rooms[key]
+            start_time = change['start_time']
+            day_key = (change['year'], change['week'], change['day'])
+            if day_key not in dates:
+                day = Day(week=Week(year=change['year'], nb=change['week']), day=change['day'])
+                dates[day_key] = flopday_to_date(day).strftime('%d/%m/%Y')
+            change_date = dates[day_key]
+
+            # Store all changes for users
+            student_object = {gettext('Mode'): mode,
+                              gettext('Date'): change_date,
+                              gettext('Start time'): french_format(start_time),
+                              gettext('Course Type'): course_type,
+                              gettext('Module'): module,
+                              gettext('Tutor'): tutor_username,
+                              gettext('Room'): room}
+            student_changes_dict[department].setdefault(train_prog, {}).setdefault(group, []).append(student_object)
+
+            # Store all changes for tutors
+            tutor_object = {gettext('Mode'): mode,
+                            gettext('Date'): change_date,
+                            gettext('Start time'): french_format(start_time),
+                            gettext('Course Type'): course_type,
+                            gettext('Module'): module,
+                            gettext('Train_prog'): train_prog,
+                            gettext('Group'): group,
+                            gettext('Room'): room}
+            tutor_changes_dict.setdefault(tutor_username, {}).setdefault(department, []).append(tutor_object)
+
+    if save_json_files:
+        # Save users changes as JSON
+        with open("notifications/modifs_student.json", "w") as outfile:
+            json.dump(student_changes_dict, outfile)
+
+        # Save tutors changes as JSON
+        with open("notifications/modifs_tutor.json", "w") as outfile:
+            json.dump(tutor_changes_dict, outfile)
 
     return student_changes_dict, tutor_changes_dict
 
@@ -186,6 +191,23 @@ def days_nb_from_today(change):
     return (datetime_date - date.today()).days
 
 
+def notifications_preferences(users):
+    """
+    Returns {user id: NotificationsPreferences} for users, and the set of the
+    ids of the users whose (default) preferences have just been created
+    """
+    preferences = {notif.user_id: notif
+                   for notif in NotificationsPreferences.objects.filter(user__in=users)}
+    created = set()
+    missing = [NotificationsPreferences(user_id=user.id) for user in users if user.id not in preferences]
+    if missing:
+        NotificationsPreferences.objects.bulk_create(missing)
+        for notif in missing:
+            preferences[notif.user_id] = notif
+            created.add(notif.user_id)
+    return preferences, created
+
+
 def send_notifications():
     student_changes_dict, tutor_changes_dict = check_changes()
     # Choose department
@@ -204,12 +226,16 @@ def send_notifications():
         "please <a href='%(url)s/edt/%(dept)s/semaine-type'> click here <a/>.") % {'url': 'url_of_your_website',
                                                                                    'dept': department}
 
+    messages = []
+
+    tutors = Tutor.objects.in_bulk([username for username in tutor_changes_dict if username is not None],
+                                   field_name='username')
+    tutors_notif, _created = notifications_preferences(list(tutors.values()))
     for tutor_username, tutor_dic in tutor_changes_dict.items():
         if tutor_username is None:
             continue
-        tutor = Tutor.objects.get(username=tutor_username)
-        notif, c = NotificationsPreferences.objects.get_or_create(user=tutor)
-        nb_of_notified_weeks = notif.nb_of_notified_weeks
+        tutor = tutors[tutor_username]
+        nb_of_notified_weeks = tutors_notif[tutor.id].nb_of_notified_weeks
         if not nb_of_notified_weeks:
             continue
         nb_of_notified_days = 7 * nb_of_notified_weeks
@@ -232,34 +258,35 @@ def send_notifications():
             dept_changes.sort(key=lambda x: (x[gettext('Date')], x[gettext('Start time')]))
             html_msg += _("For the department %s :") % department + "<br />"
             html_msg += html_table_with_changes(dept_changes)
-        send_changes_email(subject, intro_text, html_msg, outro_text, to_email=tutor.email)
-
-    students = set()
-
-    for dept_abbrev in student_changes_dict:
-        for train_prog in student_changes_dict[dept_abbrev]:
-            for group_name in student_changes_dict[dept_abbrev][train_prog]:
-                group = GenericGroup.objects.get(name=group_name, train_prog__abbrev=train_prog,
-                                                 train_prog__department__abbrev=dept_abbrev)
-                students |= set(group.student_set.all())
+        messages.append(changes_email(subject, intro_text, html_msg, outro_text, to_email=tutor.email))
+
+    changed_groups = {(dept_abbrev, train_prog, group_name)
+                      for dept_abbrev in student_changes_dict
+                      for train_prog in student_changes_dict[dept_abbrev]
+                      for group_name in student_changes_dict[dept_abbrev][train_prog]}
+    groups = [group for group in GenericGroup.objects
+              .filter(name__in={group_name for _d, _t, group_name in changed_groups},
+                      train_prog__department__abbrev__in=student_changes_dict.keys())
+              .select_related('train_prog__department')
+              if (group.train_prog.department.abbrev, group.train_prog.abbrev, group.name) in changed_groups]
+    students = list(Student.objects.filter(generic_groups__in=groups).distinct()
+                    .prefetch_related('generic_groups__train_prog__department'))
+    students_notif, created = notifications_preferences(students)
 
     for student in students:
-        notif, created = NotificationsPreferences.objects.get_or_create(user=student)
-        if created:
+        if student.id in created:
             continue
-        nb_of_notified_weeks = notif.nb_of_notified_weeks
+        nb_of_notified_weeks = students_notif[student.id].nb_of_notified_weeks
         if not nb_of_notified_weeks:
             continue
         nb_of_notified_days = 7 * nb_of_notified_weeks
         intro_text = _("Hi ") + student.first_name + ",<br /> <br />"
         intro_text += _("Here are the changes of your planning for the %g following days :") % nb_of_notified_days
         intro_text += "<br /> <br />"
-        groups = student.generic_groups.all()
-        department = groups[0].train_prog.department.abbrev
         student_changes = []
-        for group in groups:
-            if group.name in student_changes_dict[group.train_prog.department.abbrev][group.train_prog.abbrev]:
-                student_changes += student_changes_dict[group.train_prog.department.abbrev][group.train_prog.abbrev][group.name]
+        for group in student.generic_groups.all():
+            student_changes += student_changes_dict.get(group.train_prog.department.abbrev, {}) \
+                .get(group.train_prog.abbrev, {}).get(group.name, [])
 
         filtered_changes = [change for change in student_changes
                             if 0 <= days_nb_from_today(change) <= nb_of_notified_days]
@@ -267,7 +294,9 @@ def send_notifications():
             continue
         filtered_changes.sort(key=lambda x: (x[gettext('Date')], x[gettext('Start time')]))
         html_msg = html_table_with_changes(filtered_changes)
-        send_changes_email(subject, intro_text, html_msg, outro_text, to_email=student.email)
+        messages.append(changes_email(subject, intro_text, html_msg, outro_text, to_email=student.email))
+
+    send_emails(messages)
 
 
 def html_table_with_changes(filtered_changes):
@@ -289,7 +318,7 @@ def html_table_with_changes(filtered_changes):
     return msg
 
 
-def send_changes_email(subject, intro_text, html_msg, outro_text, to_email, from_email=""):
+def changes_email(subject, intro_text, html_msg, outro_text, to_email, from_email=""):
     html_message = f"""
          <html>
            <head>
@@ -313,4 +342,21 @@ def send_changes_email(subject, intro_text, html_msg, outro_text, to_email, from
          </html>
          """
     plain_message = strip_tags(html_message)
-    send_mail(subject, plain_message, from_email, [to_email], html_message=html_message)
+    message = EmailMultiAlternatives(subject, plain_message, from_email, [to_email])
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+
+def send_changes_email(subject, intro_text, html_msg, outro_text, to_email, from_email=""):
+    send_emails([changes_email(subject, intro_text, html_msg, outro_text, to_email, from_email)])
+
+
+def send_emails(messages):
+    """
+    Sends messages by batches, over a single mail connection
+    """
+    if not messages:
+        return
+    with get_connection() as connection:
+        for i in range(0, len(messages), mail_batch_size):
+            connection.send_messages(messages[i:i + mail_batch_size])
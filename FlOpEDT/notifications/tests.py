@@ -23,6 +23,57 @@
 # you develop activities involving the FlOpEDT/FlOpScheduler software
 # without disclosing the source code of your own applications.
 
+from datetime import date, timedelta
+
+from django.core import mail
 from django.test import TestCase
+from django.utils.translation import gettext
+
+import base.models as models
+from notifications.models import BackUpModif
+from notifications.notifications import backup, check_changes, send_notifications
+from people.models import Tutor, Student, NotificationsPreferences
+
+
+class NotificationsTestCase(TestCase):
+
+    def setUp(self):
+        department = models.Department.objects.create(name="departement1", abbrev="d1")
+        tp = models.TrainingProgramme.objects.create(name="tp1", abbrev="tp1", department=department)
+        group_type = models.GroupType.objects.create(name="TD", department=department)
+        group = models.StructuralGroup.objects.create(name="g1", train_prog=tp, type=group_type, size=0)
+        period = models.Period.objects.create(name="S1", department=department, starting_week=1, ending_week=20)
+        module = models.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=tp, period=period)
+        course_type = models.CourseType.objects.create(name="TD", department=department)
+        year, nb, _ = (date.today() + timedelta(days=7)).isocalendar()
+        week, _ = models.Week.objects.get_or_create(nb=nb, year=year)
+        self.tutor = Tutor.objects.create(username="prof0", first_name="Prof", email="prof0@example.com")
+        NotificationsPreferences.objects.create(user=self.tutor, nb_of_notified_weeks=2)
+        self.student = Student.objects.create(username="stud0", first_name="Stud", email="stud0@example.com")
+        self.student.generic_groups.add(group)
+        NotificationsPreferences.objects.create(user=self.student, nb_of_notified_weeks=2)
+        course = models.Course.objects.create(type=course_type, module=module, week=week, tutor=self.tutor)
+        course.groups.add(group)
+        self.scheduled = models.ScheduledCourse.objects.create(course=course, day="tu", start_time=480,
+                                                               tutor=self.tutor, work_copy=0)
+
+    def test_changes(self):
+        backup()
+        self.scheduled.room = models.Room.objects.create(name="R1")
+        self.scheduled.save()
+        backup()
+        self.assertEqual(BackUpModif.objects.filter(new=False).count(), 1)
+        self.assertEqual(check_changes(), ({}, {}))
+
+        self.scheduled.start_time = 600
+        self.scheduled.save()
+        backup()
+        student_changes, tutor_changes = check_changes()
+        self.assertEqual(sorted((c[gettext('Mode')], c[gettext('Start time')], c[gettext('Room')])
+                                for c in student_changes['d1']['tp1']['g1']),
+                         [('Created', '10h', 'R1'), ('Deleted', '8h', 'R1')])
+        self.assertEqual(len(tutor_changes['prof0']['d1']), 2)
 
-# Create your tests here.
+        send_notifications()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["prof0@example.com", "stud0@example.com"])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
@@ -3,4 +3,12 @@
 
 from django.contrib import admin
 
-# Register your models here.
+from solve_board.models import SolveJob
+
+
+class SolveJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'department', 'status', 'solver', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'department')
+
+
+admin.site.register(SolveJob, SolveJobAdmin)
@@ -31,28 +31,20 @@
 import json
 import logging
 
-from threading import Thread
+from threading import Thread, Event
 from django.core.exceptions import ObjectDoesNotExist
-from MyFlOp.MyTTModel import MyTTModel
-from base.models import TrainingProgramme, Week
+from django.db import connection
+from base.models import Department, TrainingProgramme, Week
 import TTapp.models as TTClasses
 
-# from multiprocessing import Process
 import os
-import io
-import traceback
-import signal
-import time
-
-from django.core.cache import cache
-from django.conf import settings
 
+from solve_board.models import SolveJob
+from solve_board import solve_queue
 
 from channels.generic.websocket import WebsocketConsumer
 import json, sys
 
-_solver_child_process = 0
-
 logger = logging.getLogger(__name__)
 
 class SolverConsumer(WebsocketConsumer):
@@ -62,6 +54,8 @@ class SolverConsumer(WebsocketConsumer):
 
     def connect(self):
         # ws_message()
+        self.job_id = None
+        self.followed = Event()
         self.accept()
         self.send(text_data=json.dumps({
             'message': 'hello',
@@ -69,7 +63,7 @@ class SolverConsumer(WebsocketConsumer):
         }))
 
     def disconnect(self, close_code):
-        pass
+        self.followed.set()
 
     def receive(self, text_data):
         data = json.loads(text_data)
@@ -95,140 +89,121 @@ class SolverConsumer(WebsocketConsumer):
             except:
                 stabilize = None
 
+            # Get work copy as solver starting point
+            try:
+                mip_start = int(data['mip_start'])
+            except:
+                mip_start = None
+
             # Get additional informations
             time_limit = data['time_limit'] or None
             weeks = [Week.objects.get(nb=o['week'], year=o['year']) for o in data['week_year_list']]
+            department = Department.objects.get(abbrev=data['department'])
 
-            # Start solver
-            Solve(
-                data['department'],
-                weeks,
-                data['timestamp'],
-                data['train_prog'],
-                self,
-                time_limit,
-                data['solver'],
-                data['pre_assign_rooms'],
-                data['post_assign_rooms'],
-                stabilize_work_copy=stabilize,
-                all_weeks_together=data['all_weeks_together'],
-                send_log_email=data['send_log_email'],
-                user_email=data['current_user_email']
-                ).start()
+            # if all train progs are called, train_prog=''
+            try:
+                train_prog = TrainingProgramme.objects.get(abbrev=data['train_prog'], department=department)
+            except ObjectDoesNotExist:
+                train_prog = None
+
+            # Queue the solve job
+            job = solve_queue.enqueue(department,
+                                      weeks,
+                                      train_prog=train_prog,
+                                      timestamp=data['timestamp'],
+                                      time_limit=time_limit,
+                                      solver=data['solver'],
+                                      stabilize_work_copy=stabilize,
+                                      mip_start_work_copy=mip_start,
+                                      pre_assign_rooms=data['pre_assign_rooms'],
+                                      post_assign_rooms=data['post_assign_rooms'],
+                                      all_weeks_together=data['all_weeks_together'],
+                                      user_email=data['current_user_email'] if data['send_log_email'] else None)
+            self.follow(job)
+
+        elif data['action'] == 'attach':
+            try:
+                self.follow(SolveJob.objects.get(id=data['job_id']))
+            except (KeyError, ValueError, ObjectDoesNotExist):
+                self.send(text_data=json.dumps({
+                    'message': 'there is no such solve job!',
+                    'action': 'error'
+                }))
 
         elif data['action'] == 'stop':
-            solver_child_process = cache.get("solver_child_process")
-            if solver_child_process:
+            job_id = data.get('job_id') or self.job_id
+            job = solve_queue.cancel(job_id) if job_id else None
+            if job is not None and job.status == SolveJob.RUNNING:
                 self.send(text_data=json.dumps({
-                    'message': 'sending SIGINT to solver (PID:'+str(solver_child_process)+')...',
-                    'action': 'aborted'
+                    'message': f'interrupting solve job #{job.id} (PID:{job.worker_pid})...',
+                    'action': 'info',
+                    'job_id': job.id
+                }))
+            elif job is not None and job.status == SolveJob.CANCELLED:
+                self.send(text_data=json.dumps({
+                    'message': f'solve job #{job.id} cancelled',
+                    'action': 'aborted',
+                    'job_id': job.id
                 }))
-                os.kill(solver_child_process, signal.SIGINT)
-                cache.delete('solver_child_process')
             else:
                 self.send(text_data=json.dumps({
                     'message': 'there is no running solver!',
                     'action': 'aborted'
                 }))
 
-
-
-def solver_subprocess_SIGINT_handler(sig, stack):
-    # ignore in current process and forward to process group (=> gurobi)
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
-    os.kill(0, signal.SIGINT)
-
-
-class Solve():
-    def __init__(self, department_abbrev, weeks, timestamp, training_programme, chan, time_limit, solver,
-                 pre_assign_rooms, post_assign_rooms, send_log_email, user_email, stabilize_work_copy=None, all_weeks_together=True):
-        super(Solve, self).__init__()
-        self.department_abbrev = department_abbrev
-        self.weeks = weeks
-        self.timestamp = timestamp
-        self.channel = chan
-        self.time_limit = time_limit
-        self.solver = solver
-        self.stabilize_work_copy = stabilize_work_copy
-        self.pre_assign_rooms = pre_assign_rooms
-        self.post_assign_rooms = post_assign_rooms
-        self.all_weeks_together = all_weeks_together
-        if send_log_email:
-            self.user_email = user_email
-        else:
-            self.user_email = None
-
-        # if all train progs are called, training_programme=''
+    def follow(self, job):
+        """
+        Streams the log of job to the WebSocket, until it is over
+        """
+        # stop following the previous job
+        self.followed.set()
+        self.followed = Event()
+        self.job_id = job.id
+        Thread(target=self.stream_job_log, args=(job.id, self.followed), daemon=True).start()
+
+    def stream_job_log(self, job_id, stopped, poll_interval=1):
         try:
-            self.training_programme = TrainingProgramme.objects.get(abbrev=training_programme,
-                                                                    department__abbrev=department_abbrev)
-        except ObjectDoesNotExist:
-            self.training_programme = None
-    
-    def start(self):
-        solver_child_process = cache.get("solver_child_process")
-        if solver_child_process:
-            self.channel.send(text_data=json.dumps({'message': "another solver is currently running (PID:"+str(solver_child_process)+"), let's wait"}))
+            self.stream_job_log_until_over(job_id, stopped, poll_interval)
+        finally:
+            connection.close()
+
+    def stream_job_log_until_over(self, job_id, stopped, poll_interval):
+        job = SolveJob.objects.get(id=job_id)
+        if job.status == SolveJob.QUEUED:
+            self.send(text_data=json.dumps({
+                'message': f'solve job #{job.id} queued, {solve_queue.queue_position(job)} job(s) ahead',
+                'action': 'info',
+                'job_id': job.id
+            }))
+        while job.status == SolveJob.QUEUED and not stopped.wait(poll_interval):
+            job.refresh_from_db(fields=['status'])
+
+        position = 0
+        while not stopped.is_set():
+            job.refresh_from_db(fields=['status', 'exit_code'])
+            if os.path.exists(job.log_file):
+                with open(job.log_file) as log:
+                    log.seek(position)
+                    for line in log:
+                        self.send(text_data=json.dumps({'message': line, 'action': 'info', 'job_id': job.id}))
+                    position = log.tell()
+            if job.is_over:
+                break
+            stopped.wait(poll_interval)
+
+        if stopped.is_set():
             return
-        try:
-            (rd,wd) = os.pipe()
-            solver_child_process = os.fork()
-            if solver_child_process == 0:
-                os.dup2(wd,1)   # redirect stdout
-                os.dup2(wd,2)   # redirect stderr
-                try:
-                    if self.all_weeks_together:
-                        t = MyTTModel(self.department_abbrev, weeks=self.weeks, train_prog=self.training_programme,
-                                      stabilize_work_copy=self.stabilize_work_copy,
-                                      pre_assign_rooms=self.pre_assign_rooms, post_assign_rooms=self.post_assign_rooms)
-                        os.setpgid(os.getpid(), os.getpid())
-                        signal.signal(signal.SIGINT, solver_subprocess_SIGINT_handler)
-                        t.solve(time_limit=self.time_limit, solver=self.solver, send_gurobi_logs_email_to=self.user_email)
-                    else:
-                        for w in self.weeks:
-                            t = MyTTModel(self.department_abbrev, [w], train_prog=self.training_programme,
-                                          stabilize_work_copy = self.stabilize_work_copy,
-                                          pre_assign_rooms=self.pre_assign_rooms, post_assign_rooms=self.post_assign_rooms)
-                            os.setpgid(os.getpid(), os.getpid())
-                            signal.signal(signal.SIGINT, solver_subprocess_SIGINT_handler)
-                            t.solve(time_limit=self.time_limit, solver=self.solver, send_gurobi_logs_email_to=self.user_email)
-                except:
-                    traceback.print_exc()
-                    print("solver aborting...")
-                    os._exit(1)
-                finally:
-                    print("solver exiting")
-                    os._exit(0)
-            else:
-                cache.set("solver_child_process", solver_child_process, None)
-                print("starting solver sub-process " + str(solver_child_process))
-                if solver_child_process != cache.get("solver_child_process"):
-                    print("unable to store solver_child_process PID, cache not working?")
-                    self.channel.send(text_data=json.dumps(
-                        {'message': "unable to store solver_child_process PID, you won't be able to stop it via the browser! Is Django cache not working?", 'action': 'error'}))
-                os.close(wd)
-                
-                with io.TextIOWrapper(io.FileIO(rd)) as tube:
-                    for line in tube:
-                        self.channel.send(text_data=json.dumps({'message': line, 'action': 'info'}))
-                
-                while 1:
-                    (child,status) = os.wait()
-                    if child == solver_child_process and os.WIFEXITED(status):
-                        break
-                
-                cache.delete('solver_child_process')
-                if os.WEXITSTATUS(status) != 0:
-                    self.channel.send(text_data=json.dumps({'message': f'solver process has aborted with a {os.WEXITSTATUS(status)} error code', 'action': 'error'}))
-                else:
-                    self.channel.send(text_data=json.dumps({'message': 'solver process has finished', 'action': 'finished'}))
-
-        except OSError as e:
-            print("Exception while launching a solver sub-process:")
-            traceback.print_exc()
-            print("Continuing business as usual...")
-
-    
+        if job.status == SolveJob.FINISHED:
+            self.send(text_data=json.dumps({'message': 'solver process has finished', 'action': 'finished',
+                                            'job_id': job.id}))
+        elif job.status == SolveJob.CANCELLED:
+            self.send(text_data=json.dumps({'message': f'solve job #{job.id} cancelled', 'action': 'aborted',
+                                            'job_id': job.id}))
+        else:
+            self.send(text_data=json.dumps({'message': f'solver process has aborted with a {job.exit_code} error code',
+                                            'action': 'error', 'job_id': job.id}))
+
+
 # https://vincenttide.com/blog/1/django-channels-and-celery-example/
 # http://docs.celeryproject.org/en/master/django/first-steps-with-django.html#django-first-steps
 # http://docs.celeryproject.org/en/master/getting-started/next-steps.html#next-steps
@@ -0,0 +1,33 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from solve_board.solve_queue import worker_loop, fail_orphan_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of solver workers processing the queued solve jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.SOLVE_WORKERS,
+                            help='number of jobs that can be solved concurrently')
+
+    def handle(self, *args, **options):
+        fail_orphan_jobs()
+        # each worker opens its own database connection
+        connections.close_all()
+        workers = [multiprocessing.Process(target=worker_loop, daemon=True)
+                   for _ in range(options['workers'])]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {len(workers)} solver workers"))
+
+        def stop_workers(sig, stack):
+            for w in workers:
+                w.terminate()
+        signal.signal(signal.SIGTERM, stop_workers)
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0091_auto_20221124_2149'),
+        ('solve_board', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolveJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.CharField(blank=True, max_length=30)),
+                ('time_limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('solver', models.CharField(max_length=50)),
+                ('stabilize_work_copy', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('pre_assign_rooms', models.BooleanField(default=False)),
+                ('post_assign_rooms', models.BooleanField(default=True)),
+                ('all_weeks_together', models.BooleanField(default=True)),
+                ('user_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('status', models.CharField(choices=[('Q', 'Queued'), ('R', 'Running'), ('F', 'Finished'), ('E', 'Failed'), ('C', 'Cancelled')], default='Q', max_length=1)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('worker_pid', models.PositiveIntegerField(blank=True, null=True)),
+                ('exit_code', models.SmallIntegerField(blank=True, null=True)),
+                ('log_file', models.CharField(default=None, max_length=1000, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='base.Department')),
+                ('train_prog', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='base.TrainingProgramme')),
+                ('weeks', models.ManyToManyField(to='base.Week')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solve_board', '0002_solvejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solvejob',
+            name='mip_start_work_copy',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
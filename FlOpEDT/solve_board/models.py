@@ -45,3 +45,49 @@ class SolveRun(models.Model):
     end_year = models.PositiveSmallIntegerField(null=True, blank=True)
     log_file = models.CharField(null=True, default=None, max_length = 1000)
     iis_file = models.CharField(null=True, default=None, max_length = 1000)
+
+
+class SolveJob(models.Model):
+    """
+    A timetable generation request, queued until a solver worker runs it
+    (cf. solve_board.solve_queue and the solve_workers command)
+    """
+    QUEUED = 'Q'
+    RUNNING = 'R'
+    FINISHED = 'F'
+    FAILED = 'E'
+    CANCELLED = 'C'
+
+    status_choices = ((QUEUED, 'Queued'),
+                      (RUNNING, 'Running'),
+                      (FINISHED, 'Finished'),
+                      (FAILED, 'Failed'),
+                      (CANCELLED, 'Cancelled'))
+
+    department = models.ForeignKey('base.Department', on_delete=models.CASCADE)
+    weeks = models.ManyToManyField('base.Week')
+    train_prog = models.ForeignKey('base.TrainingProgramme', null=True, blank=True, on_delete=models.SET_NULL)
+    timestamp = models.CharField(max_length=30, blank=True)
+    time_limit = models.PositiveIntegerField(null=True, blank=True)
+    solver = models.CharField(max_length=50)
+    stabilize_work_copy = models.PositiveSmallIntegerField(null=True, blank=True)
+    mip_start_work_copy = models.PositiveSmallIntegerField(null=True, blank=True)
+    pre_assign_rooms = models.BooleanField(default=False)
+    post_assign_rooms = models.BooleanField(default=True)
+    all_weeks_together = models.BooleanField(default=True)
+    user_email = models.EmailField(null=True, blank=True)
+    status = models.CharField(max_length=1, choices=status_choices, default=QUEUED)
+    cancel_requested = models.BooleanField(default=False)
+    worker_pid = models.PositiveIntegerField(null=True, blank=True)
+    exit_code = models.SmallIntegerField(null=True, blank=True)
+    log_file = models.CharField(null=True, default=None, max_length=1000)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_over(self):
+        return self.status in (SolveJob.FINISHED, SolveJob.FAILED, SolveJob.CANCELLED)
+
+    def __str__(self):
+        return f"job #{self.id} ({self.department.abbrev}, {self.get_status_display()})"
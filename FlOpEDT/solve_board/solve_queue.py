@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the FlOpEDT/FlOpScheduler project.
+# Copyright (c) 2017
+# Authors: Iulian Ober, Paul Renaud-Goud, Pablo Seban, et al.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# You can be released from the requirements of the license by purchasing
+# a commercial license. Buying such a license is mandatory as soon as
+# you develop activities involving the FlOpEDT/FlOpScheduler software
+# without disclosing the source code of your own applications.
+
+"""
+Database backed queue of solve jobs.
+
+The solve board enqueues SolveJob records; solver workers (cf. the solve_workers command) claim
+them one at a time. A job is only started when no running job of the same department shares one
+of its weeks, so that different departments, or different weeks, are solved concurrently.
+Each job runs in a forked process whose output goes to the job log file, which the WebSocket
+consumers follow.
+If settings.SOLVE_MODEL_SESSIONS > 0, the jobs that solve a single model run instead in long-lived
+model sessions, which keep the built model: a later job with the same weeks and parameters only
+updates the specific constraints that have been toggled or modified, and warm-starts the solver.
+A session is dropped as soon as the data its model was built from may have changed (cf. model_data_stamp),
+and after settings.SOLVE_MODEL_SESSION_TTL without use.
+"""
+
+import logging
+import multiprocessing
+from collections import OrderedDict
+import os
+import signal
+import time
+import traceback
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from base.models import Department, Mode, EdtVersion, Course, UserPreference
+from base.room_closure import version_cache_key as room_closure_version_cache_key
+from base.model_data import model_data_version
+from solve_board.models import SolveJob
+
+logger = logging.getLogger(__name__)
+
+solve_jobs_log_path = os.path.join(settings.TMP_DIRECTORY, "misc/logs/solve_jobs")
+
+
+def job_log_filename(job_id):
+    return os.path.join(solve_jobs_log_path, f"job_{job_id}.log")
+
+
+def enqueue(department, weeks, **parameters):
+    """
+    Creates a queued SolveJob; parameters are SolveJob fields (train_prog, solver, time_limit...)
+    """
+    job = SolveJob.objects.create(department=department, **parameters)
+    job.weeks.set(weeks)
+    job.log_file = job_log_filename(job.id)
+    job.save(update_fields=['log_file'])
+    return job
+
+
+def conflicting_running_jobs(job):
+    return SolveJob.objects.filter(status=SolveJob.RUNNING,
+                                   department_id=job.department_id,
+                                   weeks__in=job.weeks.all()) \
+        .exclude(id=job.id)
+
+
+def claim_next_job(worker_pid):
+    """
+    Marks as running the oldest queued job that does not conflict with a running one, and returns it
+    (None if there is no such job)
+    """
+    with transaction.atomic():
+        for job in SolveJob.objects.select_for_update(skip_locked=True) \
+                .filter(status=SolveJob.QUEUED).order_by('id'):
+            # serializes the claims of the jobs of a department, so that two workers
+            # cannot start conflicting jobs at the same time
+            Department.objects.select_for_update().get(id=job.department_id)
+            if conflicting_running_jobs(job).exists():
+                continue
+            job.status = SolveJob.RUNNING
+            job.worker_pid = worker_pid
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'worker_pid', 'started_at'])
+            return job
+    return None
+
+
+def cancel(job_id):
+    """
+    Cancels a queued job, or asks its worker to interrupt a running one.
+    Returns the job, or None if it does not exist.
+    """
+    SolveJob.objects.filter(id=job_id, status=SolveJob.QUEUED) \
+        .update(status=SolveJob.CANCELLED, finished_at=timezone.now())
+    SolveJob.objects.filter(id=job_id, status=SolveJob.RUNNING).update(cancel_requested=True)
+    return SolveJob.objects.filter(id=job_id).first()
+
+
+def queue_position(job):
+    """
+    Number of queued jobs created before job
+    """
+    return SolveJob.objects.filter(status=SolveJob.QUEUED, id__lt=job.id).count()
+
+
+def build_model(job, weeks):
+    from MyFlOp.MyTTModel import MyTTModel
+    return MyTTModel(job.department.abbrev, weeks=weeks, train_prog=job.train_prog,
+                     stabilize_work_copy=job.stabilize_work_copy,
+                     pre_assign_rooms=job.pre_assign_rooms, post_assign_rooms=job.post_assign_rooms)
+
+
+def solve_weeks_one_by_one(job, weeks, target_work_copy=None, threads=None):
+    """
+    Builds and solves a model for each week of weeks, in sequence
+    """
+    for week in weeks:
+        t = build_model(job, [week])
+        t.solve(time_limit=job.time_limit, target_work_copy=target_work_copy, solver=job.solver, threads=threads,
+                send_gurobi_logs_email_to=job.user_email, mip_start_work_copy=job.mip_start_work_copy)
+
+
+def solve_job(job):
+    """
+    Runs the solver for job, in the current process.
+
+    If the weeks are not solved together, the groups of weeks linked by cross-week constraints are
+    solved in parallel by settings.SOLVE_WEEKS_PROCESSES processes, sharing settings.SOLVER_THREADS
+    (the cores, if None), each group being solved week after week. All the weeks go to the same work copy.
+    """
+    from TTapp.TTUtils import dependent_weeks_groups, first_free_work_copy_of_weeks
+    weeks = list(job.weeks.all().order_by('year', 'nb'))
+    if job.all_weeks_together:
+        t = build_model(job, weeks)
+        t.solve(time_limit=job.time_limit, solver=job.solver, threads=settings.SOLVER_THREADS,
+                send_gurobi_logs_email_to=job.user_email, mip_start_work_copy=job.mip_start_work_copy)
+        return
+
+    if job.department.mode.cosmo == Mode.COOPERATIVE_BY_WORKER:
+        target_work_copy = 0
+    else:
+        target_work_copy = first_free_work_copy_of_weeks(job.department, weeks)
+    groups = dependent_weeks_groups(job.department, weeks, job.train_prog)
+    processes = min(settings.SOLVE_WEEKS_PROCESSES, len(groups))
+    if processes <= 1:
+        for group in groups:
+            solve_weeks_one_by_one(job, group, target_work_copy, threads=settings.SOLVER_THREADS)
+        return
+
+    threads = max(1, (settings.SOLVER_THREADS or os.cpu_count() or 1) // processes)
+    print(f"solving {len(groups)} groups of weeks with {processes} processes of {threads} threads")
+    # the pool processes must not share the database connections of the current one
+    connections.close_all()
+    pool = multiprocessing.get_context('fork').Pool(processes)
+    try:
+        pool.starmap(solve_weeks_one_by_one,
+                     [(job, group, target_work_copy, threads) for group in groups],
+                     chunksize=1)
+    finally:
+        # lets the processes flush their output into the job log
+        pool.close()
+        pool.join()
+
+
+def solver_subprocess_SIGINT_handler(sig, stack):
+    # ignore in current process and forward to process group (=> gurobi)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.kill(0, signal.SIGINT)
+
+
+def redirect_output(log_file):
+    fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(fd, 1)   # redirect stdout
+    os.dup2(fd, 2)   # redirect stderr
+    os.close(fd)
+
+
+def record_job_end(job, interrupted, exit_code):
+    if interrupted:
+        final_status = SolveJob.CANCELLED
+    elif exit_code == 0:
+        final_status = SolveJob.FINISHED
+    else:
+        final_status = SolveJob.FAILED
+    SolveJob.objects.filter(id=job.id).update(status=final_status, exit_code=exit_code,
+                                              finished_at=timezone.now())
+    return final_status
+
+
+def run_job(job, poll_interval=1):
+    """
+    Runs job in a forked process, interrupting it if its cancellation is requested,
+    and records its final status
+    """
+    os.makedirs(solve_jobs_log_path, exist_ok=True)
+    log_file = job.log_file or job_log_filename(job.id)
+    # the child must not share the database connections of the worker
+    connections.close_all()
+    child = os.fork()
+    if child == 0:
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGINT, solver_subprocess_SIGINT_handler)
+        redirect_output(log_file)
+        exit_code = 0
+        try:
+            solve_job(job)
+        except:
+            traceback.print_exc()
+            print("solver aborting...")
+            exit_code = 1
+        finally:
+            print("solver exiting", flush=True)
+            os._exit(exit_code)
+
+    interrupted = False
+    while True:
+        pid, status = os.waitpid(child, os.WNOHANG)
+        if pid == child:
+            break
+        if not interrupted and SolveJob.objects.filter(id=job.id, cancel_requested=True).exists():
+            logger.info(f"interrupting solve job #{job.id} (PID:{child})")
+            try:
+                os.killpg(child, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+            interrupted = True
+        time.sleep(poll_interval)
+
+    exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    return record_job_end(job, interrupted, exit_code)
+
+
+def model_session_key(job):
+    """
+    Jobs of the same key build the same model, up to the specific constraints (None if the job
+    builds several models)
+    """
+    weeks_ids = tuple(job.weeks.all().order_by('year', 'nb').values_list('id', flat=True))
+    if not job.all_weeks_together and len(weeks_ids) > 1:
+        return None
+    return (job.department_id, weeks_ids, job.train_prog_id, job.stabilize_work_copy,
+            job.pre_assign_rooms, job.post_assign_rooms)
+
+
+def model_data_stamp(job):
+    """
+    Values changing whenever the data of the model of job may have changed: timetable versions of its
+    weeks (in every department, whose public copies constrain the model), courses of its department
+    and weeks, availabilities of its tutors, and the versions stored in the cache by
+    base.model_data.invalidate_model_sessions and by the room hierarchy
+    """
+    weeks = list(job.weeks.all())
+    versions = EdtVersion.objects.filter(week__in=weeks) \
+        .aggregate(total=Sum('version'), last=Max('version'))
+    courses = Course.objects.filter(type__department_id=job.department_id, week__in=weeks) \
+        .aggregate(nb=Count('id'), last=Max('id'))
+    preferences = UserPreference.objects.filter(user__departments__id=job.department_id) \
+        .aggregate(nb=Count('id'), last=Max('id'))
+    return (versions['total'], versions['last'], courses['nb'], courses['last'],
+            preferences['nb'], preferences['last'],
+            model_data_version(), cache.get(room_closure_version_cache_key))
+
+
+def model_session_loop(connection):
+    """
+    Solves the jobs whose ids are received from connection with the same model: the first job builds it,
+    the next ones only update its specific constraints and start from the previous solution.
+    Sends back the exit code of each job, and ends after a failure.
+    """
+    os.setpgid(0, 0)
+    model = None
+    while True:
+        try:
+            job_id = connection.recv()
+        except EOFError:
+            # the worker is gone
+            break
+        if job_id is None:
+            break
+        # the connection may have been idle for long
+        connections.close_all()
+        job = SolveJob.objects.get(id=job_id)
+        redirect_output(job.log_file or job_log_filename(job.id))
+        signal.signal(signal.SIGINT, solver_subprocess_SIGINT_handler)
+        exit_code = 0
+        try:
+            if model is None:
+                model = build_model(job, list(job.weeks.all().order_by('year', 'nb')))
+                warm_start = False
+            else:
+                print(f"Reusing the model of weeks #{model.weeks}")
+                model.update_specific_constraints()
+                warm_start = True
+            model.solve(time_limit=job.time_limit, solver=job.solver, threads=settings.SOLVER_THREADS,
+                        send_gurobi_logs_email_to=job.user_email, warm_start=warm_start,
+                        mip_start_work_copy=job.mip_start_work_copy)
+        except:
+            traceback.print_exc()
+            print("solver aborting...")
+            exit_code = 1
+        finally:
+            print("solver exiting", flush=True)
+        connection.send(exit_code)
+        if exit_code != 0:
+            break
+
+
+class ModelSession(object):
+    """
+    Process keeping a built model, cf. model_session_loop
+    """
+    def __init__(self):
+        self.connection, child_connection = multiprocessing.Pipe()
+        # the process must not share the database connections of the worker
+        connections.close_all()
+        self.process = multiprocessing.get_context('fork').Process(target=model_session_loop,
+                                                                   args=(child_connection,),
+                                                                   daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.last_use = time.time()
+        # model_data_stamp of the data the model is built from
+        self.data_stamp = None
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(None)
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+def close_expired_model_sessions(model_sessions):
+    for key, session in list(model_sessions.items()):
+        if time.time() - session.last_use > settings.SOLVE_MODEL_SESSION_TTL:
+            session.close()
+            del model_sessions[key]
+
+
+def run_job_in_model_session(job, model_sessions, key, poll_interval=1):
+    """
+    Runs job in the model session of key (started if needed), interrupting it if its cancellation
+    is requested, and records its final status.
+    model_sessions is an OrderedDict {key => ModelSession}, from the least recently used
+    """
+    os.makedirs(solve_jobs_log_path, exist_ok=True)
+    data_stamp = model_data_stamp(job)
+    session = model_sessions.pop(key, None)
+    if session is not None and session.data_stamp != data_stamp:
+        logger.info(f"the data of the model of job #{job.id} changed, dropping its model session")
+        session.close()
+        session = None
+    if session is None:
+        while len(model_sessions) >= settings.SOLVE_MODEL_SESSIONS:
+            model_sessions.popitem(last=False)[1].close()
+        session = ModelSession()
+        session.data_stamp = data_stamp
+    session.connection.send(job.id)
+
+    interrupted = False
+    exit_code = -1
+    while True:
+        if session.connection.poll(poll_interval):
+            exit_code = session.connection.recv()
+            break
+        if not session.process.is_alive():
+            break
+        if not interrupted and SolveJob.objects.filter(id=job.id, cancel_requested=True).exists():
+            logger.info(f"interrupting solve job #{job.id} (PID:{session.process.pid})")
+            try:
+                os.killpg(session.process.pid, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+            interrupted = True
+
+    if exit_code == 0:
+        session.last_use = time.time()
+        model_sessions[key] = session
+    else:
+        session.close()
+    return record_job_end(job, interrupted, exit_code)
+
+
+def fail_orphan_jobs():
+    """
+    Marks as failed the running jobs whose worker is no longer alive (workers run on a single host)
+    """
+    for job in SolveJob.objects.filter(status=SolveJob.RUNNING):
+        try:
+            os.kill(job.worker_pid, 0)
+        except (ProcessLookupError, TypeError):
+            SolveJob.objects.filter(id=job.id, status=SolveJob.RUNNING) \
+                .update(status=SolveJob.FAILED, finished_at=timezone.now())
+        except PermissionError:
+            pass
+
+
+def worker_loop(poll_interval=2):
+    """
+    Claims and runs jobs, forever
+    """
+    worker_pid = os.getpid()
+    logger.info(f"solve worker {worker_pid} started")
+    model_sessions = OrderedDict()
+    while True:
+        close_expired_model_sessions(model_sessions)
+        job = claim_next_job(worker_pid)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        logger.info(f"solve worker {worker_pid} runs job #{job.id}")
+        key = model_session_key(job) if settings.SOLVE_MODEL_SESSIONS > 0 else None
+        if key is None:
+            run_job(job)
+        else:
+            run_job_in_model_session(job, model_sessions, key)
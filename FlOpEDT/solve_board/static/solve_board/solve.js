@@ -24,6 +24,7 @@
 var socket;
 
 var opti_timestamp;
+var opti_job_id;
 
 var select_opti_date, select_opti_train_prog;
 var week_year_sel, train_prog_sel, txt_area;
@@ -70,7 +71,8 @@ function stop() {
         socket.send(JSON.stringify({
             'message': 'kill',
             'action': "stop",
-            'timestamp': opti_timestamp
+            'timestamp': opti_timestamp,
+            'job_id': opti_job_id
         }))
     }
 
@@ -138,6 +140,9 @@ function open_connection() {
         // Get working copy number for stabilization
         var stabilize_working_copy = stabilize_select.value;
 
+        // Get working copy number the solver starts from
+        var mip_start_working_copy = mip_start_select.value;
+
         socket.send(JSON.stringify({
             'message':
                 "C'est ti-par.\n" + opti_timestamp + "\nSolver ok?",
@@ -147,6 +152,7 @@ function open_connection() {
             'train_prog': tp,
             'constraints': constraints,
             'stabilize': stabilize_working_copy,
+            'mip_start': mip_start_working_copy,
             'timestamp': opti_timestamp,
             'time_limit': time_limit,
             'solver': solver,
@@ -253,30 +259,30 @@ function init_work_copies(work_copies) {
     copies = work_copies.slice(0);
     copies.unshift("-");
 
-    // Display or hide working copies list
-    stabilize_div = d3.select("#stabilize");
-    if (work_copies.length == 0) {
-        stabilize_div.style("display", "none");
-    }
-    else {
-        stabilize_div.style("display", "block");
-    }
-
+    // Display or hide working copies lists
+    ["#stabilize", "#mip-start"].forEach(function (div_id) {
+        var copies_div = d3.select(div_id);
+        if (work_copies.length == 0) {
+            copies_div.style("display", "none");
+        }
+        else {
+            copies_div.style("display", "block");
+        }
 
-    // Update working copies list
-    stabilize_sel = stabilize_div.select("select");
 
-    stabilize_sel_data = stabilize_sel 
-        .selectAll("option")
-        .data(copies, (x) => x);
+        // Update working copies list
+        var copies_sel_data = copies_div.select("select")
+            .selectAll("option")
+            .data(copies, (x) => x);
 
-    stabilize_sel_data
-        .enter()
-        .append("option")
-        .attr('value', (d) => d)
-        .text((d) => d);
+        copies_sel_data
+            .enter()
+            .append("option")
+            .attr('value', (d) => d)
+            .text((d) => d);
 
-    stabilize_sel_data.exit().remove();
+        copies_sel_data.exit().remove();
+    });
 }
 
 
@@ -467,6 +473,10 @@ function dispatchAction(token) {
     let action = token.action;
     let message = token.message;
 
+    if (token.job_id) {
+        opti_job_id = token.job_id;
+    }
+
     if (!action) {
         console.log('unrecognized action' + token);
         return;
@@ -708,6 +718,7 @@ function hideFinishLabel() {
 
 var solver_select = document.querySelector("#solver");
 var stabilize_select = document.querySelector("#stabilize select");
+var mip_start_select = document.querySelector("#mip-start select");
 document.getElementById("divAnalyse").style.overflow = "scroll";
 var pre_assign_rooms_checkbox = document.querySelector("#pre-assign-rooms");
 var post_assign_rooms_checkbox = document.querySelector("#post-assign-rooms");
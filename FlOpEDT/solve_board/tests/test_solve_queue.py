@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from base import models as base
+from people.models import Tutor
+from solve_board import solve_queue
+from solve_board.models import SolveJob
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ModelDataStampTestCase(TestCase):
+
+    def setUp(self):
+        self.department = base.Department.objects.create(name="departement_solve", abbrev="dsolve")
+        tp = base.TrainingProgramme.objects.create(name="tp1", abbrev="tp1", department=self.department)
+        period = base.Period.objects.create(name="S1", department=self.department, starting_week=1, ending_week=20)
+        self.module = base.Module.objects.create(name="Algo", abbrev="ALGO", train_prog=tp, period=period)
+        self.course_type = base.CourseType.objects.create(name="TD", department=self.department)
+        self.week, _ = base.Week.objects.get_or_create(nb=10, year=2023)
+        self.course = base.Course.objects.create(type=self.course_type, module=self.module, week=self.week)
+        self.job = solve_queue.enqueue(self.department, [self.week], solver='PULP_CBC_CMD')
+
+    def assertStampChanges(self, change):
+        stamp = solve_queue.model_data_stamp(self.job)
+        change()
+        self.assertNotEqual(solve_queue.model_data_stamp(self.job), stamp)
+
+    def test_stamp(self):
+        self.assertEqual(solve_queue.model_data_stamp(self.job), solve_queue.model_data_stamp(self.job))
+        self.assertStampChanges(lambda: base.Course.objects.create(type=self.course_type, module=self.module,
+                                                                   week=self.week))
+        self.assertStampChanges(lambda: base.EdtVersion.objects.create(department=self.department,
+                                                                       week=self.week, version=1))
+        self.assertStampChanges(lambda: base.ScheduledCourse.objects.create(course=self.course, day='m',
+                                                                            start_time=480, work_copy=0))
+        tutor = Tutor.objects.create(username="prof_solve")
+        tutor.departments.add(self.department)
+        self.assertStampChanges(lambda: base.UserPreference.objects.create(user=tutor, day='m', start_time=480,
+                                                                           duration=60, value=8))
+        # other work copies do not matter
+        stamp = solve_queue.model_data_stamp(self.job)
+        base.ScheduledCourse.objects.create(course=self.course, day='m', start_time=480, work_copy=1)
+        self.assertEqual(solve_queue.model_data_stamp(self.job), stamp)
+
+
+class SolveQueueTestCase(TestCase):
+
+    def setUp(self):
+        self.department = base.Department.objects.create(name="departement_solve", abbrev="dsolve")
+        self.other_department = base.Department.objects.create(name="departement_solve2", abbrev="dsolve2")
+        self.weeks = [base.Week.objects.get_or_create(nb=nb, year=2023)[0] for nb in (10, 11)]
+
+    def enqueue(self, weeks, department=None):
+        return solve_queue.enqueue(department or self.department, weeks, solver='PULP_CBC_CMD')
+
+    def status(self, job):
+        job.refresh_from_db()
+        return job.status
+
+    def test_claim_next_job(self):
+        self.assertIsNone(solve_queue.claim_next_job(1234))
+        first = self.enqueue([self.weeks[0]])
+        second = self.enqueue([self.weeks[1]])
+        job = solve_queue.claim_next_job(1234)
+        self.assertEqual(job, first)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker_pid), (SolveJob.RUNNING, 1234))
+        self.assertIsNotNone(job.started_at)
+        # another week of the department can run at the same time
+        self.assertEqual(solve_queue.claim_next_job(1235), second)
+        self.assertIsNone(solve_queue.claim_next_job(1236))
+
+    def test_claim_conflicting_job(self):
+        running = self.enqueue(self.weeks)
+        self.assertEqual(solve_queue.claim_next_job(1234), running)
+        conflicting = self.enqueue([self.weeks[1]])
+        other_department = self.enqueue([self.weeks[1]], department=self.other_department)
+        self.assertEqual(list(solve_queue.conflicting_running_jobs(conflicting)), [running])
+        self.assertEqual(list(solve_queue.conflicting_running_jobs(other_department)), [])
+        self.assertEqual(list(solve_queue.conflicting_running_jobs(running)), [])
+
+        # the conflicting job is skipped, and claimed once the running one is over
+        self.assertEqual(solve_queue.claim_next_job(1235), other_department)
+        self.assertIsNone(solve_queue.claim_next_job(1235))
+        self.assertEqual(self.status(conflicting), SolveJob.QUEUED)
+        solve_queue.record_job_end(running, interrupted=False, exit_code=0)
+        self.assertEqual(self.status(running), SolveJob.FINISHED)
+        self.assertEqual(solve_queue.conflicting_running_jobs(conflicting).count(), 0)
+        self.assertEqual(solve_queue.claim_next_job(1235), conflicting)
+
+    def test_cancel(self):
+        queued = self.enqueue([self.weeks[0]])
+        running = self.enqueue([self.weeks[1]])
+        SolveJob.objects.filter(id=running.id).update(status=SolveJob.RUNNING, worker_pid=1234)
+        finished = self.enqueue([self.weeks[1]])
+        SolveJob.objects.filter(id=finished.id).update(status=SolveJob.FINISHED)
+
+        # a queued job is cancelled at once
+        job = solve_queue.cancel(queued.id)
+        self.assertEqual(job.status, SolveJob.CANCELLED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(solve_queue.claim_next_job(1235))
+        # the worker of a running job is asked to interrupt it
+        job = solve_queue.cancel(running.id)
+        self.assertEqual((job.status, job.cancel_requested), (SolveJob.RUNNING, True))
+        self.assertEqual(solve_queue.record_job_end(job, interrupted=True, exit_code=1), SolveJob.CANCELLED)
+        # a job that is over is left as is
+        job = solve_queue.cancel(finished.id)
+        self.assertEqual((job.status, job.cancel_requested), (SolveJob.FINISHED, False))
+        self.assertIsNone(solve_queue.cancel(-1))
+
+    def test_fail_orphan_jobs(self):
+        dead_process = subprocess.Popen(['true'])
+        dead_process.wait()
+        jobs = {}
+        for name, pid in (('alive', os.getpid()), ('dead', dead_process.pid), ('no_pid', None)):
+            jobs[name] = self.enqueue([self.weeks[0]])
+            SolveJob.objects.filter(id=jobs[name].id).update(status=SolveJob.RUNNING, worker_pid=pid)
+        queued = self.enqueue([self.weeks[0]])
+        solve_queue.fail_orphan_jobs()
+        self.assertEqual(self.status(jobs['alive']), SolveJob.RUNNING)
+        self.assertEqual(self.status(jobs['dead']), SolveJob.FAILED)
+        self.assertIsNotNone(jobs['dead'].finished_at)
+        self.assertEqual(self.status(jobs['no_pid']), SolveJob.FAILED)
+        self.assertEqual(self.status(queued), SolveJob.QUEUED)
+
+        # the process of another user is alive
+        SolveJob.objects.filter(id=jobs['dead'].id).update(status=SolveJob.RUNNING)
+        with mock.patch('solve_board.solve_queue.os.kill', side_effect=PermissionError):
+            solve_queue.fail_orphan_jobs()
+        self.assertEqual(self.status(jobs['dead']), SolveJob.RUNNING)
@@ -48,6 +48,7 @@ fi
 if [ "$START_SERVER" = 'on' ]; then
     echo "run $CONFIG server"
     cd /code/FlOpEDT || exit
+    /code/FlOpEDT/manage.py solve_workers &
     [ "$CONFIG" = 'production' ] && daphne -b 0.0.0.0 -p 8000 FlOpEDT.asgi:application
     [ "$CONFIG" = 'development' ] && /code/FlOpEDT/manage.py runserver 0.0.0.0:8000
 fi